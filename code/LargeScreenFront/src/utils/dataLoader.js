@@ -75,6 +75,230 @@ export const createLaneTimeSeriesData = (data, lane) => {
     .map(item => [item.time, item.count])
 }
 
+/**
+ * 读取后端预聚合的车道流量数据（dashboard_payload.py 生成），只拉取需要显示的方向
+ * @param {string} intersection - 交叉口编号，如 '170'
+ * @param {string} unit - '1min' 或 '15min'
+ * @param {Array} directions - 需要的方向列表
+ * @returns {Object} 按方向组织的 payload：{ start, step, length, lanes, values, points }
+ */
+export const loadLaneFlowPayload = async (intersection, unit, directions) => {
+  const base = `/data/dashboard/${intersection}/${unit}`
+  const response = await fetch(`${base}/index.json`)
+  if (!response.ok) {
+    throw new Error(`HTTP error! status: ${response.status}`)
+  }
+  const index = await response.json()
+
+  const result = {}
+  await Promise.all(directions.map(async (dir) => {
+    const meta = index.directions[dir]
+    if (!meta) {
+      result[dir] = createEmptyPayload(index.start_ms, index.step_ms)
+      return
+    }
+
+    const res = await fetch(`${base}/${meta.file}`)
+    if (!res.ok) {
+      throw new Error(`HTTP error! status: ${res.status}`)
+    }
+
+    let values
+    if (index.format === 'f32') {
+      // 小端 Float32，lanes × length 行优先，缺失为 NaN
+      const flat = new Float32Array(await res.arrayBuffer())
+      values = meta.lanes.map((_, i) => flat.subarray(i * index.length, (i + 1) * index.length))
+    } else {
+      values = (await res.json()).values
+    }
+
+    result[dir] = {
+      start: index.start_ms,
+      step: index.step_ms,
+      length: index.length,
+      lanes: meta.lanes,
+      values: values,
+      points: meta.points
+    }
+  }))
+
+  console.log(`已加载交叉口 ${intersection} 的 ${unit} 预聚合数据: ${directions.join(', ')}`)
+  return result
+}
+
+const createEmptyPayload = (start = 0, step = 60000) => ({
+  start: start,
+  step: step,
+  length: 0,
+  lanes: [],
+  values: [],
+  points: 0
+})
+
+/**
+ * 将 loadCSVData 的结果转换为与 loadLaneFlowPayload 相同的结构（预聚合数据缺失时的兼容路径）
+ * @param {Array} data - loadCSVData 返回的数据数组
+ * @param {Array} directions - 需要的方向列表
+ * @returns {Object} 按方向组织的 payload
+ */
+export const payloadFromRecords = (data, directions) => {
+  const result = {}
+  directions.forEach(dir => {
+    const rows = data.filter(item => item.direction === dir)
+    if (rows.length === 0) {
+      result[dir] = createEmptyPayload()
+      return
+    }
+
+    const times = rows.map(item => item.time.getTime())
+    const start = Math.min(...times)
+    // 时间步长取相邻时刻的最小间隔（只有一个时刻时按 1 分钟）
+    const uniq = [...new Set(times)].sort((a, b) => a - b)
+    let step = Infinity
+    for (let i = 1; i < uniq.length; i++) {
+      step = Math.min(step, uniq[i] - uniq[i - 1])
+    }
+    if (!isFinite(step)) step = 60000
+    const length = Math.round((Math.max(...times) - start) / step) + 1
+
+    const lanes = getLanesFromData(rows)
+    const values = lanes.map(() => new Array(length).fill(null))
+    rows.forEach((item, i) => {
+      const row = values[lanes.indexOf(item.lane)]
+      const pos = Math.round((times[i] - start) / step)
+      row[pos] = (row[pos] || 0) + item.count
+    })
+
+    result[dir] = { start, step, length, lanes, values, points: rows.length }
+  })
+  return result
+}
+
+/**
+ * 由 payload 生成单个车道的时间序列（按时间轴顺序，无需排序）
+ * @param {Object} payload - 单个方向的 payload
+ * @param {number} laneIndex - 车道在 payload.lanes 中的下标
+ * @returns {Array} 时间序列数据数组 [[time, count], ...]
+ */
+export const createPayloadLaneSeries = (payload, laneIndex) => {
+  const values = payload.values[laneIndex] || []
+  const series = []
+  for (let i = 0; i < values.length; i++) {
+    const v = values[i]
+    if (v !== null && !Number.isNaN(v)) {
+      series.push([new Date(payload.start + i * payload.step), v])
+    }
+  }
+  return series
+}
+
+/**
+ * 读取空间密度瓦片索引（density_tiles.py 生成）
+ * @param {string} name - 数据集名，如 '170'
+ * @returns {Object} index.json：{ crs, cells, min_zoom, max_zoom, start_ms, step_ms, length, bounds, zooms }
+ */
+export const loadDensityIndex = async (name) => {
+  const response = await fetch(`/data/density/${name}/index.json`)
+  if (!response.ok) {
+    throw new Error(`HTTP error! status: ${response.status}`)
+  }
+  const index = await response.json()
+  index.name = name
+  index.cache = new Map()
+  return index
+}
+
+// Web Mercator：经纬度 → zoom 级全局像素坐标（以瓦片为单位），与 density_tiles.mercator_cells 一致
+const lngToTileX = (lng, zoom) => (lng + 180) / 360 * Math.pow(2, zoom)
+const latToTileY = (lat, zoom) => {
+  const phi = lat * Math.PI / 180
+  return (1 - Math.log(Math.tan(phi) + 1 / Math.cos(phi)) / Math.PI) / 2 * Math.pow(2, zoom)
+}
+const tileXToLng = (x, zoom) => x / Math.pow(2, zoom) * 360 - 180
+const tileYToLat = (y, zoom) => {
+  const n = Math.PI - 2 * Math.PI * y / Math.pow(2, zoom)
+  return 180 / Math.PI * Math.atan(Math.sinh(n))
+}
+
+/**
+ * 解码单个瓦片：小端 Uint32 count[n] + Uint16 time[n] + Uint16 cell[n]
+ * @param {ArrayBuffer} buffer - <y>.bin 内容
+ * @returns {Object} { count, time, cell }
+ */
+export const decodeDensityTile = (buffer) => {
+  const n = buffer.byteLength / 8
+  return {
+    count: new Uint32Array(buffer, 0, n),
+    time: new Uint16Array(buffer, 4 * n, n),
+    cell: new Uint16Array(buffer, 6 * n, n)
+  }
+}
+
+/**
+ * 只拉取视野内、当前缩放级别的密度瓦片，并在时间范围内累加
+ * @param {Object} index - loadDensityIndex 的返回值（内含瓦片缓存）
+ * @param {number} zoom - 地图缩放级别（超出 min_zoom..max_zoom 时取最近一级）
+ * @param {Object} bounds - 视野 { west, south, east, north }（WGS84）
+ * @param {Array} timeRange - 时间桶下标 [起, 止)，缺省为全部
+ * @returns {Object} { zoom, cells: [{ south, west, north, east, count }], max }
+ */
+export const loadDensityTiles = async (index, zoom, bounds, timeRange = null) => {
+  const z = Math.min(index.max_zoom, Math.max(index.min_zoom, Math.floor(zoom)))
+  const level = index.zooms[String(z)]
+  const [t0, t1] = timeRange || [0, index.length]
+  if (!level) {
+    return { zoom: z, cells: [], max: 0 }
+  }
+
+  const x0 = Math.floor(lngToTileX(bounds.west, z))
+  const x1 = Math.floor(lngToTileX(bounds.east, z))
+  const y0 = Math.floor(latToTileY(bounds.north, z))
+  const y1 = Math.floor(latToTileY(bounds.south, z))
+  const visible = level.tiles.filter(([x, y]) => x >= x0 && x <= x1 && y >= y0 && y <= y1)
+
+  const cells = []
+  let max = 0
+  await Promise.all(visible.map(async ([x, y]) => {
+    const key = `${z}/${x}/${y}`
+    if (!index.cache.has(key)) {
+      index.cache.set(key, fetch(`/data/density/${index.name}/${key}.bin`).then(res => {
+        if (!res.ok) {
+          throw new Error(`HTTP error! status: ${res.status}`)
+        }
+        return res.arrayBuffer()
+      }).then(decodeDensityTile).catch(error => {
+        index.cache.delete(key)
+        throw error
+      }))
+    }
+    const tile = await index.cache.get(key)
+
+    // 记录按 (时间桶, 格) 升序；同一格在时间范围内累加
+    const sums = new Map()
+    for (let i = 0; i < tile.count.length; i++) {
+      const t = tile.time[i]
+      if (t < t0 || t >= t1) continue
+      sums.set(tile.cell[i], (sums.get(tile.cell[i]) || 0) + tile.count[i])
+    }
+
+    const n = index.cells
+    sums.forEach((count, cell) => {
+      const gx = x * n + (cell % n)
+      const gy = y * n + Math.floor(cell / n)
+      cells.push({
+        west: tileXToLng(gx / n, z),
+        east: tileXToLng((gx + 1) / n, z),
+        north: tileYToLat(gy / n, z),
+        south: tileYToLat((gy + 1) / n, z),
+        count: count
+      })
+      max = Math.max(max, count)
+    })
+  }))
+
+  return { zoom: z, cells, max }
+}
+
 /**
  * 获取图表颜色数组
  * @returns {Array} 颜色数组
@@ -0,0 +1,292 @@
+"""
+供需对齐的稠密矩阵：demand / capacity 长表按 (时刻, direction, movement) 对齐为 序列 × 时间 的 NumPy 数组，
+共享时间轴 times_ms（int64 epoch ms，见 timeaxis.py）与整数序列下标，run_resilience_analysis / build_queryAll_response 的快速路径
+
+    m = SupplyDemandMatrix.from_frames(capacity_df, demand_df)      # 无法对齐时返回 None
+    metrics_df = m.group_metrics()                                   # 同 compute_resilience_metrics 按 (direction, movement)
+    times_ms, demand, capacity, ef = m.resample("15min")             # 同 queryAll 的 resample(rule).mean()
+    curves = m.resample_subsets(masks, "15min")                      # 多个序列子集（批量 queryAll）一次算完
+    merged = m.to_frame()                                            # 同 run_resilience_analysis 的合并长表
+
+对齐口径同 run_resilience_analysis 的左连接：
+  - 序列 = demand 中 (direction, movement, 以及存在的 link_id / intersId / Direction) 的组合，S 行；
+    时间轴 = demand 的全部时刻（升序），T 列；present[s, t] 表示该格有 demand 行
+  - 时刻取 t_ms 列，没有时由 time_bin 换算（naive 视为北京时间），两表时区不同也能对齐
+  - capacity[s, t] 取同一 (time_bin, direction, movement) 的 capacity 行，无匹配为 0（即 fillna(0)）
+  - cap_row / row 记录每格对应的原始行号（−1 为无），to_frame 据此直接拼出合并长表，不再做 pd.merge
+同一格有多行 demand，或同一 (time_bin, direction, movement) 有多行 capacity（合并会产生笛卡尔积）时不满足
+一格一行，from_frames 返回 None，调用方回退到长表路径。
+"""
+
+import numpy as np
+import pandas as pd
+
+from timeaxis import BEIJING_OFFSET_MS, NAT_MS, freq_ms, hour_of_day, to_beijing_aware, to_epoch_ms
+
+# demand 序列键（按出现与否取用），direction / movement 必有
+SERIES_KEYS = ("intersId", "link_id", "Direction", "direction", "movement")
+
+JOIN_KEYS = ["t_ms", "direction", "movement"]
+
+# 与 t_ms 等价的时间列，to_frame 时不从 capacity 侧带出
+TIME_COLUMNS = ("time_bin", "t_ms")
+
+METRIC_COLUMNS = ["direction", "movement", "OR_operational", "DR_design", "RR_recovery"]
+
+
+def _epoch_ms(df):
+    """t_ms 列，没有时由 time_bin 换算；时间列缺失 / 非 datetime 时返回 None"""
+    if "t_ms" in df.columns:
+        return df["t_ms"].to_numpy(dtype=np.int64)
+    if "time_bin" in df.columns and pd.api.types.is_datetime64_any_dtype(df["time_bin"]):
+        return to_epoch_ms(df["time_bin"])
+    return None
+
+
+class SupplyDemandMatrix:
+    """
+    times_ms: int64 epoch ms（T，升序）；series: DataFrame（S，序列键）；
+    demand / capacity / utilized: S × T float（无 demand 的格为 NaN）；present: S × T bool；
+    row / cap_row: S × T int64，对应 demand_df / capacity_df 的行号（−1 为无）。
+    """
+
+    def __init__(self, times_ms, series, demand, capacity, present, row, cap_row, demand_df, capacity_df):
+        self.times_ms = times_ms
+        self.series = series
+        self.demand = demand
+        self.capacity = capacity
+        self.present = present
+        self.row = row
+        self.cap_row = cap_row
+        self._demand_df = demand_df
+        self._capacity_df = capacity_df
+
+    @property
+    def shape(self):
+        return self.present.shape
+
+    @property
+    def times(self):
+        """时间轴，tz-aware 北京时间 DatetimeIndex"""
+        return to_beijing_aware(self.times_ms)
+
+    # ------------------------------------------------------------
+    # 构建
+    # ------------------------------------------------------------
+    @classmethod
+    def from_frames(cls, capacity_df, demand_df, series_keys=None):
+        """
+        capacity_df / demand_df: 已按时间、方向过滤的长表（带 t_ms 或 datetime 型 time_bin），
+        demand 需有 smoothed_demand，capacity 需有 cleaned_capacity。不满足一格一行时返回 None。
+        """
+        if demand_df.empty or capacity_df.empty:
+            return None
+        if "smoothed_demand" not in demand_df.columns or "cleaned_capacity" not in capacity_df.columns:
+            return None
+        if "cleaned_capacity" in demand_df.columns or "smoothed_demand" in capacity_df.columns:
+            return None
+        d_ms, c_ms = _epoch_ms(demand_df), _epoch_ms(capacity_df)
+        if d_ms is None or c_ms is None or (d_ms == NAT_MS).any() or (c_ms == NAT_MS).any():
+            return None
+        if not all(k in df.columns for df in (demand_df, capacity_df) for k in JOIN_KEYS[1:]):
+            return None
+
+        demand_df = demand_df.reset_index(drop=True)
+        capacity_df = capacity_df.reset_index(drop=True)
+        n_d = len(demand_df)
+
+        # 连接键：两表一起编码，NaN / None 与 pd.merge 一样互相匹配
+        codes = []
+        for k in JOIN_KEYS:
+            v = np.concatenate([d_ms, c_ms]) if k == "t_ms" \
+                else pd.concat([demand_df[k], capacity_df[k]], ignore_index=True)
+            code, uniq = pd.factorize(v, use_na_sentinel=False)
+            codes.append((code.astype(np.int64), len(uniq)))
+        join = np.zeros(n_d + len(capacity_df), dtype=np.int64)
+        for code, n in codes:
+            join = join * n + code
+        d_join, c_join = join[:n_d], join[n_d:]
+
+        order = np.argsort(c_join, kind="stable")
+        c_sorted = c_join[order]
+        if len(c_sorted) > 1 and (c_sorted[1:] == c_sorted[:-1]).any():
+            return None
+        pos = np.searchsorted(c_sorted, d_join)
+        pos = np.minimum(pos, len(c_sorted) - 1)
+        matched = c_sorted[pos] == d_join
+        cap_of_row = np.where(matched, order[pos], -1)
+
+        # 序列 × 时间
+        if series_keys is None:
+            series_keys = [k for k in SERIES_KEYS if k in demand_df.columns]
+        series_keys = list(series_keys)
+        grouped = demand_df.groupby(series_keys, dropna=False, sort=True)
+        s_code = grouped.ngroup().to_numpy()
+        series = grouped.size().reset_index()[series_keys]
+        t_code, t_uniq = pd.factorize(d_ms, sort=True)
+        S, T = len(series), len(t_uniq)
+
+        flat = s_code * T + t_code
+        if len(np.unique(flat)) != n_d:
+            return None
+        row = np.full(S * T, -1, dtype=np.int64)
+        row[flat] = np.arange(n_d)
+        row = row.reshape(S, T)
+        present = row >= 0
+
+        cap_row = np.full(S * T, -1, dtype=np.int64)
+        cap_row[flat] = cap_of_row
+        cap_row = cap_row.reshape(S, T)
+
+        d_val = pd.to_numeric(demand_df["smoothed_demand"], errors="coerce").fillna(0).to_numpy(dtype=float)
+        c_val = pd.to_numeric(capacity_df["cleaned_capacity"], errors="coerce").fillna(0).to_numpy(dtype=float)
+        demand = np.full(S * T, np.nan)
+        demand[flat] = d_val
+        capacity = np.full(S * T, np.nan)
+        capacity[flat] = np.where(cap_of_row >= 0, c_val[np.maximum(cap_of_row, 0)], 0.0)
+
+        return cls(np.asarray(t_uniq, dtype=np.int64), series, demand.reshape(S, T), capacity.reshape(S, T), present, row, cap_row,
+                   demand_df, capacity_df)
+
+    # ------------------------------------------------------------
+    # 逐格运算
+    # ------------------------------------------------------------
+    @property
+    def utilized(self):
+        """ef_utilized_cap = min(demand, capacity)"""
+        return np.minimum(self.demand, self.capacity)
+
+    @property
+    def gap(self):
+        """demand − ef_utilized_cap（无 demand 的格为 NaN）"""
+        return self.demand - self.utilized
+
+    # ------------------------------------------------------------
+    # 聚合
+    # ------------------------------------------------------------
+    def group_metrics(self, by=("direction", "movement")):
+        """
+        每组一行：<by>, OR_operational, DR_design, RR_recovery，口径与 compute_resilience_metrics 一致
+        （gap 取组内全部格的均值 / 最大值，基线为北京时间 05 点各格 gap 均值，无 05 点时取全体均值；基线为 0 / NaN 时三项为 None）。
+        """
+        by = list(by)
+        grouped = self.series.groupby(by, dropna=False, sort=True)
+        g_code = grouped.ngroup().to_numpy()
+        keys = grouped.size().reset_index()[by]
+        G = len(keys)
+
+        gap = np.where(self.present, self.gap, 0.0)
+        hour5 = (hour_of_day(self.times_ms) == 5)[None, :] & self.present
+
+        n = np.bincount(g_code, weights=self.present.sum(axis=1), minlength=G)
+        total = np.bincount(g_code, weights=gap.sum(axis=1), minlength=G)
+        n5 = np.bincount(g_code, weights=hour5.sum(axis=1), minlength=G)
+        total5 = np.bincount(g_code, weights=np.where(hour5, gap, 0.0).sum(axis=1), minlength=G)
+        s_max = np.where(self.present, gap, -np.inf).max(axis=1, initial=-np.inf)
+        g_max = np.full(G, -np.inf)
+        np.maximum.at(g_max, g_code, s_max)
+
+        with np.errstate(invalid="ignore", divide="ignore"):
+            gap_mean = total / n
+            baseline = np.where(n5 > 0, total5 / np.maximum(n5, 1), gap_mean)
+            OR = 1 - gap_mean / baseline
+            DR = 1 - g_max / baseline
+
+        rows = []
+        for i in range(G):
+            ok = n[i] > 0 and np.isfinite(baseline[i]) and baseline[i] != 0
+            row = {k: keys[k].iat[i] for k in by}
+            row["OR_operational"] = float(OR[i]) if ok and np.isfinite(OR[i]) else None
+            row["DR_design"] = float(DR[i]) if ok and np.isfinite(DR[i]) else None
+            row["RR_recovery"] = row["OR_operational"]
+            rows.append(row)
+        if not rows:
+            return pd.DataFrame(columns=by + METRIC_COLUMNS[2:])
+        return pd.DataFrame(rows)
+
+    def resample(self, rule="15min"):
+        """
+        全部序列按 rule 合并为一条曲线（同 merged.set_index("time_bin").resample(rule).mean()，按北京时间墙钟分桶，空桶为 NaN）。
+        返回 (times_ms, demand, capacity, ef_utilized)，ef_utilized = min(demand, capacity)（取均值之后）。
+        """
+        step = freq_ms(rule)
+        bucket = (self.times_ms + BEIJING_OFFSET_MS) // step
+        b0 = bucket[0] if len(bucket) else 0
+        n_b = int(bucket[-1] - b0 + 1) if len(bucket) else 0
+        b_code = bucket - b0
+
+        count = np.bincount(b_code, weights=self.present.sum(axis=0), minlength=n_b)
+        d_sum = np.bincount(b_code, weights=np.where(self.present, self.demand, 0.0).sum(axis=0), minlength=n_b)
+        c_sum = np.bincount(b_code, weights=np.where(self.present, self.capacity, 0.0).sum(axis=0), minlength=n_b)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            d_mean = np.where(count > 0, d_sum / count, np.nan)
+            c_mean = np.where(count > 0, c_sum / count, np.nan)
+
+        times_ms = (b0 + np.arange(n_b, dtype=np.int64)) * step - BEIJING_OFFSET_MS
+        return times_ms, d_mean, c_mean, np.minimum(d_mean, c_mean)
+
+    def resample_subsets(self, masks, rule="15min"):
+        """
+        masks: Q × S bool，每行选出一组序列。一次矩阵乘法 + 按桶 reduceat 得到全部子集的曲线，
+        每个子集的结果与 “只用这些序列构建矩阵再 resample(rule)” 相同（时间轴从子集首个有 demand 的桶到末个桶）。
+        返回长度 Q 的列表，元素同 resample 的四元组；子集内没有 demand 格时为 None。
+        """
+        masks = np.asarray(masks, dtype=float).reshape(-1, len(self.series))
+        step = freq_ms(rule)
+        bucket = (self.times_ms + BEIJING_OFFSET_MS) // step
+        if not len(bucket):
+            return [None] * len(masks)
+
+        # 子集 × 时间
+        count_t = masks @ self.present
+        d_t = masks @ np.where(self.present, self.demand, 0.0)
+        c_t = masks @ np.where(self.present, self.capacity, 0.0)
+
+        # 时间 → 桶（times_ms 升序，同桶的列连续）
+        starts = np.flatnonzero(np.r_[True, bucket[1:] != bucket[:-1]])
+        b_code = bucket[starts] - bucket[0]
+        n_b = int(b_code[-1]) + 1
+        count, d_sum, c_sum = (np.zeros((len(masks), n_b)) for _ in range(3))
+        count[:, b_code] = np.add.reduceat(count_t, starts, axis=1)
+        d_sum[:, b_code] = np.add.reduceat(d_t, starts, axis=1)
+        c_sum[:, b_code] = np.add.reduceat(c_t, starts, axis=1)
+
+        out = []
+        for q in range(len(masks)):
+            filled = np.flatnonzero(count[q] > 0)
+            if not len(filled):
+                out.append(None)
+                continue
+            lo, hi = filled[0], filled[-1] + 1
+            n = count[q, lo:hi]
+            with np.errstate(invalid="ignore", divide="ignore"):
+                d_mean = np.where(n > 0, d_sum[q, lo:hi] / n, np.nan)
+                c_mean = np.where(n > 0, c_sum[q, lo:hi] / n, np.nan)
+            times_ms = (bucket[0] + np.arange(lo, hi, dtype=np.int64)) * step - BEIJING_OFFSET_MS
+            out.append((times_ms, d_mean, c_mean, np.minimum(d_mean, c_mean)))
+        return out
+
+    # ------------------------------------------------------------
+    # 回到长表
+    # ------------------------------------------------------------
+    def to_frame(self):
+        """
+        合并长表，与 run_resilience_analysis 的 pd.merge(how="left") + fillna(0) + ef_utilized_cap 结果相同
+        （行序为 demand 原行序，重名的非连接列加 _x / _y 后缀）。
+        """
+        dem = self._demand_df
+        cap = self._capacity_df
+        cap_of_row = np.full(len(dem), -1, dtype=np.int64)
+        cap_of_row[self.row[self.present]] = self.cap_row[self.present]
+
+        right = cap.drop(columns=[c for c in cap.columns if c in JOIN_KEYS or c in TIME_COLUMNS])
+        overlap = [c for c in right.columns if c in dem.columns]
+        left = dem.rename(columns={c: f"{c}_x" for c in overlap}) if overlap else dem.copy()
+        right = right.rename(columns={c: f"{c}_y" for c in overlap})
+        right = right.reindex(np.where(cap_of_row >= 0, cap_of_row, len(cap))).reset_index(drop=True)
+
+        out = pd.concat([left.reset_index(drop=True), right], axis=1)
+        out["smoothed_demand"] = out["smoothed_demand"].fillna(0)
+        out["cleaned_capacity"] = out["cleaned_capacity"].fillna(0)
+        out["ef_utilized_cap"] = out[["smoothed_demand", "cleaned_capacity"]].min(axis=1)
+        return out
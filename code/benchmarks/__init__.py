@@ -0,0 +1,23 @@
+"""
+基准测试工具包：合成数据生成 + 本地接口替身 + 各管线计时/内存基准
+
+    synthetic      合成路网、Kafka 感知数据、信号相位 JSON 行、phase_map 与供需 DataFrame
+    mock_api       getIntersConns / getRoadControlInfo / getLaneById /
+                   getTrafficLightsByIntersectionId 的本地 HTTP 替身
+    run_benchmarks 命令行入口：python -m benchmarks.run_benchmarks --scales small,medium
+    bench_coords   coord_convert 与前端 coordinateConverter.js 的一致性 + 吞吐量
+    bench_io       Kafka dump 读取吞吐量：明文逐行 / mmap / gzip / zstd
+
+所有模块均需在 code/ 目录下运行（与 notebook 一致，demand / supply / supply_demand 以顶层模块导入）。
+"""
+
+from .synthetic import SCALES, generate_dataset, make_supply_demand_frames
+from .mock_api import MockTrafficAPI, use_mock_endpoints
+
+__all__ = [
+    "SCALES",
+    "generate_dataset",
+    "make_supply_demand_frames",
+    "MockTrafficAPI",
+    "use_mock_endpoints",
+]
@@ -0,0 +1,147 @@
+"""
+坐标转换基准：coord_convert（NumPy）与前端 coordinateConverter.js 的一致性 + 吞吐量
+
+    cd code
+    python -m benchmarks.bench_coords --points 1000000
+
+一致性：随机点（含境外点）经 node 调用 JS 实现逐点转换，与 NumPy 结果比较最大绝对误差；
+未安装 node 时跳过一致性与 JS 吞吐量，只报告 NumPy 吞吐量。
+"""
+
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import time
+
+import numpy as np
+
+import coord_convert
+
+JS_CONVERTER = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+    "LargeScreenFront", "src", "utils", "coordinateConverter.js",
+)
+
+PAIRS = [(a, b) for a in coord_convert.COORDINATE_SYSTEMS for b in coord_convert.COORDINATE_SYSTEMS if a != b]
+
+# 经 stdin 接收 {"lng": [...], "lat": [...], "pairs": [[from, to], ...], "repeat": n}，
+# 输出每个转换对的结果与逐点耗时
+_NODE_SCRIPT = """
+import { convertCoordinate } from %s;
+let buf = '';
+process.stdin.on('data', d => { buf += d; });
+process.stdin.on('end', () => {
+  const req = JSON.parse(buf);
+  const out = {};
+  for (const [f, t] of req.pairs) {
+    const lng = new Array(req.lng.length), lat = new Array(req.lng.length);
+    const t0 = process.hrtime.bigint();
+    for (let r = 0; r < req.repeat; r++) {
+      for (let i = 0; i < req.lng.length; i++) {
+        const c = convertCoordinate(req.lng[i], req.lat[i], f, t);
+        lng[i] = c.longitude; lat[i] = c.latitude;
+      }
+    }
+    const ms = Number(process.hrtime.bigint() - t0) / 1e6 / req.repeat;
+    out[f + '_' + t] = { lng, lat, ms };
+  }
+  process.stdout.write(JSON.stringify(out));
+});
+"""
+
+
+def sample_points(n, seed=0, outside_share=0.05):
+    """北京周边为主，混入少量境外点以覆盖 isInChina 分支"""
+    rng = np.random.default_rng(seed)
+    lng = rng.uniform(115.5, 117.5, n)
+    lat = rng.uniform(39.4, 40.6, n)
+    out = rng.random(n) < outside_share
+    lng[out] = rng.uniform(-180, 180, out.sum())
+    lat[out] = rng.uniform(-80, 80, out.sum())
+    return lng, lat
+
+
+def run_js(lng, lat, pairs, repeat=1):
+    node = shutil.which("node")
+    if node is None or not os.path.exists(JS_CONVERTER):
+        return None
+    url = json.dumps("file://" + JS_CONVERTER.replace(os.sep, "/"))
+    payload = json.dumps({"lng": lng.tolist(), "lat": lat.tolist(), "pairs": pairs, "repeat": repeat})
+    proc = subprocess.run(
+        [node, "--input-type=module", "-e", _NODE_SCRIPT % url],
+        input=payload, capture_output=True, text=True, check=True,
+    )
+    return json.loads(proc.stdout)
+
+
+def check_parity(n=20000, seed=0):
+    """返回 {pair: max_abs_err_deg}；node 不可用时返回 None"""
+    lng, lat = sample_points(n, seed)
+    js = run_js(lng, lat, [list(p) for p in PAIRS])
+    if js is None:
+        return None
+    errs = {}
+    for f, t in PAIRS:
+        py_lng, py_lat = coord_convert.convert_coordinates(lng, lat, f, t)
+        r = js[f"{f}_{t}"]
+        errs[f"{f}->{t}"] = float(max(
+            np.max(np.abs(py_lng - np.asarray(r["lng"]))),
+            np.max(np.abs(py_lat - np.asarray(r["lat"]))),
+        ))
+    return errs
+
+
+def bench_throughput(n=1_000_000, repeat=3, js_points=200_000, seed=0):
+    """每个转换对：NumPy 与 JS 逐点的 百万点/秒"""
+    lng, lat = sample_points(n, seed)
+    rows = []
+    js = run_js(lng[:js_points], lat[:js_points], [list(p) for p in PAIRS]) if js_points else None
+    for f, t in PAIRS:
+        times = []
+        for _ in range(max(1, repeat)):
+            t0 = time.perf_counter()
+            coord_convert.convert_coordinates(lng, lat, f, t)
+            times.append(time.perf_counter() - t0)
+        row = {"pair": f"{f}->{t}", "points": n, "numpy_s": min(times), "numpy_mpts_s": n / min(times) / 1e6}
+        if js is not None:
+            js_s = js[f"{f}_{t}"]["ms"] / 1000
+            row.update({"js_points": js_points, "js_s": js_s, "js_mpts_s": js_points / js_s / 1e6 if js_s else None})
+        rows.append(row)
+    return rows
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="coord_convert parity + throughput")
+    parser.add_argument("--points", type=int, default=1_000_000)
+    parser.add_argument("--js-points", type=int, default=200_000, help="0 跳过 JS 吞吐量")
+    parser.add_argument("--parity-points", type=int, default=20_000)
+    parser.add_argument("--tolerance", type=float, default=1e-9, help="允许的最大绝对误差（度）")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--json", default=None, help="结果写入 JSON 文件")
+    args = parser.parse_args(argv)
+
+    parity = check_parity(args.parity_points)
+    if parity is None:
+        print("parity: skipped (node not found)")
+    else:
+        for pair, err in parity.items():
+            flag = "OK" if err <= args.tolerance else "FAIL"
+            print(f"parity {pair:<14} max_abs_err={err:.3e} {flag}")
+
+    rows = bench_throughput(args.points, args.repeat, args.js_points)
+    for r in rows:
+        js = f"  js {r['js_mpts_s']:.2f} Mpts/s" if r.get("js_mpts_s") else ""
+        print(f"{r['pair']:<14} numpy {r['numpy_mpts_s']:.2f} Mpts/s ({r['numpy_s']:.3f}s){js}")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"parity": parity, "throughput": rows}, f, indent=2)
+
+    if parity is not None and any(err > args.tolerance for err in parity.values()):
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,130 @@
+"""
+输入读取基准：明文逐行 / 明文 mmap / gzip / zstd 四种方式读取同一份 Kafka dump 的吞吐量
+
+    cd code
+    python -m benchmarks.bench_io --scale medium
+
+每种方式报告三级耗时（取 --repeat 次最小值）：
+  scan    只定位消息（逐行：行迭代 + 消息拼接；mmap：字节扫描），不解析 JSON
+  decode  scan + json 解析为 dict
+  parse   demand.parse_kafka_file 得到 DataFrame
+吞吐量按未压缩字节数计（MB/s），另报告消息数/秒。压缩副本写在 dump 同目录，已存在时复用；
+未安装 zstandard 时跳过 zstd。
+"""
+
+import argparse
+import gzip
+import json
+import os
+import re
+import shutil
+import time
+
+import demand
+import textio
+
+from .synthetic import generate_dataset
+
+_VALUE = re.compile(r"value=({.*}),\s*partition")
+
+
+def _compressed_copies(path, levels=(("gzip", 6), ("zstd", 3))):
+    out = {}
+    for kind, level in levels:
+        target = f"{path}.{'gz' if kind == 'gzip' else 'zst'}"
+        if kind == "zstd" and textio.zstandard is None:
+            continue
+        if not os.path.exists(target) or os.path.getmtime(target) < os.path.getmtime(path):
+            with open(path, "rb") as src, open(target, "wb") as dst:
+                if kind == "gzip":
+                    with gzip.GzipFile(fileobj=dst, mode="wb", compresslevel=level) as z:
+                        shutil.copyfileobj(src, z, textio.READ_CHUNK)
+                else:
+                    textio.zstandard.ZstdCompressor(level=level).copy_stream(src, dst)
+        out[kind] = target
+    return out
+
+
+def _scan_lines(path):
+    """与 demand.iter_kafka_messages 相同的逐行拼接与 value 提取，只是不解析 JSON"""
+    n = 0
+    with textio.open_text(path) as f:
+        for line in f:
+            line = line.strip()
+            if "Received message:" in line and "value=" in line:
+                if _VALUE.search(line):
+                    n += 1
+    return n
+
+
+def _scan_mmap(path):
+    return sum(1 for _ in textio.iter_value_bytes_mmap(path))
+
+
+def _decode(path, reader):
+    with demand.open_kafka_messages(path, reader) as messages:
+        return sum(1 for _ in messages)
+
+
+def _best(fn, repeat):
+    times, result = [], None
+    for _ in range(max(1, repeat)):
+        t0 = time.perf_counter()
+        result = fn()
+        times.append(time.perf_counter() - t0)
+    return min(times), result
+
+
+def bench_readers(path, repeat=3):
+    """返回每种方式一行：mode, file_mb, scan_s, decode_s, parse_s, messages, rows, *_mb_s, msg_s"""
+    raw_mb = os.path.getsize(path) / 1e6
+    modes = [("lines", path, "lines"), ("mmap", path, "mmap")]
+    modes += [(kind, p, "lines") for kind, p in _compressed_copies(path).items()]
+
+    rows = []
+    for mode, p, reader in modes:
+        scan = _scan_mmap if reader == "mmap" else _scan_lines
+        scan_s, _ = _best(lambda: scan(p), repeat)
+        decode_s, messages = _best(lambda: _decode(p, reader), repeat)
+        parse_s, df = _best(lambda: demand.parse_kafka_file(p, reader=reader), repeat)
+        rows.append({
+            "mode": mode,
+            "file_mb": os.path.getsize(p) / 1e6,
+            "messages": messages,
+            "rows": len(df),
+            "scan_s": scan_s,
+            "decode_s": decode_s,
+            "parse_s": parse_s,
+            "scan_mb_s": raw_mb / scan_s,
+            "decode_mb_s": raw_mb / decode_s,
+            "parse_mb_s": raw_mb / parse_s,
+            "msg_s": messages / decode_s,
+        })
+    return rows
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Kafka dump reader throughput")
+    parser.add_argument("--scale", default="small")
+    parser.add_argument("--data-dir", default=os.path.join("..", "data", "bench"))
+    parser.add_argument("--file", default=None, help="直接指定明文 dump（忽略 --scale）")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--json", default=None, help="结果写入 JSON 文件")
+    args = parser.parse_args(argv)
+
+    path = args.file or generate_dataset(os.path.join(args.data_dir, args.scale), args.scale)["paths"]["perception"]
+    rows = bench_readers(path, args.repeat)
+    print(f"{path}: {os.path.getsize(path) / 1e6:.1f} MB")
+    for r in rows:
+        print(
+            f"{r['mode']:<6} file {r['file_mb']:8.1f} MB  scan {r['scan_mb_s']:7.1f} MB/s  "
+            f"decode {r['decode_mb_s']:6.1f} MB/s ({r['msg_s']:,.0f} msg/s)  parse {r['parse_mb_s']:6.1f} MB/s"
+        )
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(rows, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+"""
+时间轴基准：int64 epoch ms（timeaxis.py）与逐列 tz_localize / tz_convert / 逐点 strftime 的对照 + queryAll 端到端耗时
+
+    cd code
+    python -m benchmarks.bench_time --points 3000000 --days 30
+
+一致性：两种方式得到的 time_bin 与输出字符串逐项相同，不同时以非零状态退出。
+"""
+
+import argparse
+import json
+import time
+
+import numpy as np
+import pandas as pd
+
+import supply_demand
+import timeaxis
+from benchmarks.synthetic import make_supply_demand_frames
+
+
+def _best(fn, repeat):
+    best, out = None, None
+    for _ in range(max(1, repeat)):
+        t0 = time.perf_counter()
+        out = fn()
+        dt = time.perf_counter() - t0
+        best = dt if best is None else min(best, dt)
+    return best, out
+
+
+def sample_ms(n, seed=0):
+    """一天内的随机毫秒时间戳（北京时间 2025-03-07）"""
+    rng = np.random.default_rng(seed)
+    t0 = timeaxis.parse_beijing_ms("2025-03-07 00:00:00")
+    return np.sort(t0 + rng.integers(0, 86_400_000, n))
+
+
+# ------------------------------------------------------------
+# 旧写法：Timestamp 列逐步换时区
+# ------------------------------------------------------------
+def legacy_time_bin(ms, freq):
+    return (
+        pd.to_datetime(pd.Series(ms), unit="ms", utc=True)
+        .dt.tz_convert("Asia/Shanghai").dt.floor(freq).dt.tz_localize(None)
+    )
+
+
+def legacy_format(index):
+    out = []
+    for ts in index:
+        ts = ts.tz_localize("Asia/Shanghai") if ts.tzinfo is None else ts.tz_convert("Asia/Shanghai")
+        out.append(ts.strftime("%Y-%m-%d %H:%M:%S"))
+    return out
+
+
+def bench_conversions(n=3_000_000, freq="15min", format_points=20_000, repeat=3):
+    ms = sample_ms(n)
+    rows = []
+
+    t_old, old = _best(lambda: legacy_time_bin(ms, freq), repeat)
+    t_new, new = _best(lambda: timeaxis.to_beijing_naive(timeaxis.floor_ms(ms, timeaxis.freq_ms(freq))), repeat)
+    rows.append({"op": f"time_bin floor {freq}", "points": n, "legacy_s": t_old, "epoch_ms_s": t_new,
+                 "equal": bool((old.to_numpy() == new.to_numpy()).all())})
+
+    fmt = ms[:: max(1, n // format_points)][:format_points]
+    aware = pd.DatetimeIndex(pd.to_datetime(fmt, unit="ms", utc=True)).tz_convert("Asia/Shanghai")
+    t_old, old = _best(lambda: legacy_format(aware), repeat)
+    t_new, new = _best(lambda: timeaxis.format_beijing_ms(fmt), repeat)
+    rows.append({"op": "format 'YYYY-MM-DD HH:mm:ss'", "points": len(fmt), "legacy_s": t_old, "epoch_ms_s": t_new,
+                 "equal": old == new})
+    return rows
+
+
+def bench_query_all(days=30, copies=10, repeat=3):
+    """queryAll 端到端：days 天 × copies 份 link 的供需长表"""
+    cap, dem = make_supply_demand_frames(days=days)
+    dem = pd.concat([dem.assign(link_id=dem["link_id"] + f"_{k}") for k in range(copies)], ignore_index=True)
+    begin = dem["time_bin"].min().strftime("%Y-%m-%d %H:%M:%S")
+    end = (dem["time_bin"].max() + pd.Timedelta("15min")).strftime("%Y-%m-%d %H:%M:%S")
+    rows = []
+    for use_matrix in (True, False):
+        for frequency in (1, 2):
+            t, resp = _best(lambda: supply_demand.build_queryAll_response(
+                cap, dem, begin, end, frequency=frequency, use_matrix=use_matrix), repeat)
+            rows.append({"use_matrix": use_matrix, "frequency": frequency, "rows": len(dem),
+                         "points": len(resp["data"]["trafficDemand"]), "seconds": t})
+    return rows
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="epoch-ms time axis vs pandas tz conversions")
+    parser.add_argument("--points", type=int, default=3_000_000)
+    parser.add_argument("--format-points", type=int, default=20_000)
+    parser.add_argument("--days", type=int, default=30)
+    parser.add_argument("--copies", type=int, default=10)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--json", default=None, help="结果写入 JSON 文件")
+    args = parser.parse_args(argv)
+
+    conv = bench_conversions(args.points, format_points=args.format_points, repeat=args.repeat)
+    for r in conv:
+        flag = "OK" if r["equal"] else "MISMATCH"
+        print(f"{r['op']:<30} n={r['points']:<9} legacy {r['legacy_s']:.3f}s  epoch_ms {r['epoch_ms_s']:.3f}s"
+              f"  ×{r['legacy_s'] / max(r['epoch_ms_s'], 1e-9):.1f} {flag}")
+
+    query = bench_query_all(args.days, args.copies, args.repeat)
+    for r in query:
+        print(f"queryAll matrix={r['use_matrix']!s:<5} freq={r['frequency']} rows={r['rows']} "
+              f"points={r['points']} {r['seconds']:.3f}s")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"conversions": conv, "queryAll": query}, f, indent=2)
+
+    if not all(r["equal"] for r in conv):
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,168 @@
+"""
+线上路网/信号接口的本地替身（基于合成路网），用于离线基准与回归。
+
+    POST /yzsfq/getIntersConns.do?intersId=...
+    POST /yzsfq/getRoadControlInfo.do?linkId=...
+    POST /yzsfq/getLaneById.do?laneId=...
+    POST /yzsfq/getTrafficLightsByIntersectionId.do?crossId=...
+
+返回结构与线上一致：{"state": 1, "data": ...}；未知 id 返回 {"state": 0}。
+"""
+
+import json
+import threading
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+from .synthetic import SIDES, _phase_id
+
+API_PREFIX = "/yzsfq"
+
+
+class MockTrafficAPI:
+    """
+    用法：
+        with MockTrafficAPI(network) as api:
+            demand.URL_INTERS = api.url("getIntersConns.do")
+    """
+
+    def __init__(self, network, host="127.0.0.1", port=0):
+        self.network = network
+        self.host = host
+        self.port = port
+        self.request_count = 0
+        self._server = None
+        self._thread = None
+        self._build_index()
+
+    # ------------------------------
+    # 索引
+    # ------------------------------
+    def _build_index(self):
+        links = self.network["links"]
+        self._inters = {i["intersId"]: i for i in self.network["intersections"]}
+        self._cross = {str(i["nodeId"]): i for i in self.network["intersections"]}
+        self._lane_link = {
+            ln["laneId"]: link_id
+            for link_id, link in links.items()
+            for ln in link["lanes"]
+        }
+
+    def handle(self, endpoint, params):
+        """纯函数式的接口实现，HTTP handler 与单元调用共用"""
+        links = self.network["links"]
+        if endpoint == "getIntersConns.do":
+            inter = self._inters.get(params.get("intersId"))
+            if inter is None:
+                return {"state": 0, "msg": "intersection not found"}
+            return {"state": 1, "data": {
+                "juncId": inter["intersId"],
+                "inLinks": list(inter["inLinks"].values()),
+                "outLinks": list(inter["outLinks"].values()),
+            }}
+
+        if endpoint == "getRoadControlInfo.do":
+            link = links.get(params.get("linkId"))
+            if link is None:
+                return {"state": 0, "msg": "link not found"}
+            return {"state": 1, "data": {
+                "heading": link["heading"],
+                "lanes": [{"laneId": ln["laneId"], "turnInfo": ln["turnInfo"]} for ln in link["lanes"]],
+            }}
+
+        if endpoint == "getLaneById.do":
+            link_id = self._lane_link.get(params.get("laneId"))
+            if link_id is None:
+                return {"state": 0, "msg": "lane not found"}
+            return {"state": 1, "data": {"laneId": params.get("laneId"), "link_id": link_id}}
+
+        if endpoint == "getTrafficLightsByIntersectionId.do":
+            inter = self._cross.get(params.get("crossId")) or self._inters.get(params.get("crossId"))
+            if inter is None:
+                return {"state": 0, "msg": "cross not found"}
+            data = []
+            for s, side in enumerate(SIDES):
+                link_id = inter["inLinks"][side]
+                data.append({"phaseId": _phase_id(s, "T"), "road_id": link_id})
+                data.append({"phaseId": _phase_id(s, "L"), "road_id": link_id})
+            return {"state": 1, "data": data}
+
+        return None
+
+    # ------------------------------
+    # HTTP 服务
+    # ------------------------------
+    def start(self):
+        api = self
+
+        class _Handler(BaseHTTPRequestHandler):
+            def _reply(self):
+                parsed = urlparse(self.path)
+                endpoint = parsed.path.rsplit("/", 1)[-1]
+                params = {k: v[0] for k, v in parse_qs(parsed.query).items()}
+                api.request_count += 1
+                body = api.handle(endpoint, params)
+                if body is None:
+                    self.send_response(404)
+                    self.end_headers()
+                    return
+                raw = json.dumps(body, ensure_ascii=False).encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json;charset=utf-8")
+                self.send_header("Content-Length", str(len(raw)))
+                self.end_headers()
+                self.wfile.write(raw)
+
+            do_POST = _reply
+            do_GET = _reply
+
+            def log_message(self, *args):
+                pass
+
+        self._server = ThreadingHTTPServer((self.host, self.port), _Handler)
+        self._server.daemon_threads = True
+        self.port = self._server.server_address[1]
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+    @property
+    def base_url(self):
+        return f"http://{self.host}:{self.port}{API_PREFIX}"
+
+    def url(self, endpoint):
+        return f"{self.base_url}/{endpoint}"
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+@contextmanager
+def use_mock_endpoints(api, demand_module=None):
+    """临时把 demand.URL_* 指向本地替身，退出时恢复"""
+    if demand_module is None:
+        import demand as demand_module
+
+    names = {
+        "URL_INTERS": "getIntersConns.do",
+        "URL_ROAD": "getRoadControlInfo.do",
+        "URL_LANE": "getLaneById.do",
+    }
+    saved = {n: getattr(demand_module, n) for n in names}
+    try:
+        for n, endpoint in names.items():
+            setattr(demand_module, n, api.url(endpoint))
+        yield api
+    finally:
+        for n, v in saved.items():
+            setattr(demand_module, n, v)
@@ -0,0 +1,196 @@
+"""
+各管线计时 + 内存基准
+
+    cd code
+    python -m benchmarks.run_benchmarks --scales small,medium --pipelines demand,capacity,queryall
+
+每个 (scale, pipeline) 先按 --repeat 次数计时取最优，再单独跑一次 tracemalloc 记录 Python 堆峰值；
+RSS 为进程级 ru_maxrss（只增不减，仅作参考）。
+"""
+
+import argparse
+import gc
+import json
+import os
+import sys
+import time
+import tracemalloc
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+from .synthetic import SCALES, generate_dataset, make_supply_demand_frames
+from .mock_api import MockTrafficAPI, use_mock_endpoints
+
+
+def _max_rss_mb():
+    if resource is None:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux 单位 KB，macOS 单位 B
+    return rss / (1024 * 1024) if sys.platform == "darwin" else rss / 1024
+
+
+def measure(fn, repeat=3, trace_memory=True):
+    """返回 {best_s, mean_s, peak_mb, rss_mb, result}；fn 无参"""
+    times = []
+    result = None
+    for _ in range(max(1, repeat)):
+        gc.collect()
+        t0 = time.perf_counter()
+        result = fn()
+        times.append(time.perf_counter() - t0)
+
+    peak_mb = None
+    if trace_memory:
+        gc.collect()
+        tracemalloc.start()
+        try:
+            fn()
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+        peak_mb = peak / (1024 * 1024)
+
+    return {
+        "best_s": min(times),
+        "mean_s": sum(times) / len(times),
+        "peak_mb": peak_mb,
+        "rss_mb": _max_rss_mb(),
+        "result": result,
+    }
+
+
+# ============================================================
+# 各管线基准
+# ============================================================
+def bench_demand(ds, api, repeat, trace_memory):
+    import demand
+
+    inters_ids = [i["intersId"] for i in ds["network"]["intersections"]]
+    with use_mock_endpoints(api, demand):
+        m = measure(
+            lambda: demand.run_pipeline(inters_ids, ds["paths"]["perception"]),
+            repeat=repeat, trace_memory=trace_memory,
+        )
+    lane66_df, final_df = m.pop("result")
+    m["rows_out"] = len(final_df)
+    return m
+
+
+def bench_capacity(ds, api, repeat, trace_memory, out_dir):
+    import supply
+
+    def _run_all():
+        # 信号分析走仓库内的 signal_cycles 检查点路径（不依赖 TFlight_old）；
+        # 每轮先删除检查点，计时的是全量分析而不是无新增数据的刷新
+        frames = []
+        for inter in ds["network"]["intersections"]:
+            ckpt = os.path.join(out_dir, f"signal_{inter['nodeId']}.ckpt.json")
+            for path in (ckpt, os.path.join(out_dir, f"green_ratio_{inter['nodeId']}.csv")):
+                if os.path.exists(path):
+                    os.remove(path)
+            frames.append(supply.run_capacity_pipeline(
+                base_url=api.url("getTrafficLightsByIntersectionId.do"),
+                cross_id=str(inter["nodeId"]),
+                phase_map_path=ds["paths"]["phase_map"],
+                signal_file=ds["paths"]["signal"],
+                lane_csv_path=ds["paths"]["lane_csv"][inter["nodeId"]],
+                green_output_path=os.path.join(out_dir, f"green_ratio_{inter['nodeId']}.csv"),
+                signal_checkpoint_path=ckpt,
+            ))
+        return frames
+
+    m = measure(_run_all, repeat=repeat, trace_memory=trace_memory)
+    m["rows_out"] = sum(len(f) for f in m.pop("result"))
+    return m
+
+
+def bench_queryall(ds, repeat, trace_memory):
+    import pandas as pd
+    from supply_demand import build_queryAll_response
+
+    days = ds["config"]["queryall_days"]
+    capacity_df, demand_df = make_supply_demand_frames(days=days)
+    begin = demand_df["time_bin"].min().strftime("%Y-%m-%d %H:%M:%S")
+    end = (demand_df["time_bin"].max() + pd.Timedelta("15min")).strftime("%Y-%m-%d %H:%M:%S")
+
+    m = measure(
+        lambda: build_queryAll_response(capacity_df, demand_df, beginTime=begin, endTime=end, frequency=2),
+        repeat=repeat, trace_memory=trace_memory,
+    )
+    resp = m.pop("result")
+    m["rows_in"] = len(capacity_df) + len(demand_df)
+    m["rows_out"] = len(resp["data"]["trafficDemand"])
+    return m
+
+
+# ============================================================
+# 入口
+# ============================================================
+def run(scales, pipelines, out_dir, repeat=3, trace_memory=True, seed=0):
+    os.environ.setdefault("TQDM_DISABLE", "1")
+    results = []
+    for scale in scales:
+        t0 = time.perf_counter()
+        ds = generate_dataset(os.path.join(out_dir, scale), scale, seed=seed)
+        gen_s = time.perf_counter() - t0
+        print(f"[{scale}] dataset ready in {gen_s:.1f}s: {ds['stats']}", flush=True)
+
+        with MockTrafficAPI(ds["network"]) as api:
+            for name in pipelines:
+                row = {"scale": scale, "pipeline": name}
+                try:
+                    if name == "demand":
+                        row.update(bench_demand(ds, api, repeat, trace_memory))
+                    elif name == "capacity":
+                        row.update(bench_capacity(ds, api, repeat, trace_memory, os.path.join(out_dir, scale)))
+                    elif name == "queryall":
+                        row.update(bench_queryall(ds, repeat, trace_memory))
+                    else:
+                        raise ValueError(f"unknown pipeline: {name}")
+                except ImportError as e:
+                    row["skipped"] = str(e)
+                results.append(row)
+                print(_format_row(row), flush=True)
+    return results
+
+
+def _format_row(row):
+    if "skipped" in row:
+        return f"  {row['scale']:>8} {row['pipeline']:>9}  skipped: {row['skipped']}"
+    peak = f"{row['peak_mb']:8.1f}MB" if row.get("peak_mb") is not None else "       n/a"
+    return (
+        f"  {row['scale']:>8} {row['pipeline']:>9}  best={row['best_s']:8.3f}s "
+        f"mean={row['mean_s']:8.3f}s peak={peak} rows_out={row.get('rows_out')}"
+    )
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="TrafficAnalytics pipeline benchmarks")
+    parser.add_argument("--scales", default="small", help="逗号分隔：" + ",".join(SCALES))
+    parser.add_argument("--pipelines", default="demand,capacity,queryall")
+    parser.add_argument("--out-dir", default=os.path.join("..", "data", "bench"))
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--no-memory", action="store_true", help="跳过 tracemalloc 轮次")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", default=None, help="结果写入 JSON 文件")
+    args = parser.parse_args(argv)
+
+    results = run(
+        scales=[s.strip() for s in args.scales.split(",") if s.strip()],
+        pipelines=[p.strip() for p in args.pipelines.split(",") if p.strip()],
+        out_dir=args.out_dir,
+        repeat=args.repeat,
+        trace_memory=not args.no_memory,
+        seed=args.seed,
+    )
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,542 @@
+"""
+合成数据生成：栅格路网 → 车辆到达/放行 → Kafka 感知 dump + 信号相位 JSON 行
+
+生成的数据与线上格式保持一致：
+  - 感知 dump:  Received message: topic=..., key=..., value={...}, partition=P, offset=O
+  - 信号相位:   {"message":[{"data":[{"intersections":[{"regionId", "nodeId", "phases":[...]}]}]}]}
+车辆只在其所属相位的绿灯内通过停车线，因此需求、绿信比与后续的到达-绿灯分析彼此自洽。
+"""
+
+import json
+import math
+import os
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+import pandas as pd
+
+# ------------------------------
+#         配置常量
+# ------------------------------
+BJ_OFFSET = timezone(timedelta(hours=8))
+
+ORIGIN_LON = 116.50
+ORIGIN_LAT = 39.76
+REGION_ID = 323
+
+# 方位：0=北 1=东 2=南 3=西（进口道所在一侧）
+SIDES = ["N", "E", "S", "W"]
+SIDE_CN = ["北", "东", "南", "西"]
+SIDE_UNIT = [(0.0, 1.0), (1.0, 0.0), (0.0, -1.0), (-1.0, 0.0)]  # (east, north)
+
+# 进口道车道：(turnInfo, 可选转向)；turnInfo 编码与 demand.turninfo_map 一致
+APPROACH_LANES = [(3, "L"), (1, "T"), (4, "TR")]
+EXIT_LANE_COUNT = 2
+
+LANE_WIDTH_M = 3.5
+FREE_SPEED_MPS = 12.0
+ENTER_DIST_M = 250.0
+EXIT_DWELL_S = 8.0
+YELLOW_S = 3
+
+# 相位阶段：(放行方位, 转向, 绿灯秒数)
+STAGES = [((0, 2), "T", 30), ((0, 2), "L", 15), ((1, 3), "T", 30), ((1, 3), "L", 15)]
+CYCLE_S = sum(g + YELLOW_S for _, _, g in STAGES)
+
+SCALES = {
+    "small": {
+        "rows": 1, "cols": 2, "start": "2025-03-07 07:00:00", "hours": 2,
+        "period_s": 2, "rate_per_lane_h": 150, "queryall_days": 1,
+    },
+    "medium": {
+        "rows": 3, "cols": 3, "start": "2025-03-07 05:00:00", "hours": 6,
+        "period_s": 2, "rate_per_lane_h": 150, "queryall_days": 7,
+    },
+    "district": {
+        "rows": 8, "cols": 8, "start": "2025-03-07 05:00:00", "hours": 6,
+        "period_s": 5, "rate_per_lane_h": 150, "queryall_days": 28,
+    },
+}
+
+
+# ------------------------------
+#        基础工具
+# ------------------------------
+def beijing_to_ms(value):
+    """'YYYY-MM-DD HH:mm:ss'（北京时间）→ epoch ms"""
+    dt = datetime.strptime(value, "%Y-%m-%d %H:%M:%S").replace(tzinfo=BJ_OFFSET)
+    return int(dt.timestamp() * 1000)
+
+
+def _meters_to_deg(east_m, north_m, lat):
+    dlat = north_m / 111320.0
+    dlon = east_m / (111320.0 * math.cos(math.radians(lat)))
+    return dlon, dlat
+
+
+def _right_of(unit):
+    """行驶方向的右手法向量"""
+    e, n = unit
+    return (n, -e)
+
+
+def _phase_id(side, move):
+    """每个方位两个相位：直行 2s+1，左转 2s+2（右转随直行放行）"""
+    return 2 * side + (2 if move == "L" else 1)
+
+
+def _phase_plan():
+    """phaseId → (阶段内起始秒, 绿灯秒数)"""
+    plan = {}
+    t = 0
+    for sides, move, green in STAGES:
+        for s in sides:
+            plan[_phase_id(s, move)] = (t, green)
+        t += green + YELLOW_S
+    return plan
+
+
+def tod_profile(hour):
+    """早晚高峰双峰的到达率系数（0.25 ~ 1.0）"""
+    hour = np.asarray(hour, dtype=float)
+    peak = np.maximum(np.exp(-((hour - 8.0) / 1.5) ** 2), np.exp(-((hour - 18.0) / 1.5) ** 2))
+    return 0.25 + 0.75 * peak
+
+
+# ============================================================
+# 1. 路网
+# ============================================================
+def build_network(rows, cols, spacing_m=500.0, seed=0):
+    """
+    栅格路网：相邻交叉口之间的有向路段既是上游的 outLink，也是下游的 inLink；
+    边界处补充独立的驶入/驶出路段。返回可 JSON 序列化的 dict。
+    """
+    rng = np.random.default_rng(seed)
+    intersections = []
+    by_pos = {}
+    for r in range(rows):
+        for c in range(cols):
+            k = len(intersections)
+            east, north = c * spacing_m, -r * spacing_m
+            dlon, dlat = _meters_to_deg(east, north, ORIGIN_LAT)
+            inter = {
+                "intersId": str(189390105904356353 + k),
+                "nodeId": 1001 + k,
+                "regionId": REGION_ID,
+                "row": r,
+                "col": c,
+                "lon": ORIGIN_LON + dlon,
+                "lat": ORIGIN_LAT + dlat,
+                "offset_s": int(rng.integers(0, CYCLE_S)),
+                "inLinks": {},
+                "outLinks": {},
+            }
+            intersections.append(inter)
+            by_pos[(r, c)] = inter
+
+    links = {}
+    lane_seq = [0]
+
+    def _new_link(heading):
+        link_id = str(610000 + len(links))
+        links[link_id] = {"linkId": link_id, "heading": heading, "lanes": [], "from": None, "to": None}
+        return link_id
+
+    def _add_lanes(link_id, center, unit, length, specs, inbound):
+        # 进口道沿 unit 向外延伸，车辆朝中心行驶；出口道从中心沿 unit 驶离
+        travel = (-unit[0], -unit[1]) if inbound else unit
+        right = _right_of(travel)
+        for i, turn in enumerate(specs):
+            off = LANE_WIDTH_M * (i + 0.5)
+            p0 = (unit[0] * length + right[0] * off, unit[1] * length + right[1] * off)
+            p1 = (right[0] * off, right[1] * off)
+            coords = []
+            for e, n in ((p0, p1) if inbound else (p1, p0)):
+                dlon, dlat = _meters_to_deg(e, n, center["lat"])
+                coords.append([round(center["lon"] + dlon, 7), round(center["lat"] + dlat, 7)])
+            lane_seq[0] += 1
+            links[link_id]["lanes"].append({
+                "laneId": str(8800000 + lane_seq[0]),
+                "turnInfo": int(turn),
+                "coords": coords,
+            })
+
+    neighbor = {0: (-1, 0), 1: (0, 1), 2: (1, 0), 3: (0, -1)}
+    for inter in intersections:
+        for s in range(4):
+            dr, dc = neighbor[s]
+            up = by_pos.get((inter["row"] + dr, inter["col"] + dc))
+            link_id = _new_link(heading=s * 90)
+            links[link_id]["to"] = inter["intersId"]
+            length = spacing_m if up is not None else ENTER_DIST_M
+            _add_lanes(link_id, inter, SIDE_UNIT[s], length, [t for t, _ in APPROACH_LANES], inbound=True)
+            inter["inLinks"][s] = link_id
+            if up is not None:
+                links[link_id]["from"] = up["intersId"]
+                up["outLinks"][(s + 2) % 4] = link_id
+
+    for inter in intersections:
+        for s in range(4):
+            if s in inter["outLinks"]:
+                continue
+            link_id = _new_link(heading=s * 90)
+            links[link_id]["from"] = inter["intersId"]
+            _add_lanes(link_id, inter, SIDE_UNIT[s], ENTER_DIST_M, [1] * EXIT_LANE_COUNT, inbound=False)
+            inter["outLinks"][s] = link_id
+
+    for inter in intersections:
+        inter["inLinks"] = {SIDES[s]: v for s, v in sorted(inter["inLinks"].items())}
+        inter["outLinks"] = {SIDES[s]: v for s, v in sorted(inter["outLinks"].items())}
+
+    return {
+        "origin": [ORIGIN_LON, ORIGIN_LAT],
+        "spacing_m": spacing_m,
+        "cycle_s": CYCLE_S,
+        "intersections": intersections,
+        "links": links,
+    }
+
+
+# ============================================================
+# 2. 车辆到达与放行
+# ============================================================
+def simulate_vehicles(network, start_ms, hours, rate_per_lane_h=150, seed=0):
+    """
+    每条进口车道独立的非齐次泊松到达（按时段系数稀释），车辆在其相位绿灯内通过停车线。
+    返回 {intersId: dict of numpy arrays}，各数组按 enter_ms 升序。
+    """
+    rng = np.random.default_rng(seed + 1)
+    plan = _phase_plan()
+    duration_ms = int(hours * 3600 * 1000)
+    cycle_ms = CYCLE_S * 1000
+    ff_ms = ENTER_DIST_M / FREE_SPEED_MPS * 1000
+    uuid_seq = 0
+    out = {}
+
+    for inter in network["intersections"]:
+        parts = []
+        for s in range(4):
+            for lane_idx, (_, moves) in enumerate(APPROACH_LANES):
+                lam = rate_per_lane_h * hours
+                n = rng.poisson(lam)
+                t = np.sort(rng.uniform(0, duration_ms, n))
+                hour = ((start_ms + t) / 3600000.0 + 8.0) % 24.0
+                t = t[rng.uniform(0, 1, n) < tod_profile(hour)]
+                n = len(t)
+                if moves == "TR":
+                    move = np.where(rng.uniform(0, 1, n) < 0.7, "T", "R")
+                else:
+                    move = np.full(n, moves)
+                parts.append((s, lane_idx, start_ms + t, move))
+
+        enter = np.concatenate([p[2] for p in parts]).astype(np.int64)
+        side = np.concatenate([np.full(len(p[2]), p[0]) for p in parts]).astype(np.int8)
+        lane = np.concatenate([np.full(len(p[2]), p[1]) for p in parts]).astype(np.int8)
+        move = np.concatenate([p[3] for p in parts]) if parts else np.array([], dtype="<U1")
+
+        # 到达停车线 → 所属相位下一个绿灯窗口内放行
+        arrive = enter + int(ff_ms)
+        phase = np.where(move == "L", 2 * side + 2, 2 * side + 1)
+        ss = np.array([plan[int(p)][0] for p in phase], dtype=np.int64) * 1000
+        green = np.array([plan[int(p)][1] for p in phase], dtype=np.int64) * 1000
+        rel = (arrive - inter["offset_s"] * 1000 - ss) % cycle_ms
+        queued = rel >= green
+        wait = np.where(queued, cycle_ms - rel + rng.uniform(0, 6000, len(rel)).astype(np.int64), 0)
+        cross = arrive + wait
+
+        exit_side = np.where(move == "T", (side + 2) % 4, np.where(move == "L", (side + 1) % 4, (side + 3) % 4))
+        exit_ms = cross + int(EXIT_DWELL_S * 1000)
+
+        order = np.argsort(enter, kind="stable")
+        n = len(enter)
+        uuids = np.array([f"{uuid_seq + i:012x}" for i in range(n)], dtype=object)
+        uuid_seq += n
+        out[inter["intersId"]] = {
+            "uuid": uuids,
+            "enter_ms": enter[order],
+            "cross_ms": cross[order],
+            "exit_ms": exit_ms[order],
+            "side": side[order],
+            "lane": lane[order],
+            "move": move[order],
+            "phaseId": phase[order],
+            "exit_side": exit_side[order].astype(np.int8),
+            "exit_lane": rng.integers(0, EXIT_LANE_COUNT, n).astype(np.int8),
+        }
+    return out
+
+
+def _positions(inter, v, idx, t_ms, network):
+    """在 t_ms 时刻计算 idx 对应车辆的经纬度、laneId 与 turnInfo"""
+    links = network["links"]
+    lat0 = inter["lat"]
+    side = v["side"][idx]
+    before = t_ms < v["cross_ms"][idx]
+
+    d_in = np.maximum(0.0, ENTER_DIST_M - FREE_SPEED_MPS * (t_ms - v["enter_ms"][idx]) / 1000.0)
+    d_out = FREE_SPEED_MPS * (t_ms - v["cross_ms"][idx]) / 1000.0
+    link_side = np.where(before, side, v["exit_side"][idx])
+    dist = np.where(before, d_in, d_out)
+    lane_pos = np.where(before, v["lane"][idx], v["exit_lane"][idx])
+
+    unit = np.array(SIDE_UNIT)[link_side]
+    travel = np.where(before[:, None], -unit, unit)
+    right = np.stack([travel[:, 1], -travel[:, 0]], axis=1)
+    off = LANE_WIDTH_M * (lane_pos + 0.5)
+    east = unit[:, 0] * dist + right[:, 0] * off
+    north = unit[:, 1] * dist + right[:, 1] * off
+    dlon, dlat = _meters_to_deg(east, north, lat0)
+
+    lane_ids, turns = [], []
+    for b, s, lp, es in zip(before, side, lane_pos, v["exit_side"][idx]):
+        key = SIDES[s] if b else SIDES[es]
+        link = links[inter["inLinks"][key] if b else inter["outLinks"][key]]
+        ln = link["lanes"][min(int(lp), len(link["lanes"]) - 1)]
+        lane_ids.append(ln["laneId"])
+        turns.append(ln["turnInfo"])
+    return inter["lon"] + dlon, lat0 + dlat, lane_ids, turns
+
+
+# ============================================================
+# 3. 写出 Kafka 感知 dump
+# ============================================================
+def write_perception_dump(path, network, vehicles, start_ms, hours, period_s=2, partitions=3,
+                          missing_lane_rate=0.0, seed=0):
+    """
+    每个交叉口每 period_s 秒一条消息，targets 为当刻在检测范围内的车辆；
+    missing_lane_rate 比例的 target 不带 laneId / turnInfo（模拟感知未匹配车道）
+    """
+    rng = np.random.default_rng(seed + 7)
+    end_ms = start_ms + int(hours * 3600 * 1000)
+    period_ms = int(period_s * 1000)
+    max_dwell_ms = int((ENTER_DIST_M / FREE_SPEED_MPS + CYCLE_S + 6 + EXIT_DWELL_S) * 1000)
+    offsets = [0] * partitions
+    n_messages = n_targets = n_missing = 0
+
+    with open(path, "w", encoding="utf-8") as f:
+        for t in range(start_ms, end_ms, period_ms):
+            for k, inter in enumerate(network["intersections"]):
+                v = vehicles[inter["intersId"]]
+                lo = np.searchsorted(v["enter_ms"], t - max_dwell_ms, side="left")
+                hi = np.searchsorted(v["enter_ms"], t, side="right")
+                idx = np.arange(lo, hi)
+                idx = idx[v["exit_ms"][idx] > t]
+                targets = []
+                if len(idx):
+                    lon, lat, lane_ids, turns = _positions(inter, v, idx, t, network)
+                    drop = rng.random(len(idx)) < missing_lane_rate if missing_lane_rate else np.zeros(len(idx), bool)
+                    for i, j in enumerate(idx):
+                        targets.append({
+                            "uuid": v["uuid"][j],
+                            "longitude": round(float(lon[i]), 7),
+                            "latitude": round(float(lat[i]), 7),
+                            "laneId": None if drop[i] else lane_ids[i],
+                            "turnInfo": None if drop[i] else turns[i],
+                        })
+                    n_missing += int(drop.sum())
+                value = json.dumps(
+                    {"timestamp": t, "deviceId": inter["intersId"], "targets": targets},
+                    ensure_ascii=False, separators=(",", ":"),
+                )
+                p = k % partitions
+                f.write(
+                    f"Received message: topic=perception, key={inter['intersId']}, "
+                    f"value={value}, partition={p}, offset={offsets[p]}\n"
+                )
+                offsets[p] += 1
+                n_messages += 1
+                n_targets += len(targets)
+    return {"messages": n_messages, "targets": n_targets, "missing_lane": n_missing}
+
+
+# ============================================================
+# 4. 信号相位 JSON 行 + phase_map.csv
+# ============================================================
+def write_signal_file(path, network, start_ms, hours):
+    """每个交叉口每个周期一行，包含 8 个相位的 红→绿→黄 状态（light: 3/5/7）"""
+    plan = _phase_plan()
+    cycle_ms = CYCLE_S * 1000
+    end_ms = start_ms + int(hours * 3600 * 1000)
+    lines = []
+    for inter in network["intersections"]:
+        off = inter["offset_s"] * 1000
+        k0 = (start_ms - off) // cycle_ms - 1
+        k1 = (end_ms - off) // cycle_ms + 1
+        for k in range(k0, k1):
+            base = off + k * cycle_ms
+            phases = []
+            for pid, (ss, green) in sorted(plan.items()):
+                gs = base + ss * 1000
+                ge = gs + green * 1000
+                ye = ge + YELLOW_S * 1000
+                phases.append({
+                    "phaseId": pid,
+                    "phaseStates": [
+                        {"light": 3, "startUTCTime": gs - cycle_ms + green * 1000 + YELLOW_S * 1000,
+                         "likelyEndUTCTime": gs},
+                        {"light": 5, "startUTCTime": gs, "likelyEndUTCTime": ge},
+                        {"light": 7, "startUTCTime": ge, "likelyEndUTCTime": ye},
+                    ],
+                })
+            msg = {"message": [{"data": [{"intersections": [{
+                "regionId": inter["regionId"], "nodeId": inter["nodeId"], "phases": phases,
+            }]}]}]}
+            lines.append((base, json.dumps(msg, separators=(",", ":"))))
+    lines.sort(key=lambda x: x[0])
+    with open(path, "w", encoding="utf-8") as f:
+        for _, line in lines:
+            f.write(line + "\n")
+    return {"lines": len(lines)}
+
+
+def phase_map_frame():
+    """与线上 phase_map.xlsx 同结构：PhaseId, PhaseName, Angle（写成 CSV，supply.read_phase_map 可直接读取）"""
+    rows = []
+    for s in range(4):
+        rows.append({"PhaseId": _phase_id(s, "T"), "PhaseName": f"{SIDE_CN[s]}-直行", "Angle": s * 90})
+        rows.append({"PhaseId": _phase_id(s, "L"), "PhaseName": f"{SIDE_CN[s]}-左转", "Angle": s * 90})
+    return pd.DataFrame(rows).sort_values("PhaseId").reset_index(drop=True)
+
+
+def lane_snapshot(network):
+    """车道几何快照（lane_index.load_lane_snapshot 的输入格式）"""
+    return [
+        {"laneId": ln["laneId"], "link_id": link_id, "turnInfo": ln["turnInfo"], "coords": ln["coords"]}
+        for link_id, link in network["links"].items()
+        for ln in link["lanes"]
+    ]
+
+
+def intersection_links_frame(network):
+    """fetch_intersection_links 的等价输出（intersId, linkId, linkType）"""
+    rows = []
+    for inter in network["intersections"]:
+        for link_type, key in (("inLink", "inLinks"), ("outLink", "outLinks")):
+            for link_id in inter[key].values():
+                rows.append({"intersId": inter["intersId"], "linkId": link_id, "linkType": link_type})
+    return pd.DataFrame(rows)
+
+
+def lane_count_frame(network, inters_id):
+    """单个交叉口的车道数表，列与 demand.run_pipeline 的 lane66_df 一致"""
+    turn_action = {3: "Left Turn", 1: "Through", 4: "Through"}
+    inter = next(i for i in network["intersections"] if i["intersId"] == inters_id)
+    rows = []
+    for s, link_id in inter["inLinks"].items():
+        counts = {}
+        for ln in network["links"][link_id]["lanes"]:
+            action = turn_action.get(ln["turnInfo"])
+            if action:
+                counts[action] = counts.get(action, 0) + 1
+        for action, n in counts.items():
+            rows.append({"link_id": link_id, "direction": s, "turn_action": action, "lane_count": n})
+    return pd.DataFrame(rows)
+
+
+# ============================================================
+# 5. 供需 DataFrame（build_queryAll_response 基准用）
+# ============================================================
+def make_supply_demand_frames(days=1, start="2025-03-07 00:00:00", seed=0):
+    """
+    直接构造单个交叉口的 demand / capacity 长表（15min 粒度），列名与
+    run_pipeline（direction 已小写）及 run_capacity_pipeline 的输出一致。
+    """
+    rng = np.random.default_rng(seed)
+    bins = pd.date_range(start, periods=int(days * 96), freq="15min")
+    prof = tod_profile(bins.hour + bins.minute / 60.0)
+
+    demand_parts = []
+    for s, d in enumerate(SIDES):
+        for m, base in (("Left Turn", 300.0), ("Through", 900.0), ("Right Turn", 250.0)):
+            demand = np.round(base * prof * rng.uniform(0.8, 1.2, len(bins)) / 48.0) * 48.0
+            demand_parts.append(pd.DataFrame({
+                "time_bin": bins,
+                "link_id": str(610000 + s),
+                "direction": d,
+                "movement": m,
+                "demand": demand,
+                "smoothed_demand": pd.Series(demand).rolling(3, center=True).mean().to_numpy(),
+            }))
+    demand_df = pd.concat(demand_parts, ignore_index=True)
+
+    cap_parts = []
+    for s, d in enumerate(SIDES):
+        for m, cn, gr, lanes in (("Through", "直行", 0.29, 2), ("Left Turn", "左转", 0.15, 1)):
+            green_ratio = np.clip(gr + rng.normal(0, 0.02, len(bins)), 0.05, 0.9)
+            cap_parts.append(pd.DataFrame({
+                "Angle": s * 90,
+                "phaseId": _phase_id(s, "L" if m == "Left Turn" else "T"),
+                "time_bin": bins,
+                "green_ratio": green_ratio,
+                "cycle_time_sec": float(CYCLE_S),
+                "regionId": REGION_ID,
+                "nodeId": 1001,
+                "PhaseName": f"{SIDE_CN[s]}-{cn}",
+                "direction": d,
+                "movement": m,
+                "lane_count": float(lanes),
+                "cleaned_capacity": green_ratio * lanes * 1200,
+            }))
+    capacity_df = pd.concat(cap_parts, ignore_index=True)
+    return capacity_df, demand_df
+
+
+# ============================================================
+# 总入口：按规模生成整套数据
+# ============================================================
+def generate_dataset(out_dir, scale="small", seed=0, overwrite=False):
+    """
+    生成 network.json / perception.txt / signal.txt / phase_map.csv / lane_<nodeId>.csv / lanes.json，
+    已存在且 overwrite=False 时直接复用。返回各文件路径与规模信息。
+    """
+    cfg = SCALES[scale] if isinstance(scale, str) else scale
+    os.makedirs(out_dir, exist_ok=True)
+    paths = {
+        "network": os.path.join(out_dir, "network.json"),
+        "perception": os.path.join(out_dir, "perception.txt"),
+        "signal": os.path.join(out_dir, "signal.txt"),
+        "phase_map": os.path.join(out_dir, "phase_map.csv"),
+        "lane_snapshot": os.path.join(out_dir, "lanes.json"),
+    }
+    start_ms = beijing_to_ms(cfg["start"])
+
+    if os.path.exists(paths["network"]) and os.path.exists(paths["perception"]) and not overwrite:
+        with open(paths["network"], "r", encoding="utf-8") as f:
+            network = json.load(f)
+        stats = network.get("stats", {})
+    else:
+        network = build_network(cfg["rows"], cfg["cols"], seed=seed)
+        vehicles = simulate_vehicles(network, start_ms, cfg["hours"], cfg["rate_per_lane_h"], seed=seed)
+        stats = write_perception_dump(
+            paths["perception"], network, vehicles, start_ms, cfg["hours"], cfg["period_s"],
+            missing_lane_rate=cfg.get("missing_lane_rate", 0.0), seed=seed,
+        )
+        stats.update(write_signal_file(paths["signal"], network, start_ms, cfg["hours"]))
+        stats["vehicles"] = int(sum(len(v["uuid"]) for v in vehicles.values()))
+        network["stats"] = stats
+        with open(paths["network"], "w", encoding="utf-8") as f:
+            json.dump(network, f, ensure_ascii=False)
+
+    if not os.path.exists(paths["phase_map"]) or overwrite:
+        phase_map_frame().to_csv(paths["phase_map"], index=False)
+
+    if not os.path.exists(paths["lane_snapshot"]) or overwrite:
+        with open(paths["lane_snapshot"], "w", encoding="utf-8") as f:
+            json.dump(lane_snapshot(network), f, ensure_ascii=False)
+
+    lane_csvs = {}
+    for inter in network["intersections"]:
+        p = os.path.join(out_dir, f"lane_{inter['nodeId']}.csv")
+        if not os.path.exists(p) or overwrite:
+            lane_count_frame(network, inter["intersId"]).to_csv(p, index=True, encoding="utf-8-sig")
+        lane_csvs[inter["nodeId"]] = p
+    paths["lane_csv"] = lane_csvs
+
+    return {
+        "scale": scale,
+        "config": cfg,
+        "start_ms": start_ms,
+        "network": network,
+        "paths": paths,
+        "stats": stats,
+    }
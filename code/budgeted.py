@@ -0,0 +1,509 @@
+"""
+内存受限模式：按块解析 Kafka dump、按时间片做供需合并，结果与全量内存运行一致
+
+    lane66_df, final_df = run_pipeline_budgeted(inters_ids, kafka_file, max_rss_mb=1500)
+    metrics_df, merged = run_resilience_analysis_budgeted(capacity_df, final_df, max_rss_mb=1500)
+
+跨块携带的状态：
+  - uuid 首次出现：未定稿的 uuid 保留完整首行；水位线越过其 15min 时段后计入 demand，
+    只以 uint64 哈希 + 首个 time_bin 的有序数组记住已定稿 uuid
+  - 韧性指标：每个 (direction, movement) 的 gap 累加量（sum / count / max / 05:00 基线）
+  - 可选积压：每个 (direction, movement) 的 unsatisfied 余量
+"""
+
+import gc
+
+import numpy as np
+import pandas as pd
+
+import demand
+import supply_demand
+from instrumentation import PipelineStats, _current_rss_mb
+from timeaxis import NAT_MS, as_epoch_ms, floor_ms, freq_ms, to_beijing_naive, to_epoch_ms
+
+# 经验值：list-of-dict 解析 + DataFrame + merge 的单行峰值开销
+BYTES_PER_ROW = 1200
+MIN_CHUNK_ROWS = 10_000
+MAX_CHUNK_ROWS = 5_000_000
+
+DEMAND_KEYS = ["time_bin", "turn_name", "laneId"]
+
+
+# ============================================================
+# 块大小控制
+# ============================================================
+class ChunkBudget:
+    """根据 max_rss_mb 与当前 RSS 估算块行数；超出 90% 预算时减半"""
+
+    def __init__(self, max_rss_mb, chunk_rows=None, bytes_per_row=BYTES_PER_ROW):
+        self.max_rss_mb = max_rss_mb
+        self.over_budget = 0
+        if chunk_rows is not None:
+            self.rows = int(chunk_rows)
+        else:
+            headroom = max(0.0, max_rss_mb - _current_rss_mb())
+            rows = int(headroom * 0.4 * 1024 * 1024 / bytes_per_row)
+            self.rows = min(MAX_CHUNK_ROWS, max(MIN_CHUNK_ROWS, rows))
+
+    def __call__(self):
+        return self.rows
+
+    def observe(self):
+        rss = _current_rss_mb()
+        if rss > self.max_rss_mb * 0.9:
+            self.over_budget += 1
+            self.rows = max(MIN_CHUNK_ROWS, self.rows // 2)
+        return rss
+
+
+def release():
+    """显式回收块间中间结果"""
+    gc.collect()
+
+
+# ============================================================
+# uuid 首次出现状态
+# ============================================================
+def _hash_uuid(values):
+    return pd.util.hash_array(np.asarray(values, dtype=object))
+
+
+def _sorted_lookup(sorted_keys, keys):
+    """返回 (命中 mask, 命中位置)"""
+    if len(sorted_keys) == 0:
+        return np.zeros(len(keys), dtype=bool), np.zeros(len(keys), dtype=np.int64)
+    pos = np.searchsorted(sorted_keys, keys)
+    pos_c = np.minimum(pos, len(sorted_keys) - 1)
+    return sorted_keys[pos_c] == keys, pos_c
+
+
+class FirstAppearanceState:
+    """
+    与 demand.first_appearance_demand 等价的增量版本：
+    文件乱序不超过 allowed_disorder 时结果完全一致；超出的早到记录计入 late_dropped。
+    """
+
+    COLUMNS = ["uuid", "time_bin", "turn_name", "laneId", "link_id", "direction"]
+
+    def __init__(self, allowed_disorder="15min", freq="15min"):
+        self.allowed_disorder = pd.Timedelta(allowed_disorder)
+        self.freq = pd.Timedelta(freq)
+        self.pending = None
+        self.seen_hash = np.empty(0, dtype=np.uint64)
+        self.seen_bin = np.empty(0, dtype="datetime64[ns]")
+        self.partials = []
+        self.max_time = None
+        self.late_dropped = 0
+
+    def update(self, data):
+        data["time_bin"] = to_beijing_naive(floor_ms(as_epoch_ms(data["timestamp"]), freq_ms(self.freq)))
+        if not len(data):
+            return
+
+        chunk_max = data["time_beijing"].max()
+        if pd.notna(chunk_max):
+            chunk_max = chunk_max.tz_localize(None)
+            self.max_time = chunk_max if self.max_time is None else max(self.max_time, chunk_max)
+
+        h = _hash_uuid(data["uuid"].to_numpy())
+        hit, pos = _sorted_lookup(self.seen_hash, h)
+        if hit.any():
+            earlier = data["time_bin"].to_numpy()[hit] < self.seen_bin[pos[hit]]
+            self.late_dropped += int(earlier.sum())
+            data = data[~hit]
+
+        cand = (
+            data.sort_values("time_bin", kind="stable")
+            .drop_duplicates(subset="uuid", keep="first")[self.COLUMNS]
+        )
+        if self.pending is None or self.pending.empty:
+            self.pending = cand
+        else:
+            self.pending = (
+                pd.concat([self.pending, cand], ignore_index=True)
+                .sort_values("time_bin", kind="stable")
+                .drop_duplicates(subset="uuid", keep="first")
+            )
+
+        if self.max_time is not None:
+            watermark = self.max_time - self.allowed_disorder
+            ready = (self.pending["time_bin"] + self.freq) <= watermark
+            if ready.any():
+                self._finalize(self.pending[ready])
+                self.pending = self.pending[~ready]
+
+    def _finalize(self, rows):
+        part = (
+            rows.groupby(DEMAND_KEYS)
+            .agg(
+                demand=("uuid", "count"),
+                link_id=("link_id", "first"),
+                direction=("direction", "first"),
+            )
+            .reset_index()
+        )
+        self.partials.append(part)
+
+        h = _hash_uuid(rows["uuid"].to_numpy())
+        b = rows["time_bin"].to_numpy()
+        all_h = np.concatenate([self.seen_hash, h])
+        all_b = np.concatenate([self.seen_bin, b])
+        order = np.argsort(all_h, kind="stable")
+        self.seen_hash, self.seen_bin = all_h[order], all_b[order]
+
+    def finish(self):
+        """定稿所有剩余 uuid，返回与 first_appearance_demand 同结构的 demand_df"""
+        if self.pending is not None and not self.pending.empty:
+            self._finalize(self.pending)
+        self.pending = None
+
+        if not self.partials:
+            empty = pd.DataFrame(columns=DEMAND_KEYS + ["demand", "link_id", "direction"])
+            empty["demand"] = empty["demand"].astype("int64")
+            return empty
+
+        demand_df = (
+            pd.concat(self.partials, ignore_index=True)
+            .groupby(DEMAND_KEYS)
+            .agg(
+                demand=("demand", "sum"),
+                link_id=("link_id", "first"),
+                direction=("direction", "first"),
+            )
+            .reset_index()
+        )
+        self.partials = []
+
+        # 乘以 4 恢复到 1 小时流量
+        demand_df["demand"] = demand_df["demand"] * 4
+        return demand_df
+
+
+# ============================================================
+# 1. demand：分块解析
+# ============================================================
+def run_pipeline_budgeted(
+    inters_ids,
+    kafka_file_path,
+    max_rss_mb=2048,
+    beginTime=None,
+    endTime=None,
+    direction=-1,
+    movement=-1,
+    frequency=2,
+    chunk_rows=None,
+    allowed_disorder="15min",
+    return_stats=False,
+    profile=None,
+    lane_index=None,
+    dedup="auto",
+):
+    """
+    与 demand.run_pipeline 同参数同输出的内存受限版本（return_stats=True 时返回 demand.PipelineResult）。
+    chunk_rows 缺省按 max_rss_mb 估算；allowed_disorder 为 dump 内允许的时间乱序上限。
+    lane_index / dedup 同 demand.run_pipeline（去重集合跨块保留，每条消息 1 个哈希）。
+    """
+    stats = PipelineStats("budgeted.run_pipeline_budgeted", profile=profile)
+    budget = ChunkBudget(max_rss_mb, chunk_rows)
+
+    with stats.run():
+        with stats.stage("fetch_intersections", rows_in=len(inters_ids)) as st:
+            df_inter = demand.fetch_intersection_links(inters_ids, stats)
+            st.rows_out = len(df_inter)
+
+        allowed_links = set(df_inter.loc[df_inter["linkType"] == "inLink", "linkId"])
+
+        road_ids = df_inter["linkId"].unique().tolist()
+        with stats.stage("fetch_road_lanes", rows_in=len(road_ids)) as st:
+            df_lane = demand.fetch_road_lanes(road_ids, stats)
+            st.rows_out = len(df_lane)
+        del df_inter
+
+        state = FirstAppearanceState(allowed_disorder=allowed_disorder)
+        lane_link_df = pd.DataFrame(columns=["laneId", "link_id"])
+        known_lanes = set()
+        chunks = 0
+        peak_rss = 0.0
+
+        deduper = demand.MessageDedup.coerce(dedup)
+        chunk_iter = demand.iter_kafka_chunks(kafka_file_path, chunk_rows=budget, dedup=deduper)
+        while True:
+            with stats.stage("parse_kafka") as st:
+                chunk = next(chunk_iter, None)
+                if chunk is not None:
+                    st.rows_out = (st.rows_out or 0) + len(chunk)
+                if deduper is not None:
+                    st.extra.update(deduper.summary())
+            if chunk is None:
+                break
+            chunks += 1
+
+            if lane_index is not None:
+                with stats.stage("spatial_resolve", rows_in=len(chunk)) as st:
+                    chunk, local_links, pending, recovered = demand.resolve_lane_links(chunk, lane_index)
+                    st.extra["recovered_targets"] = st.extra.get("recovered_targets", 0) + recovered
+                    fresh = local_links[~local_links["laneId"].isin(known_lanes)]
+                    if len(fresh):
+                        known_lanes.update(fresh["laneId"])
+                        lane_link_df = pd.concat([lane_link_df, fresh], ignore_index=True)
+                    st.rows_out = len(lane_link_df)
+                candidates = pending
+            else:
+                candidates = chunk["laneId"].dropna().astype(str).unique()
+            new_lanes = [l for l in candidates if l not in known_lanes]
+            if new_lanes:
+                with stats.stage("fetch_lane_links", rows_in=len(new_lanes)) as st:
+                    fetched = demand.fetch_lane_links(new_lanes, stats)
+                    known_lanes.update(new_lanes)
+                    lane_link_df = pd.concat([lane_link_df, fetched], ignore_index=True).drop_duplicates()
+                    st.rows_out = len(lane_link_df)
+
+            with stats.stage("merge_links", rows_in=len(chunk)) as st:
+                chunk = demand.attach_links(chunk, lane_link_df, allowed_links)
+                st.rows_out = (st.rows_out or 0) + len(chunk)
+
+            with stats.stage("label_turns", rows_in=len(chunk)) as st:
+                chunk = demand.label_turns(chunk)
+                st.rows_out = (st.rows_out or 0) + len(chunk)
+
+            with stats.stage("first_appearance", rows_in=len(chunk)) as st:
+                state.update(chunk)
+                st.rows_out = len(state.seen_hash)
+
+            del chunk
+            release()
+            peak_rss = max(peak_rss, budget.observe())
+
+        with stats.stage("first_appearance") as st:
+            demand_df = state.finish()
+            st.extra.update({
+                "chunks": chunks,
+                "chunk_rows": budget.rows,
+                "over_budget": budget.over_budget,
+                "late_dropped": state.late_dropped,
+                "peak_rss_mb": peak_rss,
+            })
+
+        with stats.stage("summarize", rows_in=len(demand_df)) as st:
+            lane66_df, final_df = demand.summarize_demand(demand_df, df_lane)
+            st.rows_out = len(final_df)
+        del demand_df, state
+
+        with stats.stage("query_filter", rows_in=len(final_df)) as st:
+            final_df = demand.filter_query(final_df, beginTime, endTime, direction, movement)
+            st.rows_out = len(final_df)
+
+    if return_stats:
+        return demand.PipelineResult(lane66_df, final_df, stats=stats)
+    return lane66_df, final_df
+
+
+# ============================================================
+# 2. 韧性分析：按时间片合并 + 指标累加
+# ============================================================
+def _slice_bounds(demand_df, n_slices):
+    """demand 按行连续切片（run_pipeline 输出按 time_bin 有序，行切片即时间切片）"""
+    n = len(demand_df)
+    step = max(1, -(-n // max(1, n_slices)))
+    return [(i, min(n, i + step)) for i in range(0, n, step)]
+
+
+def _capacity_for(capacity_df, cap_ms, piece_ms):
+    """
+    取出与切片时间匹配的 capacity 行；cap_ms / piece_ms 为两侧 time_bin 的 epoch ms（timeaxis.to_epoch_ms，
+    与 run_resilience_analysis 的对齐口径一致，字符串 / tz-aware / naive 均可）。
+    为空时保留一行 NaT 哨兵，使 merge 走与全量一致的 left-join 分支
+    """
+    if capacity_df.empty or cap_ms is None:
+        return capacity_df
+    if (piece_ms == NAT_MS).all():
+        sub = capacity_df[cap_ms == NAT_MS]
+    else:
+        sub = capacity_df[np.isin(cap_ms, np.unique(piece_ms[piece_ms != NAT_MS]))]
+    if sub.empty:
+        sub = capacity_df.iloc[:1].copy()
+        sub["time_bin"] = pd.NaT
+    return sub
+
+
+def _accumulate_gap(merged):
+    """与 compute_resilience_metrics 相同口径的 gap 累加量"""
+    if "ef_utilized_cap" in merged.columns:
+        utilized = merged["ef_utilized_cap"].fillna(0)
+    elif "utilized_supply" in merged.columns:
+        utilized = merged["utilized_supply"].fillna(0)
+    else:
+        utilized = 0
+    gap = merged["smoothed_demand"].fillna(0) - utilized
+    is5 = merged["time_bin"].dt.hour == 5
+    acc = pd.DataFrame({
+        "direction": merged["direction"],
+        "movement": merged["movement"],
+        "gap_sum": gap,
+        "gap_n": 1,
+        "gap_max": gap,
+        "base_sum": gap.where(is5, 0.0),
+        "base_n": is5.astype(int),
+    })
+    return (
+        acc.groupby(["direction", "movement"], dropna=False)
+        .agg(gap_sum=("gap_sum", "sum"), gap_n=("gap_n", "sum"), gap_max=("gap_max", "max"),
+             base_sum=("base_sum", "sum"), base_n=("base_n", "sum"))
+        .reset_index()
+    )
+
+
+def _metrics_from_acc(acc):
+    rows = []
+    for r in acc.itertuples(index=False):
+        mean_gap = r.gap_sum / r.gap_n if r.gap_n else np.nan
+        baseline = r.base_sum / r.base_n if r.base_n else mean_gap
+        if baseline is None or baseline == 0 or pd.isna(baseline):
+            OR = DR = RR = None
+        else:
+            OR = float(1 - mean_gap / baseline)
+            DR = float(1 - r.gap_max / baseline)
+            RR = OR
+        rows.append({
+            "direction": r.direction,
+            "movement": r.movement,
+            "OR_operational": OR,
+            "DR_design": DR,
+            "RR_recovery": RR,
+        })
+    return pd.DataFrame(rows)
+
+
+def _backlog_carry(merged, carry):
+    """按 (direction, movement) 携带 unsatisfied 余量的积压递推（口径同 compute_utilized_supply_with_backlog）"""
+    merged = merged.reset_index(drop=True)
+    order = merged.sort_values("time_bin", kind="stable").index.to_numpy()
+    dem = merged["smoothed_demand"].fillna(0).to_numpy(dtype=float)
+    cap = merged["cleaned_capacity"].fillna(0).to_numpy(dtype=float) * 1.5
+    keys = [
+        (None if pd.isna(d) else d, None if pd.isna(m) else m)
+        for d, m in zip(merged["direction"], merged["movement"])
+    ]
+    utilized = np.zeros(len(merged))
+    backlog = np.zeros(len(merged))
+    for i in order:
+        total = dem[i] + carry.get(keys[i], 0.0)
+        utilized[i] = min(cap[i], total)
+        backlog[i] = carry[keys[i]] = max(0.0, total - cap[i])
+    merged["utilized_supply"] = utilized
+    merged["unsatisfied_demand"] = backlog
+    return merged
+
+
+def run_resilience_analysis_budgeted(
+    capacity_df,
+    demand_df,
+    max_rss_mb=2048,
+    beginTime=None,
+    endTime=None,
+    direction=-1,
+    movement=-1,
+    n_slices=None,
+    keep_merged=True,
+    with_backlog=False,
+):
+    """
+    与 supply_demand.run_resilience_analysis 同口径：
+    demand 按时间切片，每片只复制/合并该片数据；指标由跨片累加量得出。
+    keep_merged=False 时不保留合并后的长表（返回 None），峰值内存只与单片相关。
+    with_backlog=True 时追加 utilized_supply / unsatisfied_demand（积压跨片携带）。
+    """
+    if demand_df is None or demand_df.empty:
+        return supply_demand.run_resilience_analysis(
+            capacity_df, demand_df, beginTime=beginTime, endTime=endTime,
+            direction=direction, movement=movement,
+        )
+    capacity_df = capacity_df if capacity_df is not None else pd.DataFrame()
+
+    if n_slices is None:
+        row_bytes = demand_df.memory_usage(deep=False).sum() / max(1, len(demand_df))
+        headroom = max(1.0, max_rss_mb - _current_rss_mb()) * 1024 * 1024
+        # 每片合并后约为 demand 行的 4 倍宽，留一半余量
+        rows_per_slice = max(1000, int(headroom * 0.5 / max(1.0, row_bytes * 4)))
+        n_slices = max(1, -(-len(demand_df) // rows_per_slice))
+
+    has_time = "time_bin" in demand_df.columns
+    cap_ms = to_epoch_ms(capacity_df["time_bin"]) if "time_bin" in capacity_df.columns else None
+    if has_time:
+        dem_ms = to_epoch_ms(demand_df["time_bin"])
+        nat = dem_ms == NAT_MS
+        body_ms, tail_ms = dem_ms[~nat], dem_ms[nat]
+        body = demand_df[~nat] if nat.any() else demand_df
+        tail = demand_df[nat] if nat.any() else None
+    else:
+        body, tail = demand_df, None
+
+    accs, merged_parts, carry = [], [], {}
+    bounds = _slice_bounds(body, n_slices)
+    pieces = [body.iloc[a:b] for a, b in bounds]
+    piece_ms = [body_ms[a:b] for a, b in bounds] if has_time else [None] * len(pieces)
+    if tail is not None:
+        pieces.append(tail)
+        piece_ms.append(tail_ms)
+
+    for piece, ms in zip(pieces, piece_ms):
+        cap = _capacity_for(capacity_df, cap_ms, ms) if has_time else capacity_df
+        _, merged = supply_demand.run_resilience_analysis(
+            cap, piece, beginTime=beginTime, endTime=endTime,
+            direction=direction, movement=movement,
+        )
+        del cap
+        if not merged.empty:
+            accs.append(_accumulate_gap(merged))
+            if with_backlog:
+                merged = _backlog_carry(merged, carry)
+            if keep_merged:
+                merged_parts.append(merged)
+        del merged
+        release()
+
+    metric_cols = ["direction", "movement", "OR_operational", "DR_design", "RR_recovery"]
+    if not accs:
+        return pd.DataFrame(columns=metric_cols), (pd.DataFrame() if keep_merged else None)
+
+    acc = (
+        pd.concat(accs, ignore_index=True)
+        .groupby(["direction", "movement"], dropna=False)
+        .agg(gap_sum=("gap_sum", "sum"), gap_n=("gap_n", "sum"), gap_max=("gap_max", "max"),
+             base_sum=("base_sum", "sum"), base_n=("base_n", "sum"))
+        .reset_index()
+    )
+    metrics_df = _metrics_from_acc(acc)
+
+    merged_df = pd.concat(merged_parts, ignore_index=True) if keep_merged else None
+    return metrics_df, merged_df
+
+
+# ============================================================
+# 3. 端到端
+# ============================================================
+def run_end_to_end_budgeted(
+    inters_ids,
+    kafka_file_path,
+    capacity_df,
+    max_rss_mb=2048,
+    beginTime=None,
+    endTime=None,
+    direction=-1,
+    movement=-1,
+    keep_merged=False,
+    with_backlog=False,
+):
+    """
+    demand（分块）→ 韧性分析（分片）。run_pipeline 输出列名为 Direction，
+    此处统一为 direction 以便与 capacity 对齐。返回 (lane66_df, final_df, metrics_df, merged_df)。
+    """
+    lane66_df, final_df = run_pipeline_budgeted(inters_ids, kafka_file_path, max_rss_mb=max_rss_mb)
+    release()
+    demand_in = final_df.rename(columns={"Direction": "direction"})
+    metrics_df, merged_df = run_resilience_analysis_budgeted(
+        capacity_df, demand_in, max_rss_mb=max_rss_mb,
+        beginTime=beginTime, endTime=endTime, direction=direction, movement=movement,
+        keep_merged=keep_merged, with_backlog=with_backlog,
+    )
+    return lane66_df, final_df, metrics_df, merged_df
@@ -0,0 +1,151 @@
+"""
+WGS84 / GCJ02 / BD09 坐标转换（NumPy 向量化版）
+
+与前端 LargeScreenFront/src/utils/coordinateConverter.js 逐式对应，
+对整列坐标一次性计算，后端可直接输出地图所用坐标系的经纬度：
+
+    lng, lat = convert_coordinates(df["longitude"], df["latitude"], "wgs84", "gcj02")
+    df = convert_frame(df, "wgs84", "bd09")
+
+gcj02 → wgs84 与 JS 相同，为单步近似（误差约 1~2 m）。
+"""
+
+import numpy as np
+import pandas as pd
+
+PI = np.pi
+A = 6378245.0  # 长半轴
+EE = 0.00669342162296594323  # 偏心率平方
+
+COORDINATE_SYSTEMS = ("wgs84", "gcj02", "bd09")
+
+
+def _as_arrays(lng, lat):
+    return np.asarray(lng, dtype=float), np.asarray(lat, dtype=float)
+
+
+def is_in_china(lng, lat):
+    """判断坐标是否在中国境内（逐点布尔数组）"""
+    lng, lat = _as_arrays(lng, lat)
+    return (lng >= 72.004) & (lng <= 137.8347) & (lat >= 0.8293) & (lat <= 55.8271)
+
+
+def _transform_lat(lng, lat):
+    ret = -100.0 + 2.0 * lng + 3.0 * lat + 0.2 * lat * lat + 0.1 * lng * lat + 0.2 * np.sqrt(np.abs(lng))
+    ret += (20.0 * np.sin(6.0 * lng * PI) + 20.0 * np.sin(2.0 * lng * PI)) * 2.0 / 3.0
+    ret += (20.0 * np.sin(lat * PI) + 40.0 * np.sin(lat / 3.0 * PI)) * 2.0 / 3.0
+    ret += (160.0 * np.sin(lat / 12.0 * PI) + 320 * np.sin(lat * PI / 30.0)) * 2.0 / 3.0
+    return ret
+
+
+def _transform_lng(lng, lat):
+    ret = 300.0 + lng + 2.0 * lat + 0.1 * lng * lng + 0.1 * lng * lat + 0.1 * np.sqrt(np.abs(lng))
+    ret += (20.0 * np.sin(6.0 * lng * PI) + 20.0 * np.sin(2.0 * lng * PI)) * 2.0 / 3.0
+    ret += (20.0 * np.sin(lng * PI) + 40.0 * np.sin(lng / 3.0 * PI)) * 2.0 / 3.0
+    ret += (150.0 * np.sin(lng / 12.0 * PI) + 300.0 * np.sin(lng / 30.0 * PI)) * 2.0 / 3.0
+    return ret
+
+
+def _gcj_offset(lng, lat):
+    """WGS84 与 GCJ02 之间的偏移量（dlng, dlat），在 (lng, lat) 处求值"""
+    dlat = _transform_lat(lng - 105.0, lat - 35.0)
+    dlng = _transform_lng(lng - 105.0, lat - 35.0)
+    radlat = lat / 180.0 * PI
+    magic = np.sin(radlat)
+    magic = 1 - EE * magic * magic
+    sqrtmagic = np.sqrt(magic)
+    dlat = (dlat * 180.0) / ((A * (1 - EE)) / (magic * sqrtmagic) * PI)
+    dlng = (dlng * 180.0) / (A / sqrtmagic * np.cos(radlat) * PI)
+    return dlng, dlat
+
+
+# ============================================================
+# 两两转换
+# ============================================================
+def wgs84_to_gcj02(lng, lat):
+    lng, lat = _as_arrays(lng, lat)
+    dlng, dlat = _gcj_offset(lng, lat)
+    inside = is_in_china(lng, lat)
+    return np.where(inside, lng + dlng, lng), np.where(inside, lat + dlat, lat)
+
+
+def gcj02_to_wgs84(lng, lat):
+    lng, lat = _as_arrays(lng, lat)
+    dlng, dlat = _gcj_offset(lng, lat)
+    inside = is_in_china(lng, lat)
+    return np.where(inside, lng - dlng, lng), np.where(inside, lat - dlat, lat)
+
+
+def gcj02_to_bd09(lng, lat):
+    lng, lat = _as_arrays(lng, lat)
+    z = np.sqrt(lng * lng + lat * lat) + 0.00002 * np.sin(lat * PI * 3000.0 / 180.0)
+    theta = np.arctan2(lat, lng) + 0.000003 * np.cos(lng * PI * 3000.0 / 180.0)
+    return z * np.cos(theta) + 0.0065, z * np.sin(theta) + 0.006
+
+
+def bd09_to_gcj02(lng, lat):
+    lng, lat = _as_arrays(lng, lat)
+    x = lng - 0.0065
+    y = lat - 0.006
+    z = np.sqrt(x * x + y * y) - 0.00002 * np.sin(y * PI * 3000.0 / 180.0)
+    theta = np.arctan2(y, x) - 0.000003 * np.cos(x * PI * 3000.0 / 180.0)
+    return z * np.cos(theta), z * np.sin(theta)
+
+
+def wgs84_to_bd09(lng, lat):
+    return gcj02_to_bd09(*wgs84_to_gcj02(lng, lat))
+
+
+def bd09_to_wgs84(lng, lat):
+    return gcj02_to_wgs84(*bd09_to_gcj02(lng, lat))
+
+
+_CONVERTERS = {
+    ("wgs84", "gcj02"): wgs84_to_gcj02,
+    ("wgs84", "bd09"): wgs84_to_bd09,
+    ("gcj02", "wgs84"): gcj02_to_wgs84,
+    ("gcj02", "bd09"): gcj02_to_bd09,
+    ("bd09", "wgs84"): bd09_to_wgs84,
+    ("bd09", "gcj02"): bd09_to_gcj02,
+}
+
+
+# ============================================================
+# 统一入口
+# ============================================================
+def convert_coordinates(lng, lat, from_type, to_type):
+    """
+    统一坐标转换，from_type / to_type ∈ {"wgs84", "gcj02", "bd09"}；
+    标量、列表、ndarray、Series 均可，返回 (lng, lat) 两个 float64 数组。
+    """
+    from_type, to_type = str(from_type).lower(), str(to_type).lower()
+    if from_type == to_type:
+        return _as_arrays(lng, lat)
+    converter = _CONVERTERS.get((from_type, to_type))
+    if converter is None:
+        raise ValueError(f"不支持的坐标转换类型: {from_type} -> {to_type}")
+    return converter(lng, lat)
+
+
+def convert_frame(df, from_type, to_type, lng_col="longitude", lat_col="latitude"):
+    """返回经纬度列已转换的新 DataFrame"""
+    lng, lat = convert_coordinates(
+        pd.to_numeric(df[lng_col], errors="coerce"), pd.to_numeric(df[lat_col], errors="coerce"),
+        from_type, to_type,
+    )
+    return df.assign(**{lng_col: lng, lat_col: lat})
+
+
+def convert_polylines(polylines, from_type, to_type):
+    """[[[lng, lat], ...], ...] 折线列表（如车道几何）整体转换，保持原有嵌套结构"""
+    lengths = [len(p) for p in polylines]
+    if not sum(lengths):
+        return [list(p) for p in polylines]
+    pts = np.array([pt for p in polylines for pt in p], dtype=float)
+    lng, lat = convert_coordinates(pts[:, 0], pts[:, 1], from_type, to_type)
+    flat = np.column_stack([lng, lat]).tolist()
+    out, i = [], 0
+    for n in lengths:
+        out.append(flat[i:i + n])
+        i += n
+    return out
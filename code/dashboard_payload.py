@@ -0,0 +1,196 @@
+"""
+大屏流量图预聚合数据：每交叉口 × 粒度（1min / 15min）× 方向 一个紧凑文件，
+前端只拉取正在显示的方向，不再在浏览器里逐行解析 CSV、按方向过滤、按车道排序。
+
+目录结构（front end: /data/dashboard/...）：
+
+    <out_dir>/<intersection>/<unit>/index.json
+    <out_dir>/<intersection>/<unit>/<direction>.json   (fmt="json")
+    <out_dir>/<intersection>/<unit>/<direction>.f32    (fmt="f32"，小端 Float32，lanes × length 行优先，缺失为 NaN)
+
+index.json：{intersection, unit, start_ms, step_ms, length, format,
+             directions: {方向: {file, lanes, points}}}
+同一交叉口同一粒度共享时间轴 start_ms + i * step_ms；时间为北京时间墙钟按 UTC 编码的 epoch ms，
+与旧 loadCSVData（UTC + 8h）得到的 Date 一致。
+
+    python dashboard_payload.py --csv ../data/minutes/170minute_lane_flow.csv --intersection 170 --unit 1min
+    python dashboard_payload.py --kafka ../data/kafka.txt --inters 1893...,1893... --intersection 170
+"""
+
+import argparse
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+from timeaxis import as_epoch_ms, floor_ms, freq_ms, to_beijing_naive
+
+UNITS = {"1min": "1min", "15min": "15min"}
+
+BEIJING_OFFSET = pd.Timedelta(hours=8)
+
+FLOW_COLUMNS = ["direction", "lane", "time_bin", "vehicle_count"]
+
+
+# ============================================================
+# 1. 车道流量长表（direction, lane, time_bin, vehicle_count）
+# ============================================================
+def lane_flow_counts(data, df_lane=None, freq="1min"):
+    """
+    label_turns 之后的明细 → 每 freq 每车道去重车辆数；
+    direction 取 df_lane 中路段方向（缺省用 link_id），time_bin 为北京时间（naive）。
+    """
+    time_bin = to_beijing_naive(floor_ms(as_epoch_ms(data["timestamp"]), freq_ms(freq)))
+    flow = (
+        data.assign(time_bin=time_bin, lane=data["laneId"].astype(str))
+        .groupby(["link_id", "lane", "time_bin"])["uuid"]
+        .nunique()
+        .reset_index(name="vehicle_count")
+    )
+    if df_lane is not None:
+        direction_map = df_lane[["roadId", "direction"]].drop_duplicates().rename(columns={"roadId": "link_id"})
+        flow = flow.merge(direction_map, how="left", on="link_id")
+        flow["direction"] = flow["direction"].fillna(flow["link_id"])
+    else:
+        flow["direction"] = flow["link_id"]
+    return flow[FLOW_COLUMNS]
+
+
+def read_lane_flow_csv(path):
+    """旧版前端 CSV（direction,lane,minute,vehicle_count，minute 为 UTC）→ 长表，时间转北京时间"""
+    df = pd.read_csv(path, dtype={"direction": str, "lane": str})
+    t = pd.to_datetime(df["minute"], utc=True).dt.tz_localize(None) + BEIJING_OFFSET
+    return pd.DataFrame({
+        "direction": df["direction"].str.strip(),
+        "lane": df["lane"].str.strip(),
+        "time_bin": t,
+        "vehicle_count": pd.to_numeric(df["vehicle_count"], errors="coerce"),
+    })
+
+
+# ============================================================
+# 2. 长表 → 稠密矩阵
+# ============================================================
+def build_payloads(flow, unit="1min"):
+    """
+    返回 (axis, {direction: {"lanes": [...], "values": ndarray(lanes × length), "points": n}})，
+    axis = {"start_ms", "step_ms", "length"}；车道按字符串排序（与前端原 getLanesFromData 一致）。
+    """
+    step = pd.Timedelta(UNITS[unit])
+    flow = flow.dropna(subset=["time_bin"])
+    if flow.empty:
+        return {"start_ms": 0, "step_ms": int(step / pd.Timedelta(milliseconds=1)), "length": 0}, {}
+
+    t = flow["time_bin"].dt.floor(step)
+    start = t.min()
+    length = int((t.max() - start) / step) + 1
+    pos = ((t - start) / step).astype(np.int64).to_numpy()
+
+    payloads = {}
+    for direction, idx in flow.groupby("direction").indices.items():
+        lanes_raw = flow["lane"].to_numpy()[idx]
+        lanes = sorted(set(lanes_raw))
+        lane_pos = pd.Index(lanes).get_indexer(lanes_raw)
+        counts = flow["vehicle_count"].to_numpy(dtype=float)[idx]
+
+        # 同一格重复记录时累加；无记录的格为 NaN（前端不画点）
+        acc = np.zeros((len(lanes), length))
+        np.add.at(acc, (lane_pos, pos[idx]), np.nan_to_num(counts))
+        filled = np.zeros((len(lanes), length), dtype=bool)
+        filled[lane_pos, pos[idx]] = True
+        values = np.where(filled, acc, np.nan).astype(np.float32)
+        payloads[direction] = {"lanes": lanes, "values": values, "points": int(len(idx))}
+
+    axis = {
+        "start_ms": int((start - pd.Timestamp(0)) / pd.Timedelta(milliseconds=1)),
+        "step_ms": int(step / pd.Timedelta(milliseconds=1)),
+        "length": length,
+    }
+    return axis, payloads
+
+
+def _safe_name(direction):
+    return "".join(c if c.isalnum() or c in "-_" else "_" for c in str(direction))
+
+
+def write_dashboard_payloads(flow, out_dir, intersection, unit="1min", fmt="json"):
+    """写出 index.json + 每方向一个文件，返回 index dict"""
+    if fmt not in ("json", "f32"):
+        raise ValueError(f"unsupported format: {fmt}")
+    axis, payloads = build_payloads(flow, unit)
+    target = os.path.join(out_dir, str(intersection), unit)
+    os.makedirs(target, exist_ok=True)
+
+    directions = {}
+    for direction, p in payloads.items():
+        name = f"{_safe_name(direction)}.{fmt}"
+        path = os.path.join(target, name)
+        if fmt == "f32":
+            p["values"].astype("<f4").tofile(path)
+        else:
+            values = [
+                [None if np.isnan(v) else (int(v) if float(v).is_integer() else round(float(v), 3)) for v in row]
+                for row in p["values"]
+            ]
+            with open(path, "w", encoding="utf-8") as f:
+                json.dump({"lanes": p["lanes"], "values": values}, f, ensure_ascii=False, separators=(",", ":"))
+        directions[str(direction)] = {"file": name, "lanes": p["lanes"], "points": p["points"]}
+
+    index = {"intersection": str(intersection), "unit": unit, "format": fmt, **axis, "directions": directions}
+    with open(os.path.join(target, "index.json"), "w", encoding="utf-8") as f:
+        json.dump(index, f, ensure_ascii=False, indent=1)
+    return index
+
+
+def export_intersection(data, df_lane, out_dir, intersection, units=("1min", "15min"), fmt="json"):
+    """label_turns 之后的明细 → 各粒度 payload"""
+    return {
+        unit: write_dashboard_payloads(lane_flow_counts(data, df_lane, UNITS[unit]), out_dir, intersection, unit, fmt)
+        for unit in units
+    }
+
+
+# ============================================================
+# 命令行
+# ============================================================
+def _labelled_from_kafka(inters_ids, kafka_file_path):
+    """demand 前 5 个阶段：link / lane 表 + 解析 + 合并 link_id + 转向标注"""
+    import demand
+
+    df_inter = demand.fetch_intersection_links(inters_ids)
+    allowed_links = set(df_inter.loc[df_inter["linkType"] == "inLink", "linkId"])
+    df_lane = demand.fetch_road_lanes(df_inter["linkId"].unique().tolist())
+    data = demand.parse_kafka_file(kafka_file_path)
+    lane_link_df = demand.fetch_lane_links(data["laneId"].dropna().astype(str).unique())
+    data = demand.attach_links(data, lane_link_df, allowed_links)
+    return demand.label_turns(data), df_lane
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Pre-aggregated dashboard lane-flow payloads")
+    src = parser.add_mutually_exclusive_group(required=True)
+    src.add_argument("--csv", help="旧版 direction,lane,minute,vehicle_count CSV")
+    src.add_argument("--kafka", help="Kafka 感知 dump，配合 --inters")
+    parser.add_argument("--inters", default="", help="逗号分隔的 intersId（--kafka 时必填）")
+    parser.add_argument("--intersection", required=True, help="前端交叉口编号，如 170")
+    parser.add_argument("--unit", default=None, choices=list(UNITS), help="--csv 时 CSV 的粒度")
+    parser.add_argument("--out-dir", default=os.path.join("LargeScreenFront", "public", "data", "dashboard"))
+    parser.add_argument("--format", default="json", choices=["json", "f32"])
+    args = parser.parse_args(argv)
+
+    if args.csv:
+        units = [args.unit] if args.unit else list(UNITS)
+        flow = read_lane_flow_csv(args.csv)
+        for unit in units:
+            index = write_dashboard_payloads(flow, args.out_dir, args.intersection, unit, args.format)
+            print(f"{args.intersection}/{unit}: {len(index['directions'])} directions × {index['length']} bins")
+    else:
+        inters_ids = [s for s in args.inters.split(",") if s]
+        data, df_lane = _labelled_from_kafka(inters_ids, args.kafka)
+        for unit, index in export_intersection(data, df_lane, args.out_dir, args.intersection, fmt=args.format).items():
+            print(f"{args.intersection}/{unit}: {len(index['directions'])} directions × {index['length']} bins")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,9 +1,15 @@
+import contextlib
+from collections import namedtuple
 import requests
 import pandas as pd
 from tqdm import tqdm
 import json
 import re
 
+from instrumentation import PipelineStats
+from textio import detect_compression, iter_messages_mmap, kafka_position, open_text
+from timeaxis import as_epoch_ms, floor_ms, freq_ms, to_beijing_naive
+
 # ------------------------------
 #         配置常量
 # ------------------------------
@@ -11,6 +17,31 @@ URL_INTERS = "http://172.30.11.143:8086/yzsfq/getIntersConns.do"
 URL_ROAD = "http://172.30.11.143:8086/yzsfq/getRoadControlInfo.do"
 URL_LANE = "http://172.30.11.143:8086/yzsfq/getLaneById.do"
 
+TURNINFO_MAP = {
+    1: "直", 2: "右", 3: "左", 4: "直右", 5: "直左", 6: "左右", 7: "左直右",
+    8: "调头", 9: "调头右", 10: "调头左", 11: "调头直右", 12: "调头左直",
+    13: "调头左右", 14: "调头左直右", 15: "斜右", 16: "斜左", 17: "直斜右",
+    18: "直斜左", 19: "左斜右", 20: "右斜右", 21: "右斜左", 22: "左斜左",
+    23: "调头斜右", 24: "调头斜左", 25: "斜左斜右", 26: "直右斜左",
+    27: "直右斜右", 28: "直左斜左", 29: "直左斜右", 30: "调直",
+    99: "其他",
+}
+
+TURN_MAP = {
+    "左": "Left Turn",
+    "直": "Through",
+    "右": "Right Turn",
+    "直右": "Through",
+    "调头左": "Left Turn",
+}
+
+# run_pipeline 请求了附加输出时的返回值：未请求的阶段为 None（字段顺序同 return_* 参数的顺序）
+PipelineResult = namedtuple(
+    "PipelineResult",
+    ["lane66_df", "final_df", "stats", "traj_df", "network", "stopline_df", "od_df"],
+    defaults=(None, None, None, None, None),
+)
+
 
 # ------------------------------
 # 角度 → 方向
@@ -71,18 +102,20 @@ def _parse_direction_movement(direction, movement):
     return d, movement_name
 
 # ------------------------------
-# 总入口函数
+#        各阶段函数
 # ------------------------------
-def run_pipeline(inters_ids, kafka_file_path, beginTime=None, endTime=None, direction=-1, movement=-1, frequency=2):
+def _http_post(stats):
+    return stats.wrap_http(requests.post) if stats is not None else requests.post
 
-    # ====================================================
-    # 1. 获取 inLinks / outLinks
-    # ====================================================
+
+def fetch_intersection_links(inters_ids, stats=None):
+    """intersId → inLinks / outLinks 长表（intersId, linkId, linkType）"""
+    post = _http_post(stats)
     inter_records = []
 
     for iid in tqdm(inters_ids, desc="Fetching intersection info"):
         try:
-            resp = requests.post(f"{URL_INTERS}?intersId={iid}", timeout=10)
+            resp = post(f"{URL_INTERS}?intersId={iid}", timeout=10)
             resp.raise_for_status()
             data = resp.json()
             if data.get("state") != 1 or "data" not in data:
@@ -102,20 +135,17 @@ def run_pipeline(inters_ids, kafka_file_path, beginTime=None, endTime=None, dire
         except:
             continue
 
-    df_inter = pd.DataFrame(inter_records)
+    return pd.DataFrame(inter_records)
 
-    # allowed only inLink
-    allowed_links = set(df_inter.loc[df_inter["linkType"] == "inLink", "linkId"])
 
-    # ====================================================
-    # 2. 获取 roadId → lane 列表
-    # ====================================================
-    road_ids = df_inter["linkId"].unique().tolist()
+def fetch_road_lanes(road_ids, stats=None):
+    """roadId → lane 列表（roadId, heading, laneId, turnInfo, direction）"""
+    post = _http_post(stats)
     lane_records = []
 
     for rid in tqdm(road_ids, desc="Fetching road control info"):
         try:
-            resp = requests.post(f"{URL_ROAD}?linkId={rid}", timeout=10)
+            resp = post(f"{URL_ROAD}?linkId={rid}", timeout=10)
             resp.raise_for_status()
             data = resp.json()
 
@@ -135,65 +165,201 @@ def run_pipeline(inters_ids, kafka_file_path, beginTime=None, endTime=None, dire
 
     df_lane = pd.DataFrame(lane_records)
     df_lane["direction"] = df_lane["heading"].apply(angle_to_direction)
+    return df_lane
+
+
+KAFKA_COLUMNS = ["timestamp", "uuid", "longitude", "latitude", "laneId", "turnInfo"]
+
+DEDUP_MODES = ("auto", "offset", "value")
+
+
+class MessageDedup:
+    """
+    消息级去重（json.loads 之前）：消费者重启 / 分区再均衡后 dump 里会重放同一条消息。
+      - "offset"：按 (topic, partition, offset) 判重，缺消息位置时退回按 value 判重
+      - "value"：按 value 原始字节的哈希判重（同一内容被生产者重发、offset 不同也算重复）
+      - "auto"：同 "offset"
+    只保存 64 位哈希（进程内 hash()，不落盘）；重复消息不解析、不展开成 target。
+    """
+
+    def __init__(self, mode="auto"):
+        if mode not in DEDUP_MODES:
+            raise ValueError(f"unsupported dedup mode: {mode}")
+        self.mode = mode
+        self.seen = set()
+        self.messages = 0
+        self.duplicates = 0
+
+    @classmethod
+    def coerce(cls, dedup):
+        """None / 模式名 / MessageDedup → MessageDedup 或 None"""
+        if dedup is None or isinstance(dedup, cls):
+            return dedup
+        return cls(dedup)
+
+    def is_duplicate(self, value, position=None):
+        self.messages += 1
+        key = hash(position) if position is not None and self.mode != "value" else hash(value)
+        if key in self.seen:
+            self.duplicates += 1
+            return True
+        self.seen.add(key)
+        return False
+
+    @property
+    def duplicate_rate(self):
+        return self.duplicates / self.messages if self.messages else 0.0
+
+    def summary(self):
+        return {
+            "messages": self.messages,
+            "duplicate_messages": self.duplicates,
+            "duplicate_rate": round(self.duplicate_rate, 6),
+        }
 
-    # ====================================================
-    # 3. 解析 Kafka txt
-    # ====================================================
-    records = []
+
+def iter_kafka_messages(lines, dedup=None, sample=None):
+    """
+    从行迭代器中还原 Kafka 消息（value={...} 可能跨多行），逐条产出 json 解析后的 dict。
+    文件与实时流（tail / socket）共用。dedup: MessageDedup，给定时重复消息在解析前跳过；
+    sample: sampling.UuidSample，给定时只产出含抽中车辆的消息（只含这些 target）。
+    """
     buffer = ""
+    position = None
+
+    for line in lines:
+        line = line.strip()
+        if not line:
+            continue
 
-    with open(kafka_file_path, "r", encoding="utf-8") as f:
-        for line in f:
-            line = line.strip()
-            if not line:
+        if "Received message:" in line and "value=" in line:
+            match = re.search(r'value=({.*}),\s*partition', line)
+            if match:
+                buffer = match.group(1)
+                if dedup is not None:
+                    position = kafka_position(line[:match.start(1)], line[match.end(1):])
+            else:
+                buffer = line[line.find("value=") + 6:]
+                position = None
                 continue
 
-            if "Received message:" in line and "value=" in line:
-                match = re.search(r'value=({.*}),\s*partition', line)
-                if match:
-                    buffer = match.group(1)
-                else:
-                    buffer = line[line.find("value=") + 6:]
-                    continue
-
-            elif buffer:
-                buffer += line
-
-            # 若 JSON 括号匹配，解析
-            if buffer and buffer.count("{") == buffer.count("}"):
-                try:
-                    data = json.loads(buffer)
-                except:
-                    buffer = ""
-                    continue
-
-                timestamp = data.get("timestamp")
-                targets = data.get("targets", [])
-
-                for t in targets:
-                    records.append({
-                        "longitude": t.get("longitude"),
-                        "latitude": t.get("latitude"),
-                        "uuid": t.get("uuid"),
-                        "laneId": t.get("laneId"),
-                        "turnInfo": t.get("turnInfo"),
-                        "timestamp": timestamp
-                    })
+        elif buffer:
+            buffer += line
 
+        # 若 JSON 括号匹配，解析
+        if buffer and buffer.count("{") == buffer.count("}"):
+            if dedup is not None and dedup.is_duplicate(buffer, position):
+                buffer = ""
+                continue
+            if sample is not None:
+                data = sample.reduce(buffer)
                 buffer = ""
+                if data is not None:
+                    yield data
+                continue
+            try:
+                data = json.loads(buffer)
+            except:
+                buffer = ""
+                continue
 
-    data = pd.DataFrame(records)
-    data = data[["timestamp", "uuid", "longitude", "latitude", "laneId", "turnInfo"]]
+            buffer = ""
+            yield data
 
-    # ====================================================
-    # 4. laneId → link_id 映射
-    # ====================================================
-    unique_lanes = data["laneId"].dropna().astype(str).unique()
+
+def iter_kafka_messages_mmap(kafka_file_path, dedup=None, sample=None):
+    """未压缩 dump 的快速路径：mmap 扫描字节，逐条产出 json 解析后的 dict（无法解析的消息跳过）"""
+    for value, position in iter_messages_mmap(kafka_file_path, positions=dedup is not None):
+        if dedup is not None and dedup.is_duplicate(value, position):
+            continue
+        if sample is not None:
+            data = sample.reduce(value)
+            if data is not None:
+                yield data
+            continue
+        try:
+            yield json.loads(value)
+        except ValueError:
+            continue
+
+
+@contextlib.contextmanager
+def open_kafka_messages(kafka_file_path, reader="auto", dedup=None, sample=None):
+    """
+    reader: "lines"（逐行，支持 gzip / zstd）、"mmap"（仅未压缩文件）、
+            "auto"（未压缩走 mmap，压缩文件流式解压后逐行）
+    dedup: None / "auto" / "offset" / "value" / MessageDedup，见 MessageDedup
+    sample: None / 抽样比例 / sampling.UuidSample，按 uuid 哈希抽样（解析前过滤）
+    """
+    if reader not in ("auto", "lines", "mmap"):
+        raise ValueError(f"unsupported reader: {reader}")
+    dedup = MessageDedup.coerce(dedup)
+    if sample is not None:
+        from sampling import UuidSample
+
+        sample = UuidSample.coerce(sample)
+    compressed = detect_compression(kafka_file_path) is not None
+    if reader == "mmap" and compressed:
+        raise ValueError("mmap 读取只支持未压缩文件")
+    if reader == "mmap" or (reader == "auto" and not compressed):
+        yield iter_kafka_messages_mmap(kafka_file_path, dedup, sample)
+    else:
+        with open_text(kafka_file_path) as f:
+            yield iter_kafka_messages(f, dedup, sample)
+
+
+def iter_kafka_chunks(kafka_file_path, chunk_rows=None, reader="auto", dedup="auto", sample=None):
+    """
+    逐块解析 Kafka dump（可为 gzip / zstd 压缩），每块为 KAFKA_COLUMNS 的 DataFrame。
+    chunk_rows=None 时整个文件作为一块；也可传入返回行数的无参函数，按内存情况动态调整块大小。
+    reader / dedup / sample 见 open_kafka_messages；需要重复率 / 抽样计数时传入实例，解析后读其计数。
+    """
+    target_fields = [c for c in KAFKA_COLUMNS if c != "timestamp"]
+    columns = {c: [] for c in KAFKA_COLUMNS}
+    yielded = False
+
+    def _limit():
+        return chunk_rows() if callable(chunk_rows) else chunk_rows
+
+    def _frame():
+        return pd.DataFrame(columns)[KAFKA_COLUMNS]
+
+    # 按列累积，避免每个 target 一个 dict
+    with open_kafka_messages(kafka_file_path, reader, dedup, sample) as messages:
+        for data in messages:
+            targets = data.get("targets", [])
+            if not targets:
+                continue
+            columns["timestamp"].extend([data.get("timestamp")] * len(targets))
+            for c in target_fields:
+                columns[c].extend([t.get(c) for t in targets])
+
+            limit = _limit()
+            if limit and len(columns["timestamp"]) >= limit:
+                yield _frame()
+                yielded = True
+                columns = {c: [] for c in KAFKA_COLUMNS}
+
+    if columns["timestamp"] or not yielded:
+        yield _frame()
+
+
+def parse_kafka_file(kafka_file_path, reader="auto", dedup="auto", sample=None):
+    """
+    解析 Kafka dump（可为 gzip / zstd 压缩），每个 target 一行（timestamp, uuid, longitude, latitude, laneId, turnInfo）；
+    重放的重复消息按 dedup 在解析前丢弃（dedup=None 关闭），sample 给定时只保留抽中车辆
+    """
+    return next(iter_kafka_chunks(kafka_file_path, reader=reader, dedup=dedup, sample=sample))
+
+
+def fetch_lane_links(lane_ids, stats=None):
+    """laneId → link_id 映射表"""
+    post = _http_post(stats)
     link_records = []
 
-    for lid in tqdm(unique_lanes, desc="Fetching lane->link_id"):
+    for lid in tqdm(lane_ids, desc="Fetching lane->link_id"):
         try:
-            r = requests.post(f"{URL_LANE}?laneId={lid}", timeout=10)
+            r = post(f"{URL_LANE}?laneId={lid}", timeout=10)
             j = r.json()
             if j.get("state") == 1:
                 link_id = j["data"].get("link_id")
@@ -203,8 +369,24 @@ def run_pipeline(inters_ids, kafka_file_path, beginTime=None, endTime=None, dire
             link_id = None
         link_records.append({"laneId": str(lid), "link_id": link_id})
 
-    lane_link_df = pd.DataFrame(link_records).drop_duplicates()
+    return pd.DataFrame(link_records).drop_duplicates()
+
+
+def resolve_lane_links(data, lane_index):
+    """
+    用车道空间索引补齐缺失 laneId，并给出索引覆盖的 laneId → link_id 映射。
+    返回 (data, lane_link_df, pending_lanes, recovered)：pending_lanes 为索引外、仍需 getLaneById 的 laneId，
+    recovered 为按坐标补齐 laneId 的 target 数。
+    """
+    data, recovered = lane_index.fill_missing_lanes(data)
+    local = lane_index.lane_link_frame()
+    lanes = data["laneId"].dropna().astype(str).unique()
+    pending = lanes[~pd.Series(lanes).isin(local["laneId"]).to_numpy()]
+    return data, local[local["laneId"].isin(lanes)], pending, recovered
+
 
+def attach_links(data, lane_link_df, allowed_links):
+    """合并 link_id，只保留 allowed_links，并转成北京时间"""
     data["laneId"] = data["laneId"].astype(str)
     lane_link_df["laneId"] = lane_link_df["laneId"].astype(str)
 
@@ -216,60 +398,100 @@ def run_pipeline(inters_ids, kafka_file_path, beginTime=None, endTime=None, dire
 
     # 转成北京时间
     data["time_beijing"] = pd.to_datetime(data["timestamp"], unit="ms", utc=True).dt.tz_convert("Asia/Shanghai")
+    return data
 
-    # ====================================================
-    # 5. turnInfo → 文本
-    # ====================================================
-    turninfo_map = {
-        1: "直", 2: "右", 3: "左", 4: "直右", 5: "直左", 6: "左右", 7: "左直右",
-        8: "调头", 9: "调头右", 10: "调头左", 11: "调头直右", 12: "调头左直",
-        13: "调头左右", 14: "调头左直右", 15: "斜右", 16: "斜左", 17: "直斜右",
-        18: "直斜左", 19: "左斜右", 20: "右斜右", 21: "右斜左", 22: "左斜左",
-        23: "调头斜右", 24: "调头斜左", 25: "斜左斜右", 26: "直右斜左",
-        27: "直右斜右", 28: "直左斜左", 29: "直左斜右", 30: "调直",
-        99: "其他",
-    }
 
+def label_turns(data):
+    """turnInfo → 文本，去掉无效与“其他”(99)"""
     turn_num = pd.to_numeric(data["turnInfo"], errors="coerce")
     data = data[turn_num.notna()]
     turn_num = pd.to_numeric(data["turnInfo"], errors="coerce")
     data = data[turn_num != 99]
 
-    data["turn_name"] = turn_num.map(turninfo_map)
+    data["turn_name"] = turn_num.map(TURNINFO_MAP)
     data["direction"] = data["link_id"].astype(str) + "_" + data["turn_name"]
+    if "lane_turnInfo" in data.columns:
+        # turning="od"：turnInfo 已按 OD 改写，车道本身的转向另存一列供统计车道数
+        data["lane_turn_name"] = pd.to_numeric(data["lane_turnInfo"], errors="coerce").map(TURNINFO_MAP)
+    return data
 
-    # ====================================================
-    # 6. 统计每 15min demand
-    # ====================================================
-    data["time_bin"] = data["time_beijing"].dt.floor("15min").dt.tz_localize(None)
 
+def first_appearance_demand(data, sample_rate=None):
+    """
+    每 15min 按 uuid 首次出现计数 → (time_bin, turn_name, laneId) 的 demand；
+    sample_rate 给定时 data 为按 uuid 抽样的明细：sampled 列保留抽中车辆数，demand 按 1 / sample_rate 放大
+    """
+    data["time_bin"] = to_beijing_naive(floor_ms(as_epoch_ms(data["timestamp"]), freq_ms("15min")))
+
+    # 稳定排序：同一 time_bin 内以文件中先出现的记录为准（分块执行时结果可复现）
     first_appearance = (
-        data.sort_values("time_bin")
+        data.sort_values("time_bin", kind="stable")
         .drop_duplicates(subset="uuid", keep="first")
     )
 
+    aggs = {
+        "demand": ("uuid", "count"),
+        "link_id": ("link_id", "first"),
+        "direction": ("direction", "first"),
+    }
+    if "lane_turn_name" in first_appearance.columns:
+        aggs["lane_turn_name"] = ("lane_turn_name", "first")
     demand_df = (
         first_appearance
         .groupby(["time_bin", "turn_name", "laneId"])
-        .agg(
-            demand=("uuid", "count"),
-            link_id=("link_id", "first"),
-            direction=("direction", "first"),
-        )
+        .agg(**aggs)
         .reset_index()
     )
 
+    if sample_rate is not None:
+        demand_df["sampled"] = demand_df["demand"]
+        demand_df["demand"] = demand_df["demand"] / sample_rate
+
     # 乘以 4 恢复到 1 小时流量
     demand_df["demand"] = demand_df["demand"] * 4
+    return demand_df
 
-    turn_map = {
-        "左": "Left Turn",
-        "直": "Through",
-        "右": "Right Turn",
-        "直右": "Through",
-        "调头左": "Left Turn",
-    }
-    demand_df["turn_action"] = demand_df["turn_name"].map(turn_map)
+
+def trajectory_metrics(data, df_lane, free_speed_mps=None):
+    """
+    label_turns 之后的明细 → 每 15min × link × 流向 的速度 / 停车 / 延误，
+    键与 final_df 一致（time_bin, link_id, Direction, movement）。
+    """
+    from trajectory import TrajectoryStore, aggregate_approaches
+
+    store = TrajectoryStore.from_frame(data)
+    runs = store.approach_runs(free_speed_mps=free_speed_mps)
+    runs["movement"] = runs["turn_name"].map(TURN_MAP)
+
+    direction_map = df_lane[["roadId", "direction"]].drop_duplicates().rename(
+        columns={"roadId": "link_id", "direction": "Direction"}
+    )
+    runs = runs.merge(direction_map, how="left", on="link_id")
+    return aggregate_approaches(runs, keys=("time_bin", "link_id", "Direction", "movement"))
+
+
+def stopline_events(data, df_lane):
+    """
+    label_turns 之后的明细 → 每车每进口道的 arrive_ms / cross_ms（见 TrajectoryStore.stopline_events），
+    追加 movement 与 Direction（与 final_df 同口径），供 signal_states.assign_phases / arrival_on_green 使用。
+    """
+    from trajectory import TrajectoryStore
+
+    events = TrajectoryStore.from_frame(data).stopline_events()
+    events["movement"] = events["turn_name"].map(TURN_MAP)
+
+    direction_map = df_lane[["roadId", "direction"]].drop_duplicates().rename(
+        columns={"roadId": "link_id", "direction": "Direction"}
+    )
+    return events.merge(direction_map, how="left", on="link_id")
+
+
+def summarize_demand(demand_df, df_lane, sample_rate=None):
+    """
+    合并 road 方向 → 车道数表 lane66_df 与平滑后的 final_df；
+    demand_df 带 sampled 列（抽样模式）时 final_df 追加 sampled 与 demand 的 95% 区间 demand_low / demand_high
+    """
+    demand_df["turn_action"] = demand_df["turn_name"].map(TURN_MAP)
 
     # 合并 road 方向
     direction_map = df_lane[["roadId", "direction"]].drop_duplicates()
@@ -282,24 +504,50 @@ def run_pipeline(inters_ids, kafka_file_path, beginTime=None, endTime=None, dire
     )
 
     # ====================================================
-    # 7. 统计每 link 的 lane 数
+    # 统计每 link 的 lane 数
     # ====================================================
+    # 车道数按车道本身的 turnInfo 归流向：OD 模式下共用车道的车辆分属多个流向，
+    # 但一条车道只计入一个流向，否则 lane_count × 1200 的容量会被重复计算
+    lane_action = (
+        demand_df["lane_turn_name"].map(TURN_MAP) if "lane_turn_name" in demand_df.columns
+        else demand_df["turn_action"]
+    )
     lane66_df = (
-        demand_df.groupby(["link_id", "direction", "turn_action"])["laneId"]
+        demand_df.assign(turn_action=lane_action)
+        .groupby(["link_id", "direction", "turn_action"])["laneId"]
         .nunique()
         .reset_index(name="lane_count")
     )
 
     # ====================================================
-    # 8. 计算最终 demand（平滑）
+    # 计算最终 demand（平滑）
     # ====================================================
+    value_columns = ["demand", "sampled"] if "sampled" in demand_df.columns else ["demand"]
     demand_sum = (
-        demand_df.groupby(["time_bin", "link_id", "direction", "turn_action"])["demand"]
+        demand_df.groupby(["time_bin", "link_id", "direction", "turn_action"])[value_columns]
         .sum()
         .reset_index()
     )
 
     demand_sum["demand"] = demand_sum["demand"] * 12  # 1h
+    if "sampled" in demand_sum.columns:
+        from sampling import count_interval
+
+        # 抽样模式：没有抽中车辆的 时段 × 序列 也要有一行（sampled = 0，区间上界 > 0），
+        # 补齐为 全部时段 × 已出现序列 的网格，平滑窗口也不会跨过缺失的时段
+        keys = ["link_id", "direction", "turn_action"]
+        times = pd.DataFrame({"time_bin": pd.date_range(demand_sum["time_bin"].min(), demand_sum["time_bin"].max(),
+                                                       freq="15min")})
+        grid = times.merge(demand_sum[keys].drop_duplicates(), how="cross")
+        demand_sum = grid.merge(demand_sum, on=["time_bin", *keys], how="left")
+        demand_sum[value_columns] = demand_sum[value_columns].fillna(0)
+        demand_sum = demand_sum.sort_values(["time_bin", *keys], ignore_index=True)
+
+        # 区间是总车辆数 N 的区间（N_hat = sampled / rate），再乘上 demand 相对 N_hat 的换算系数
+        # （first_appearance_demand 的 ×4 与上面的 ×12）
+        low, high = count_interval(demand_sum["sampled"].to_numpy(), sample_rate)
+        demand_sum["demand_low"] = low * 4 * 12
+        demand_sum["demand_high"] = high * 4 * 12
     demand_sum["smoothed_demand"] = demand_sum["demand"].rolling(window=3, center=True).mean()
 
     final_df = demand_sum.rename(
@@ -308,11 +556,11 @@ def run_pipeline(inters_ids, kafka_file_path, beginTime=None, endTime=None, dire
             "turn_action": "movement",
         }
     )
+    return lane66_df, final_df
 
 
-    # ====================================================
-    # 9. 按查询参数过滤（可选）
-    # ====================================================
+def filter_query(final_df, beginTime=None, endTime=None, direction=-1, movement=-1):
+    """按查询参数过滤（时间闭区间、方向、动作）"""
     begin_dt = _parse_beijing_time(beginTime)
     end_dt = _parse_beijing_time(endTime)
     if begin_dt is not None:
@@ -325,8 +573,188 @@ def run_pipeline(inters_ids, kafka_file_path, beginTime=None, endTime=None, dire
         final_df = final_df[final_df["Direction"].astype(str).str.upper() == d_filter]
     if m_filter is not None:
         final_df = final_df[final_df["movement"].astype(str) == m_filter]
+    return final_df
 
-    return lane66_df, final_df
+
+# ------------------------------
+# 总入口函数
+# ------------------------------
+def run_pipeline(inters_ids, kafka_file_path, beginTime=None, endTime=None, direction=-1, movement=-1, frequency=2,
+                 return_stats=False, profile=None, lane_index=None, return_trajectories=False, return_network=False,
+                 return_stopline=False, density_output_dir=None, dedup="auto", sample_rate=None, sample_seed=0,
+                 turning="lane", return_od=False):
+    """
+    返回 (lane66_df, final_df)；任一 return_* 为 True 时改为返回 PipelineResult（按字段名取用，未请求的字段为 None）：
+      lane66_df / final_df  车道数与平滑 demand
+      stats        return_stats=True：PipelineStats（各阶段耗时/行数/内存/HTTP 延迟）
+      traj_df      return_trajectories=True：每 15min × link × 流向 的速度 / 停车 / 延误（见 trajectory_metrics）
+      network      return_network=True：由 df_inter 构建的 network.LinkGraph（供 network.propagate_unsatisfied 使用）
+      stopline_df  return_stopline=True：每车每进口道的到达 / 过停车线时刻（见 stopline_events，不受查询参数过滤）
+      od_df        return_od=True：每 15min × 交叉口 × from_link × to_link 的转向计数（见 turning.od_matrix）
+    profile: "cprofile" / "tracemalloc" / "all"，缺省读环境变量 TRAFFIC_PROFILE。
+    lane_index: lane_index.LaneIndex，给定时 laneId → link_id 由本地几何解析，
+                缺失 laneId 的 target 按坐标补齐，只有索引外的车道才调用 getLaneById。
+    dedup: 消息级去重方式（"auto" / "offset" / "value" / None，见 MessageDedup），重复率记入 parse_kafka 阶段。
+    sample_rate: 近似模式，如 0.05：按 uuid 哈希（sample_seed 固定则可复现）只解析 5% 的车辆，
+                 final_df 的 demand 按比例放大并追加 sampled / demand_low / demand_high（95% 区间）；
+                 lane66_df 的车道数、轨迹与停车线事件、密度瓦片只反映抽中的车辆，不放大。
+    density_output_dir: 给定时把解析出的全部 target 写成多级空间密度瓦片（见 density_tiles），供 MapPage 热力图使用。
+    turning: "lane"（缺省）按车道 turnInfo 归流向；"od" 按轨迹的首个 inLink / 末个 outLink 归流向，
+             共用车道（直右、左直右等）按实际去向拆分，未解析出去向的车辆仍用车道 turnInfo。
+             lane66_df 的车道数始终按车道本身的 turnInfo 统计（共用车道不重复计入多个流向）。
+    """
+    if turning not in ("lane", "od"):
+        raise ValueError(f"turning must be 'lane' or 'od': {turning}")
+    with_od = return_od or turning == "od"
+
+    stats = PipelineStats("demand.run_pipeline", profile=profile)
+
+    with stats.run():
+        # ====================================================
+        # 1. 获取 inLinks / outLinks
+        # ====================================================
+        with stats.stage("fetch_intersections", rows_in=len(inters_ids)) as st:
+            df_inter = fetch_intersection_links(inters_ids, stats)
+            st.rows_out = len(df_inter)
+
+        # allowed only inLink
+        allowed_links = set(df_inter.loc[df_inter["linkType"] == "inLink", "linkId"])
+        # 转向 OD 需要车辆驶出后的 outLink 观测，合并 link 时一并保留，OD 算完再只留 inLink
+        od_links = set(df_inter.loc[df_inter["linkType"].isin(["inLink", "outLink"]), "linkId"]) if with_od else allowed_links
+
+        graph = None
+        if return_network:
+            # network 依赖 scipy.sparse，只在需要路网图时导入
+            from network import LinkGraph
+
+            with stats.stage("link_graph", rows_in=len(df_inter)) as st:
+                graph = LinkGraph.from_frame(df_inter)
+                st.rows_out = graph.adjacency.nnz
+
+        # ====================================================
+        # 2. 获取 roadId → lane 列表
+        # ====================================================
+        road_ids = df_inter["linkId"].unique().tolist()
+        with stats.stage("fetch_road_lanes", rows_in=len(road_ids)) as st:
+            df_lane = fetch_road_lanes(road_ids, stats)
+            st.rows_out = len(df_lane)
+
+        # ====================================================
+        # 3. 解析 Kafka txt
+        # ====================================================
+        with stats.stage("parse_kafka") as st:
+            deduper = MessageDedup.coerce(dedup)
+            # 比例为 1 时不必逐 target 抽样，走完整解析（区间退化为点）
+            sample = None
+            if sample_rate is not None and sample_rate < 1:
+                from sampling import UuidSample
+
+                sample = UuidSample(sample_rate, sample_seed)
+            data = parse_kafka_file(kafka_file_path, dedup=deduper, sample=sample)
+            st.rows_out = len(data)
+            if deduper is not None:
+                st.extra.update(deduper.summary())
+            if sample is not None:
+                st.extra.update(sample.summary())
+
+        if density_output_dir is not None:
+            from density_tiles import export_density
+
+            with stats.stage("density_tiles", rows_in=len(data)) as st:
+                index = export_density(data, density_output_dir)
+                st.rows_out = sum(len(z["tiles"]) for z in index["zooms"].values())
+                st.extra["time_bins"] = index["length"]
+
+        # ====================================================
+        # 4. laneId → link_id 映射
+        # ====================================================
+        local_links = None
+        if lane_index is not None:
+            with stats.stage("spatial_resolve", rows_in=len(data)) as st:
+                data, local_links, unique_lanes, recovered = resolve_lane_links(data, lane_index)
+                st.rows_out = len(local_links)
+                st.extra["recovered_targets"] = recovered
+        else:
+            unique_lanes = data["laneId"].dropna().astype(str).unique()
+
+        with stats.stage("fetch_lane_links", rows_in=len(unique_lanes)) as st:
+            lane_link_df = fetch_lane_links(unique_lanes, stats) if len(unique_lanes) else pd.DataFrame(columns=["laneId", "link_id"])
+            if local_links is not None:
+                lane_link_df = pd.concat([local_links, lane_link_df], ignore_index=True)
+            st.rows_out = len(lane_link_df)
+
+        with stats.stage("merge_links", rows_in=len(data)) as st:
+            data = attach_links(data, lane_link_df, od_links)
+            st.rows_out = len(data)
+
+        od_df = None
+        if with_od:
+            from turning import apply_od_turns, od_matrix, vehicle_od
+
+            with stats.stage("od_matrix", rows_in=len(data)) as st:
+                vod = vehicle_od(data, df_inter)
+                od_df = od_matrix(vod, df_lane, sample_rate=sample_rate)
+                st.rows_out = len(od_df)
+                st.extra["od_vehicles"] = len(vod)
+                st.extra["od_resolved"] = round(float(vod["to_link"].notna().mean()), 4) if len(vod) else 0.0
+                if turning == "od":
+                    data, st.extra["od_turn_points"] = apply_od_turns(data, vod)
+                data = data[data["link_id"].isin(allowed_links)]
+
+        # ====================================================
+        # 5. turnInfo → 文本
+        # ====================================================
+        with stats.stage("label_turns", rows_in=len(data)) as st:
+            data = label_turns(data)
+            st.rows_out = len(data)
+
+        traj_df = None
+        if return_trajectories:
+            with stats.stage("trajectory_metrics", rows_in=len(data)) as st:
+                traj_df = trajectory_metrics(data, df_lane)
+                st.rows_out = len(traj_df)
+
+        events_df = None
+        if return_stopline:
+            with stats.stage("stopline_events", rows_in=len(data)) as st:
+                events_df = stopline_events(data, df_lane)
+                st.rows_out = len(events_df)
+
+        # ====================================================
+        # 6. 统计每 15min demand
+        # ====================================================
+        with stats.stage("first_appearance", rows_in=len(data)) as st:
+            demand_df = first_appearance_demand(data, sample_rate)
+            st.rows_out = len(demand_df)
+
+        # ====================================================
+        # 7-8. 车道数 + 平滑 demand
+        # ====================================================
+        with stats.stage("summarize", rows_in=len(demand_df)) as st:
+            lane66_df, final_df = summarize_demand(demand_df, df_lane, sample_rate)
+            st.rows_out = len(final_df)
+
+        # ====================================================
+        # 9. 按查询参数过滤（可选）
+        # ====================================================
+        with stats.stage("query_filter", rows_in=len(final_df)) as st:
+            final_df = filter_query(final_df, beginTime, endTime, direction, movement)
+            if traj_df is not None:
+                traj_df = filter_query(traj_df, beginTime, endTime, direction, movement)
+            if od_df is not None:
+                od_df = filter_query(od_df, beginTime, endTime, direction, movement)
+            st.rows_out = len(final_df)
+
+    if not (return_stats or return_trajectories or return_network or return_stopline or return_od):
+        return lane66_df, final_df
+    return PipelineResult(
+        lane66_df, final_df,
+        stats=stats if return_stats else None,
+        traj_df=traj_df,
+        network=graph,
+        stopline_df=events_df,
+        od_df=od_df if return_od else None,
+    )
 
 
 # ------------------------------
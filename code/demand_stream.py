@@ -0,0 +1,436 @@
+"""
+实时 demand：消费感知消息流（tail 文件 / 本地 socket），按事件时间 15min 窗口统计每车道每转向的首次出现车辆
+
+    lane_map = build_lane_map(["189390105904356353"])
+    engine = StreamingDemandEngine(lane_map, on_emit=print)
+    run_stream(tail_lines("kafka_data_1.txt"), engine)
+
+解析沿用 demand.iter_kafka_messages，口径与 run_pipeline 一致（首次出现计数、turnInfo 过滤、
+demand = count × 4 × 12）。窗口在水位线越过窗口结束时发出（kind="final"），
+允许迟到 allowed_lateness 内的消息继续更新并重新发出（kind="update"），超出则丢弃计数。
+"""
+
+import argparse
+import json
+import os
+import selectors
+import socket
+import sys
+import time
+from collections import deque
+
+import pandas as pd
+
+import demand
+from demand import TURN_MAP, TURNINFO_MAP, iter_kafka_messages
+from textio import open_binary
+from timeaxis import BEIJING_OFFSET_MS
+
+# 与 run_pipeline 的 final_df["demand"] 口径一致：15min 计数 × 4（小时） × 12
+DEMAND_SCALE = 4 * 12
+
+
+def _to_ms(value):
+    return int(pd.Timedelta(value).total_seconds() * 1000)
+
+
+def _format_bj(ms):
+    return pd.Timestamp(ms + BEIJING_OFFSET_MS, unit="ms").strftime("%Y-%m-%d %H:%M:%S")
+
+
+# ============================================================
+# 1. 车道 → link 映射
+# ============================================================
+def build_lane_map(inters_ids, stats=None):
+    """
+    通过 getIntersConns + getRoadControlInfo 一次性建立 laneId → (link_id, direction)，
+    只保留 inLink（与 run_pipeline 的 allowed_links 一致），流处理时无需逐车道请求。
+    """
+    df_inter = demand.fetch_intersection_links(inters_ids, stats)
+    in_links = df_inter.loc[df_inter["linkType"] == "inLink", "linkId"].unique().tolist()
+    df_lane = demand.fetch_road_lanes(in_links, stats)
+    return {
+        str(r.laneId): (str(r.roadId), r.direction)
+        for r in df_lane.itertuples(index=False)
+    }
+
+
+# ============================================================
+# 2. 流式引擎
+# ============================================================
+class StreamingDemandEngine:
+    def __init__(
+        self,
+        lane_map,
+        window="15min",
+        allowed_lateness="5min",
+        watermark_delay="10s",
+        uuid_ttl="30min",
+        on_emit=None,
+        lane_resolver=None,
+    ):
+        """
+        lane_map: laneId → link_id 或 (link_id, direction)
+        lane_resolver: 未知 laneId 的兜底解析函数（结果缓存，None 表示丢弃）
+        """
+        self.lane_map = {str(k): (v if isinstance(v, tuple) else (str(v), None)) for k, v in lane_map.items()}
+        self.lane_resolver = lane_resolver
+        self.window_ms = _to_ms(window)
+        self.lateness_ms = _to_ms(allowed_lateness)
+        self.delay_ms = _to_ms(watermark_delay)
+        self.uuid_ttl_ms = _to_ms(uuid_ttl)
+        self.on_emit = on_emit
+
+        self.windows = {}        # window_start_ms → {(link_id, laneId, turn_name): count}
+        self.fired = set()
+        self.uuid_first = {}     # uuid → (window_start_ms, key)
+        self.max_event_ms = None
+        self.watermark_ms = None
+        self._last_arrival = None
+
+        self.counters = {
+            "messages": 0, "targets": 0, "counted": 0, "late_dropped": 0,
+            "moved": 0, "emitted": 0, "updates": 0, "evicted_uuids": 0,
+        }
+        # latencies_ms：消息到达（run_stream 从数据源读到其最后一行）→ 计数已更新；
+        # emit_latencies_ms：触发发出的消息到达 → on_emit 返回（不含空闲 tick / flush 发出的窗口）
+        self.latencies_ms = deque(maxlen=10000)
+        self.emit_latencies_ms = deque(maxlen=10000)
+        self._arrival = None
+
+    # ------------------------------
+    # 工具
+    # ------------------------------
+    def window_start(self, ts_ms):
+        # 北京时间对齐（15min 与 UTC 对齐一致，更长窗口按北京日界）
+        local = ts_ms + BEIJING_OFFSET_MS
+        return local - local % self.window_ms - BEIJING_OFFSET_MS
+
+    def _resolve_lane(self, lane_id):
+        hit = self.lane_map.get(lane_id)
+        if hit is None and self.lane_resolver is not None and lane_id not in self.lane_map:
+            link_id = self.lane_resolver(lane_id)
+            hit = (str(link_id), None) if link_id is not None else None
+            self.lane_map[lane_id] = hit
+        return hit
+
+    # ------------------------------
+    # 处理单条消息
+    # ------------------------------
+    def process(self, msg, arrival=None):
+        t0 = arrival if arrival is not None else time.perf_counter()
+        self._arrival = t0
+        self.counters["messages"] += 1
+        ts = msg.get("timestamp")
+        if ts is None:
+            return
+        ts = int(ts)
+        ws = self.window_start(ts)
+
+        if self.watermark_ms is not None and ws + self.window_ms + self.lateness_ms <= self.watermark_ms:
+            self.counters["late_dropped"] += 1
+            return
+
+        touched = set()
+        for t in msg.get("targets", []):
+            self.counters["targets"] += 1
+            uuid = t.get("uuid")
+            lane_id = t.get("laneId")
+            if uuid is None or lane_id is None:
+                continue
+            lane_id = str(lane_id)
+            lane = self._resolve_lane(lane_id)
+            if lane is None:
+                continue
+            try:
+                turn = int(float(t.get("turnInfo")))
+            except (TypeError, ValueError):
+                continue
+            if turn == 99 or turn not in TURNINFO_MAP:
+                continue
+            key = (lane[0], lane_id, TURNINFO_MAP[turn])
+
+            prev = self.uuid_first.get(uuid)
+            if prev is None:
+                self._add(ws, key, 1)
+                self.uuid_first[uuid] = (ws, key)
+                touched.add(ws)
+                self.counters["counted"] += 1
+            elif ws < prev[0]:
+                # 迟到消息携带了更早的首次出现：从原窗口移到更早的窗口
+                if prev[0] in self.windows:
+                    self._add(prev[0], prev[1], -1)
+                    touched.add(prev[0])
+                self._add(ws, key, 1)
+                self.uuid_first[uuid] = (ws, key)
+                touched.add(ws)
+                self.counters["moved"] += 1
+
+        if self.max_event_ms is None or ts > self.max_event_ms:
+            self.max_event_ms = ts
+        self._last_arrival = time.monotonic()
+
+        for w in sorted(touched):
+            if w in self.fired:
+                self._emit(w, "update")
+        self._advance(self.max_event_ms - self.delay_ms)
+        self.latencies_ms.append((time.perf_counter() - t0) * 1000)
+        self._arrival = None
+
+    def _add(self, ws, key, n):
+        counts = self.windows.setdefault(ws, {})
+        counts[key] = counts.get(key, 0) + n
+        if counts[key] <= 0:
+            del counts[key]
+
+    # ------------------------------
+    # 水位线推进
+    # ------------------------------
+    def tick(self):
+        """空闲时按处理时间推进水位线，避免数据停止后最后一个窗口迟迟不发出"""
+        self._arrival = None
+        if self.max_event_ms is None or self._last_arrival is None:
+            return
+        idle_ms = int((time.monotonic() - self._last_arrival) * 1000)
+        self._advance(self.max_event_ms + idle_ms - self.delay_ms)
+
+    def _advance(self, watermark):
+        if self.watermark_ms is not None and watermark <= self.watermark_ms:
+            return
+        self.watermark_ms = watermark
+
+        for ws in sorted(self.windows):
+            if ws + self.window_ms <= watermark and ws not in self.fired:
+                self.fired.add(ws)
+                self._emit(ws, "final")
+
+        expired = [ws for ws in self.windows if ws + self.window_ms + self.lateness_ms <= watermark]
+        for ws in expired:
+            del self.windows[ws]
+            self.fired.discard(ws)
+        if expired:
+            horizon = watermark - self.lateness_ms - self.uuid_ttl_ms
+            stale = [u for u, (ws, _) in self.uuid_first.items() if ws + self.window_ms <= horizon]
+            for u in stale:
+                del self.uuid_first[u]
+            self.counters["evicted_uuids"] += len(stale)
+
+    def flush(self):
+        """流结束：发出所有未发出的窗口"""
+        self._arrival = None
+        for ws in sorted(self.windows):
+            if ws not in self.fired:
+                self.fired.add(ws)
+                self._emit(ws, "final")
+
+    # ------------------------------
+    # 输出
+    # ------------------------------
+    def _rows(self, ws):
+        rows = []
+        for (link_id, lane_id, turn_name), n in sorted(self.windows.get(ws, {}).items()):
+            rows.append({
+                "link_id": link_id,
+                "laneId": lane_id,
+                "direction": self.lane_map.get(lane_id, (None, None))[1],
+                "turn_name": turn_name,
+                "movement": TURN_MAP.get(turn_name),
+                "count": n,
+                "demand": n * DEMAND_SCALE,
+            })
+        return rows
+
+    def _emit(self, ws, kind):
+        self.counters["emitted" if kind == "final" else "updates"] += 1
+        if self.on_emit is None:
+            return
+        self.on_emit({
+            "kind": kind,
+            "time_bin": _format_bj(ws),
+            "window_start_ms": ws,
+            "watermark_ms": self.watermark_ms,
+            "rows": self._rows(ws),
+        })
+        if self._arrival is not None:
+            self.emit_latencies_ms.append((time.perf_counter() - self._arrival) * 1000)
+
+    def snapshot(self):
+        """当前所有保留窗口（含未关闭窗口）的计数，列与 run_pipeline 的 demand 口径对齐"""
+        rows = []
+        for ws in sorted(self.windows):
+            tb = pd.Timestamp(ws + BEIJING_OFFSET_MS, unit="ms")
+            for r in self._rows(ws):
+                r["time_bin"] = tb
+                r["final"] = ws in self.fired
+                rows.append(r)
+        cols = ["time_bin", "link_id", "laneId", "direction", "turn_name", "movement", "count", "demand", "final"]
+        return pd.DataFrame(rows, columns=cols)
+
+    def latency_summary(self):
+        """消息到达 → 计数更新（p50 / p95 / p99 / max），以及消息到达 → on_emit（emit_p99 / emit_max），单位 ms"""
+        def _q(vals, q):
+            return vals[min(len(vals) - 1, int(len(vals) * q))] if vals else None
+
+        vals = sorted(self.latencies_ms)
+        emits = sorted(self.emit_latencies_ms)
+        return {
+            "p50_ms": _q(vals, 0.5),
+            "p95_ms": _q(vals, 0.95),
+            "p99_ms": _q(vals, 0.99),
+            "max_ms": vals[-1] if vals else None,
+            "emit_p99_ms": _q(emits, 0.99),
+            "emit_max_ms": emits[-1] if emits else None,
+        }
+
+
+# ============================================================
+# 3. 数据源：tail 文件 / 本地 socket
+# ============================================================
+def tail_lines(path, from_start=True, poll_interval=0.1, stop=None):
+    """
+    持续读取追加写入的文件；空闲时产出 None（供引擎 tick）。
+    文件被截断/轮转（大小变小）时从头重新读取。
+    """
+    f = open(path, "r", encoding="utf-8")
+    try:
+        if not from_start:
+            f.seek(0, 2)
+        partial = ""
+        while stop is None or not stop.is_set():
+            line = f.readline()
+            if line:
+                partial += line
+                if partial.endswith("\n"):
+                    yield partial
+                    partial = ""
+                continue
+            try:
+                if os.path.getsize(path) < f.tell():
+                    f.close()
+                    f = open(path, "r", encoding="utf-8")
+                    partial = ""
+            except OSError:
+                pass
+            yield None
+            time.sleep(poll_interval)
+    finally:
+        f.close()
+
+
+def socket_lines(host="127.0.0.1", port=9099, idle_timeout=0.2, stop=None, ready=None):
+    """
+    本地 socket 替身：监听 TCP 端口，接收任意数量生产者按行写入的消息；空闲时产出 None。
+    ready: 可选 threading.Event，监听就绪后 set（端口为 0 时可读取 ready.port）。
+    """
+    sel = selectors.DefaultSelector()
+    server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    server.bind((host, port))
+    server.listen()
+    server.setblocking(False)
+    sel.register(server, selectors.EVENT_READ, data=None)
+    if ready is not None:
+        ready.port = server.getsockname()[1]
+        ready.set()
+    buffers = {}
+    try:
+        while stop is None or not stop.is_set():
+            events = sel.select(timeout=idle_timeout)
+            if not events:
+                yield None
+                continue
+            for key, _ in events:
+                if key.data is None:
+                    conn, _ = key.fileobj.accept()
+                    conn.setblocking(False)
+                    sel.register(conn, selectors.EVENT_READ, data="conn")
+                    buffers[conn] = b""
+                    continue
+                conn = key.fileobj
+                chunk = conn.recv(65536)
+                if not chunk:
+                    sel.unregister(conn)
+                    conn.close()
+                    rest = buffers.pop(conn, b"")
+                    if rest:
+                        yield rest.decode("utf-8")
+                    continue
+                buf = buffers[conn] + chunk
+                *lines, buffers[conn] = buf.split(b"\n")
+                for line in lines:
+                    yield line.decode("utf-8")
+    finally:
+        for conn in list(buffers):
+            conn.close()
+        sel.close()
+        server.close()
+
+
+def replay_to_socket(path, host="127.0.0.1", port=9099, lines_per_sec=None):
+    """把 Kafka dump（可为 gzip / zstd 压缩）逐行回放到 socket_lines（测试/演示用生产者）"""
+    with socket.create_connection((host, port)) as conn, open_binary(path) as f:
+        for line in f:
+            conn.sendall(line)
+            if lines_per_sec:
+                time.sleep(1.0 / lines_per_sec)
+
+
+# ============================================================
+# 4. 运行
+# ============================================================
+def run_stream(lines, engine, flush_at_end=True):
+    """
+    驱动引擎直至数据源结束；None 行触发 tick。
+    每条消息的到达时刻取读到其最后一行的时刻，传给 engine.process（延迟统计从这里开始计）。
+    """
+    arrival = [None]
+
+    def _ticking():
+        for line in lines:
+            if line is None:
+                engine.tick()
+                continue
+            arrival[0] = time.perf_counter()
+            yield line
+
+    for msg in iter_kafka_messages(_ticking()):
+        engine.process(msg, arrival=arrival[0])
+    if flush_at_end:
+        engine.flush()
+    return engine
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Streaming demand over perception messages")
+    src = parser.add_mutually_exclusive_group(required=True)
+    src.add_argument("--tail", help="持续读取的 Kafka dump 文件")
+    src.add_argument("--listen", help="本地 socket 监听地址 host:port")
+    parser.add_argument("--inters", required=True, help="逗号分隔的 intersId")
+    parser.add_argument("--window", default="15min")
+    parser.add_argument("--lateness", default="5min")
+    parser.add_argument("--delay", default="10s", help="水位线相对最大事件时间的延迟")
+    args = parser.parse_args(argv)
+
+    lane_map = build_lane_map([i.strip() for i in args.inters.split(",") if i.strip()])
+
+    def _print(result):
+        sys.stdout.write(json.dumps(result, ensure_ascii=False) + "\n")
+        sys.stdout.flush()
+
+    engine = StreamingDemandEngine(
+        lane_map, window=args.window, allowed_lateness=args.lateness,
+        watermark_delay=args.delay, on_emit=_print,
+    )
+    if args.tail:
+        lines = tail_lines(args.tail)
+    else:
+        host, port = args.listen.rsplit(":", 1)
+        lines = socket_lines(host, int(port))
+    try:
+        run_stream(lines, engine)
+    except KeyboardInterrupt:
+        engine.flush()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,223 @@
+"""
+感知目标空间密度瓦片：target 经纬度按 Web Mercator 瓦片金字塔（z/x/y，与 Leaflet / OSM 相同）× 时间桶计数，
+MapPage 只拉取视野内、当前缩放级别的瓦片画热力图
+
+    pyramid = density_pyramid(data, freq="15min", min_zoom=12, max_zoom=18)     # data: parse_kafka_file 的输出
+    index = write_density_tiles(pyramid, "LargeScreenFront/public/data/density/170")
+
+    python density_tiles.py --kafka ../data/kafka.txt --name 170
+
+每个瓦片再切成 cells × cells 个格子。最细一级（max_zoom）对全部点一次算出全局格号，
+(时间桶, 格 y, 格 x) 编码为单个 int64 后 np.unique 计数（稀疏二维直方图，只保留非空格）；
+上一级由下一级格号右移一位后合并计数得到，不再回到原始点。计数为目标观测点数（同一车辆多次采样各计一次）。
+坐标先由 source_crs（缺省 gcj02，与 MapPage 缺省坐标系一致）转成 WGS84，瓦片按 WGS84 划分，可直接叠加在 OSM 底图上。
+
+目录结构（front end: /data/density/<name>/...）：
+
+    <out_dir>/index.json
+    <out_dir>/<z>/<x>/<y>.bin
+
+<y>.bin：n 条记录按 (时间桶, 格) 升序，小端 Uint32 count[n] + Uint16 time[n] + Uint16 cell[n]（共 8n 字节），
+cell = 格 y × cells + 格 x（瓦片内，左上角为 0）。
+index.json：{crs, cells, min_zoom, max_zoom, start_ms, step_ms, length, bounds: [west, south, east, north],
+             zooms: {z: {max_count, tiles: [[x, y, records, total], ...]}}}
+时间轴同 dashboard_payload：start_ms + i * step_ms，为北京时间墙钟按 UTC 编码的 epoch ms（前端 Date 直接显示北京时间）。
+"""
+
+import argparse
+import json
+import os
+
+import numpy as np
+
+from coord_convert import convert_coordinates
+from timeaxis import BEIJING_OFFSET_MS, NAT_MS, as_epoch_ms, floor_ms, freq_ms
+
+TILE_CELLS = 64
+MIN_ZOOM = 12
+MAX_ZOOM = 18
+SOURCE_CRS = "gcj02"
+
+MAX_LAT = 85.05112878
+
+RECORD_BYTES = 8
+
+
+# ============================================================
+# 1. 经纬度 → 全局格号
+# ============================================================
+def mercator_cells(lng, lat, zoom, cells=TILE_CELLS):
+    """WGS84 → zoom 级全局格号 (gx, gy)（瓦片号 = 格号 // cells），超出 Web Mercator 纬度范围的点 valid=False"""
+    lng = np.asarray(lng, dtype=float)
+    lat = np.asarray(lat, dtype=float)
+    valid = np.isfinite(lng) & np.isfinite(lat) & (np.abs(lat) <= MAX_LAT) & (np.abs(lng) <= 180)
+    n = (1 << zoom) * cells
+    phi = np.radians(np.where(valid, lat, 0.0))
+    x = (np.where(valid, lng, 0.0) + 180.0) / 360.0 * n
+    y = (1.0 - np.log(np.tan(phi) + 1.0 / np.cos(phi)) / np.pi) / 2.0 * n
+    gx = np.clip(np.floor(x), 0, n - 1).astype(np.int64)
+    gy = np.clip(np.floor(y), 0, n - 1).astype(np.int64)
+    return gx, gy, valid
+
+
+def _count_cells(t, gx, gy, weights=None):
+    """(t, gx, gy) 相同的合并计数：在数据包围盒内编码为 int64 后 np.unique，返回 (t, gx, gy, count)，按 (t, gy, gx) 升序"""
+    if not len(t):
+        empty = np.empty(0, dtype=np.int64)
+        return empty, empty, empty, empty
+    x0, y0 = gx.min(), gy.min()
+    w = int(gx.max() - x0) + 1
+    h = int(gy.max() - y0) + 1
+    weights = np.ones(len(t), dtype=np.int64) if weights is None else weights
+    if (int(t.max()) + 1) * h * w < 1 << 62:
+        code = (t * h + (gy - y0)) * w + (gx - x0)
+        uniq, inverse = np.unique(code, return_inverse=True)
+        count = np.bincount(inverse, weights=weights, minlength=len(uniq)).astype(np.int64)
+        return uniq // (w * h), uniq % w + x0, (uniq // w) % h + y0, count
+    # 包围盒过大（离群坐标）时编码会溢出：退回三键排序
+    order = np.lexsort((gx, gy, t))
+    t, gy, gx, weights = t[order], gy[order], gx[order], weights[order]
+    first = np.concatenate([[True], (np.diff(t) != 0) | (np.diff(gy) != 0) | (np.diff(gx) != 0)])
+    starts = np.flatnonzero(first)
+    return t[starts], gx[starts], gy[starts], np.add.reduceat(weights, starts).astype(np.int64)
+
+
+# ============================================================
+# 2. 金字塔
+# ============================================================
+def density_pyramid(data, freq="15min", min_zoom=MIN_ZOOM, max_zoom=MAX_ZOOM, cells=TILE_CELLS,
+                    source_crs=SOURCE_CRS):
+    """
+    data: 含 timestamp（epoch ms）、longitude、latitude 的明细（parse_kafka_file 的输出即可）。
+    返回 {"start_ms", "step_ms", "length", "cells", "crs", "bounds", "levels": {z: (t, gx, gy, count)}}，
+    各级四列为等长 int64 数组，t 为时间桶下标。
+    """
+    if min_zoom > max_zoom:
+        raise ValueError(f"min_zoom {min_zoom} > max_zoom {max_zoom}")
+    step = freq_ms(freq)
+    t_ms = as_epoch_ms(data["timestamp"])
+    lng, lat = convert_coordinates(data["longitude"], data["latitude"], source_crs, "wgs84")
+    gx, gy, valid = mercator_cells(lng, lat, max_zoom, cells)
+    valid &= t_ms != NAT_MS
+
+    t_bin = floor_ms(t_ms[valid], step)
+    start = int(t_bin.min()) if len(t_bin) else 0
+    t = (t_bin - start) // step
+    length = int(t.max()) + 1 if len(t) else 0
+    if length > np.iinfo(np.uint16).max + 1:
+        raise ValueError(f"{length} 个时间桶超过瓦片格式上限 65536，请增大 freq 或分段导出")
+
+    levels = {max_zoom: _count_cells(t, gx[valid], gy[valid])}
+    for z in range(max_zoom - 1, min_zoom - 1, -1):
+        t_f, gx_f, gy_f, c_f = levels[z + 1]
+        levels[z] = _count_cells(t_f, gx_f >> 1, gy_f >> 1, weights=c_f)
+
+    bounds = None
+    if valid.any():
+        bounds = [float(lng[valid].min()), float(lat[valid].min()), float(lng[valid].max()), float(lat[valid].max())]
+    return {
+        # 与 dashboard_payload 相同：北京时间墙钟按 UTC 编码
+        "start_ms": start + BEIJING_OFFSET_MS,
+        "step_ms": step,
+        "length": length,
+        "cells": cells,
+        "crs": "wgs84",
+        "bounds": bounds,
+        "levels": levels,
+    }
+
+
+# ============================================================
+# 3. 写出瓦片
+# ============================================================
+def _tile_bytes(count, t, cell):
+    return (count.astype("<u4").tobytes() + t.astype("<u2").tobytes() + cell.astype("<u2").tobytes())
+
+
+def write_density_tiles(pyramid, out_dir):
+    """写出 <z>/<x>/<y>.bin 与 index.json，返回 index dict"""
+    cells = pyramid["cells"]
+    if cells * cells > np.iinfo(np.uint16).max + 1:
+        raise ValueError(f"cells={cells} 超过瓦片格式上限 256")
+    zooms = {}
+    for z, (t, gx, gy, count) in sorted(pyramid["levels"].items()):
+        tx, ty = gx // cells, gy // cells
+        cell = (gy % cells) * cells + (gx % cells)
+        order = np.lexsort((cell, t, ty, tx))
+        tx, ty, t, cell, count = tx[order], ty[order], t[order], cell[order], count[order]
+
+        tiles = []
+        if len(tx):
+            cut = np.flatnonzero((np.diff(tx) != 0) | (np.diff(ty) != 0)) + 1
+            starts = np.concatenate([[0], cut])
+            ends = np.concatenate([cut, [len(tx)]])
+            for a, b in zip(starts, ends):
+                x, y = int(tx[a]), int(ty[a])
+                folder = os.path.join(out_dir, str(z), str(x))
+                os.makedirs(folder, exist_ok=True)
+                with open(os.path.join(folder, f"{y}.bin"), "wb") as f:
+                    f.write(_tile_bytes(count[a:b], t[a:b], cell[a:b]))
+                tiles.append([x, y, int(b - a), int(count[a:b].sum())])
+        zooms[str(z)] = {"max_count": int(count.max()) if len(count) else 0, "tiles": tiles}
+
+    index = {
+        "crs": pyramid["crs"],
+        "cells": cells,
+        "min_zoom": min(pyramid["levels"]),
+        "max_zoom": max(pyramid["levels"]),
+        "start_ms": pyramid["start_ms"],
+        "step_ms": pyramid["step_ms"],
+        "length": pyramid["length"],
+        "bounds": pyramid["bounds"],
+        "zooms": zooms,
+    }
+    os.makedirs(out_dir, exist_ok=True)
+    with open(os.path.join(out_dir, "index.json"), "w", encoding="utf-8") as f:
+        json.dump(index, f, ensure_ascii=False, separators=(",", ":"))
+    return index
+
+
+def read_density_tile(path, cells=TILE_CELLS):
+    """<y>.bin → (count, t, cell_x, cell_y)，供核对 / 离线分析"""
+    raw = np.fromfile(path, dtype=np.uint8)
+    n = len(raw) // RECORD_BYTES
+    count = raw[:4 * n].view("<u4").astype(np.int64)
+    t = raw[4 * n:6 * n].view("<u2").astype(np.int64)
+    cell = raw[6 * n:8 * n].view("<u2").astype(np.int64)
+    return count, t, cell % cells, cell // cells
+
+
+def export_density(data, out_dir, freq="15min", min_zoom=MIN_ZOOM, max_zoom=MAX_ZOOM, cells=TILE_CELLS,
+                   source_crs=SOURCE_CRS):
+    """明细 → 金字塔 → 瓦片，返回 index dict"""
+    pyramid = density_pyramid(data, freq, min_zoom, max_zoom, cells, source_crs)
+    return write_density_tiles(pyramid, out_dir)
+
+
+# ============================================================
+# 命令行
+# ============================================================
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Multi-zoom density tiles from perception targets")
+    parser.add_argument("--kafka", required=True, help="Kafka 感知 dump（可为 gzip / zstd）")
+    parser.add_argument("--name", required=True, help="数据集名，如交叉口编号 170")
+    parser.add_argument("--out-dir", default=os.path.join("LargeScreenFront", "public", "data", "density"))
+    parser.add_argument("--freq", default="15min")
+    parser.add_argument("--min-zoom", type=int, default=MIN_ZOOM)
+    parser.add_argument("--max-zoom", type=int, default=MAX_ZOOM)
+    parser.add_argument("--cells", type=int, default=TILE_CELLS, help="每个瓦片每边的格数（≤ 256）")
+    parser.add_argument("--crs", default=SOURCE_CRS, choices=["wgs84", "gcj02", "bd09"], help="感知数据坐标系")
+    args = parser.parse_args(argv)
+
+    import demand
+
+    data = demand.parse_kafka_file(args.kafka)
+    index = export_density(data, os.path.join(args.out_dir, args.name), args.freq,
+                           args.min_zoom, args.max_zoom, args.cells, args.crs)
+    n_tiles = sum(len(z["tiles"]) for z in index["zooms"].values())
+    print(f"{args.name}: {len(data)} targets → {n_tiles} tiles, zoom {index['min_zoom']}–{index['max_zoom']}, "
+          f"{index['length']} bins")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,151 @@
+"""
+需求预测：对 final_df 的 smoothed_demand 按 link × 流向 逐序列预测未来 N 个时段，所有序列在 序列 × 时间 二维数组上一起拟合
+
+    fc = forecast_demand(final_df, horizon=8)
+    resp = build_queryAll_response(capacity_df, demand_df, ..., forecast_df=fc)
+
+模型：加性指数平滑，水平 + 时段（time-of-day）季节 + 星期（day-of-week）季节两层剖面：
+    ŷ_t = ℓ + s_tod[slot(t)] + s_dow[dow(t)]
+    e_t = y_t − ŷ_t
+    ℓ += α e，s_tod[slot] += γ e，s_dow[dow] += δ e
+初值：ℓ 取全体均值，时段剖面取各时段残差均值，星期剖面取时段剖面之后各星期的残差均值（未出现的星期为 0）。
+缺测时刻不更新状态；预测值截断为非负。逐时刻循环，每步只做长度为 序列数 的向量运算。
+"""
+
+import numpy as np
+import pandas as pd
+
+DEFAULT_KEYS = ("link_id", "Direction", "direction", "movement")
+
+
+def _series_keys(df, keys):
+    if keys is not None:
+        return list(keys)
+    found = [k for k in DEFAULT_KEYS if k in df.columns]
+    # Direction / direction 只取一个
+    if "Direction" in found and "direction" in found:
+        found.remove("direction")
+    return found
+
+
+# ============================================================
+# 1. 长表 → 序列 × 时间
+# ============================================================
+def series_matrix(df, keys=None, value="smoothed_demand", freq="15min"):
+    """
+    返回 (times, series, Y)：times 为 freq 等间隔的完整时间轴，series 为各序列的键，
+    Y 为 序列 × 时间 数组（缺测为 NaN，同一格多行取均值）。
+    """
+    keys = _series_keys(df, keys)
+    df = df[df["time_bin"].notna()]
+    step = pd.Timedelta(freq)
+    t = df["time_bin"].dt.floor(step)
+    times = pd.date_range(t.min(), t.max(), freq=step) if len(df) else pd.DatetimeIndex([])
+    t_pos = ((t - times[0]) // step).to_numpy(dtype=np.int64) if len(df) else np.array([], dtype=np.int64)
+
+    grouped = df.groupby(keys, dropna=False, sort=True)
+    s_pos = grouped.ngroup().to_numpy()
+    series = grouped.size().reset_index()[keys]
+
+    S, T = len(series), len(times)
+    v = pd.to_numeric(df[value], errors="coerce").to_numpy(dtype=float)
+    ok = np.isfinite(v)
+    flat = s_pos[ok] * T + t_pos[ok]
+    total = np.bincount(flat, weights=v[ok], minlength=S * T).reshape(S, T)
+    count = np.bincount(flat, minlength=S * T).reshape(S, T)
+    Y = np.divide(total, count, out=np.full((S, T), np.nan), where=count > 0)
+    return times, series, Y
+
+
+# ============================================================
+# 2. 拟合 + 预测（二维数组）
+# ============================================================
+def _slots(times, step):
+    tod = ((times - times.normalize()) // step).to_numpy(dtype=np.int64)
+    return tod, times.dayofweek.to_numpy()
+
+
+def fit_predict(Y, times, horizon, freq="15min", alpha=0.1, gamma=0.2, delta=0.05):
+    """
+    Y: 序列 × 时间（缺测 NaN），times: 对应的等间隔时间轴。
+    返回 (F, future_times, sigma)：F 为 序列 × horizon 预测，sigma 为各序列一步预测误差的标准差。
+    """
+    step = pd.Timedelta(freq)
+    n_tod = int(pd.Timedelta("1D") // step)
+    S, T = Y.shape
+    future = pd.date_range(times[-1] + step, periods=horizon, freq=step) if T else pd.DatetimeIndex([])
+    if S == 0 or T == 0:
+        return np.zeros((S, horizon)), future, np.full(S, np.nan)
+
+    tod, dow = _slots(times, step)
+    observed = np.isfinite(Y)
+    Y0 = np.where(observed, Y, 0.0)
+
+    # 初值：水平 → 时段剖面 → 星期剖面
+    n_obs = observed.sum(axis=1)
+    level = np.divide(Y0.sum(axis=1), n_obs, out=np.zeros(S), where=n_obs > 0)
+    resid = np.where(observed, Y0 - level[:, None], 0.0)
+    s_tod = _profile(resid, observed, tod, n_tod)
+    resid = np.where(observed, resid - s_tod[:, tod], 0.0)
+    s_dow = _profile(resid, observed, dow, 7)
+
+    # 逐时刻平滑，记录一步预测误差；按时间为首维存放，每步取连续内存
+    Yt = np.ascontiguousarray(Y0.T)
+    obs_t = np.ascontiguousarray(observed.T)
+    s_tod = np.ascontiguousarray(s_tod.T)
+    s_dow = np.ascontiguousarray(s_dow.T)
+    sq_err = np.zeros(S)
+    e = np.empty(S)
+    for t in range(T):
+        k, d = tod[t], dow[t]
+        np.subtract(Yt[t], level, out=e)
+        e -= s_tod[k]
+        e -= s_dow[d]
+        e *= obs_t[t]
+        level += alpha * e
+        s_tod[k] += gamma * e
+        s_dow[d] += delta * e
+        sq_err += e * e
+    s_tod, s_dow = s_tod.T, s_dow.T
+
+    sigma = np.sqrt(np.divide(sq_err, n_obs, out=np.full(S, np.nan), where=n_obs > 0))
+    f_tod, f_dow = _slots(future, step)
+    F = np.maximum(level[:, None] + s_tod[:, f_tod] + s_dow[:, f_dow], 0.0)
+    F[n_obs == 0] = np.nan
+    return F, future, sigma
+
+
+def _profile(resid, observed, slot, n_slots):
+    """各 slot 的残差均值（序列 × n_slots，无观测为 0）"""
+    S = resid.shape[0]
+    flat = (np.arange(S)[:, None] * n_slots + slot[None, :]).ravel()
+    total = np.bincount(flat, weights=resid.ravel(), minlength=S * n_slots).reshape(S, n_slots)
+    count = np.bincount(flat, weights=observed.ravel(), minlength=S * n_slots).reshape(S, n_slots)
+    return np.divide(total, count, out=np.zeros((S, n_slots)), where=count > 0)
+
+
+# ============================================================
+# 3. 总入口
+# ============================================================
+def forecast_demand(final_df, horizon=8, keys=None, value="smoothed_demand", freq="15min",
+                    alpha=0.1, gamma=0.2, delta=0.05, z=1.96):
+    """
+    每 序列 × 预测时段 一行：time_bin, <keys>, forecast_demand, forecast_lower, forecast_upper
+    （区间为 ± z·sigma，sigma 为一步预测误差标准差，下限截断为 0）。
+    """
+    keys = _series_keys(final_df, keys)
+    columns = ["time_bin", *keys, "forecast_demand", "forecast_lower", "forecast_upper"]
+    if final_df.empty:
+        return pd.DataFrame(columns=columns)
+
+    times, series, Y = series_matrix(final_df, keys, value, freq)
+    F, future, sigma = fit_predict(Y, times, horizon, freq, alpha, gamma, delta)
+
+    S, H = F.shape
+    out = series.loc[np.repeat(np.arange(S), H)].reset_index(drop=True)
+    out.insert(0, "time_bin", future[np.tile(np.arange(H), S)])
+    out["forecast_demand"] = F.ravel()
+    band = np.repeat(np.nan_to_num(sigma) * z, H)
+    out["forecast_lower"] = np.maximum(out["forecast_demand"] - band, 0.0)
+    out["forecast_upper"] = out["forecast_demand"] + band
+    return out[columns]
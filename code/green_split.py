@@ -0,0 +1,244 @@
+"""
+绿信比优化：按交叉口 × 时段搜索各相位阶段的绿灯分配，使未满足需求（积压）总量最小
+
+    splits, summary = optimize_network({"170": (capacity_df, demand_df), ...}, cycle_s=120)
+
+模型沿用现有口径：
+  - 容量 cleaned_capacity = green_ratio * lane_count * 1200（supply.py）
+  - 积压 b_t = max(0, b_{t-1} + demand_t − 1.5 * capacity_t)（compute_utilized_supply_with_backlog），
+    用 scenarios.backlog_arrays 的闭式解在整段时间上向量化
+  - 目标：受控序列在全时段的积压之和
+
+约束：同一阶段（stage）内的 (direction, movement) 共享绿灯；各阶段绿灯 ≥ min_green_s，
+      总绿灯 = cycle_s − lost_time_s。缺省阶段为对向放行：NS/EW × 直行/左转。
+搜索：按时段做坐标下降，每个时段一次性评估一批候选（候选 × 序列 × 时间 数组），
+      候选为约束单纯形上的 Dirichlet 采样，逐轮向当前最优收缩；交叉口之间进程并行。
+"""
+
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+import supply_demand
+from scenarios import SATURATION_FLOW, backlog_arrays, build_series_arrays
+
+# 缺省时段（小时，左闭右开）
+DEFAULT_PERIODS = (
+    ("night", 0, 6),
+    ("am_peak", 6, 10),
+    ("midday", 10, 16),
+    ("pm_peak", 16, 20),
+    ("evening", 20, 24),
+)
+
+_AXIS = {"N": "NS", "S": "NS", "E": "EW", "W": "EW"}
+
+
+def default_stages(series):
+    """对向放行：{"NS-Through": [序列下标, ...], ...}；右转及无法识别方向的序列不参与优化"""
+    stages = {}
+    for s, (d, m) in enumerate(zip(series["direction"], series["movement"])):
+        axis = _AXIS.get(str(d).strip().upper()[:1])
+        if axis is None or str(m).lower().startswith("right"):
+            continue
+        stages.setdefault(f"{axis}-{m}", []).append(s)
+    return stages
+
+
+def _stages_from_spec(spec, series):
+    """spec: {stage: [(direction, movement), ...]} → {stage: [序列下标, ...]}"""
+    dm = list(zip(series["direction"], series["movement"]))
+    out = {}
+    for name, members in spec.items():
+        idx = [s for s, key in enumerate(dm) if key in set(map(tuple, members))]
+        if idx:
+            out[name] = idx
+    return out
+
+
+# ============================================================
+# 1. 候选生成（约束单纯形）
+# ============================================================
+def _project(weights, g_min, g_total):
+    """权重（行和为 1）→ 满足 g ≥ g_min、Σg = g_total 的绿信比"""
+    n = weights.shape[-1]
+    return g_min + (g_total - n * g_min) * weights
+
+
+def _sample(rng, n_cand, center_w, concentration):
+    """以 center_w 为均值的 Dirichlet 采样；concentration 越大越集中"""
+    alpha = np.maximum(center_w * concentration, 1e-3)
+    return rng.dirichlet(alpha, size=n_cand)
+
+
+# ============================================================
+# 2. 单交叉口
+# ============================================================
+def _evaluate(schedule, ctx):
+    """
+    schedule: 候选 × 时段 × 阶段 的绿信比 → 每个候选的受控序列积压总和
+    """
+    C = schedule.shape[0]
+    per_t = schedule[:, ctx["period_of_t"], :]                      # C × T × J
+    g_series = per_t[:, :, ctx["stage_of_s"]].transpose(0, 2, 1)    # C × S × T
+    cap = g_series * ctx["lanes"][None] * SATURATION_FLOW
+    demand = np.broadcast_to(ctx["demand"][None], cap.shape)
+    present = np.broadcast_to(ctx["present"][None], cap.shape)
+    backlog, _ = backlog_arrays(demand, cap, present)
+    return np.nansum(backlog.reshape(C, -1), axis=1)
+
+
+def optimize_intersection(
+    capacity_df,
+    demand_df,
+    cycle_s=120,
+    min_green_s=10,
+    lost_time_s=12,
+    periods=DEFAULT_PERIODS,
+    stages=None,
+    n_candidates=256,
+    n_rounds=4,
+    n_sweeps=2,
+    beginTime=None,
+    endTime=None,
+    seed=0,
+):
+    """
+    返回 (splits, summary)：
+      splits  每 时段 × 阶段 一行：period, stage, green_ratio_current, green_ratio_opt, green_s_opt
+      summary 每时段一行 + ALL：backlog_current, backlog_opt, reduction
+    """
+    _, merged = supply_demand.run_resilience_analysis(capacity_df, demand_df, beginTime=beginTime, endTime=endTime)
+    arrays = build_series_arrays(merged, ["direction", "movement"])
+    series = arrays["series"]
+    stage_map = default_stages(series) if stages is None else _stages_from_spec(stages, series)
+    if not stage_map:
+        raise ValueError("没有可优化的相位阶段")
+
+    stage_names = list(stage_map)
+    J = len(stage_names)
+    g_min = min_green_s / cycle_s
+    g_total = (cycle_s - lost_time_s) / cycle_s
+    if J * g_min > g_total:
+        raise ValueError(f"{J} 个阶段 × 最小绿 {min_green_s}s 超过有效绿灯 {cycle_s - lost_time_s}s")
+
+    # 受控序列：属于某阶段且有车道数
+    controlled = np.concatenate([np.asarray(v) for v in stage_map.values()])
+    stage_of = np.full(len(series), -1)
+    for j, name in enumerate(stage_names):
+        stage_of[stage_map[name]] = j
+    lanes = arrays["lane_count"]
+    lane_ok = np.isfinite(lanes).any(axis=1)
+    controlled = controlled[lane_ok[controlled]]
+    lanes_c = lanes[controlled]
+    lanes_c = np.where(np.isfinite(lanes_c), lanes_c, np.nanmean(lanes_c, axis=1, keepdims=True))
+
+    hours = arrays["times"].hour
+    period_of_t = np.full(len(hours), -1)
+    for p, (_, h0, h1) in enumerate(periods):
+        period_of_t[(hours >= h0) & (hours < h1)] = p
+    if (period_of_t < 0).any():
+        raise ValueError("periods 未覆盖全部时段")
+    P = len(periods)
+
+    ctx = {
+        "period_of_t": period_of_t,
+        "stage_of_s": stage_of[controlled],
+        "lanes": lanes_c,
+        "demand": np.nan_to_num(arrays["demand"][controlled]),
+        "present": arrays["present"][controlled],
+    }
+
+    # 现状：各阶段取序列 green_ratio 的时段均值（仅用于对照输出）；现状积压用原 cleaned_capacity
+    cur_green = arrays["green_ratio"][controlled]
+    current = np.zeros((P, J))
+    for p in range(P):
+        for j in range(J):
+            sel = ctx["stage_of_s"] == j
+            v = cur_green[sel][:, period_of_t == p]
+            current[p, j] = np.nanmean(v) if np.isfinite(v).any() else np.nan
+    current_cap = np.nan_to_num(arrays["capacity"][controlled])
+    cur_backlog, _ = backlog_arrays(ctx["demand"], current_cap, ctx["present"])
+    backlog_current_t = np.nansum(cur_backlog, axis=0)
+
+    # 起点：Webster 流量比（时段需求 / 饱和流量）分配
+    rng = np.random.default_rng(seed)
+    best_w = np.zeros((P, J))
+    for p in range(P):
+        cols = period_of_t == p
+        flow = ctx["demand"][:, cols].mean(axis=1) / (lanes_c[:, cols].mean(axis=1) * SATURATION_FLOW)
+        y = np.array([flow[ctx["stage_of_s"] == j].max(initial=0.0) for j in range(J)])
+        best_w[p] = (y + 1e-6) / (y + 1e-6).sum()
+    best = _project(best_w, g_min, g_total)
+    best_obj = _evaluate(best[None], ctx)[0]
+
+    for _ in range(n_sweeps):
+        for p in range(P):
+            for r in range(n_rounds):
+                # 第一轮全局采样，之后围绕当前最优逐步收缩
+                conc = 1.0 * J if r == 0 else 10.0 * J * (4 ** r)
+                center = best_w[p] if r > 0 else np.full(J, 1.0 / J)
+                w = _sample(rng, n_candidates, center, conc)
+                sched = np.repeat(best[None], n_candidates, axis=0)
+                sched[:, p, :] = _project(w, g_min, g_total)
+                obj = _evaluate(sched, ctx)
+                i = int(np.argmin(obj))
+                if obj[i] < best_obj:
+                    best_obj = obj[i]
+                    best_w[p] = w[i]
+                    best[p] = sched[i, p]
+
+    opt_backlog = _evaluate(best[None], ctx)  # 总量；分时段见下
+    per_t = best[period_of_t][:, ctx["stage_of_s"]].T
+    b_opt, _ = backlog_arrays(ctx["demand"], per_t * lanes_c * SATURATION_FLOW, ctx["present"])
+    backlog_opt_t = np.nansum(b_opt, axis=0)
+
+    splits = pd.DataFrame([
+        {
+            "period": periods[p][0],
+            "stage": stage_names[j],
+            "green_ratio_current": current[p, j],
+            "green_ratio_opt": best[p, j],
+            "green_s_opt": best[p, j] * cycle_s,
+        }
+        for p in range(P) for j in range(J)
+    ])
+    rows = []
+    for p in range(P):
+        cols = period_of_t == p
+        rows.append({"period": periods[p][0],
+                     "backlog_current": backlog_current_t[cols].sum(),
+                     "backlog_opt": backlog_opt_t[cols].sum()})
+    rows.append({"period": "ALL", "backlog_current": backlog_current_t.sum(), "backlog_opt": float(opt_backlog[0])})
+    summary = pd.DataFrame(rows)
+    summary["reduction"] = 1 - summary["backlog_opt"] / summary["backlog_current"].where(summary["backlog_current"] > 0)
+    return splits, summary
+
+
+# ============================================================
+# 3. 多交叉口并行
+# ============================================================
+def _optimize_one(args):
+    key, capacity_df, demand_df, kwargs = args
+    splits, summary = optimize_intersection(capacity_df, demand_df, **kwargs)
+    return key, splits, summary
+
+
+def optimize_network(frames, max_workers=None, **kwargs):
+    """
+    frames: {交叉口: (capacity_df, demand_df)}；其余参数同 optimize_intersection。
+    max_workers=1 时串行；缺省按 CPU 数开进程池。返回带 intersection 列的 (splits, summary)。
+    """
+    tasks = [(key, cap, dem, kwargs) for key, (cap, dem) in frames.items()]
+    workers = max_workers or min(len(tasks), os.cpu_count() or 1)
+    if workers <= 1 or len(tasks) <= 1:
+        results = [_optimize_one(t) for t in tasks]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(_optimize_one, tasks))
+
+    splits = pd.concat([s.assign(intersection=k) for k, s, _ in results], ignore_index=True)
+    summary = pd.concat([m.assign(intersection=k) for k, _, m in results], ignore_index=True)
+    return splits, summary
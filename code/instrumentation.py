@@ -0,0 +1,307 @@
+"""
+轻量级管线埋点：每个阶段记录 耗时 / 行数进出 / 内存增量 / HTTP 延迟直方图
+
+    stats = PipelineStats("demand.run_pipeline", profile="tracemalloc")
+    with stats.run():
+        with stats.stage("parse_kafka") as st:
+            df = parse(...)
+            st.rows_out = len(df)
+    print(stats.summary())
+
+profile 可选 "cprofile" / "tracemalloc" / "all"（逗号分隔组合），
+未显式传入时读取环境变量 TRAFFIC_PROFILE。
+"""
+
+import cProfile
+import io
+import os
+import pstats
+import sys
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+PROFILE_ENV = "TRAFFIC_PROFILE"
+
+# HTTP 延迟直方图桶上界（ms），最后一桶为 +inf
+HTTP_BUCKETS_MS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+
+
+def _current_rss_mb():
+    """当前常驻内存（Linux 读 /proc，其它平台退化为 ru_maxrss）"""
+    try:
+        with open("/proc/self/statm", "r") as f:
+            pages = int(f.read().split()[1])
+        return pages * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+    except (OSError, ValueError, IndexError, AttributeError):
+        return _max_rss_mb()
+
+
+def _max_rss_mb():
+    if resource is None:
+        return 0.0
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss / (1024 * 1024) if sys.platform == "darwin" else rss / 1024
+
+
+# ============================================================
+# tracemalloc 峰值：进程内所有未结束阶段共用
+# ============================================================
+# tracemalloc 的峰值是进程级的，任一阶段 reset_peak() 都会清掉外层（嵌套）或其它线程（并发）阶段的峰值。
+# 因此每次重置前先把当前峰值并入所有未结束阶段，各阶段只读自己记下的最大值。
+_peak_lock = threading.Lock()
+_open_peaks = []        # 未结束阶段的 [当前记下的绝对峰值]
+
+
+def _fold_and_reset_peak():
+    """当前峰值并入所有未结束阶段后重置；调用方持有 _peak_lock"""
+    peak = tracemalloc.get_traced_memory()[1]
+    for slot in _open_peaks:
+        slot[0] = max(slot[0], peak)
+    tracemalloc.reset_peak()
+
+
+def _open_peak():
+    with _peak_lock:
+        _fold_and_reset_peak()
+        slot = [tracemalloc.get_traced_memory()[0]]
+        _open_peaks.append(slot)
+        return slot
+
+
+def _close_peak(slot):
+    """返回该阶段期间的绝对峰值（字节）"""
+    with _peak_lock:
+        _fold_and_reset_peak()
+        _open_peaks[:] = [s for s in _open_peaks if s is not slot]
+        return slot[0]
+
+
+def parse_profile_modes(profile=None):
+    """None → 读环境变量；True/"1"/"all" → 全开；返回 {"cprofile", "tracemalloc"} 子集"""
+    if profile is None:
+        profile = os.environ.get(PROFILE_ENV, "")
+    if profile is True:
+        return {"cprofile", "tracemalloc"}
+    if not profile:
+        return set()
+    modes = set()
+    for part in str(profile).lower().split(","):
+        part = part.strip()
+        if part in ("1", "true", "all"):
+            modes |= {"cprofile", "tracemalloc"}
+        elif part in ("cprofile", "profile"):
+            modes.add("cprofile")
+        elif part in ("tracemalloc", "memory"):
+            modes.add("tracemalloc")
+    return modes
+
+
+# ============================================================
+# HTTP 延迟直方图
+# ============================================================
+class HttpHistogram:
+    def __init__(self):
+        self.latencies_ms = []
+        self.errors = 0
+
+    def add(self, latency_ms, error=False):
+        self.latencies_ms.append(latency_ms)
+        if error:
+            self.errors += 1
+
+    @property
+    def count(self):
+        return len(self.latencies_ms)
+
+    def buckets(self):
+        counts = [0] * (len(HTTP_BUCKETS_MS) + 1)
+        for v in self.latencies_ms:
+            i = 0
+            while i < len(HTTP_BUCKETS_MS) and v > HTTP_BUCKETS_MS[i]:
+                i += 1
+            counts[i] += 1
+        labels = [f"<={b}ms" for b in HTTP_BUCKETS_MS] + [f">{HTTP_BUCKETS_MS[-1]}ms"]
+        return dict(zip(labels, counts))
+
+    def quantile(self, q):
+        if not self.latencies_ms:
+            return None
+        vals = sorted(self.latencies_ms)
+        return vals[min(len(vals) - 1, int(q * len(vals)))]
+
+    def to_dict(self):
+        return {
+            "count": self.count,
+            "errors": self.errors,
+            "total_ms": sum(self.latencies_ms),
+            "p50_ms": self.quantile(0.5),
+            "p95_ms": self.quantile(0.95),
+            "max_ms": max(self.latencies_ms) if self.latencies_ms else None,
+            "buckets": self.buckets(),
+        }
+
+
+# ============================================================
+# 单阶段统计
+# ============================================================
+class StageStats:
+    def __init__(self, name, rows_in=None):
+        self.name = name
+        self.rows_in = rows_in
+        self.rows_out = None
+        self.wall_s = 0.0
+        self.rss_delta_mb = 0.0
+        self.peak_rss_delta_mb = 0.0
+        self.py_peak_mb = None
+        self.http = HttpHistogram()
+        self.extra = {}
+
+    def to_dict(self):
+        d = {
+            "stage": self.name,
+            "wall_s": self.wall_s,
+            "rows_in": self.rows_in,
+            "rows_out": self.rows_out,
+            "rss_delta_mb": self.rss_delta_mb,
+            "peak_rss_delta_mb": self.peak_rss_delta_mb,
+            "py_peak_mb": self.py_peak_mb,
+            "http": self.http.to_dict() if self.http.count else None,
+        }
+        d.update(self.extra)
+        return d
+
+
+# ============================================================
+# 整条管线统计
+# ============================================================
+class PipelineStats:
+    def __init__(self, pipeline, profile=None):
+        self.pipeline = pipeline
+        self.modes = parse_profile_modes(profile)
+        self.stages = {}
+        self.wall_s = 0.0
+        self.profiler = None
+        self._current = None
+        self._own_tracemalloc = False
+
+    # ------------------------------
+    # 整体运行（cProfile / tracemalloc 开关）
+    # ------------------------------
+    @contextmanager
+    def run(self):
+        if "tracemalloc" in self.modes and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._own_tracemalloc = True
+        if "cprofile" in self.modes:
+            self.profiler = cProfile.Profile()
+            self.profiler.enable()
+        t0 = time.perf_counter()
+        try:
+            yield self
+        finally:
+            self.wall_s = time.perf_counter() - t0
+            if self.profiler is not None:
+                self.profiler.disable()
+            if self._own_tracemalloc:
+                tracemalloc.stop()
+                self._own_tracemalloc = False
+
+    @contextmanager
+    def stage(self, name, rows_in=None):
+        st = self.stages.get(name)
+        if st is None:
+            st = self.stages[name] = StageStats(name, rows_in)
+        elif rows_in is not None:
+            st.rows_in = (st.rows_in or 0) + rows_in
+
+        prev = self._current
+        self._current = st
+        tracing = tracemalloc.is_tracing()
+        if tracing:
+            base_py = tracemalloc.get_traced_memory()[0]
+            slot = _open_peak()
+        rss0 = _current_rss_mb()
+        max0 = _max_rss_mb()
+        t0 = time.perf_counter()
+        try:
+            yield st
+        finally:
+            st.wall_s += time.perf_counter() - t0
+            st.rss_delta_mb += _current_rss_mb() - rss0
+            st.peak_rss_delta_mb += _max_rss_mb() - max0
+            if tracing:
+                peak = (_close_peak(slot) - base_py) / (1024 * 1024)
+                st.py_peak_mb = max(st.py_peak_mb or 0.0, peak)
+            self._current = prev
+
+    # ------------------------------
+    # HTTP 计时
+    # ------------------------------
+    def wrap_http(self, fn):
+        """返回与 fn 同签名的包装函数，把每次调用的延迟记入当前阶段"""
+        def _call(*args, **kwargs):
+            st = self._current
+            t0 = time.perf_counter()
+            try:
+                result = fn(*args, **kwargs)
+            except Exception:
+                if st is not None:
+                    st.http.add((time.perf_counter() - t0) * 1000, error=True)
+                raise
+            if st is not None:
+                status = getattr(result, "status_code", 200)
+                st.http.add((time.perf_counter() - t0) * 1000, error=status >= 400)
+            return result
+        return _call
+
+    # ------------------------------
+    # 输出
+    # ------------------------------
+    def to_dict(self):
+        return {
+            "pipeline": self.pipeline,
+            "wall_s": self.wall_s,
+            "profile_modes": sorted(self.modes),
+            "stages": [st.to_dict() for st in self.stages.values()],
+        }
+
+    def to_frame(self):
+        import pandas as pd
+
+        rows = []
+        for st in self.stages.values():
+            d = st.to_dict()
+            http = d.pop("http") or {}
+            d["http_count"] = http.get("count", 0)
+            d["http_p95_ms"] = http.get("p95_ms")
+            rows.append(d)
+        return pd.DataFrame(rows)
+
+    def profile_text(self, top=30, sort="cumulative"):
+        if self.profiler is None:
+            return ""
+        buf = io.StringIO()
+        pstats.Stats(self.profiler, stream=buf).sort_stats(sort).print_stats(top)
+        return buf.getvalue()
+
+    def summary(self):
+        lines = [f"{self.pipeline}: {self.wall_s:.3f}s"]
+        for st in self.stages.values():
+            share = st.wall_s / self.wall_s * 100 if self.wall_s else 0.0
+            http = f" http={st.http.count} p95={st.http.quantile(0.95):.1f}ms" if st.http.count else ""
+            py = f" py_peak={st.py_peak_mb:.1f}MB" if st.py_peak_mb is not None else ""
+            lines.append(
+                f"  {st.name:<24} {st.wall_s:8.3f}s {share:5.1f}%  "
+                f"rows {st.rows_in}→{st.rows_out}  rss{st.rss_delta_mb:+.1f}MB{py}{http}"
+            )
+        return "\n".join(lines)
+
+    def __repr__(self):
+        return self.summary()
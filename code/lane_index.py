@@ -0,0 +1,279 @@
+"""
+车道空间索引：经纬度 → 最近车道 / link，批量向量化解析
+
+    index = LaneIndex.from_snapshot("lanes.json")
+    lane_pos, dist_m = index.query(lon_array, lat_array)
+
+车道几何快照（JSON 列表）每项：{"laneId", "link_id", "turnInfo", "coords": [[lon, lat], ...]}；
+也可直接读取 benchmarks 生成的 network.json。
+几何按 step_m 加密为采样点建 KD-tree（scipy 可选，缺失时退化为网格分桶），
+取近邻候选线段后再按点到线段的精确距离择优。
+"""
+
+import json
+
+import numpy as np
+import pandas as pd
+
+try:
+    from scipy.spatial import cKDTree
+except ImportError:  # scipy 为可选依赖
+    cKDTree = None
+
+EARTH_M_PER_DEG = 111320.0
+
+# 等距（差值在此范围内）时优先取点位于其下游端的车道：停车线上的车辆归进口道而非出口道
+TIE_M = 1e-3
+
+_MISSING_LANE = {"", "None", "none", "nan", "NaN", "null"}
+
+
+# ============================================================
+# 快照读取
+# ============================================================
+def load_lane_snapshot(path):
+    """读取车道几何快照，返回 DataFrame(laneId, link_id, turnInfo, coords)"""
+    with open(path, "r", encoding="utf-8") as f:
+        raw = json.load(f)
+    if isinstance(raw, dict) and "links" in raw:
+        return lanes_from_network(raw)
+    df = pd.DataFrame(raw)
+    if "link_id" not in df.columns and "roadId" in df.columns:
+        df = df.rename(columns={"roadId": "link_id"})
+    return df[["laneId", "link_id", "turnInfo", "coords"]]
+
+
+def lanes_from_network(network):
+    rows = []
+    for link_id, link in network["links"].items():
+        for ln in link["lanes"]:
+            rows.append({
+                "laneId": str(ln["laneId"]),
+                "link_id": str(link_id),
+                "turnInfo": ln.get("turnInfo"),
+                "coords": ln["coords"],
+            })
+    return pd.DataFrame(rows, columns=["laneId", "link_id", "turnInfo", "coords"])
+
+
+def missing_lane_mask(lane_ids):
+    """laneId 缺失（None / NaN / 空串 / 'None'）的行"""
+    s = pd.Series(lane_ids)
+    return (s.isna() | s.astype(str).str.strip().isin(_MISSING_LANE)).to_numpy()
+
+
+# ============================================================
+# 索引
+# ============================================================
+class LaneIndex:
+    def __init__(self, lanes, step_m=2.0, max_dist_m=15.0, k=8):
+        lanes = lanes.reset_index(drop=True)
+        self.lanes = lanes.assign(laneId=lanes["laneId"].astype(str), link_id=lanes["link_id"].astype(str))
+        self.step_m = step_m
+        self.max_dist_m = max_dist_m
+        self.k = k
+
+        all_pts = np.array([p for c in self.lanes["coords"] for p in c], dtype=float)
+        self.lon0 = float(all_pts[:, 0].mean())
+        self.lat0 = float(all_pts[:, 1].mean())
+        self._kx = EARTH_M_PER_DEG * np.cos(np.radians(self.lat0))
+        self._ky = EARTH_M_PER_DEG
+
+        self._build_segments()
+        self._build_samples()
+
+    @classmethod
+    def from_snapshot(cls, path, **kwargs):
+        return cls(load_lane_snapshot(path), **kwargs)
+
+    @classmethod
+    def from_network(cls, network, **kwargs):
+        return cls(lanes_from_network(network), **kwargs)
+
+    # ------------------------------
+    # 构建
+    # ------------------------------
+    def _project(self, lon, lat):
+        x = (np.asarray(lon, dtype=float) - self.lon0) * self._kx
+        y = (np.asarray(lat, dtype=float) - self.lat0) * self._ky
+        return x, y
+
+    def _build_segments(self):
+        a, b, owner = [], [], []
+        for i, coords in enumerate(self.lanes["coords"]):
+            c = np.asarray(coords, dtype=float)
+            if len(c) == 1:
+                c = np.vstack([c, c])
+            a.append(c[:-1])
+            b.append(c[1:])
+            owner.append(np.full(len(c) - 1, i))
+        a = np.vstack(a)
+        b = np.vstack(b)
+        self.seg_ax, self.seg_ay = self._project(a[:, 0], a[:, 1])
+        self.seg_bx, self.seg_by = self._project(b[:, 0], b[:, 1])
+        self.seg_lane = np.concatenate(owner)
+
+    def _build_samples(self):
+        dx = self.seg_bx - self.seg_ax
+        dy = self.seg_by - self.seg_ay
+        length = np.hypot(dx, dy)
+        n = np.maximum(1, np.ceil(length / self.step_m).astype(int)) + 1
+        seg = np.repeat(np.arange(len(n)), n)
+        start = np.repeat(np.cumsum(n) - n, n)
+        frac = (np.arange(n.sum()) - start) / np.repeat(n - 1, n)
+        self.sample_x = self.seg_ax[seg] + dx[seg] * frac
+        self.sample_y = self.seg_ay[seg] + dy[seg] * frac
+        self.sample_seg = seg
+
+        if cKDTree is not None:
+            self._tree = cKDTree(np.column_stack([self.sample_x, self.sample_y]))
+        else:
+            # 网格按线段分桶：格宽 ≥ max_dist_m + step_m，3×3 邻域必然覆盖 max_dist_m 内的所有线段
+            self._tree = None
+            self._cell = self.max_dist_m + self.step_m
+            cx = np.floor(self.sample_x / self._cell).astype(np.int64)
+            cy = np.floor(self.sample_y / self._cell).astype(np.int64)
+            pairs = np.unique(np.column_stack([self._cell_key(cx, cy), seg]), axis=0)
+            self._grid_key = pairs[:, 0]
+            self._grid_seg = pairs[:, 1]
+
+    @staticmethod
+    def _cell_key(cx, cy):
+        return (cx + (1 << 31)) * (1 << 32) + (cy + (1 << 31))
+
+    # ------------------------------
+    # 近邻候选
+    # ------------------------------
+    def _nearest_tree(self, x, y, max_dist_m):
+        """KD-tree 取 k 个最近采样点，其所属线段中按精确距离择优，返回 (best_seg, best_d)"""
+        k = min(self.k, len(self.sample_seg))
+        # 采样点与线段最近点相距不超过半个步长，搜索半径相应放宽
+        _, idx = self._tree.query(
+            np.column_stack([x, y]), k=k, distance_upper_bound=max_dist_m + self.step_m, workers=-1
+        )
+        idx = idx.reshape(len(x), -1)
+        best_score = np.full(len(x), np.inf)
+        best_d = np.full(len(x), np.inf)
+        best_seg = np.full(len(x), -1, dtype=np.int64)
+        for j in range(idx.shape[1]):
+            valid = idx[:, j] < len(self.sample_seg)
+            seg = self.sample_seg[np.where(valid, idx[:, j], 0)]
+            score, d = self._score(x, y, seg)
+            better = valid & (score < best_score)
+            best_score = np.where(better, score, best_score)
+            best_d = np.where(better, d, best_d)
+            best_seg = np.where(better, seg, best_seg)
+        return best_seg, best_d
+
+    def _nearest_grid(self, x, y):
+        """网格兜底：3×3 邻域内所有线段逐一求精确距离，返回 (best_seg, best_d)"""
+        cx = np.floor(x / self._cell).astype(np.int64)
+        cy = np.floor(y / self._cell).astype(np.int64)
+        best_score = np.full(len(x), np.inf)
+        best_d = np.full(len(x), np.inf)
+        best_seg = np.full(len(x), -1, dtype=np.int64)
+        for ox in (-1, 0, 1):
+            for oy in (-1, 0, 1):
+                key = self._cell_key(cx + ox, cy + oy)
+                lo = np.searchsorted(self._grid_key, key, side="left")
+                cnt = np.searchsorted(self._grid_key, key, side="right") - lo
+                has = cnt > 0
+                if not has.any():
+                    continue
+                q = np.repeat(np.arange(len(x)), cnt)
+                starts = np.cumsum(cnt) - cnt
+                seg = self._grid_seg[np.repeat(lo, cnt) + np.arange(cnt.sum()) - np.repeat(starts, cnt)]
+                score, d = self._score(x[q], y[q], seg)
+
+                # 每个查询点组内取最小（q 已按点有序）
+                group_min = np.minimum.reduceat(score, starts[has])
+                at_min = np.flatnonzero(score == np.repeat(group_min, cnt[has]))
+                qs, first = np.unique(q[at_min], return_index=True)
+                pick = at_min[first]
+                better = group_min < best_score[qs]
+                best_score[qs[better]] = group_min[better]
+                best_d[qs[better]] = d[pick][better]
+                best_seg[qs[better]] = seg[pick][better]
+        return best_seg, best_d
+
+    # ------------------------------
+    # 查询
+    # ------------------------------
+    def query(self, lon, lat, max_dist_m=None):
+        """
+        返回 (lane_pos, dist_m)：lane_pos 为 self.lanes 的行号，超出 max_dist_m 或坐标缺失时为 -1
+        """
+        max_dist_m = self.max_dist_m if max_dist_m is None else max_dist_m
+        lon = pd.to_numeric(pd.Series(lon), errors="coerce").to_numpy(dtype=float)
+        lat = pd.to_numeric(pd.Series(lat), errors="coerce").to_numpy(dtype=float)
+        n = len(lon)
+        lane_pos = np.full(n, -1, dtype=np.int64)
+        dist = np.full(n, np.inf)
+        ok = np.isfinite(lon) & np.isfinite(lat)
+        if not ok.any():
+            return lane_pos, dist
+
+        x, y = self._project(lon[ok], lat[ok])
+        if self._tree is not None:
+            best_seg, best_d = self._nearest_tree(x, y, max_dist_m)
+        else:
+            best_seg, best_d = self._nearest_grid(x, y)
+
+        hit = (best_seg >= 0) & (best_d <= max_dist_m)
+        out_pos = np.where(hit, self.seg_lane[np.maximum(best_seg, 0)], -1)
+        lane_pos[ok] = out_pos
+        dist[ok] = np.where(hit, best_d, np.inf)
+        return lane_pos, dist
+
+    def _point_segment_dist(self, x, y, seg):
+        """点到线段距离及投影位置 t∈[0, 1]（线段按车道行驶方向）"""
+        ax, ay = self.seg_ax[seg], self.seg_ay[seg]
+        dx, dy = self.seg_bx[seg] - ax, self.seg_by[seg] - ay
+        denom = dx * dx + dy * dy
+        t = np.where(denom > 0, ((x - ax) * dx + (y - ay) * dy) / np.where(denom > 0, denom, 1), 0.0)
+        t = np.clip(t, 0.0, 1.0)
+        return np.hypot(x - (ax + t * dx), y - (ay + t * dy)), t
+
+    def _score(self, x, y, seg):
+        d, t = self._point_segment_dist(x, y, seg)
+        return d + TIE_M * (1.0 - t), d
+
+    # ------------------------------
+    # 与 demand 管线对接
+    # ------------------------------
+    def lane_link_frame(self):
+        """laneId → link_id（与 demand.fetch_lane_links 输出同结构）"""
+        return self.lanes[["laneId", "link_id"]].drop_duplicates().reset_index(drop=True)
+
+    def resolve_frame(self, data, max_dist_m=None):
+        """为每行追加 lane_resolved / link_resolved / lane_dist_m"""
+        pos, dist = self.query(data["longitude"], data["latitude"], max_dist_m)
+        hit = pos >= 0
+        lane = np.where(hit, self.lanes["laneId"].to_numpy()[np.maximum(pos, 0)], None)
+        link = np.where(hit, self.lanes["link_id"].to_numpy()[np.maximum(pos, 0)], None)
+        return data.assign(lane_resolved=lane, link_resolved=link, lane_dist_m=np.where(hit, dist, np.nan))
+
+    def fill_missing_lanes(self, data, max_dist_m=None):
+        """
+        对 laneId 缺失的行按坐标补齐 laneId（turnInfo 同样缺失时一并补齐），
+        返回 (data, 补齐行数)。已有 laneId 的行保持不变。
+        """
+        missing = missing_lane_mask(data["laneId"])
+        if not missing.any():
+            return data, 0
+        sub = data.loc[missing, ["longitude", "latitude"]]
+        pos, _ = self.query(sub["longitude"], sub["latitude"], max_dist_m)
+        hit = pos >= 0
+        if not hit.any():
+            return data, 0
+
+        rows = data.index[missing][hit]
+        lane_rows = self.lanes.iloc[pos[hit]]
+        data = data.copy()
+        data["laneId"] = data["laneId"].astype(object)
+        data.loc[rows, "laneId"] = lane_rows["laneId"].to_numpy()
+        turn_missing = pd.to_numeric(data.loc[rows, "turnInfo"], errors="coerce").isna().to_numpy()
+        if turn_missing.any():
+            data["turnInfo"] = data["turnInfo"].astype(object)
+            data.loc[rows[turn_missing], "turnInfo"] = lane_rows["turnInfo"].to_numpy()[turn_missing]
+        return data, int(hit.sum())
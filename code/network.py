@@ -0,0 +1,276 @@
+"""
+路网 / 干线模式：由 fetch_intersection_links 的 df_inter（intersId, linkId, linkType）构建路段邻接稀疏图，
+逐时段把上游交叉口未满足的需求传播为下游的追加需求
+
+    graph = LinkGraph.from_frame(df_inter)
+    result = propagate_unsatisfied(graph, demand_df, {intersId: capacity_df, ...})
+
+图：节点为各交叉口的 inLink；交叉口 B 的 inLink l → B 的 outLink o，若 o 同时是下游交叉口 C 的 inLink，
+    则 l → o 为一条边，权重为转向分流比（缺省在 B 的全部 outLink 上均分，驶出路网的部分不再传播；
+    可用 turn_shares 覆盖）。
+传播（每个时段一次稀疏矩阵 × 向量）：
+    avail_t  = b_{t-1} + d_t + p_t                        （p_t 为上游传来的追加需求）
+    served_t = min(avail_t, 1.5 * c_t)                    （口径同 compute_utilized_supply_with_backlog）
+    u_t      = min(d_t + p_t, avail_t − served_t)         （本时段到达中未放行的部分，先到先放行）
+    b_t      = avail_t − served_t − r ⊙ u_t               （r 为 P 的列和：传到下游的车辆移出上游队列）
+    p_{t+lag} += P · u_t
+P 为 序列 × 序列 的稀疏算子：上游序列 → 路段（分流比）→ 下游路段内按全时段需求占比分到各流向。
+无容量记录的序列（如右转、缺少相位的交叉口）视为不受限，不产生积压。
+scipy 可选：缺失时用 np.bincount 做 COO 矩阵乘。
+"""
+
+import numpy as np
+import pandas as pd
+
+import supply_demand
+from scenarios import BACKLOG_CAPACITY_FACTOR, backlog_arrays, build_series_arrays
+
+try:
+    from scipy import sparse
+except ImportError:  # scipy 为可选依赖
+    sparse = None
+
+SERIES_KEYS = ["intersId", "link_id", "direction", "movement"]
+
+
+class _SparseOperator:
+    """COO 三元组 → y = A · x；有 scipy 时转 CSR"""
+
+    def __init__(self, rows, cols, vals, shape):
+        self.rows = np.asarray(rows, dtype=np.int64)
+        self.cols = np.asarray(cols, dtype=np.int64)
+        self.vals = np.asarray(vals, dtype=float)
+        self.shape = shape
+        self._csr = sparse.csr_matrix((self.vals, (self.rows, self.cols)), shape=shape) if sparse is not None else None
+
+    @property
+    def nnz(self):
+        return len(self.vals)
+
+    def column_sums(self):
+        """每个上游序列被传到路网内的比例（驶出路网的部分不计）"""
+        return np.bincount(self.cols, weights=self.vals, minlength=self.shape[1])
+
+    def __matmul__(self, x):
+        if self._csr is not None:
+            return self._csr @ x
+        return np.bincount(self.rows, weights=self.vals * x[self.cols], minlength=self.shape[0])
+
+
+# ============================================================
+# 1. 路段邻接图
+# ============================================================
+class LinkGraph:
+    """inLink → 下游 inLink 的加权有向图（links 为节点顺序）"""
+
+    def __init__(self, links, link_inters, rows, cols, shares):
+        self.links = pd.Index(links)
+        self.link_inters = np.asarray(link_inters, dtype=object)
+        self.adjacency = _SparseOperator(rows, cols, shares, (len(links), len(links)))
+
+    @classmethod
+    def from_frame(cls, df_inter, turn_shares=None):
+        """
+        df_inter: fetch_intersection_links 的输出。
+        turn_shares: 可选 DataFrame(from_link, to_link, share)，给出的 from_link 按其分流比，不再均分。
+        """
+        df = df_inter.assign(linkId=df_inter["linkId"].astype(str), intersId=df_inter["intersId"].astype(str))
+        ins = df[df["linkType"] == "inLink"].drop_duplicates("linkId")
+        outs = df[df["linkType"] == "outLink"].drop_duplicates(["intersId", "linkId"])
+
+        links = ins["linkId"].tolist()
+        pos = pd.Index(links)
+
+        # l (B 的 inLink) × o (B 的 outLink)，均分
+        pairs = ins[["intersId", "linkId"]].merge(
+            outs[["intersId", "linkId"]].rename(columns={"linkId": "to_link"}), on="intersId"
+        ).rename(columns={"linkId": "from_link"})
+        pairs["share"] = 1.0 / pairs.groupby("from_link")["to_link"].transform("size")
+
+        if turn_shares is not None and not turn_shares.empty:
+            given = turn_shares.assign(
+                from_link=turn_shares["from_link"].astype(str), to_link=turn_shares["to_link"].astype(str)
+            )[["from_link", "to_link", "share"]]
+            pairs = pd.concat([pairs[~pairs["from_link"].isin(given["from_link"])], given], ignore_index=True)
+
+        src = pos.get_indexer(pairs["from_link"])
+        dst = pos.get_indexer(pairs["to_link"])
+        keep = (src >= 0) & (dst >= 0) & (src != dst)
+        # 行 = 下游，列 = 上游：p = A · u
+        return cls(links, ins["intersId"].to_numpy(), dst[keep], src[keep], pairs["share"].to_numpy(dtype=float)[keep])
+
+    def __len__(self):
+        return len(self.links)
+
+    def edges(self):
+        """DataFrame(from_link, to_link, share)"""
+        a = self.adjacency
+        return pd.DataFrame({"from_link": self.links[a.cols], "to_link": self.links[a.rows], "share": a.vals})
+
+    def downstream(self, link_id):
+        a = self.adjacency
+        i = self.links.get_loc(str(link_id))
+        return self.links[a.rows[a.cols == i]].tolist()
+
+    def upstream(self, link_id):
+        a = self.adjacency
+        i = self.links.get_loc(str(link_id))
+        return self.links[a.cols[a.rows == i]].tolist()
+
+
+# ============================================================
+# 2. 序列数组
+# ============================================================
+def _beijing_naive(t):
+    t = pd.to_datetime(t)
+    return t.dt.tz_convert("Asia/Shanghai").dt.tz_localize(None) if t.dt.tz is not None else t
+
+
+def network_series_arrays(graph, demand_df, capacities, beginTime=None, endTime=None):
+    """
+    demand_df: 含 link_id 的需求长表（多个交叉口可合在一起；Direction 列自动改为 direction）；
+    capacities: {intersId: capacity_df}。需求按 link_id 归属交叉口后，与容量按
+    (intersId, time_bin, direction, movement) 一次合并（口径同 run_resilience_analysis，缺失容量记 0），
+    整理为 build_series_arrays 的 序列 × 时间 数组，series 含 intersId；另加 capped（序列是否有容量记录）。
+    """
+    if "direction" not in demand_df.columns and "Direction" in demand_df.columns:
+        demand_df = demand_df.rename(columns={"Direction": "direction"})
+    inter_of = pd.Series(graph.link_inters, index=graph.links)
+    link_ids = demand_df["link_id"].astype(str)
+    dem = demand_df.assign(link_id=link_ids, intersId=link_ids.map(inter_of), time_bin=_beijing_naive(demand_df["time_bin"]))
+    dem = dem[dem["intersId"].notna()]
+
+    keys = ["intersId", "time_bin", "direction", "movement"]
+    cap_cols = ["cleaned_capacity", "green_ratio", "lane_count"]
+    cap_parts = []
+    for iid, cap in (capacities or {}).items():
+        if cap is None or cap.empty:
+            continue
+        cap = cap.assign(intersId=str(iid), time_bin=_beijing_naive(cap["time_bin"]))
+        cap_parts.append(cap[keys + [c for c in cap_cols if c in cap.columns]])
+    cap = pd.concat(cap_parts, ignore_index=True) if cap_parts else pd.DataFrame(columns=keys + cap_cols)
+    for col in cap_cols:
+        if col not in cap.columns:
+            cap[col] = np.nan
+
+    begin = supply_demand._parse_beijing_time(beginTime)
+    end = supply_demand._parse_beijing_time(endTime)
+    if begin is not None:
+        dem = dem[dem["time_bin"] >= begin.tz_localize(None)]
+    if end is not None:
+        dem = dem[dem["time_bin"] <= end.tz_localize(None)]
+
+    merged = dem.drop(columns=cap_cols, errors="ignore").merge(cap, on=keys, how="left")
+    merged["smoothed_demand"] = pd.to_numeric(merged["smoothed_demand"], errors="coerce").fillna(0)
+    arrays = build_series_arrays(merged, SERIES_KEYS)
+
+    # 有容量记录（lane_count / green_ratio / cleaned_capacity 任一非空）才视为受限
+    capped = np.isfinite(arrays["lane_count"]) | np.isfinite(arrays["green_ratio"]) | np.isfinite(arrays["capacity"])
+    arrays["capped"] = capped.any(axis=1)
+    arrays["capacity"] = np.nan_to_num(arrays["capacity"])
+    return arrays
+
+
+def series_operator(graph, arrays):
+    """序列 × 序列 传播算子：上游序列 → 上游路段 → 下游路段（分流比）→ 下游各流向（需求占比）"""
+    series = arrays["series"]
+    link_of = graph.links.get_indexer(series["link_id"].astype(str))
+    S = len(series)
+
+    # 下游路段内各序列的需求占比（全时段合计；全为 0 时均分）
+    total = np.nansum(arrays["demand"], axis=1)
+    valid = link_of >= 0
+    li = np.maximum(link_of, 0)
+    link_total = np.bincount(link_of[valid], weights=total[valid], minlength=len(graph))[li]
+    link_n = np.bincount(link_of[valid], minlength=len(graph))[li]
+    split = np.where(link_total > 0, total / np.where(link_total > 0, link_total, 1.0), 1.0 / np.maximum(link_n, 1))
+    split[~valid] = 0.0
+
+    # 路段 → 其下的序列（CSR 风格分组）
+    order = np.argsort(np.where(valid, link_of, len(graph)), kind="stable")
+    counts = np.bincount(link_of[valid], minlength=len(graph))
+    starts = np.concatenate([[0], np.cumsum(counts)])
+
+    a = graph.adjacency
+    src_series = np.flatnonzero(valid)
+    # 上游序列 s（路段 l）× 边 l → l'：每条边展开到 l' 下的全部序列
+    edge_by_src = pd.Series(np.arange(a.nnz)).groupby(a.cols).apply(list).to_dict() if a.nnz else {}
+    rows, cols, vals = [], [], []
+    for s in src_series:
+        for e in edge_by_src.get(link_of[s], ()):
+            dst_link = a.rows[e]
+            members = order[starts[dst_link]:starts[dst_link + 1]]
+            rows.append(members)
+            cols.append(np.full(len(members), s))
+            vals.append(a.vals[e] * split[members])
+    if rows:
+        rows, cols, vals = np.concatenate(rows), np.concatenate(cols), np.concatenate(vals)
+    return _SparseOperator(rows, cols, vals, (S, S))
+
+
+# ============================================================
+# 3. 逐时段传播
+# ============================================================
+def propagate_arrays(operator, demand, capacity, present, capped, lag_bins=1):
+    """
+    demand / capacity / present: 序列 × 时间；capped: 序列（False 的序列不受容量限制）。
+    返回 dict：propagated（上游传来的追加需求）、unsatisfied（积压）、served（放行量），均为 序列 × 时间；
+    in_transit（序列）为最后 lag_bins 个时段内传出、尚未到达下游的量。
+    传到下游的未放行车辆从上游积压中移出（驶出路网的部分仍留在上游积压），车辆守恒：
+        Σ demand = Σ served + Σ unsatisfied[:, -1] + Σ in_transit
+    """
+    if lag_bins < 1:
+        raise ValueError("lag_bins 至少为 1（同一时段内的传播需要迭代求解）")
+    S, T = demand.shape
+    d = np.where(present, np.nan_to_num(demand), 0.0)
+    limit = np.where(capped[:, None], np.nan_to_num(capacity) * BACKLOG_CAPACITY_FACTOR, np.inf)
+    limit = np.where(present, limit, 0.0)
+
+    pending = np.zeros((T + lag_bins, S))
+    backlog = np.zeros((S, T))
+    served = np.zeros((S, T))
+    b = np.zeros(S)
+    routed = operator.column_sums()
+    for t in range(T):
+        arrivals = d[:, t] + pending[t]
+        avail = b + arrivals
+        out = np.minimum(avail, limit[:, t])
+        b = avail - out
+        u = np.minimum(arrivals, b)
+        if u.any():
+            pending[t + lag_bins] += operator @ u
+            # 已传到下游的车辆不再留在上游队列中
+            b = b - u * routed
+        backlog[:, t] = b
+        served[:, t] = out
+
+    return {"propagated": pending[:T].T, "unsatisfied": backlog, "served": served,
+            "in_transit": pending[T:].sum(axis=0)}
+
+
+def propagate_unsatisfied(graph, demand_df, capacities, lag_bins=1, beginTime=None, endTime=None):
+    """
+    每 序列 × 时段 一行：time_bin, intersId, link_id, direction, movement, demand, capacity,
+    propagated_demand, network_demand, unsatisfied_local（孤立交叉口口径）, unsatisfied_network。
+    """
+    arrays = network_series_arrays(graph, demand_df, capacities, beginTime, endTime)
+    series, present = arrays["series"], arrays["present"]
+    if present.size == 0:
+        return pd.DataFrame(columns=["time_bin", *SERIES_KEYS, "demand", "capacity", "propagated_demand",
+                                     "network_demand", "unsatisfied_local", "unsatisfied_network"])
+
+    demand, capacity, capped = np.nan_to_num(arrays["demand"]), arrays["capacity"], arrays["capped"]
+    local, _ = backlog_arrays(demand, capacity, present)
+    local = np.where(capped[:, None], local, 0.0)
+    net = propagate_arrays(series_operator(graph, arrays), demand, capacity, present, capped, lag_bins)
+
+    s_idx, t_idx = np.nonzero(present)
+    out = series.iloc[s_idx].reset_index(drop=True)
+    out.insert(0, "time_bin", arrays["times"][t_idx])
+    out["demand"] = demand[s_idx, t_idx]
+    out["capacity"] = np.where(capped[s_idx], capacity[s_idx, t_idx], np.nan)
+    out["propagated_demand"] = net["propagated"][s_idx, t_idx]
+    out["network_demand"] = out["demand"] + out["propagated_demand"]
+    out["unsatisfied_local"] = np.nan_to_num(local[s_idx, t_idx])
+    out["unsatisfied_network"] = net["unsatisfied"][s_idx, t_idx]
+    return out.sort_values(["time_bin", *SERIES_KEYS], ignore_index=True)
@@ -0,0 +1,256 @@
+"""
+一站式 queryAll：demand 与信号分析两条分支并行，DataFrame 在内存中传递，不写中间文件
+
+    resp, frames, stats = run_query_all(
+        inters_ids=["189390105904356353"], kafka_file_path="kafka_data_1.txt",
+        cross_id="117", signal_file="signal.txt", phase_map_path="phase_map.xlsx",
+        beginTime="2025-03-07 00:00:00", endTime="2025-03-07 17:00:00",
+        return_frames=True, return_stats=True,
+    )
+
+    python orchestrator.py --inters 189390105904356353 --kafka kafka_data_1.txt \\
+        --cross-id 117 --signal signal.txt --phase-map phase_map.xlsx \\
+        --begin "2025-03-07 00:00:00" --end "2025-03-07 17:00:00" --out resp.json
+
+对应 test.ipynb 的三段手工流程：
+  demand 分支   run_pipeline → lane66_df / final_df（原先写 117lane_2.csv）
+  signal 分支   相位映射 → 信号分析 → 15min 聚合（原先 calculate_green_occ 写临时绿信比 CSV，这里写 os.devnull）
+  汇合          lane66_df 直接传给 match_lane_and_capacity → 过滤 → build_queryAll_response
+两条分支互不依赖，用线程并行（HTTP 与文件读取为主）；pandas / demand / supply 等在函数内延迟导入，
+命令行 --help 与参数校验不需要加载它们，缺少 TFlight_old 时 demand 分支也可单独使用（signal_file=None）。
+"""
+
+import argparse
+import json
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+DEFAULT_SIGNAL_URL = "http://172.30.11.143:8086/yzsfq/getTrafficLightsByIntersectionId.do"
+
+
+def _run_demand(inters_ids, kafka_file_path, beginTime, endTime, lane_index):
+    import demand
+
+    res = demand.run_pipeline(
+        inters_ids, kafka_file_path, beginTime=beginTime, endTime=endTime,
+        lane_index=lane_index, return_stats=True,
+    )
+    return res.lane66_df, res.final_df, res.stats
+
+
+def _run_signal(base_url, cross_id, phase_map_path, signal_file, signal_checkpoint=None, sketches=False):
+    from instrumentation import PipelineStats
+    import supply
+
+    stats = PipelineStats("supply.signal_stages")
+    with stats.run():
+        out = supply.run_signal_stages(base_url, cross_id, phase_map_path, signal_file, None, stats,
+                                       return_sketches=sketches, signal_checkpoint_path=signal_checkpoint)
+    agg_df, sketch_df = out if sketches else (out, None)
+    return agg_df, sketch_df, stats
+
+
+def run_query_all(
+    inters_ids,
+    kafka_file_path,
+    cross_id=None,
+    signal_file=None,
+    phase_map_path=None,
+    base_url=DEFAULT_SIGNAL_URL,
+    beginTime=None,
+    endTime=None,
+    direction=-1,
+    movement=-1,
+    queries=None,
+    frequency=2,
+    max_points=None,
+    forecast_horizon=None,
+    lane_index=None,
+    signal_checkpoint=None,
+    sketches=False,
+    parallel=True,
+    return_frames=False,
+    return_stats=False,
+):
+    """
+    返回 build_queryAll_response 的 dict；queries 为 [(direction, movement), ...] 时忽略 direction / movement，
+    改用 build_queryAll_batch 返回与 queries 一一对应的 list。return_frames=True 时追加
+    {"lane66": ..., "demand": ..., "capacity": ..., "forecast": ..., "sketches": ...}
+    （sketches 为周期 / 绿信比分位数草图，见 sketches.py，仅 sketches=True 时计算，否则为 None）；return_stats=True 时再追加
+    {"demand": PipelineStats, "signal": PipelineStats, "orchestrator": PipelineStats}。
+    signal_file=None 时跳过信号分支（容量为空，只输出需求曲线）。
+    signal_checkpoint: 信号分析检查点路径；给定时只分析 signal_file 新追加的部分（见 signal_cycles.py）。
+    parallel=False 时两条分支顺序执行（便于调试 / 对比耗时）。
+    """
+    from instrumentation import PipelineStats
+
+    stats = PipelineStats("orchestrator.run_query_all")
+    with stats.run():
+        with stats.stage("branches") as st:
+            with_signal = signal_file is not None
+            if parallel and with_signal:
+                with ThreadPoolExecutor(max_workers=2, thread_name_prefix="query_all") as pool:
+                    demand_future = pool.submit(_run_demand, inters_ids, kafka_file_path, beginTime, endTime, lane_index)
+                    signal_future = pool.submit(_run_signal, base_url, cross_id, phase_map_path, signal_file,
+                                                signal_checkpoint, sketches)
+                    lane66_df, final_df, demand_stats = demand_future.result()
+                    agg_df, sketch_df, signal_stats = signal_future.result()
+            else:
+                lane66_df, final_df, demand_stats = _run_demand(inters_ids, kafka_file_path, beginTime, endTime, lane_index)
+                agg_df, sketch_df, signal_stats = (
+                    _run_signal(base_url, cross_id, phase_map_path, signal_file, signal_checkpoint, sketches)
+                    if with_signal else (None, None, None)
+                )
+            st.rows_out = len(final_df)
+            st.extra["parallel"] = bool(parallel and with_signal)
+
+        import supply_demand
+
+        capacity_df = None
+        if agg_df is not None:
+            import supply
+
+            with stats.stage("match_lane_capacity", rows_in=len(agg_df)) as st:
+                capacity_df = supply.match_lane_and_capacity(agg_df, lane66_df)
+                capacity_df = supply.filter_capacity(capacity_df, beginTime, endTime)
+                st.rows_out = len(capacity_df)
+
+        # run_pipeline 的方向列为 Direction，供需合并使用 direction
+        demand_df = final_df.rename(columns={"Direction": "direction"})
+
+        forecast_df = None
+        if forecast_horizon:
+            import forecast
+
+            with stats.stage("forecast", rows_in=len(demand_df)) as st:
+                forecast_df = forecast.forecast_demand(demand_df, horizon=int(forecast_horizon))
+                st.rows_out = len(forecast_df)
+
+        with stats.stage("query_response", rows_in=len(demand_df)) as st:
+            if queries is not None:
+                resp = supply_demand.build_queryAll_batch(
+                    capacity_df=capacity_df,
+                    demand_df=demand_df,
+                    beginTime=beginTime,
+                    endTime=endTime,
+                    queries=queries,
+                    frequency=frequency,
+                    max_points=max_points,
+                    forecast_df=forecast_df,
+                )
+                st.rows_out = sum(len(r["data"]["trafficDemand"]) for r in resp)
+                st.extra["queries"] = len(resp)
+            else:
+                resp = supply_demand.build_queryAll_response(
+                    capacity_df=capacity_df,
+                    demand_df=demand_df,
+                    beginTime=beginTime,
+                    endTime=endTime,
+                    direction=direction,
+                    movement=movement,
+                    frequency=frequency,
+                    max_points=max_points,
+                    forecast_df=forecast_df,
+                )
+                st.rows_out = len(resp["data"]["trafficDemand"])
+
+    out = (resp,)
+    if return_frames:
+        out += ({"lane66": lane66_df, "demand": demand_df, "capacity": capacity_df, "forecast": forecast_df,
+                 "sketches": sketch_df},)
+    if return_stats:
+        out += ({"demand": demand_stats, "signal": signal_stats, "orchestrator": stats},)
+    return out[0] if len(out) == 1 else out
+
+
+# ============================================================
+# 命令行
+# ============================================================
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="demand + signal → queryAll response in one run")
+    parser.add_argument("--inters", required=True, help="逗号分隔的 intersId")
+    parser.add_argument("--kafka", required=True, help="Kafka 感知 dump（可为 gzip / zstd）")
+    parser.add_argument("--cross-id", default=None, help="信号机路口编号，如 117")
+    parser.add_argument("--signal", default=None, help="信号相位文件；缺省时只输出需求曲线")
+    parser.add_argument("--phase-map", default="phase_map.xlsx")
+    parser.add_argument("--base-url", default=DEFAULT_SIGNAL_URL)
+    parser.add_argument("--begin", default=None, help="YYYY-MM-DD HH:MM:SS（北京时间）")
+    parser.add_argument("--end", default=None)
+    parser.add_argument("--direction", default="-1", help="如 S-L / N；-1 表示全部")
+    parser.add_argument("--movement", default="-1", help="L / T / R 或全称；-1 表示全部")
+    parser.add_argument("--queries", default=None,
+                        help="批量查询，逗号分隔的 方向/转向，如 N/L,S/-1,-1/T；给定时忽略 --direction / --movement，输出 list")
+    parser.add_argument("--frequency", type=int, default=2, choices=[1, 2], help="1 = 5min，2 = 15min")
+    parser.add_argument("--max-points", type=int, default=None)
+    parser.add_argument("--forecast", type=int, default=None, help="预测未来 N 个时段")
+    parser.add_argument("--lane-snapshot", default=None, help="车道几何快照，启用本地 laneId → link_id 解析")
+    parser.add_argument("--serial", action="store_true", help="两条分支顺序执行")
+    parser.add_argument("--stats", action="store_true", help="在 stderr 打印各阶段耗时")
+    parser.add_argument("--out", default=None, help="响应 JSON 输出路径，缺省打印到 stdout")
+    parser.add_argument("--sketches", default=None, help="周期 / 绿信比分位数草图 CSV 输出路径（需 --signal）")
+    parser.add_argument("--signal-checkpoint", default=None,
+                        help="信号分析检查点 JSON；给定时只分析 --signal 新追加的部分，绿信比累积在检查点旁")
+    args = parser.parse_args(argv)
+
+    if args.signal is not None and args.cross_id is None:
+        parser.error("--signal 需要同时给出 --cross-id")
+
+    lane_index = None
+    if args.lane_snapshot:
+        from lane_index import LaneIndex
+
+        lane_index = LaneIndex.from_snapshot(args.lane_snapshot)
+
+    queries = None
+    if args.queries:
+        queries = []
+        for item in args.queries.split(","):
+            d, _, m = item.strip().partition("/")
+            queries.append((-1 if d in ("", "-1") else d, -1 if m in ("", "-1") else m))
+
+    t0 = time.perf_counter()
+    resp, frames, stats = run_query_all(
+        inters_ids=[s for s in args.inters.split(",") if s],
+        kafka_file_path=args.kafka,
+        cross_id=args.cross_id,
+        signal_file=args.signal,
+        phase_map_path=args.phase_map,
+        base_url=args.base_url,
+        beginTime=args.begin,
+        endTime=args.end,
+        direction=-1 if args.direction == "-1" else args.direction,
+        movement=-1 if args.movement == "-1" else args.movement,
+        queries=queries,
+        frequency=args.frequency,
+        max_points=args.max_points,
+        forecast_horizon=args.forecast,
+        lane_index=lane_index,
+        signal_checkpoint=args.signal_checkpoint,
+        sketches=bool(args.sketches),
+        parallel=not args.serial,
+        return_frames=True,
+        return_stats=True,
+    )
+
+    text = json.dumps(resp, ensure_ascii=False, indent=2)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            f.write(text)
+    else:
+        print(text)
+
+    if args.sketches and frames["sketches"] is not None:
+        from sketches import write_sketches
+
+        write_sketches(frames["sketches"], args.sketches)
+
+    if args.stats:
+        for s in stats.values():
+            if s is not None:
+                print(s.summary(), file=sys.stderr)
+        print(f"total {time.perf_counter() - t0:.3f}s", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,187 @@
+"""
+探索性查询的抽样近似模式：按 uuid 的确定性哈希抽取固定比例的车辆（同一车辆的全部记录要么都保留、要么都丢弃），
+需求计数按 1 / rate 放大，并给出每个时段的置信区间
+
+    sample = UuidSample(0.05)                      # 5%，seed 相同则抽中的车辆相同（跨进程、跨运行可复现）
+    data = demand.parse_kafka_file(path, sample=sample)
+    low, high = count_interval(k, 0.05)            # 抽中 k 辆时总量的 95% 区间
+
+抽样发生在 json.loads 之前：先用正则从 value 原始字节里取出 uuid（C 层面的 findall + 集合运算），
+不含抽中车辆的消息不解析；含抽中车辆的消息只解析这些 target 的 {...} 片段，
+片段定位不到（"uuid": "…" 带空格等）、不是扁平对象、或找不到消息级 timestamp 时退回整条解析。因此解析耗时大致按抽样比例下降。
+
+以车辆为抽样单元，首次出现计数 k ~ Binomial(N, rate)，N_hat = k / rate 无偏；
+区间为已知 rate 下 N 的精确区间（与负二项分布的对偶关系，需要 scipy），缺 scipy 时用正态近似。
+"""
+
+import hashlib
+import json
+import re
+
+import numpy as np
+
+CONFIDENCE = 0.95
+
+_UUID = re.compile(rb'"uuid"\s*:\s*"?([^",}\s]*)')
+_UUID_COMPACT = re.compile(rb'"uuid":"([^"]*)"')
+_TIMESTAMP = re.compile(rb'"timestamp"\s*:\s*(-?\d+)')
+_TARGETS = re.compile(rb'"targets"\s*:')
+
+
+class UuidSample:
+    """
+    按 blake2b(seed, uuid) 的前 64 位抽样：值 < rate × 2^64 的车辆入样。
+    seen / kept 为已判定 / 已入样的 uuid（bytes），每个 uuid 只算一次哈希。
+    """
+
+    def __init__(self, rate, seed=0):
+        if not 0 < rate <= 1:
+            raise ValueError(f"sample rate must be in (0, 1]: {rate}")
+        self.rate = float(rate)
+        self.seed = int(seed)
+        self._key = str(self.seed).encode()
+        self._threshold = min(int(self.rate * 2 ** 64), 2 ** 64)
+        self.seen = set()
+        self.kept = set()
+        self.messages = 0
+        self.decoded = 0
+        self.fallbacks = 0
+
+    @classmethod
+    def coerce(cls, sample, seed=0):
+        """None / 比例 / UuidSample → UuidSample 或 None"""
+        if sample is None or isinstance(sample, cls):
+            return sample
+        return cls(sample, seed)
+
+    def keeps(self, uuid):
+        """单个 uuid（str / bytes / 数字）是否入样"""
+        if not isinstance(uuid, bytes):
+            uuid = str(uuid).encode()
+        digest = hashlib.blake2b(uuid, digest_size=8, key=self._key).digest()
+        return int.from_bytes(digest, "little") < self._threshold
+
+    def _admit(self, uuids):
+        for u in set(uuids).difference(self.seen):
+            self.seen.add(u)
+            if self.keeps(u):
+                self.kept.add(u)
+
+    def reduce(self, value):
+        """
+        value（Kafka 消息 JSON，bytes / str）→ 只含抽中 target 的消息 dict {"timestamp", "targets"}；
+        没有抽中的 target 时返回 None（不解析），value 不是合法 JSON 时同样返回 None
+        """
+        self.messages += 1
+        raw = value.encode("utf-8") if isinstance(value, str) else bytes(value)
+        uuids = _UUID_COMPACT.findall(raw)
+        if len(uuids) != raw.count(b'"uuid"'):
+            uuids = _UUID.findall(raw)   # 带空格或数字 uuid
+        if not uuids:
+            return None
+        if not self.seen.issuperset(uuids):
+            self._admit(uuids)
+        hits = self.kept.intersection(uuids)
+        if not hits:
+            return None
+
+        self.decoded += 1
+        if 2 * len(hits) > len(uuids):
+            # 抽中过半时整条解析更快
+            return self._reduce_full(raw)
+        targets = _sampled_targets(raw, hits)
+        timestamp = _message_timestamp(raw)
+        if targets is None or timestamp is None:
+            self.fallbacks += 1
+            return self._reduce_full(raw)
+        return {"timestamp": timestamp, "targets": targets}
+
+    def _reduce_full(self, raw):
+        """整条解析后按 uuid 过滤 target"""
+        try:
+            data = json.loads(raw)
+        except ValueError:
+            return None
+        targets = [t for t in data.get("targets") or [] if str(t.get("uuid")).encode() in self.kept]
+        return {"timestamp": data.get("timestamp"), "targets": targets} if targets else None
+
+    def summary(self):
+        return {
+            "sample_rate": self.rate,
+            "sample_seed": self.seed,
+            "sampled_uuids": len(self.kept),
+            "seen_uuids": len(self.seen),
+            "decoded_messages": self.decoded,
+            "decode_fallbacks": self.fallbacks,
+        }
+
+
+def _sampled_targets(raw, hits):
+    """
+    抽中 uuid 所在的扁平 {...} 片段逐个解析（按在消息中的先后顺序）；
+    定位不到、或片段不是以该 uuid 为键的扁平对象时返回 None（由调用方整条解析）
+    """
+    found = []
+    for u in hits:
+        needle = b'"uuid":"' + u + b'"'
+        pos = raw.find(needle)
+        if pos < 0:
+            return None
+        while pos >= 0:
+            found.append((pos, u))
+            pos = raw.find(needle, pos + len(needle))
+    found.sort()
+
+    # 各片段拼成一个 JSON 数组一次解析；片段不是完整扁平对象时整体解析失败
+    pieces = []
+    for pos, _ in found:
+        begin = raw.rfind(b"{", 0, pos)
+        end = raw.find(b"}", pos)
+        if begin < 0 or end < 0:
+            return None
+        pieces.append(raw[begin:end + 1])
+    try:
+        targets = json.loads(b"[" + b",".join(pieces) + b"]")
+    except ValueError:
+        return None
+    for target, (_, u) in zip(targets, found):
+        if not isinstance(target, dict) or str(target.get("uuid")).encode() != u:
+            return None
+    return targets
+
+
+def _message_timestamp(raw):
+    """消息级 timestamp：须出现在 "targets" 键之前（避免取到 target 内的同名字段）"""
+    ts = _TIMESTAMP.search(raw)
+    tg = _TARGETS.search(raw)
+    if ts is None or tg is None or ts.start() > tg.start():
+        return None
+    return int(ts.group(1))
+
+
+# ============================================================
+# 放大与置信区间
+# ============================================================
+def count_interval(k, rate, confidence=CONFIDENCE):
+    """
+    抽中 k 个单元（抽样比例 rate）时总量 N 的置信区间 (low, high)，k 可为数组。
+    k ~ Binomial(N, rate)：P(K ≥ k | N) = NB(k, rate).cdf(N - k)，由此反解上下界；rate = 1 时区间退化为 [k, k]。
+    """
+    k = np.asarray(k, dtype=float)
+    alpha = 1.0 - confidence
+    if rate >= 1:
+        return k.copy(), k.copy()
+    # scipy 只在真正需要区间时导入：import demand / sampling 不承担其加载开销
+    try:
+        from scipy import stats
+    except ImportError:  # scipy 为可选依赖
+        stats = None
+    if stats is not None:
+        low = k + np.where(k > 0, stats.nbinom.ppf(alpha / 2, np.maximum(k, 1), rate), 0.0)
+        high = k + stats.nbinom.ppf(1 - alpha / 2, k + 1, rate)
+        return low, high
+    # 正态近似：Var(k / rate) ≈ k (1 - rate) / rate²，下界不低于已观测的 k
+    z = {0.9: 1.6449, 0.95: 1.9600, 0.99: 2.5758}.get(round(confidence, 2), 1.9600)
+    est = k / rate
+    half = z * np.sqrt(np.maximum(k, 1.0) * (1 - rate)) / rate
+    return np.maximum(est - half, k), est + half
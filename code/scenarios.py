@@ -0,0 +1,254 @@
+"""
+What-if 情景批量评估：容量倍数 / 绿信比覆盖 / 需求增长 → 积压与韧性指标
+
+    scens = scenario_grid(capacity_scale=[0.8, 1.0, 1.2], demand_growth=[1.0, 1.1])
+    table = evaluate_scenarios(capacity_df, demand_df, scens, beginTime=..., endTime=...)
+
+供需长表只合并一次（supply_demand.run_resilience_analysis），随后整理为 序列 × 时间 的稠密数组，
+所有情景在 情景 × 序列 × 时间 的数组上一次算完：
+  - 容量：cleaned_capacity = green_ratio * lane_count * SATURATION_FLOW（与 supply.py 一致），再乘 capacity_scale
+  - 韧性：口径同 compute_resilience_metrics（gap = demand − min(demand, capacity)，05 点为基线）
+  - 积压：口径同 compute_utilized_supply_with_backlog（容量 × 1.5），
+          递推 b_t = max(0, b_{t-1} + d_t − c_t) 用累加和的闭式解 b_t = S_t − min(0, min_{k≤t} S_k) 向量化
+
+情景为 dict：
+    {"name": "绿信比+10%", "capacity_scale": 1.0, "demand_growth": 1.0,
+     "green_ratio": 0.45 或 {("N", "Through"): 0.45, ...}}
+缺省字段即不改变；green_ratio 为 dict 时只覆盖列出的 (direction, movement)。
+"""
+
+import itertools
+
+import numpy as np
+import pandas as pd
+
+import supply_demand
+
+SATURATION_FLOW = 1200
+
+# compute_utilized_supply_with_backlog 中的容量放大系数
+BACKLOG_CAPACITY_FACTOR = 1.5
+
+SCENARIO_FIELDS = ("capacity_scale", "demand_growth", "green_ratio")
+
+
+def scenario_grid(capacity_scale=(1.0,), demand_growth=(1.0,), green_ratio=(None,)):
+    """三类参数的笛卡尔积 → 情景列表（green_ratio=None 表示不覆盖）"""
+    out = []
+    for cs, dg, gr in itertools.product(capacity_scale, demand_growth, green_ratio):
+        name = f"cap×{cs:g} dem×{dg:g}" + ("" if gr is None else f" g={gr:g}")
+        out.append({"name": name, "capacity_scale": cs, "demand_growth": dg, "green_ratio": gr})
+    return out
+
+
+# ============================================================
+# 1. 长表 → 序列 × 时间 稠密数组
+# ============================================================
+def build_series_arrays(merged, series_keys=None):
+    """
+    merged: run_resilience_analysis 返回的合并长表。
+    series_keys 缺省为 direction, movement（存在 link_id 时追加，使 (序列, 时间) 唯一）；
+    同一 (序列, 时间) 多行时取均值。返回 dict：
+      times (DatetimeIndex, T), series (DataFrame, S), demand / capacity / green_ratio / lane_count (S × T，缺失为 NaN)
+    """
+    if series_keys is None:
+        series_keys = ["direction", "movement"] + (["link_id"] if "link_id" in merged.columns else [])
+    series_keys = list(series_keys)
+
+    merged = merged[merged["time_bin"].notna()]
+    t_code, times = pd.factorize(merged["time_bin"], sort=True)
+    grouped = merged.groupby(series_keys, dropna=False, sort=True)
+    s_code = grouped.ngroup().to_numpy()
+    series = grouped.size().reset_index()[series_keys]
+    S, T = len(series), len(times)
+
+    def _dense(col):
+        if col not in merged.columns:
+            return np.full((S, T), np.nan)
+        v = pd.to_numeric(merged[col], errors="coerce").to_numpy(dtype=float)
+        total = np.zeros((S, T))
+        count = np.zeros((S, T))
+        ok = np.isfinite(v)
+        np.add.at(total, (s_code[ok], t_code[ok]), v[ok])
+        np.add.at(count, (s_code[ok], t_code[ok]), 1)
+        return np.divide(total, count, out=np.full((S, T), np.nan), where=count > 0)
+
+    present = np.zeros((S, T), dtype=bool)
+    present[s_code, t_code] = True
+    return {
+        "times": pd.DatetimeIndex(times),
+        "series": series,
+        "present": present,
+        "demand": _dense("smoothed_demand"),
+        "capacity": _dense("cleaned_capacity"),
+        "green_ratio": _dense("green_ratio"),
+        "lane_count": _dense("lane_count"),
+    }
+
+
+# ============================================================
+# 2. 情景参数 → 情景 × 序列 数组
+# ============================================================
+def _scenario_params(scenarios, series):
+    K, S = len(scenarios), len(series)
+    cap_scale = np.ones(K)
+    growth = np.ones(K)
+    green = np.full((K, S), np.nan)
+
+    def _factor(sc, key):
+        # 显式给出的 0 有效（如 capacity_scale=0 表示进口关闭），缺省 / None 为 1
+        v = sc.get(key)
+        v = float(1.0 if v is None else v)
+        if v < 0:
+            raise ValueError(f"{key} must be >= 0: {v}")
+        return v
+
+    dm = list(zip(series["direction"], series["movement"]))
+    for k, sc in enumerate(scenarios):
+        cap_scale[k] = _factor(sc, "capacity_scale")
+        growth[k] = _factor(sc, "demand_growth")
+        gr = sc.get("green_ratio")
+        if gr is None:
+            continue
+        if isinstance(gr, dict):
+            for s, key in enumerate(dm):
+                if key in gr:
+                    green[k, s] = float(gr[key])
+        else:
+            green[k, :] = float(gr)
+    return cap_scale, growth, green
+
+
+def _scenario_capacity(arrays, cap_scale, green):
+    """K × S × T 容量：有绿信比覆盖时按 green * lane_count * 1200 重算（无车道数时按原绿信比等比缩放）"""
+    base = np.nan_to_num(arrays["capacity"])[None, :, :]
+    g_new = green[:, :, None]
+    lanes = arrays["lane_count"][None, :, :]
+    g_old = arrays["green_ratio"][None, :, :]
+    from_lanes = g_new * lanes * SATURATION_FLOW
+    from_ratio = np.divide(base * g_new, g_old, out=np.full(np.broadcast_shapes(base.shape, g_new.shape, g_old.shape), np.nan),
+                           where=np.isfinite(g_old) & (g_old > 0))
+    overridden = np.where(np.isfinite(from_lanes), from_lanes, from_ratio)
+    cap = np.where(np.isfinite(g_new) & np.isfinite(overridden), overridden, base)
+    return cap * cap_scale[:, None, None]
+
+
+# ============================================================
+# 3. 指标
+# ============================================================
+def _resilience(demand, capacity, present, hour5):
+    """口径同 compute_resilience_metrics；返回 (gap_mean, gap_max, OR, DR)，形状 K × S"""
+    gap = np.where(present, demand - np.minimum(demand, capacity), 0.0)
+    n = present.sum(axis=-1)
+    gap_mean = np.divide(gap.sum(axis=-1), n, out=np.full(gap.shape[:-1], np.nan), where=n > 0)
+    gap_max = np.where(n > 0, np.where(present, gap, -np.inf).max(axis=-1), np.nan)
+
+    p5 = present & hour5
+    n5 = p5.sum(axis=-1)
+    base5 = np.divide(np.where(p5, gap, 0.0).sum(axis=-1), n5, out=np.full(gap.shape[:-1], np.nan), where=n5 > 0)
+    baseline = np.where(n5 > 0, base5, gap_mean)
+
+    valid = np.isfinite(baseline) & (baseline != 0)
+    safe = np.where(valid, baseline, 1.0)
+    OR = np.where(valid, 1 - gap_mean / safe, np.nan)
+    DR = np.where(valid, 1 - gap_max / safe, np.nan)
+    return gap_mean, gap_max, OR, DR
+
+
+def backlog_arrays(demand, capacity, present):
+    """
+    积压递推的闭式解（Lindley）：x_t = d_t − 1.5 c_t，S_t = Σx，b_t = S_t − min(0, min_{k≤t} S_k)。
+    缺失时刻 x_t = 0（积压原样携带）。返回 (unsatisfied, utilized)，与输入同形。
+    """
+    x = np.where(present, demand - capacity * BACKLOG_CAPACITY_FACTOR, 0.0)
+    S = np.cumsum(x, axis=-1)
+    backlog = S - np.minimum(0.0, np.minimum.accumulate(S, axis=-1))
+    prev = np.concatenate([np.zeros(backlog.shape[:-1] + (1,)), backlog[..., :-1]], axis=-1)
+    utilized = np.where(present, demand + prev - backlog, np.nan)
+    return np.where(present, backlog, np.nan), utilized
+
+
+def _last_index(present):
+    """每个序列最后一个有数据的时刻下标"""
+    T = present.shape[-1]
+    return T - 1 - np.argmax(present[..., ::-1], axis=-1)
+
+
+# ============================================================
+# 4. 总入口
+# ============================================================
+def evaluate_scenarios(
+    capacity_df,
+    demand_df,
+    scenarios,
+    beginTime=None,
+    endTime=None,
+    direction=-1,
+    movement=-1,
+    series_keys=None,
+    return_arrays=False,
+):
+    """
+    每个 情景 × 序列 一行：scenario, capacity_scale, demand_growth, green_ratio, <series_keys>, bins,
+    mean_demand, mean_capacity, gap_mean, gap_max, OR_operational, DR_design, RR_recovery,
+    backlog_mean, backlog_max, backlog_final。
+    return_arrays=True 时追加 dict（times, series, present，demand / capacity / unsatisfied / utilized：情景 × 序列 × 时间）。
+    """
+    _, merged = supply_demand.run_resilience_analysis(
+        capacity_df, demand_df, beginTime=beginTime, endTime=endTime, direction=direction, movement=movement,
+    )
+    arrays = build_series_arrays(merged, series_keys) if not merged.empty else None
+    if arrays is None or arrays["present"].size == 0:
+        empty = pd.DataFrame(columns=["scenario", *SCENARIO_FIELDS])
+        return (empty, None) if return_arrays else empty
+
+    series = arrays["series"]
+    present = arrays["present"][None, :, :]
+    hour5 = (arrays["times"].hour == 5)[None, None, :]
+
+    cap_scale, growth, green = _scenario_params(scenarios, series)
+    demand = np.nan_to_num(arrays["demand"])[None, :, :] * growth[:, None, None]
+    capacity = _scenario_capacity(arrays, cap_scale, green)
+    demand = np.where(present, demand, np.nan)
+    capacity = np.where(present, capacity, np.nan)
+
+    gap_mean, gap_max, OR, DR = _resilience(np.nan_to_num(demand), np.nan_to_num(capacity), present, hour5)
+    unsatisfied, utilized = backlog_arrays(np.nan_to_num(demand), np.nan_to_num(capacity), present)
+
+    K, S = len(scenarios), len(series)
+    n = present.sum(axis=-1)
+    last = np.where(n > 0, _last_index(present), 0)
+    with np.errstate(invalid="ignore"):
+        table = pd.DataFrame({
+            "scenario": np.repeat([sc.get("name", f"scenario_{k}") for k, sc in enumerate(scenarios)], S),
+            "capacity_scale": np.repeat(cap_scale, S),
+            "demand_growth": np.repeat(growth, S),
+            "green_ratio": green.ravel(),
+        })
+        for col in series.columns:
+            table[col] = np.tile(series[col].to_numpy(), K)
+        table["bins"] = np.tile(n[0], K)
+        table["mean_demand"] = np.nanmean(demand, axis=-1).ravel()
+        table["mean_capacity"] = np.nanmean(capacity, axis=-1).ravel()
+        table["gap_mean"] = gap_mean.ravel()
+        table["gap_max"] = gap_max.ravel()
+        table["OR_operational"] = OR.ravel()
+        table["DR_design"] = DR.ravel()
+        table["RR_recovery"] = OR.ravel()
+        table["backlog_mean"] = np.nanmean(unsatisfied, axis=-1).ravel()
+        table["backlog_max"] = np.nanmax(unsatisfied, axis=-1).ravel()
+        table["backlog_final"] = np.take_along_axis(
+            unsatisfied, np.broadcast_to(last, (K, S))[..., None], axis=-1
+        )[..., 0].ravel()
+
+    if return_arrays:
+        return table, {
+            "times": arrays["times"],
+            "series": series,
+            "present": arrays["present"],
+            "demand": demand,
+            "capacity": capacity,
+            "unsatisfied": unsatisfied,
+            "utilized": utilized,
+        }
+    return table
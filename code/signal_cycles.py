@@ -0,0 +1,323 @@
+"""
+逐周期绿信比（增量版）：信号文件只追加，按相位持久化检查点，每次刷新只解析新增行，补完跨越上次边界的周期，
+新周期追加到绿信比 CSV，不重算历史
+
+    new_rows, info = refresh_green_ratio("signal.txt", "signal.ckpt.json", "green_ratio.csv", phase_ids=[1, 2])
+    signal_df = read_green_ratio("green_ratio.csv")        # 全部历史，同 calculate_green_occ 的 csv_rows
+    supply.run_capacity_pipeline(..., signal_checkpoint_path="signal.ckpt.json")     # 管线中使用
+
+口径同 docs/数据提取-交叉口-信号灯绿信比-基于信号相位数据-张启航/traffic_signal_prepare.py（SignalAnalyzer + calculate_green_occ）：
+  - 状态去重键 (regionId, nodeId, phaseId, light, startUTCTime)，保留首次；时长不在 3–1000 s 的丢弃
+  - 每相位按开始时间找首尾相接的 红→绿→黄→红…（相位没有黄灯时为 红→绿→红…）：下一状态的开始与上一状态的结束
+    相差 < 1 s 即接上，至少接上一次的链才保留；链断开后从链最后一个状态之后重新找红灯
+  - 相邻两次红灯开始 [s, e) 为一个周期：cycle_time_sec = e − s，green_ratio = 期间绿灯时长 / 周期（无绿灯为空）
+检查点按相位记录：未结束的链（期望的下一灯色、上一状态结束时刻、只有红灯时的红灯本身）、链未接上时暂缓的状态、
+最近一次红灯开始与其后的绿灯、已处理到的开始时间（水位）；文件级记录已处理到的字节偏移，
+以及与之对应的绿信比 CSV 长度：新周期先追加到 CSV 再保存检查点，两步之间进程退出时，
+下次刷新按检查点把 CSV 截回该长度后重新追加，历史中不会出现重复周期。
+新数据中开始时间早于该相位水位的状态（重复下发 / 迟到）不再参与，计入 late_states。
+"""
+
+import json
+import os
+
+import pandas as pd
+
+from signal_states import LIGHT_GREEN, LIGHT_RED, LIGHT_YELLOW, parse_signal_lines, parse_signal_states
+from textio import detect_compression, read_appended_lines
+
+CHECKPOINT_VERSION = 2          # 2：记录绿信比 CSV 的已提交长度（output_bytes）
+
+MATCH_MS = 1000                 # 下一状态开始与上一状态结束的最大间隔（TIME_THRESHOLD_MS）
+MIN_STATE_MS = 3_000            # 状态时长过滤
+MAX_STATE_MS = 1_000_000
+GREEN_TAIL_MS = 4_000           # 绿灯结束可晚于下一次红灯开始 4 s
+
+GREEN_COLUMNS = ["startTime", "regionId", "nodeId", "phaseId", "green_ratio", "cycle_time_sec"]
+
+
+# ============================================================
+# 1. 单相位状态机
+# ============================================================
+class _PhaseTracker:
+    """一个 (regionId, nodeId, phaseId) 的链 / 周期状态；状态为 (light, start_ms, end_ms)"""
+
+    def __init__(self, key):
+        self.key = key
+        self.has_yellow = False
+        self.target = None          # 链中期望的下一灯色，None 为没有打开的链
+        self.last_end = None
+        self.open_red = None        # 链只有一个红灯时暂存（接上绿灯才算数）
+        self.skipped = []           # 链未接上前经过的状态，链断开时重新参与找红灯
+        self.last_red = None        # 最近一次（已确认的）红灯开始
+        self.greens = []            # last_red 之后已确认的绿灯 (start, end)
+        self.watermark = None       # 已处理的最大开始时间
+        self.seen = []              # 开始时间等于水位的状态键 (light, start)，用于去重
+
+    # ------------------------------------------------------------
+    def feed(self, states, rows):
+        """states: 已去重、按开始时间升序（开始时间均不早于水位）"""
+        if any(s[0] == LIGHT_YELLOW for s in states):
+            self.has_yellow = True
+        queue = list(reversed(states))
+        while queue:
+            state = queue.pop()
+            light, start, end = state
+            if self.target is not None:
+                if light == self.target and abs(start - self.last_end) < MATCH_MS:
+                    self._extend(state, rows)
+                    self.skipped = []
+                elif start < self.last_end + MATCH_MS:
+                    self.skipped.append(state)
+                else:
+                    # 之后的状态开始更晚，链接不上了：关闭，暂缓的状态重新找红灯
+                    queue.append(state)
+                    queue.extend(reversed(self.skipped))
+                    self._close()
+            elif light == LIGHT_RED:
+                self.target = LIGHT_GREEN
+                self.last_end = end
+                self.open_red = state
+
+    def _next_light(self, light):
+        if light == LIGHT_RED:
+            return LIGHT_GREEN
+        if light == LIGHT_GREEN and self.has_yellow:
+            return LIGHT_YELLOW
+        return LIGHT_RED
+
+    def _extend(self, state, rows):
+        if self.open_red is not None:
+            self._commit(self.open_red, rows)
+            self.open_red = None
+        self._commit(state, rows)
+        self.target = self._next_light(state[0])
+        self.last_end = state[2]
+
+    def _close(self):
+        self.target = None
+        self.last_end = None
+        self.open_red = None
+        self.skipped = []
+
+    def _commit(self, state, rows):
+        light, start, end = state
+        if light == LIGHT_RED:
+            if self.last_red is not None:
+                total_ms = start - self.last_red
+                green_ms = sum(e - s for s, e in self.greens if e <= start + GREEN_TAIL_MS)
+                ratio = green_ms / total_ms if green_ms > 0 and total_ms > 0 else None
+                rows.append((self.last_red, *self.key, ratio, total_ms / 1000))
+            self.last_red = start
+            self.greens = []
+        elif light == LIGHT_GREEN and self.last_red is not None:
+            self.greens.append((start, end))
+
+    # ------------------------------------------------------------
+    def to_dict(self):
+        return {
+            "key": list(self.key),
+            "has_yellow": self.has_yellow,
+            "target": self.target,
+            "last_end": self.last_end,
+            "open_red": self.open_red,
+            "skipped": self.skipped,
+            "last_red": self.last_red,
+            "greens": self.greens,
+            "watermark": self.watermark,
+            "seen": self.seen,
+        }
+
+    @classmethod
+    def from_dict(cls, d):
+        tracker = cls(tuple(d["key"]))
+        tracker.has_yellow = d["has_yellow"]
+        tracker.target = d["target"]
+        tracker.last_end = d["last_end"]
+        tracker.open_red = tuple(d["open_red"]) if d["open_red"] is not None else None
+        tracker.skipped = [tuple(s) for s in d["skipped"]]
+        tracker.last_red = d["last_red"]
+        tracker.greens = [tuple(g) for g in d["greens"]]
+        tracker.watermark = d["watermark"]
+        tracker.seen = [tuple(s) for s in d["seen"]]
+        return tracker
+
+
+# ============================================================
+# 2. 全部相位 + 检查点
+# ============================================================
+class GreenRatioTracker:
+    """
+    phases: {(regionId, nodeId, phaseId): _PhaseTracker}；offset: 信号文件已处理到的字节偏移（解压后）；
+    output_bytes: 与 offset 对应的绿信比 CSV 长度（字节）。
+    phase_ids / node_ids 为 None 时不过滤。
+    """
+
+    def __init__(self, signal_file=None, phase_ids=None, node_ids=None):
+        self.signal_file = signal_file
+        self.phase_ids = sorted(int(p) for p in phase_ids) if phase_ids is not None else None
+        self.node_ids = sorted(int(n) for n in node_ids) if node_ids is not None else None
+        self.offset = 0
+        self.output_bytes = 0
+        self.phases = {}
+
+    def matches(self, signal_file, phase_ids=None, node_ids=None):
+        """检查点是否属于同一文件与相位集合（否则需从头重算）"""
+        other = GreenRatioTracker(signal_file, phase_ids, node_ids)
+        return (os.path.abspath(self.signal_file or "") == os.path.abspath(signal_file)
+                and self.phase_ids == other.phase_ids and self.node_ids == other.node_ids)
+
+    def update(self, states):
+        """
+        states: signal_states.parse_signal_lines 的输出（新增行）。
+        返回 (rows, late)：rows 为新完成的周期（GREEN_COLUMNS 顺序的 tuple，startTime 为 UTC 毫秒），late 为丢弃的迟到状态数。
+        """
+        if self.phase_ids is not None:
+            states = states[states["phaseId"].isin(self.phase_ids)]
+        states = states.drop_duplicates(subset=["regionId", "nodeId", "phaseId", "light", "start_ms"], keep="first")
+
+        rows, late = [], 0
+        for key, g in states.groupby(["regionId", "nodeId", "phaseId"], sort=True, dropna=False):
+            key = tuple(v.item() if hasattr(v, "item") else v for v in key)
+            tracker = self.phases.get(key)
+            if tracker is None:
+                tracker = self.phases[key] = _PhaseTracker(key)
+
+            light = g["light"].to_numpy().tolist()
+            start = g["start_ms"].to_numpy().tolist()
+            end = g["end_ms"].to_numpy().tolist()
+            fresh = []
+            seen = set(tracker.seen)
+            for l, s, e in zip(light, start, end):
+                if tracker.watermark is not None and (s < tracker.watermark or (s == tracker.watermark and (l, s) in seen)):
+                    late += 1
+                    continue
+                fresh.append((l, s, e))
+            if not fresh:
+                continue
+
+            # 水位与去重按过滤前的状态；排序稳定，同一开始时间保持文件顺序
+            fresh.sort(key=lambda x: x[1])
+            tracker.watermark = fresh[-1][1]
+            tracker.seen = [(l, s) for l, s, _ in fresh if s == tracker.watermark]
+            tracker.feed([x for x in fresh if MIN_STATE_MS <= x[2] - x[1] <= MAX_STATE_MS], rows)
+        rows.sort(key=lambda r: (r[0], r[1:4]))
+        return rows, late
+
+    # ------------------------------------------------------------
+    def to_dict(self):
+        return {
+            "version": CHECKPOINT_VERSION,
+            "signal_file": self.signal_file,
+            "phase_ids": self.phase_ids,
+            "node_ids": self.node_ids,
+            "offset": self.offset,
+            "output_bytes": self.output_bytes,
+            "phases": [t.to_dict() for t in self.phases.values()],
+        }
+
+    @classmethod
+    def from_dict(cls, d):
+        tracker = cls(d["signal_file"], d["phase_ids"], d["node_ids"])
+        tracker.offset = d["offset"]
+        tracker.output_bytes = d["output_bytes"]
+        for p in d["phases"]:
+            t = _PhaseTracker.from_dict(p)
+            tracker.phases[t.key] = t
+        return tracker
+
+    def save(self, path):
+        """原子写入（先写临时文件再替换），中途失败不破坏旧检查点"""
+        tmp = f"{path}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(self.to_dict(), f, ensure_ascii=False, separators=(",", ":"))
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path):
+        """文件不存在或版本不符时返回 None"""
+        if not os.path.exists(path):
+            return None
+        with open(path, "r", encoding="utf-8") as f:
+            d = json.load(f)
+        if d.get("version") != CHECKPOINT_VERSION:
+            return None
+        return cls.from_dict(d)
+
+
+# ============================================================
+# 3. 刷新 / 读取
+# ============================================================
+def _rows_frame(rows):
+    df = pd.DataFrame(rows, columns=GREEN_COLUMNS)
+    df["startTime"] = pd.to_datetime(df["startTime"].astype("int64"), unit="ms")
+    return df
+
+
+def refresh_green_ratio(signal_file, checkpoint_path, output_path, phase_ids=None, node_ids=None):
+    """
+    从检查点的偏移继续读 signal_file，新完成的周期追加到 output_path（CSV，列同 GREEN_COLUMNS），再保存检查点。
+    output_path 比检查点记录的长度长（上次追加后、保存检查点前中断）时先截回该长度，不重复追加。
+    检查点不存在、属于别的文件 / 相位集合，文件比偏移短（被截断 / 轮转），或 output_path 比记录的短时
+    从头重算并重写 output_path。
+    返回 (new_rows_df, info)，info: new_lines / states / new_rows / late_states / offset / reset。
+    """
+    tracker = GreenRatioTracker.load(checkpoint_path)
+    reset = (
+        tracker is None
+        or not tracker.matches(signal_file, phase_ids, node_ids)
+        or (detect_compression(signal_file) is None and os.path.getsize(signal_file) < tracker.offset)
+        or not os.path.exists(output_path)
+        or os.path.getsize(output_path) < tracker.output_bytes
+    )
+    if reset:
+        tracker = GreenRatioTracker(signal_file, phase_ids, node_ids)
+    elif os.path.getsize(output_path) > tracker.output_bytes:
+        # 上次追加了周期但检查点未保存：丢弃未提交的尾部，本次从检查点偏移重新产出
+        with open(output_path, "r+b") as f:
+            f.truncate(tracker.output_bytes)
+
+    lines, offset = read_appended_lines(signal_file, tracker.offset)
+    states = parse_signal_lines(lines, tracker.node_ids)
+    rows, late = tracker.update(states)
+    new_rows = _rows_frame(rows)
+
+    if reset:
+        new_rows.to_csv(output_path, index=False)
+    elif len(new_rows):
+        new_rows.to_csv(output_path, mode="a", header=False, index=False)
+    tracker.offset = offset
+    tracker.output_bytes = os.path.getsize(output_path)
+    tracker.save(checkpoint_path)
+
+    info = {
+        "new_lines": len(lines),
+        "states": len(states),
+        "new_rows": len(new_rows),
+        "late_states": late,
+        "offset": offset,
+        "reset": bool(reset),
+    }
+    return new_rows, info
+
+
+def green_ratio_frame(signal_file, phase_ids=None, node_ids=None):
+    """
+    一次算出 signal_file 的全部周期（不读写检查点），列同 read_green_ratio。
+    signal_file 可为 gzip / zstd 压缩，经 textio.open_text 流式解压，不落临时文件。
+    """
+    tracker = GreenRatioTracker(signal_file, phase_ids, node_ids)
+    rows, _ = tracker.update(parse_signal_states(signal_file, tracker.node_ids))
+    return _rows_frame(rows)
+
+
+def green_path_for(checkpoint_path):
+    """signal.ckpt.json → signal.ckpt.green.csv（未指定绿信比 CSV 时与检查点放在一起）"""
+    return f"{os.path.splitext(checkpoint_path)[0]}.green.csv"
+
+
+def read_green_ratio(output_path):
+    """refresh_green_ratio 累积的全部周期（startTime 为 naive UTC，与 SignalAnalyzer 输出一致）"""
+    df = pd.read_csv(output_path)
+    df["startTime"] = pd.to_datetime(df["startTime"], format="ISO8601")
+    return df
@@ -0,0 +1,303 @@
+"""
+信号灯态区间索引 + 车辆到达灯态标注：回答“t 时刻该相位亮的是什么灯”，批量给车辆的到达 / 过停车线时刻打上灯态，
+统计每 相位 × 15min 的绿灯到达（arrival on green）与红灯到达次数
+
+    index = SignalStateIndex.from_signal_file("signal.txt")                  # 或 from_frame(parse_signal_states(...))
+    events = demand.stopline_events(data, df_lane)                           # 每车每进口道：arrive_ms / cross_ms
+    events = assign_phases(events, phase_table(phase_map), node_id=1001)     # (Direction, movement) → phaseId
+    aog = arrival_on_green(events, index)
+
+灯态区间：信号文件每行一条消息，phases[].phaseStates[] 为 {light, startUTCTime, likelyEndUTCTime}（3 红 / 5 绿 / 7 黄）。
+同一相位的区间按开始时间排序后首尾相接（结束时间截断到下一段开始），重复下发的同一区间保留文件中最后一次。
+索引为 CSR：phases 第 i 行的区间位于 offsets[i]:offsets[i+1]；查询时把 (相位, 时刻) 编码为单个 int64，
+在全体区间的开始时刻上一次 searchsorted，相当于按相位分组的 merge_asof(direction="backward")，
+落在区间结束之后（数据缺口）或无该相位时为 LIGHT_UNKNOWN。
+"""
+
+import json
+
+import numpy as np
+import pandas as pd
+
+from textio import open_text
+from timeaxis import BEIJING_OFFSET_MS, to_beijing_naive
+
+LIGHT_UNKNOWN = 0
+LIGHT_RED = 3
+LIGHT_GREEN = 5
+LIGHT_YELLOW = 7
+
+
+LIGHT_NAMES = {LIGHT_UNKNOWN: "unknown", LIGHT_RED: "red", LIGHT_GREEN: "green", LIGHT_YELLOW: "yellow"}
+
+STATE_COLUMNS = ["regionId", "nodeId", "phaseId", "light", "start_ms", "end_ms"]
+
+# PhaseName（如 “南-左转”）→ 方向 / 动作，与 supply.aggregate_to_15min 一致
+PHASE_DIRECTION_MAP = {
+    '东': 'E', '西': 'W', '南': 'S', '北': 'N',
+    '东北': 'NE', '东南': 'SE', '西北': 'NW', '西南': 'SW'
+}
+PHASE_MOVEMENT_MAP = {
+    '左转': 'Left Turn',
+    '右转': 'Right Turn',
+    '直行': 'Through',
+    '机动车信号灯': 'Through'
+}
+
+
+# ============================================================
+# 1. 信号文件 → 灯态区间长表
+# ============================================================
+def parse_signal_states(signal_file, node_ids=None):
+    """
+    每个灯态区间一行：regionId, nodeId, phaseId, light, start_ms, end_ms（UTC 毫秒）。
+    signal_file 可为 gzip / zstd 压缩；node_ids 给定时只保留这些路口。
+    """
+    with open_text(signal_file) as f:
+        return parse_signal_lines(f, node_ids)
+
+
+def parse_signal_lines(lines, node_ids=None):
+    """同 parse_signal_states，输入为已读出的行（str 或 bytes，如 textio.read_appended_lines 的输出）"""
+    keep = None if node_ids is None else {int(n) for n in node_ids}
+    cols = {c: [] for c in STATE_COLUMNS}
+    for line in lines:
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            msg = json.loads(line)
+        except ValueError:
+            continue
+        for m in msg.get("message", []):
+            for d in m.get("data", []):
+                for inter in d.get("intersections", []):
+                    node = inter.get("nodeId")
+                    if keep is not None and node not in keep:
+                        continue
+                    region = inter.get("regionId")
+                    for ph in inter.get("phases", []):
+                        pid = ph.get("phaseId")
+                        for st in ph.get("phaseStates", []):
+                            start, end = st.get("startUTCTime"), st.get("likelyEndUTCTime")
+                            if start is None or end is None:
+                                continue
+                            cols["regionId"].append(region)
+                            cols["nodeId"].append(node)
+                            cols["phaseId"].append(pid)
+                            cols["light"].append(st.get("light", LIGHT_UNKNOWN))
+                            cols["start_ms"].append(start)
+                            cols["end_ms"].append(end)
+
+    return pd.DataFrame({
+        "regionId": cols["regionId"],
+        "nodeId": pd.array(cols["nodeId"], dtype="Int64"),
+        "phaseId": pd.array(cols["phaseId"], dtype="Int64"),
+        "light": np.asarray(cols["light"], dtype=np.int8),
+        "start_ms": np.asarray(cols["start_ms"], dtype=np.int64),
+        "end_ms": np.asarray(cols["end_ms"], dtype=np.int64),
+    })
+
+
+# ============================================================
+# 2. 区间索引
+# ============================================================
+class SignalStateIndex:
+    """
+    phases: DataFrame（keys 列，P 行）；offsets: P+1；start_ms / end_ms / light: 全体区间（相位内按开始时间升序）。
+    """
+
+    def __init__(self, keys, phases, offsets, start_ms, end_ms, light):
+        self.keys = list(keys)
+        self.phases = phases
+        self.offsets = offsets
+        self.start_ms = start_ms
+        self.end_ms = end_ms
+        self.light = light
+
+        # (相位, 时刻) → int64：相位 p 的区间占据 [p·span, (p+1)·span)
+        self._t0 = int(start_ms.min()) if len(start_ms) else 0
+        self._span = int(end_ms.max()) - self._t0 + 2 if len(end_ms) else 2
+        phase_of = np.repeat(np.arange(len(phases), dtype=np.int64), np.diff(offsets))
+        self._code = phase_of * self._span + (start_ms - self._t0)
+        self._key_index = pd.MultiIndex.from_frame(phases) if len(self.keys) > 1 else pd.Index(phases[self.keys[0]])
+
+    @classmethod
+    def from_frame(cls, states, keys=("nodeId", "phaseId")):
+        """states: parse_signal_states 的输出（至少含 keys、light、start_ms、end_ms）"""
+        keys = list(keys)
+        states = states.dropna(subset=keys)
+        # 重复下发的同一区间保留最后一次（likelyEnd 以最新为准）
+        states = states.drop_duplicates(subset=keys + ["light", "start_ms"], keep="last")
+
+        grouped = states.groupby(keys, sort=True)
+        p_code = grouped.ngroup().to_numpy().astype(np.int64)
+        phases = grouped.size().reset_index()[keys]
+        start = states["start_ms"].to_numpy(dtype=np.int64)
+        end = states["end_ms"].to_numpy(dtype=np.int64)
+        light = states["light"].to_numpy(dtype=np.int8)
+
+        order = np.lexsort((start, p_code))
+        p_code, start, end, light = p_code[order], start[order], end[order], light[order]
+        offsets = np.zeros(len(phases) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(p_code, minlength=len(phases)), out=offsets[1:])
+
+        # 首尾相接：结束时间不超过同相位下一段的开始
+        if len(start) > 1:
+            same = p_code[1:] == p_code[:-1]
+            end[:-1] = np.where(same, np.minimum(end[:-1], start[1:]), end[:-1])
+        return cls(keys, phases, offsets, start, end, light)
+
+    @classmethod
+    def from_signal_file(cls, signal_file, keys=("nodeId", "phaseId"), node_ids=None):
+        return cls.from_frame(parse_signal_states(signal_file, node_ids), keys)
+
+    def __len__(self):
+        return len(self.start_ms)
+
+    @property
+    def nbytes(self):
+        return int(sum(a.nbytes for a in (self.offsets, self.start_ms, self.end_ms, self.light, self._code)))
+
+    # ------------------------------
+    # 查询
+    # ------------------------------
+    def phase_codes(self, frame):
+        """frame 的 keys 列 → 相位下标（无此相位为 −1）"""
+        if len(self.keys) > 1:
+            probe = pd.MultiIndex.from_frame(frame[self.keys].astype(self.phases.dtypes.to_dict()))
+        else:
+            probe = pd.Index(frame[self.keys[0]].astype(self.phases[self.keys[0]].dtype))
+        return self._key_index.get_indexer(probe).astype(np.int64)
+
+    def lookup(self, phase_code, t_ms):
+        """
+        批量查询：phase_code（相位下标，−1 表示未知）与 t_ms 等长。
+        返回 (light, interval)：灯态（无覆盖为 LIGHT_UNKNOWN）与命中的区间下标（−1 为无）。
+        """
+        phase_code = np.asarray(phase_code, dtype=np.int64)
+        t_ms = np.asarray(t_ms, dtype=np.int64)
+        rel = t_ms - self._t0
+        ok = (phase_code >= 0) & (rel >= 0) & (rel < self._span - 1)
+        q = np.where(ok, phase_code * self._span + rel, 0)
+
+        pos = np.searchsorted(self._code, q, side="right") - 1
+        safe = np.clip(pos, 0, max(len(self._code) - 1, 0))
+        if len(self._code):
+            ok &= (pos >= self.offsets[np.maximum(phase_code, 0)]) & (t_ms < self.end_ms[safe])
+        else:
+            ok[:] = False
+        light = np.where(ok, self.light[safe] if len(self._code) else 0, LIGHT_UNKNOWN).astype(np.int8)
+        return light, np.where(ok, pos, -1)
+
+    def state_at(self, frame, time_col="t_ms"):
+        """frame（含 keys 列与 time_col）每行的灯态"""
+        light, _ = self.lookup(self.phase_codes(frame), frame[time_col].to_numpy(dtype=np.int64))
+        return light
+
+
+# ============================================================
+# 3. 相位表：PhaseName → (direction, movement)
+# ============================================================
+def phase_table(phase_map):
+    """phase_map（PhaseId, PhaseName[, Angle]）→ phaseId, PhaseName, direction, movement"""
+    parts = phase_map["PhaseName"].astype(str).str.split("-", n=1, expand=True)
+    return pd.DataFrame({
+        "phaseId": phase_map["PhaseId"].astype(int).to_numpy(),
+        "PhaseName": phase_map["PhaseName"].to_numpy(),
+        "direction": parts[0].map(PHASE_DIRECTION_MAP).to_numpy(),
+        "movement": parts[1].map(PHASE_MOVEMENT_MAP).to_numpy() if parts.shape[1] > 1 else None,
+    })
+
+
+def assign_phases(events, phases, node_id=None, direction_col="Direction", movement_col="movement"):
+    """
+    按 (方向, 动作) 给车辆事件挂相位：events 的 direction_col / movement_col 与 phase_table 的 direction / movement 对应。
+    同一 (方向, 动作) 有多个相位时取 phaseId 最小者；无对应相位（如无独立相位的右转）的行丢弃。
+    node_id 给定时追加 nodeId 列，供 keys=("nodeId", "phaseId") 的索引使用。
+    """
+    table = (
+        phases.dropna(subset=["direction", "movement"])
+        .sort_values("phaseId")
+        .drop_duplicates(subset=["direction", "movement"])
+        .rename(columns={"direction": direction_col, "movement": movement_col})
+    )[[direction_col, movement_col, "phaseId"]]
+    out = events.merge(table, on=[direction_col, movement_col], how="inner")
+    if node_id is not None:
+        out["nodeId"] = int(node_id)
+    return out
+
+
+# ============================================================
+# 4. 到达灯态 → 时段 × 相位 汇总
+# ============================================================
+def _label(events, index, col, codes):
+    """events[col] 的灯态与所在区间剩余毫秒数（无覆盖为 LIGHT_UNKNOWN / −1）"""
+    t = events[col].to_numpy(dtype=np.int64)
+    light, interval = index.lookup(codes, t)
+    left = index.end_ms[np.maximum(interval, 0)] - t if len(index) else np.zeros(len(t), dtype=np.int64)
+    return light, np.where(interval >= 0, left, -1)
+
+
+def label_events(events, index, arrive_col="arrive_ms", cross_col="cross_ms"):
+    """
+    追加 arrive_light / cross_light（灯态代码）、arrive_state / cross_state（red / green / yellow / unknown）
+    与 cross_state_left_ms（过线时刻距所在灯态结束的毫秒数，无覆盖为 −1）。
+    arrive_ms 为车辆到达停车线（或排队队尾）的时刻，cross_ms 为驶过停车线的时刻。
+    """
+    codes = index.phase_codes(events)
+    out = events.copy()
+    names = pd.Series(LIGHT_NAMES)
+    for col, prefix in ((arrive_col, "arrive"), (cross_col, "cross")):
+        if col not in events.columns:
+            continue
+        light, left = _label(events, index, col, codes)
+        out[f"{prefix}_light"] = light
+        out[f"{prefix}_state"] = names.reindex(light).to_numpy()
+        if prefix == "cross":
+            out["cross_state_left_ms"] = left
+    return out
+
+
+def arrival_on_green(events, index, freq="15min", arrive_col="arrive_ms", cross_col="cross_ms",
+                     cross_tolerance_ms=2000):
+    """
+    每 time_bin × 相位 一行（time_bin 为到达时刻所在时段，北京时间；相位列为索引的 keys）：
+    vehicles, arrivals_green, arrivals_yellow, arrivals_red, arrivals_unknown,
+    aog_ratio（绿灯到达 / 灯态已知的到达）, red_ratio, crossed_on_red（过线时为红灯，闯红灯或数据偏差）。
+    cross_ms 取过线前最后一次观测，红灯在其后 cross_tolerance_ms（约一个感知周期）内结束的不计入 crossed_on_red。
+    索引中没有的相位不输出。
+    """
+    codes = index.phase_codes(events)
+    arrive, _ = _label(events, index, arrive_col, codes)
+    if cross_col in events.columns:
+        cross, left = _label(events, index, cross_col, codes)
+        cross_red = (cross == LIGHT_RED) & (left > cross_tolerance_ms)
+    else:
+        cross_red = np.zeros(len(events), dtype=bool)
+
+    # 时段 × 相位 编码成一个整数后 bincount（北京时间 = UTC + 8h，无夏令时）
+    step = pd.Timedelta(freq).value // 1_000_000
+    t_bin = (events[arrive_col].to_numpy(dtype=np.int64) + BEIJING_OFFSET_MS) // step
+    known_phase = codes >= 0
+    b0 = t_bin[known_phase].min() if known_phase.any() else 0
+    P = len(index.phases)
+    group = (t_bin - b0) * P + codes
+    uniq, inv = np.unique(group[known_phase], return_inverse=True)
+    G = len(uniq)
+
+    def _count(mask):
+        return np.bincount(inv, weights=mask[known_phase], minlength=G).astype(np.int64)
+
+    out = index.phases.iloc[uniq % P].reset_index(drop=True)
+    out.insert(0, "time_bin", to_beijing_naive((uniq // P + b0) * step - BEIJING_OFFSET_MS))
+    out["vehicles"] = np.bincount(inv, minlength=G).astype(np.int64)
+    out["arrivals_green"] = _count(arrive == LIGHT_GREEN)
+    out["arrivals_yellow"] = _count(arrive == LIGHT_YELLOW)
+    out["arrivals_red"] = _count(arrive == LIGHT_RED)
+    out["arrivals_unknown"] = _count(arrive == LIGHT_UNKNOWN)
+    out["crossed_on_red"] = _count(cross_red)
+    known = (out["vehicles"] - out["arrivals_unknown"]).to_numpy()
+    out["aog_ratio"] = np.divide(out["arrivals_green"].to_numpy(), known, out=np.full(G, np.nan), where=known > 0)
+    out["red_ratio"] = np.divide(out["arrivals_red"].to_numpy(), known, out=np.full(G, np.nan), where=known > 0)
+    return out
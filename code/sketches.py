@@ -0,0 +1,221 @@
+"""
+信号配时分布的可合并分位数草图：每 相位 × 15min × 指标（cycle_time_sec / green_ratio）一个草图，
+按任意时间范围合并后求 p50 / p85 / p95 等，内存有界、误差已知，不必保留逐周期明细
+
+    sk = sketch_signal(signal_df)                          # analyze_signal 的逐周期结果 → 草图长表
+    write_sketches(sk, "117Capacity_2.sketch.csv")
+    q = sketch_quantiles(read_sketches("117Capacity_2.sketch.csv"),
+                         beginTime="2025-11-01 00:00:00", endTime="2025-12-01 00:00:00")
+
+草图为对数分桶直方图（DDSketch）：γ = (1 + α) / (1 − α)，正值 v 落入桶 k = ceil(log_γ v)，
+桶代表值 2γ^k / (γ + 1)；≤ 0 的值计入零桶。返回的分位数与真实分位数的相对误差不超过 α（缺省 1%）。
+合并即按桶累加计数，与合并顺序、时间切分无关；单个草图的桶数不超过 log_γ(max / min) + 2
+（周期 30 ~ 300s 时约 116 个），长表每行 (phaseId, time_bin, metric, key, count)。
+
+15min 一个草图时每格只有几个周期，行数与逐周期明细相当；压缩靠时间上的汇总：
+compact_sketches / compact_sketch_file 把早于 before 的行并成按天的草图（分位数误差不变，只是时间分辨率变粗），
+每 相位 × 天 × 指标 的行数受桶数约束而与周期数无关。merge_sketches 逐个（或逐块）累加，
+内存只取决于结果的 分组 × 桶 数，不随存档长度增长：
+
+    q = sketch_quantiles(read_sketches(path, chunk_rows=200_000), beginTime=..., endTime=...)
+    compact_sketch_file(path, before="2025-11-01 00:00:00")      # 11 月以前的 15min 行并为按天
+"""
+
+import os
+
+import numpy as np
+import pandas as pd
+
+from timeaxis import floor_ms, freq_ms, to_beijing_naive, to_epoch_ms
+
+RELATIVE_ACCURACY = 0.01
+
+SKETCH_METRICS = ("cycle_time_sec", "green_ratio")
+
+SKETCH_COLUMNS = ["phaseId", "time_bin", "metric", "key", "count"]
+
+# 零桶（值 ≤ 0）
+ZERO_KEY = np.iinfo(np.int32).min
+
+
+def _gamma(alpha):
+    return (1 + alpha) / (1 - alpha)
+
+
+def bucket_keys(values, alpha=RELATIVE_ACCURACY):
+    """值 → 桶编号（NaN 由调用方先行过滤）"""
+    v = np.asarray(values, dtype=float)
+    keys = np.full(v.shape, ZERO_KEY, dtype=np.int64)
+    pos = v > 0
+    keys[pos] = np.ceil(np.log(v[pos]) / np.log(_gamma(alpha))).astype(np.int64)
+    return keys
+
+
+def bucket_values(keys, alpha=RELATIVE_ACCURACY):
+    """桶编号 → 代表值（零桶为 0）"""
+    keys = np.asarray(keys, dtype=np.int64)
+    g = _gamma(alpha)
+    out = 2 * np.power(g, keys.astype(float)) / (g + 1)
+    return np.where(keys == ZERO_KEY, 0.0, out)
+
+
+# ============================================================
+# 1. 逐周期明细 → 草图
+# ============================================================
+def sketch_signal(signal_df, freq="15min", metrics=SKETCH_METRICS, alpha=RELATIVE_ACCURACY):
+    """
+    signal_df: analyze_signal 的输出（phaseId, startTime, green_ratio, cycle_time_sec, ...）。
+    time_bin 与容量输出一致：startTime 向下取整到 freq，按 UTC 转北京时间（见 supply.filter_capacity）。
+    """
+    parts = []
+    time_bin = to_beijing_naive(floor_ms(to_epoch_ms(signal_df["startTime"], naive="utc"), freq_ms(freq)))
+    for metric in metrics:
+        if metric not in signal_df.columns:
+            continue
+        v = pd.to_numeric(signal_df[metric], errors="coerce").to_numpy(dtype=float)
+        ok = np.isfinite(v) & time_bin.notna()
+        part = pd.DataFrame({
+            "phaseId": signal_df["phaseId"].to_numpy()[ok],
+            "time_bin": time_bin.to_numpy()[ok],
+            "metric": metric,
+            "key": bucket_keys(v[ok], alpha),
+        })
+        parts.append(part.groupby(["phaseId", "time_bin", "metric", "key"], sort=True).size().reset_index(name="count"))
+    if not parts:
+        return pd.DataFrame(columns=SKETCH_COLUMNS)
+    return pd.concat(parts, ignore_index=True)[SKETCH_COLUMNS]
+
+
+# ============================================================
+# 2. 合并 / 分位数
+# ============================================================
+def _time_filter(sketch_df, beginTime=None, endTime=None):
+    t = sketch_df["time_bin"]
+    keep = np.ones(len(sketch_df), dtype=bool)
+    if beginTime is not None:
+        keep &= (t >= pd.Timestamp(beginTime)).to_numpy()
+    if endTime is not None:
+        keep &= (t <= pd.Timestamp(endTime)).to_numpy()
+    return sketch_df[keep]
+
+
+def _iter_frames(sketch_dfs):
+    """参数可以是 DataFrame，也可以是 DataFrame 的可迭代对象（如 read_sketches(path, chunk_rows=...)）"""
+    for item in sketch_dfs:
+        if isinstance(item, pd.DataFrame):
+            yield item
+        else:
+            yield from item
+
+
+def merge_sketches(*sketch_dfs, by=("phaseId", "metric"), beginTime=None, endTime=None, freq=None):
+    """
+    合并一个或多个草图长表（或分块迭代器）：时间范围内按 by + key 累加计数。
+    by 含 time_bin 时即为按时段合并（例如多份文件里同一时段的草图）；
+    freq（如 "1D"）给出时 time_bin 先向下取整再合并，可把长期存档压成按天 / 按周的草图，结果仍可继续合并。
+    逐个输入先各自汇总再并入累计结果，不整体拼接全部输入。
+    """
+    by = list(by)
+    if freq is not None and "time_bin" not in by:
+        by = ["phaseId", "time_bin", *[c for c in by if c != "phaseId"]]
+    keys = by + ["key"]
+
+    acc = None
+    for df in _iter_frames(sketch_dfs):
+        df = _time_filter(df, beginTime, endTime)
+        if freq is not None:
+            df = df.assign(time_bin=df["time_bin"].dt.floor(freq))
+        part = df.groupby(keys, sort=False)["count"].sum()
+        acc = part if acc is None else pd.concat([acc, part]).groupby(level=keys, sort=False).sum()
+    if acc is None:
+        return pd.DataFrame(columns=keys + ["count"])
+    return acc.sort_index().reset_index()
+
+
+def compact_sketches(sketch_df, before=None, freq="1D"):
+    """
+    早于 before 的行（before=None 时为全部）按 freq 汇总为 (phaseId, time_bin, metric, key, count)，
+    其余行原样保留。汇总后的 time_bin 为 freq 的起点，按时间范围合并时这部分只能精确到 freq。
+    """
+    if before is None:
+        old, recent = sketch_df, sketch_df.iloc[:0]
+    else:
+        is_old = (sketch_df["time_bin"] < pd.Timestamp(before)).to_numpy()
+        old, recent = sketch_df[is_old], sketch_df[~is_old]
+    rolled = merge_sketches(old, by=("phaseId", "time_bin", "metric"), freq=freq)
+    return pd.concat([rolled, recent], ignore_index=True)[SKETCH_COLUMNS]
+
+
+def sketch_quantiles(sketch_df, qs=(0.05, 0.5, 0.85, 0.95), by=("phaseId", "metric"),
+                     beginTime=None, endTime=None, alpha=RELATIVE_ACCURACY):
+    """
+    每个 by 分组一行：<by>, count, p05 / p50 / p85 / p95 ...（列名按百分位），spread = 最大分位 − 最小分位。
+    相对误差 ≤ alpha（alpha 需与建草图时一致）。
+    """
+    by = list(by)
+    merged = merge_sketches(sketch_df, by=by, beginTime=beginTime, endTime=endTime)
+    cols = [f"p{int(round(q * 100)):02d}" for q in qs]
+    if merged.empty:
+        return pd.DataFrame(columns=by + ["count", *cols, "spread"])
+
+    grp = merged.groupby(by, sort=True)
+    cum = grp["count"].cumsum().to_numpy()
+    total = grp["count"].transform("sum").to_numpy()
+    start = cum - merged["count"].to_numpy()
+    values = bucket_values(merged["key"].to_numpy(), alpha)
+    gid = grp.ngroup().to_numpy()
+
+    out = grp["count"].sum().reset_index()
+    n_groups = len(out)
+    for q, col in zip(qs, cols):
+        # 秩 q·(n−1) 所在的桶：start ≤ rank < cum
+        rank = np.floor(q * (total - 1))
+        hit = (start <= rank) & (rank < cum)
+        res = np.full(n_groups, np.nan)
+        res[gid[hit]] = values[hit]
+        out[col] = res
+    out["spread"] = out[cols[-1]] - out[cols[0]]
+    return out
+
+
+# ============================================================
+# 3. 读写（与容量结果同目录的 CSV）
+# ============================================================
+def sketch_path_for(capacity_path):
+    """117Capacity_2.csv → 117Capacity_2.sketch.csv"""
+    return f"{os.path.splitext(capacity_path)[0]}.sketch.csv"
+
+
+def write_sketches(sketch_df, path, append=False):
+    """append=True 时追加到已有文件（同一时段重复写入会在合并时重复计数，请按时间范围分批追加）"""
+    header = not (append and os.path.exists(path))
+    sketch_df[SKETCH_COLUMNS].to_csv(path, mode="a" if append else "w", header=header, index=False,
+                                     date_format="%Y-%m-%d %H:%M:%S")
+    return path
+
+
+def read_sketches(path, chunk_rows=None):
+    """chunk_rows 给定时返回按块读取的迭代器（可直接传给 merge_sketches / sketch_quantiles）"""
+    kwargs = dict(dtype={"metric": str, "key": np.int64, "count": np.int64}, parse_dates=["time_bin"])
+    if chunk_rows is None:
+        return pd.read_csv(path, **kwargs)[SKETCH_COLUMNS]
+    return (chunk[SKETCH_COLUMNS] for chunk in pd.read_csv(path, chunksize=chunk_rows, **kwargs))
+
+
+def compact_sketch_file(path, before=None, freq="1D", chunk_rows=200_000):
+    """
+    就地压缩草图文件：逐块 compact_sketches 后累加（同一 相位 × 时段 × 指标 × 桶 跨块合并），
+    写临时文件后替换原文件。返回 (压缩前行数, 压缩后行数)。
+    """
+    n_in = [0]
+
+    def _compacted():
+        for chunk in read_sketches(path, chunk_rows=chunk_rows):
+            n_in[0] += len(chunk)
+            yield compact_sketches(chunk, before, freq)
+
+    merged = merge_sketches(_compacted(), by=("phaseId", "time_bin", "metric"))
+    tmp = f"{path}.tmp"
+    write_sketches(merged, tmp)
+    os.replace(tmp, path)
+    return n_in[0], len(merged)
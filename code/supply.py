@@ -2,22 +2,22 @@
 获取信号灯信息 → 相位名称映射 → 信号分析 → 计算流量 → 清洗产能 → 返回最终 DataFrame
 """
 
+import os
+
 import requests
 import pandas as pd
-from TFlight_old import SignalAnalyzer, calculate_green_occ
+
+from instrumentation import PipelineStats
+from signal_cycles import green_path_for, green_ratio_frame, read_green_ratio, refresh_green_ratio
+from sketches import sketch_signal, write_sketches
+from textio import detect_compression
+from timeaxis import NAT_MS, parse_beijing_ms, to_beijing_naive, to_epoch_ms
 
 
 
 # ============================================================
 #        查询参数工具函数
 # ============================================================
-def _parse_beijing_time(value):
-    """Parse 'YYYY-MM-DD HH:mm:ss' (assumed Asia/Shanghai) into tz-naive pandas Timestamp."""
-    if value is None or value == "" or value == -1:
-        return None
-    ts = pd.to_datetime(value, format="%Y-%m-%d %H:%M:%S", errors="raise")
-    return ts.to_pydatetime()
-
 def _parse_direction_movement(direction, movement):
     if direction in (None, "", -1, "-1"):
         d = None
@@ -54,13 +54,23 @@ def _parse_direction_movement(direction, movement):
 # ============================================================
 # 1. 获取交通灯与相位映射
 # ============================================================
-def fetch_phase_mapping(base_url: str, cross_id: str, phase_map_path: str):
+def read_phase_map(phase_map_path):
+    """phase_map（PhaseId, PhaseName, Angle）：.xlsx 路径（需 openpyxl）、.csv 路径，或已读入的 DataFrame"""
+    if isinstance(phase_map_path, pd.DataFrame):
+        return phase_map_path.copy()
+    if str(phase_map_path).lower().endswith(".csv"):
+        return pd.read_csv(phase_map_path)
+    return pd.read_excel(phase_map_path)
+
+
+def fetch_phase_mapping(base_url: str, cross_id: str, phase_map_path, stats=None):
     """
     调用接口，获取 phaseId-road_id 关系，
-    并与 phase_map.xlsx 做字段补充 (PhaseName, Angle)
+    并与 phase_map.xlsx 做字段补充 (PhaseName, Angle)；phase_map_path 的写法见 read_phase_map
     """
 
-    resp = requests.post(f"{base_url}?crossId={cross_id}", timeout=10)
+    post = stats.wrap_http(requests.post) if stats is not None else requests.post
+    resp = post(f"{base_url}?crossId={cross_id}", timeout=10)
     resp.raise_for_status()
     data = resp.json()
 
@@ -80,7 +90,7 @@ def fetch_phase_mapping(base_url: str, cross_id: str, phase_map_path: str):
     mapping_df = pd.DataFrame(records).drop_duplicates()
 
     # 合并 phase_map.xlsx
-    phase_map = pd.read_excel(phase_map_path)
+    phase_map = read_phase_map(phase_map_path)
     phase_map["PhaseId"] = phase_map["PhaseId"].astype(int)
     mapping_df["phaseId"] = mapping_df["phaseId"].astype(int)
 
@@ -97,17 +107,39 @@ def fetch_phase_mapping(base_url: str, cross_id: str, phase_map_path: str):
 # ============================================================
 # 2. 信号数据分析
 # ============================================================
-def analyze_signal(signal_file: str, phase_ids, phase_map, green_output_path: str):
-    analyzer = SignalAnalyzer(
-        file_path=signal_file,
-        target_phase_ids=phase_ids
-    )
-    results = analyzer.run()
+def analyze_signal(signal_file: str, phase_ids, phase_map, green_output_path: str,
+                   checkpoint_path=None, extra=None):
+    """
+    checkpoint_path: 给定时走增量模式（signal_cycles.refresh_green_ratio）：只解析上次之后追加的行，
+    新周期追加到 green_output_path（为 None / os.devnull 时用 green_path_for(checkpoint_path)），返回全部历史周期；
+    extra: 可选 dict，写入本次刷新的计数（new_lines / new_rows / late_states ...）。
+    """
+    if checkpoint_path is not None:
+        if green_output_path in (None, os.devnull):
+            green_output_path = green_path_for(checkpoint_path)
+        _, info = refresh_green_ratio(signal_file, checkpoint_path, green_output_path, phase_ids=phase_ids)
+        if extra is not None:
+            extra.update(info)
+        df = read_green_ratio(green_output_path)
+    elif detect_compression(signal_file) is not None:
+        # SignalAnalyzer 只接受路径：gzip / zstd 压缩文件改走 signal_cycles（同口径，流式解压，不落临时文件）
+        df = green_ratio_frame(signal_file, phase_ids)
+        if green_output_path not in (None, os.devnull):
+            df.to_csv(green_output_path, index=False)
+    else:
+        # TFlight_old 不在本仓库中，只在走 SignalAnalyzer 时导入（检查点 / 压缩文件路径不需要）
+        from TFlight_old import SignalAnalyzer, calculate_green_occ
+
+        analyzer = SignalAnalyzer(
+            file_path=signal_file,
+            target_phase_ids=phase_ids
+        )
+        results = analyzer.run()
 
-    # 使用外部传入的路径
-    _, csv_rows = calculate_green_occ(results, output_path=green_output_path)
+        # 使用外部传入的路径
+        _, csv_rows = calculate_green_occ(results, output_path=green_output_path)
 
-    df = pd.DataFrame(csv_rows)
+        df = pd.DataFrame(csv_rows)
     df["phaseId"] = df["phaseId"].astype(int)
 
     df = df.merge(
@@ -164,7 +196,11 @@ def aggregate_to_15min(signal_df):
 # 4. 车道数匹配 + cleaned_capacity
 # ============================================================
 def match_lane_and_capacity(result_df, lane_csv_path):
-    lane_df = pd.read_csv(lane_csv_path)
+    """lane_csv_path: 车道数 CSV 路径，或直接传入 run_pipeline 返回的 lane66_df"""
+    if isinstance(lane_csv_path, pd.DataFrame):
+        lane_df = lane_csv_path.copy()
+    else:
+        lane_df = pd.read_csv(lane_csv_path)
     lane_df = lane_df.rename(columns={'turn_action': 'movement'})
 
     # 初次精确匹配
@@ -217,6 +253,70 @@ def match_lane_and_capacity(result_df, lane_csv_path):
     return merged
 
 
+# ============================================================
+# 5. 按查询参数过滤
+# ============================================================
+def filter_capacity(final_df, beginTime=None, endTime=None, direction=-1, movement=-1):
+    begin_ms = parse_beijing_ms(beginTime)
+    end_ms = parse_beijing_ms(endTime)
+
+    # time_bin is already 15min bins (naive UTC); filter on epoch ms, output tz-naive Beijing time
+    t_ms = to_epoch_ms(final_df["time_bin"], naive="utc")
+    final_df["time_bin"] = to_beijing_naive(t_ms)
+
+    if begin_ms is not None or end_ms is not None:
+        keep = t_ms != NAT_MS
+        if begin_ms is not None:
+            keep &= t_ms >= begin_ms
+        if end_ms is not None:
+            keep &= t_ms <= end_ms
+        final_df = final_df[keep]
+
+    d_filter, m_filter = _parse_direction_movement(direction, movement)
+    if d_filter is not None:
+        final_df = final_df[final_df["direction"].astype(str).str.upper() == d_filter]
+    if m_filter is not None:
+        final_df = final_df[final_df["movement"].astype(str) == m_filter]
+    return final_df
+
+
+# ============================================================
+# 信号侧阶段（不依赖车道数，可与 demand 并行）
+# ============================================================
+def run_signal_stages(base_url, cross_id, phase_map_path, signal_file, green_output_path, stats,
+                      return_sketches=False, signal_checkpoint_path=None):
+    """
+    相位映射 → 信号分析 → 15min 聚合，返回 agg_df；green_output_path=None 时不落盘。
+    signal_checkpoint_path: 给定时信号分析为增量模式（见 analyze_signal），本次刷新的计数记入 analyze_signal 阶段。
+    return_sketches=True 时返回 (agg_df, sketch_df)：逐周期明细在聚合前写入 相位 × 15min 分位数草图（见 sketches.py）。
+    """
+    with stats.stage("fetch_phase_mapping") as st:
+        mapping, phase_map = fetch_phase_mapping(base_url, cross_id, phase_map_path, stats)
+        st.rows_out = len(mapping)
+
+    with stats.stage("analyze_signal", rows_in=len(mapping)) as st:
+        signal_df = analyze_signal(
+            signal_file,
+            mapping['phaseId'].tolist(),
+            phase_map,
+            green_output_path if green_output_path is not None else os.devnull,    # ★ 传入
+            checkpoint_path=signal_checkpoint_path,
+            extra=st.extra,
+        )
+        st.rows_out = len(signal_df)
+
+    with stats.stage("aggregate_15min", rows_in=len(signal_df)) as st:
+        agg_df = aggregate_to_15min(signal_df)
+        st.rows_out = len(agg_df)
+
+    if not return_sketches:
+        return agg_df
+    with stats.stage("quantile_sketch", rows_in=len(signal_df)) as st:
+        sketch_df = sketch_signal(signal_df)
+        st.rows_out = len(sketch_df)
+    return agg_df, sketch_df
+
+
 # ============================================================
 # 主函数，返回最终 dataframe
 # ============================================================
@@ -225,46 +325,49 @@ def run_capacity_pipeline(
     cross_id: str,
     phase_map_path: str,
     signal_file: str,
-    lane_csv_path: str,
+    lane_csv_path,
     green_output_path: str = "temp_green_ratio_output.csv",
     beginTime=None,
     endTime=None,
     direction=-1,
-    movement=-1
+    movement=-1,
+    return_stats: bool = False,
+    profile=None,
+    sketch_output_path=None,
+    signal_checkpoint_path=None,
 ):
+    """
+    返回 final_df；return_stats=True 时返回 (final_df, PipelineStats)。
+    lane_csv_path: 车道数 CSV 路径或 lane66_df；green_output_path=None 时不写逐周期绿信比 CSV。
+    sketch_output_path: 周期 / 绿信比分位数草图 CSV，通常放在容量结果旁（sketches.sketch_path_for）；
+    按分析时段写全量，不受 beginTime / endTime 过滤，之后用 sketches.sketch_quantiles 按任意时间范围合并。
+    signal_checkpoint_path: 信号分析检查点（JSON）；给定时只分析 signal_file 上次之后追加的部分，
+    逐周期绿信比累积在 green_output_path（None 时放在检查点旁，见 signal_cycles.green_path_for）。
+    profile: "cprofile" / "tracemalloc" / "all"，缺省读环境变量 TRAFFIC_PROFILE。
+    """
+    stats = PipelineStats("supply.run_capacity_pipeline", profile=profile)
 
-    mapping, phase_map = fetch_phase_mapping(base_url, cross_id, phase_map_path)
-
-    signal_df = analyze_signal(
-    signal_file,
-    mapping['phaseId'].tolist(),
-    phase_map,
-    green_output_path     # ★ 传入
-)
-
-
-    agg_df = aggregate_to_15min(signal_df)
-
-    final_df = match_lane_and_capacity(agg_df, lane_csv_path)
-
-    # ============================================================
-    # 按查询参数过滤（可选）
-    # ============================================================
-    begin_dt = _parse_beijing_time(beginTime)
-    end_dt = _parse_beijing_time(endTime)
-
-    # time_bin is already 15min bins; keep tz-naive for filtering
-    final_df["time_bin"] = pd.to_datetime(final_df["time_bin"], errors="coerce", utc=True)        .dt.tz_convert("Asia/Shanghai").dt.tz_localize(None)
-
-    if begin_dt is not None:
-        final_df = final_df[final_df["time_bin"] >= begin_dt]
-    if end_dt is not None:
-        final_df = final_df[final_df["time_bin"] <= end_dt]
-
-    d_filter, m_filter = _parse_direction_movement(direction, movement)
-    if d_filter is not None:
-        final_df = final_df[final_df["direction"].astype(str).str.upper() == d_filter]
-    if m_filter is not None:
-        final_df = final_df[final_df["movement"].astype(str) == m_filter]
-
+    with stats.run():
+        if sketch_output_path is None:
+            agg_df = run_signal_stages(base_url, cross_id, phase_map_path, signal_file, green_output_path, stats,
+                                       signal_checkpoint_path=signal_checkpoint_path)
+        else:
+            agg_df, sketch_df = run_signal_stages(base_url, cross_id, phase_map_path, signal_file,
+                                                  green_output_path, stats, return_sketches=True,
+                                                  signal_checkpoint_path=signal_checkpoint_path)
+            write_sketches(sketch_df, sketch_output_path)
+
+        with stats.stage("match_lane_capacity", rows_in=len(agg_df)) as st:
+            final_df = match_lane_and_capacity(agg_df, lane_csv_path)
+            st.rows_out = len(final_df)
+
+        # ============================================================
+        # 按查询参数过滤（可选）
+        # ============================================================
+        with stats.stage("query_filter", rows_in=len(final_df)) as st:
+            final_df = filter_capacity(final_df, beginTime, endTime, direction, movement)
+            st.rows_out = len(final_df)
+
+    if return_stats:
+        return final_df, stats
     return final_df
@@ -1,12 +1,15 @@
 import pandas as pd
 import numpy as np
 import math
-from typing import Any, Dict, Optional, Tuple, Union
+from typing import Any, Dict, List, Optional, Sequence, Tuple, Union
+
+from aligned import SupplyDemandMatrix
+from timeaxis import BJ_TZ, NAT_MS, format_beijing_ms, freq_ms, parse_beijing_ms, resample_mean, to_beijing_aware, to_epoch_ms
 
 # ===========================================================
 #  Beijing timezone helpers
+#  （内部统一为 int64 epoch ms 列 t_ms，见 timeaxis.py；只在输入输出处换算）
 # ===========================================================
-BJ_TZ = "Asia/Shanghai"
 
 def _parse_beijing_time(value: Optional[Union[str, pd.Timestamp]]) -> Optional[pd.Timestamp]:
     """
@@ -25,17 +28,6 @@ def _parse_beijing_time(value: Optional[Union[str, pd.Timestamp]]) -> Optional[p
         ts = ts.tz_convert(BJ_TZ)
     return ts
 
-def _to_beijing_aware(series: pd.Series) -> pd.Series:
-    """
-    Convert a datetime-like Series to tz-aware Asia/Shanghai.
-    - If tz-naive: assume it's already Beijing local time, localize.
-    - If tz-aware: convert to Beijing.
-    """
-    s = pd.to_datetime(series, errors="coerce")
-    if getattr(s.dt, "tz", None) is None:
-        return s.dt.tz_localize(BJ_TZ)
-    return s.dt.tz_convert(BJ_TZ)
-
 def _normalize_direction_movement(
     direction: Union[str, int, None],
     movement: Union[str, int, None],
@@ -117,19 +109,10 @@ def _safe_float(x: Any) -> Optional[float]:
     except Exception:
         return None
 
-def _format_time(ts: pd.Timestamp) -> str:
-    """
-    Output time as 'YYYY-MM-DD HH:mm:ss' in Beijing local time.
-    """
-    if isinstance(ts, pd.Timestamp):
-        if ts.tzinfo is None:
-            # assume it's Beijing local
-            ts = ts.tz_localize(BJ_TZ)
-        else:
-            ts = ts.tz_convert(BJ_TZ)
-        return ts.strftime("%Y-%m-%d %H:%M:%S")
-    # fallback
-    return pd.to_datetime(ts).strftime("%Y-%m-%d %H:%M:%S")
+def _float_list(values) -> list:
+    """数组 → Python float 列表，NaN / inf 为 None（整列版 _safe_float）"""
+    v = np.asarray(values, dtype=float)
+    return np.where(np.isfinite(v), v, None).tolist()
 
 
 # ===========================================================
@@ -231,29 +214,35 @@ def run_resilience_analysis(
     endTime: str | None = None,
     direction=-1,
     movement=-1,
+    use_matrix: bool = True,
 ):
     """
     纯 column 版本：
     - 不使用 set_index
     - 不使用 groupby(level=...)
     - direction / movement / time_bin 只存在于 columns
+
+    use_matrix=True 时先尝试 aligned.SupplyDemandMatrix（序列 × 时间 稠密数组，结果相同）；
+    无法一格一行对齐（合并会产生笛卡尔积）时自动回退到 pd.merge 长表路径。
     """
+    capacity_df, demand_df = _prepare_frames(capacity_df, demand_df, beginTime, endTime, direction, movement)
+
+    matrix = SupplyDemandMatrix.from_frames(capacity_df, demand_df) if use_matrix else None
+    if matrix is not None:
+        return matrix.group_metrics(), _restore_time_bin(matrix.to_frame())
+    return _merge_and_metrics(capacity_df, demand_df)
+
+
+def _prepare_frames(capacity_df, demand_df, beginTime, endTime, direction, movement):
+    """run_resilience_analysis 第 0–4 步：复制、补字段、统一北京时间、时间与方向过滤"""
 
     # ---------- 0. 防御性复制 ----------
     capacity_df = capacity_df.copy() if capacity_df is not None else pd.DataFrame()
     demand_df = demand_df.copy() if demand_df is not None else pd.DataFrame()
 
-    # ---------- 1. 时间解析（北京时间，tz-aware） ----------
-    def _parse_beijing(ts):
-        if ts is None:
-            return None
-        t = pd.to_datetime(ts, format="%Y-%m-%d %H:%M:%S", errors="raise")
-        if t.tzinfo is None:
-            t = t.tz_localize("Asia/Shanghai")
-        return t
-
-    begin_ts = _parse_beijing(beginTime)
-    end_ts = _parse_beijing(endTime)
+    # ---------- 1. 时间解析（北京时间 → epoch ms） ----------
+    begin_ms = parse_beijing_ms(beginTime)
+    end_ms = parse_beijing_ms(endTime)
 
     # ---------- 2. 统一字段存在 ----------
     for df in (capacity_df, demand_df):
@@ -265,32 +254,25 @@ def run_resilience_analysis(
                 df["movement"] = None
 
 
-    # ---------- 2.5 统一 time_bin 为北京时间（tz-aware） ----------
-    def _ensure_beijing_tz(df):
-        if df.empty or "time_bin" not in df.columns:
-            return df
-        if not pd.api.types.is_datetime64_any_dtype(df["time_bin"]):
-            return df
-
-        # 如果 time_bin 是 tz-naive，补上 Asia/Shanghai
-        if df["time_bin"].dt.tz is None:
-            df["time_bin"] = df["time_bin"].dt.tz_localize("Asia/Shanghai")
-        return df
-
-    capacity_df = _ensure_beijing_tz(capacity_df)
-    demand_df   = _ensure_beijing_tz(demand_df)
+    # ---------- 2.5 time_bin → t_ms（epoch ms；naive 视为北京时间），之后只比较整数 ----------
+    for df in (capacity_df, demand_df):
+        if not df.empty and "time_bin" in df.columns:
+            df["t_ms"] = to_epoch_ms(df["time_bin"])
 
 
     # ---------- 3. 时间过滤 ----------
     def _time_filter(df):
-        if df.empty or "time_bin" not in df.columns:
+        if df.empty or "t_ms" not in df.columns:
             return df
-        out = df
-        if begin_ts is not None:
-            out = out[out["time_bin"] >= begin_ts]
-        if end_ts is not None:
-            out = out[out["time_bin"] <= end_ts]
-        return out
+        if begin_ms is None and end_ms is None:
+            return df
+        t = df["t_ms"].to_numpy()
+        keep = t != NAT_MS
+        if begin_ms is not None:
+            keep &= t >= begin_ms
+        if end_ms is not None:
+            keep &= t <= end_ms
+        return df[keep]
 
     capacity_df = _time_filter(capacity_df)
     demand_df = _time_filter(demand_df)
@@ -308,11 +290,31 @@ def run_resilience_analysis(
 
     capacity_df = _dm_filter(capacity_df)
     demand_df = _dm_filter(demand_df)
+    return capacity_df, demand_df
 
-    # ---------- 5. merge（column → column，不碰 index） ----------
+
+def _restore_time_bin(df: pd.DataFrame) -> pd.DataFrame:
+    """输出边界：t_ms → tz-aware 北京时间 time_bin（保持原列位置），去掉 t_ms"""
+    if "t_ms" not in df.columns:
+        return df
+    df["time_bin"] = to_beijing_aware(df["t_ms"].to_numpy())
+    return df.drop(columns=["t_ms"])
+
+
+def _merge_and_metrics(capacity_df, demand_df):
+    """run_resilience_analysis 第 5–8 步（长表路径）：左连接 → 有效利用供给 → 按方向 / 动作计算韧性"""
+
+    # ---------- 5. merge（column → column，不碰 index；时间按 t_ms 整数连接） ----------
     if capacity_df.empty:
         supply_demand = demand_df.copy()
         supply_demand["cleaned_capacity"] = pd.NA
+    elif "t_ms" in demand_df.columns and "t_ms" in capacity_df.columns:
+        supply_demand = pd.merge(
+            demand_df,
+            capacity_df.drop(columns=["time_bin"], errors="ignore"),
+            on=["t_ms", "direction", "movement"],
+            how="left",
+        )
     else:
         supply_demand = pd.merge(
             demand_df,
@@ -320,6 +322,7 @@ def run_resilience_analysis(
             on=["time_bin", "direction", "movement"],
             how="left",
         )
+    supply_demand = _restore_time_bin(supply_demand)
 
     # ---------- 6. 兜底字段 ----------
     if "smoothed_demand" not in supply_demand.columns:
@@ -375,9 +378,82 @@ def run_resilience_analysis(
 
 
 
+# ===========================================================
+# 3b) Shape-preserving downsampling (multi-series LTTB)
+# ===========================================================
+def lttb_indices(x: np.ndarray, ys: list, max_points: int) -> np.ndarray:
+    """
+    Largest-Triangle-Three-Buckets over several aligned series at once.
+    Each series is scaled to [0, 1] and the triangle areas are summed, so one
+    shared set of indices keeps the shape of every series (and charts that
+    overlay them stay aligned). First and last points are always kept.
+    NaN contributes zero area; returns sorted integer positions.
+    """
+    n = len(x)
+    if max_points is None or max_points >= n or n <= 2:
+        return np.arange(n)
+    max_points = max(int(max_points), 3)
+
+    x = np.asarray(x, dtype=float)
+    x = (x - x[0]) / ((x[-1] - x[0]) or 1.0)
+    scaled = []
+    for y in ys:
+        y = np.asarray(y, dtype=float)
+        finite = y[np.isfinite(y)]
+        lo = finite.min() if finite.size else 0.0
+        span = (finite.max() - lo) if finite.size and finite.max() > lo else 1.0
+        scaled.append(np.nan_to_num((y - lo) / span))
+    Y = np.vstack(scaled) if scaled else np.zeros((1, n))
+
+    # 中间 n-2 个点均分到 max_points-2 个桶；最后一个桶的“下一桶”即末点
+    edges = np.linspace(1, n - 1, max_points - 1).astype(np.int64)
+    edges = np.append(edges, n)
+    out = np.empty(max_points, dtype=np.int64)
+    out[0], out[-1] = 0, n - 1
+    a = 0
+    for b in range(max_points - 2):
+        lo, hi = edges[b], edges[b + 1]
+        cx = x[hi:edges[b + 2]].mean()
+        cy = Y[:, hi:edges[b + 2]].mean(axis=1, keepdims=True)
+        area = np.abs(
+            (x[a] - cx) * (Y[:, lo:hi] - Y[:, [a]]) - (x[a] - x[lo:hi]) * (cy - Y[:, [a]])
+        ).sum(axis=0)
+        a = lo + int(np.argmax(area))
+        out[b + 1] = a
+    return np.unique(out)
+
+
 # ===========================================================
 # 4) PDF output: /api/static/queryAll
 # ===========================================================
+def _forecast_points(forecast_df: pd.DataFrame, direction, movement, rule: str) -> Dict[str, list]:
+    """forecast_demand 长表 → forecastDemand / forecastBand（多序列按时刻取均值，与 trafficDemand 口径一致）"""
+    fc = _force_flat(forecast_df)
+    if "direction" not in fc.columns and "Direction" in fc.columns:
+        fc = fc.rename(columns={"Direction": "direction"})
+    if direction != -1 and "direction" in fc.columns:
+        fc = fc[fc["direction"].astype(str).str.upper() == str(direction).upper()]
+    if movement != -1 and "movement" in fc.columns:
+        fc = fc[fc["movement"] == movement]
+    if fc.empty:
+        return {"forecastDemand": [], "forecastBand": []}
+
+    fc = fc[fc["time_bin"].notna()]
+    value = fc["forecast_demand"].to_numpy(dtype=float)
+    lower = fc["forecast_lower"].to_numpy(dtype=float) if "forecast_lower" in fc.columns else value
+    upper = fc["forecast_upper"].to_numpy(dtype=float) if "forecast_upper" in fc.columns else value
+    t_ms, (value, lower, upper) = resample_mean(
+        to_epoch_ms(fc["time_bin"]), freq_ms(rule), value, lower, upper
+    )
+    keep = ~np.isnan(value)
+    times = format_beijing_ms(t_ms[keep])
+    value, lower, upper = _float_list(value[keep]), _float_list(lower[keep]), _float_list(upper[keep])
+    return {
+        "forecastDemand": [{"time": t, "value": v} for t, v in zip(times, value)],
+        "forecastBand": [{"time": t, "Lower": lo, "Upper": up} for t, lo, up in zip(times, lower, upper)],
+    }
+
+
 def build_queryAll_response(
     capacity_df: pd.DataFrame,
     demand_df: pd.DataFrame,
@@ -387,8 +463,17 @@ def build_queryAll_response(
     movement: Union[str, int, None] = -1,
     frequency: int = 2,
     metrics_df: Optional[pd.DataFrame] = None,
+    max_points: Optional[int] = None,
+    forecast_df: Optional[pd.DataFrame] = None,
+    use_matrix: bool = True,
 ) -> Dict[str, Any]:
     """
+    max_points: 每条曲线最多输出的点数；超出时按 LTTB 在服务端降采样，
+                trafficDemand / trafficCap / efUtilizedCap / actualVolume 及韧性带共用同一组时刻。
+    forecast_df: forecast.forecast_demand 的输出；给定时追加 forecastDemand（预测值）与
+                 forecastBand（Lower / Upper 区间），按同样的方向 / 动作过滤，不受 beginTime / endTime 限制。
+    use_matrix: 同 run_resilience_analysis；走稠密矩阵时各曲线直接由 序列 × 时间 数组按列聚合得到。
+
     输出结构（PDF + 扩展）：
       {
         "code": 0,
@@ -416,68 +501,89 @@ def build_queryAll_response(
     direction, movement = _normalize_direction_movement(direction, movement)
 
     # -------- 1. 计算韧性 & 合并序列 --------
-    if metrics_df is None:
-        metrics_df, merged_df = run_resilience_analysis(
-            capacity_df=capacity_df,
-            demand_df=demand_df,
-            beginTime=beginTime,
-            endTime=endTime,
-            direction=direction,
-            movement=movement,
-        )
+    # 能一格一行对齐时走稠密矩阵（不拼合并长表），否则回退到 run_resilience_analysis 的长表路径
+    capacity_f, demand_f = _prepare_frames(capacity_df, demand_df, beginTime, endTime, direction, movement)
+    matrix = SupplyDemandMatrix.from_frames(capacity_f, demand_f) if use_matrix else None
+    if matrix is not None:
+        merged_df = None
+        if metrics_df is None:
+            metrics_df = matrix.group_metrics()
     else:
-        _, merged_df = run_resilience_analysis(
-            capacity_df=capacity_df,
-            demand_df=demand_df,
-            beginTime=beginTime,
-            endTime=endTime,
-            direction=direction,
-            movement=movement,
-        )
-
-    if merged_df is None or merged_df.empty:
-        empty_data = {
-            "actualVolume": [],
-            "trafficDemand": [],
-            "trafficCap": [],
-            "efUtilizedCap": [],
-            "prepareResil": [],
-            "operateResil": [],
-            "designResil": [],
-            "recoverResil": [],
-            "generalResilience": None,
-        }
-        return {
-            "code": 0,
-            "success": True,
-            "data": empty_data,
-            "timestamp": int(pd.Timestamp.now(tz=BJ_TZ).timestamp() * 1000),
-        }
+        computed_metrics, merged_df = _merge_and_metrics(capacity_f, demand_f)
+        if metrics_df is None:
+            metrics_df = computed_metrics
+
+    forecast_data = (
+        _forecast_points(forecast_df, direction, movement, "5min" if int(frequency) == 1 else "15min")
+        if forecast_df is not None
+        else {}
+    )
 
-    merged_df = _force_flat(merged_df)
+    if matrix is None and (merged_df is None or merged_df.empty):
+        return _empty_response(forecast_data)
 
     # -------- 2. 频率 --------
     rule = "5min" if int(frequency) == 1 else "15min"
 
-    # -------- 3. 时间序列 --------
-    ts = merged_df.sort_values("time_bin").set_index("time_bin")
+    # -------- 3. 时间序列（epoch ms + NumPy 数组，输出时统一格式化一次） --------
+    if matrix is not None:
+        times_ms, demand_v, cap_v, ef_v = matrix.resample(rule)
+    else:
+        merged_df = _force_flat(merged_df)
+        step_ms = freq_ms(rule)
+        t_all = to_epoch_ms(merged_df["time_bin"])
+        valid = t_all != NAT_MS
+        demand_raw = merged_df["smoothed_demand"].to_numpy(dtype=float)[valid]
+        cap_raw = (
+            merged_df["cleaned_capacity"].to_numpy(dtype=float)[valid]
+            if "cleaned_capacity" in merged_df.columns
+            else np.zeros(int(valid.sum()))
+        )
+        times_ms, (demand_v, cap_v) = resample_mean(t_all[valid], step_ms, demand_raw, cap_raw)
+        ef_v = np.minimum(demand_v, cap_v)
+
+    return _series_response(times_ms, demand_v, cap_v, ef_v, metrics_df, forecast_data, max_points)
+
+
+def _empty_response(forecast_data: Dict[str, list]) -> Dict[str, Any]:
+    empty_data = {
+        "actualVolume": [],
+        "trafficDemand": [],
+        "trafficCap": [],
+        "efUtilizedCap": [],
+        "prepareResil": [],
+        "operateResil": [],
+        "designResil": [],
+        "recoverResil": [],
+        "generalResilience": None,
+        **forecast_data,
+    }
+    return {
+        "code": 0,
+        "success": True,
+        "data": empty_data,
+        "timestamp": int(pd.Timestamp.now(tz=BJ_TZ).timestamp() * 1000),
+    }
 
-    demand_series = ts["smoothed_demand"].resample(rule).mean()
 
-    cap_series = (
-        ts["cleaned_capacity"].resample(rule).mean()
-        if "cleaned_capacity" in ts.columns
-        else demand_series * 0
-    )
+def _series_response(
+    times_ms: np.ndarray,
+    demand_v: np.ndarray,
+    cap_v: np.ndarray,
+    ef_v: np.ndarray,
+    metrics_df: Optional[pd.DataFrame],
+    forecast_data: Dict[str, list],
+    max_points: Optional[int],
+) -> Dict[str, Any]:
+    """重采样后的三条曲线 + 韧性指标 → queryAll 响应（LTTB 降采样、格式化时刻）"""
+    if max_points is not None and len(times_ms) > max_points:
+        keep = lttb_indices(times_ms, [demand_v, cap_v, ef_v], max_points)
+        times_ms, demand_v, cap_v, ef_v = times_ms[keep], demand_v[keep], cap_v[keep], ef_v[keep]
 
-    ef_series = np.minimum(demand_series, cap_series)
-    actual_series = ef_series.copy()
+    labels = format_beijing_ms(times_ms)
 
-    def series_to_points(s: pd.Series) -> list:
-        return [
-            {"time": _format_time(t), "value": _safe_float(v)}
-            for t, v in s.items()
-        ]
+    def series_to_points(values: np.ndarray) -> list:
+        return [{"time": t, "value": v} for t, v in zip(labels, _float_list(values))]
 
     # -------- 4. 从 metrics 提取韧性指标 --------
     prepare = operate = design = recover = general = None
@@ -509,28 +615,26 @@ def build_queryAll_response(
             else None
         )
 
-    def band_points(index: pd.DatetimeIndex, upper: Optional[float]) -> list:
-        return [
-            {"time": _format_time(t), "Lower": 0.0, "Upper": upper}
-            for t in index
-        ]
-
-    idx = demand_series.index
+    def band_points(upper: Optional[float]) -> list:
+        return [{"time": t, "Lower": 0.0, "Upper": upper} for t in labels]
 
     data = {
-        "actualVolume": series_to_points(actual_series),
-        "trafficDemand": series_to_points(demand_series),
-        "trafficCap": series_to_points(cap_series),
-        "efUtilizedCap": series_to_points(ef_series),
+        "actualVolume": series_to_points(ef_v),
+        "trafficDemand": series_to_points(demand_v),
+        "trafficCap": series_to_points(cap_v),
+        "efUtilizedCap": series_to_points(ef_v),
 
         # 四阶段韧性
-        "prepareResil": band_points(idx, prepare),
-        "operateResil": band_points(idx, operate),
-        "designResil": band_points(idx, design),
-        "recoverResil": band_points(idx, recover),
+        "prepareResil": band_points(prepare),
+        "operateResil": band_points(operate),
+        "designResil": band_points(design),
+        "recoverResil": band_points(recover),
 
         # 综合韧性（单值）
         "generalResilience": general,
+
+        # 预测（可选）
+        **forecast_data,
     }
 
     return {
@@ -540,3 +644,67 @@ def build_queryAll_response(
         "timestamp": int(pd.Timestamp.now(tz=BJ_TZ).timestamp() * 1000),
     }
 
+
+# ===========================================================
+# 5) Batch: many direction / movement panels over one window
+# ===========================================================
+def _series_mask(series: pd.DataFrame, direction, movement) -> np.ndarray:
+    """与 _prepare_frames 的 _dm_filter 同口径，作用在矩阵的序列表上"""
+    mask = np.ones(len(series), dtype=bool)
+    if direction != -1:
+        mask &= (series["direction"] == direction).to_numpy()
+    if movement != -1:
+        mask &= (series["movement"] == movement).to_numpy()
+    return mask
+
+
+def build_queryAll_batch(
+    capacity_df: pd.DataFrame,
+    demand_df: pd.DataFrame,
+    beginTime: str,
+    endTime: str,
+    queries: Sequence[Tuple[Union[str, int, None], Union[str, int, None]]],
+    frequency: int = 2,
+    metrics_df: Optional[pd.DataFrame] = None,
+    max_points: Optional[int] = None,
+    forecast_df: Optional[pd.DataFrame] = None,
+    use_matrix: bool = True,
+) -> List[Dict[str, Any]]:
+    """
+    同一时间窗内多个 (direction, movement) 面板一次算完，返回与 queries 等长、顺序一致的响应列表，
+    每个响应与 build_queryAll_response(..., direction, movement, ...) 相同（曲线数值至多差浮点舍入）。
+    queries 中每项的写法同 build_queryAll_response 的两个参数，如 ("S-L", -1)、("N", "T")、(-1, -1)。
+
+    时间过滤、对齐矩阵、各 (direction, movement) 组的韧性指标只算一次；
+    各面板的曲线由 SupplyDemandMatrix.resample_subsets 在一次分组聚合中得到。
+    整表无法对齐为矩阵（或 use_matrix=False）时，时间过滤仍只做一次，各面板逐个走 build_queryAll_response。
+    """
+    queries = [_normalize_direction_movement(d, m) for d, m in queries]
+    rule = "5min" if int(frequency) == 1 else "15min"
+
+    capacity_f, demand_f = _prepare_frames(capacity_df, demand_df, beginTime, endTime, -1, -1)
+    matrix = SupplyDemandMatrix.from_frames(capacity_f, demand_f) if use_matrix else None
+    if matrix is None:
+        return [
+            build_queryAll_response(
+                capacity_f, demand_f, None, None, direction, movement, frequency,
+                metrics_df=metrics_df, max_points=max_points, forecast_df=forecast_df, use_matrix=use_matrix,
+            )
+            for direction, movement in queries
+        ]
+
+    group_metrics = matrix.group_metrics() if metrics_df is None else None
+    masks = np.vstack([_series_mask(matrix.series, d, m) for d, m in queries])
+    curves = matrix.resample_subsets(masks, rule)
+
+    responses = []
+    for (direction, movement), curve in zip(queries, curves):
+        forecast_data = _forecast_points(forecast_df, direction, movement, rule) if forecast_df is not None else {}
+        if curve is None:
+            responses.append(_empty_response(forecast_data))
+            continue
+        panel_metrics = metrics_df
+        if panel_metrics is None:
+            panel_metrics = group_metrics[_series_mask(group_metrics, direction, movement)]
+        responses.append(_series_response(*curve, panel_metrics, forecast_data, max_points))
+    return responses
@@ -0,0 +1,16 @@
+import os
+import sys
+
+import pytest
+
+# code/ 下为平铺模块（demand、supply_demand …），测试直接按模块名导入
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("TQDM_DISABLE", "1")
+
+
+@pytest.fixture(scope="session")
+def small_dataset(tmp_path_factory):
+    """small 规模的合成数据集（perception / signal / 路网），整个会话共用一份"""
+    from benchmarks import generate_dataset
+
+    return generate_dataset(str(tmp_path_factory.mktemp("bench_small")), "small")
@@ -0,0 +1,54 @@
+import io
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import budgeted
+import supply_demand as sd
+from benchmarks import make_supply_demand_frames
+
+
+def _csv_roundtrip(df):
+    buf = io.StringIO()
+    df.to_csv(buf, index=False)
+    buf.seek(0)
+    return pd.read_csv(buf)
+
+
+def _tz_aware(df):
+    return df.assign(time_bin=pd.to_datetime(df["time_bin"]).dt.tz_localize("Asia/Shanghai"))
+
+
+@pytest.fixture(scope="module")
+def frames():
+    return make_supply_demand_frames(days=2)
+
+
+@pytest.mark.parametrize("variant", ["plain", "str_capacity", "tz_capacity", "tz_demand"])
+def test_budgeted_resilience_matches_full_run(frames, variant):
+    cap, dem = frames
+    if variant == "str_capacity":
+        cap = _csv_roundtrip(cap)          # 从 CSV 读回，time_bin 为字符串列
+        assert cap["time_bin"].dtype == object
+    elif variant == "tz_capacity":
+        cap = _tz_aware(cap)
+    elif variant == "tz_demand":
+        dem = _tz_aware(dem)
+
+    m_full, merged_full = sd.run_resilience_analysis(cap, dem)
+    m_b, merged_b = budgeted.run_resilience_analysis_budgeted(cap, dem, n_slices=5)
+
+    keys = ["direction", "movement"]
+    m_full = m_full.sort_values(keys).reset_index(drop=True)
+    m_b = m_b.sort_values(keys).reset_index(drop=True)
+    for c in ["OR_operational", "DR_design", "RR_recovery"]:
+        np.testing.assert_allclose(m_b[c].astype(float), m_full[c].astype(float), rtol=1e-9, equal_nan=True)
+
+    order = keys + ["time_bin"]
+    merged_full = merged_full.sort_values(order).reset_index(drop=True)
+    merged_b = merged_b.sort_values(order).reset_index(drop=True)
+    assert len(merged_b) == len(merged_full)
+    assert merged_full["cleaned_capacity"].sum() > 0
+    for c in ["smoothed_demand", "cleaned_capacity"]:
+        np.testing.assert_allclose(merged_b[c].astype(float), merged_full[c].astype(float), equal_nan=True)
@@ -0,0 +1,69 @@
+import socket
+import threading
+import time
+
+import numpy as np
+
+import demand_stream
+from benchmarks import MockTrafficAPI, use_mock_endpoints
+
+LINES_PER_SEC = 2000
+
+
+def test_socket_replay_message_to_emit_latency(small_dataset):
+    ds = small_dataset
+    ids = [i["intersId"] for i in ds["network"]["intersections"]]
+    with MockTrafficAPI(ds["network"]) as api, use_mock_endpoints(api):
+        lane_map = demand_stream.build_lane_map(ids)
+    lines = open(ds["paths"]["perception"], "rb").read().splitlines(keepends=True)
+
+    sent = np.zeros(len(lines))      # 第 i 条消息（每行一条）写入 socket 的时刻
+    applied = np.zeros(len(lines))   # 第 i 条消息处理完（计数已更新）的时刻
+    emits = []                       # (on_emit 时刻, 触发它的消息序号)；只记处理消息时发出的窗口
+
+    class _Engine(demand_stream.StreamingDemandEngine):
+        current = None
+
+        def process(self, msg, arrival=None):
+            self.current = self.counters["messages"]
+            super().process(msg, arrival)
+            self.current = None
+            applied[self.counters["messages"] - 1] = time.perf_counter()
+
+    def _on_emit(result):
+        if engine.current is not None:
+            emits.append((time.perf_counter(), engine.current))
+
+    engine = _Engine(lane_map, on_emit=_on_emit)
+    ready, stop = threading.Event(), threading.Event()
+    source = demand_stream.socket_lines(port=0, idle_timeout=0.05, stop=stop, ready=ready)
+    consumer = threading.Thread(target=demand_stream.run_stream, args=(source, engine), kwargs={"flush_at_end": False})
+    consumer.start()
+    assert ready.wait(5)
+
+    # 按固定速率回放，记录每行写出的时刻
+    with socket.create_connection(("127.0.0.1", ready.port)) as conn:
+        t0 = time.perf_counter()
+        for i, line in enumerate(lines):
+            delay = t0 + i / LINES_PER_SEC - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            sent[i] = time.perf_counter()
+            conn.sendall(line)
+    deadline = time.time() + 30
+    while engine.counters["messages"] < len(lines) and time.time() < deadline:
+        time.sleep(0.01)
+    stop.set()
+    consumer.join(5)
+
+    assert engine.counters["messages"] == len(lines)
+    to_update = (applied - sent) * 1000
+    assert np.percentile(to_update, 99) < 1000
+
+    assert len(emits) >= 5
+    to_emit = np.array([(t - sent[i]) * 1000 for t, i in emits])
+    assert np.percentile(to_emit, 99) < 1000
+
+    summary = engine.latency_summary()
+    assert summary["p99_ms"] is not None and summary["p99_ms"] < 1000
+    assert summary["emit_p99_ms"] is not None and summary["emit_p99_ms"] < 1000
@@ -0,0 +1,20 @@
+import os
+import subprocess
+import sys
+
+CODE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _loaded_after_import(module, names):
+    code = f"import sys, {module}; print(' '.join(n for n in {names!r} if n in sys.modules))"
+    out = subprocess.run([sys.executable, "-c", code], cwd=CODE_DIR, capture_output=True, text=True, check=True)
+    return out.stdout.split()
+
+
+def test_import_demand_skips_optional_stage_dependencies():
+    optional = ["scipy", "network", "sampling", "density_tiles", "trajectory", "turning"]
+    assert _loaded_after_import("demand", optional) == []
+
+
+def test_import_orchestrator_is_light():
+    assert _loaded_after_import("orchestrator", ["pandas", "demand", "supply", "scipy"]) == []
@@ -0,0 +1,39 @@
+import threading
+
+from instrumentation import PipelineStats
+
+
+def test_nested_stage_keeps_outer_peak():
+    stats = PipelineStats("test", profile="tracemalloc")
+    with stats.run():
+        with stats.stage("outer"):
+            block = bytearray(50 * 1024 * 1024)
+            del block
+            with stats.stage("inner"):
+                small = bytearray(1024 * 1024)
+                del small
+    assert stats.stages["outer"].py_peak_mb >= 49
+    assert 0.9 <= stats.stages["inner"].py_peak_mb < 10
+
+
+def test_concurrent_stage_keeps_peak():
+    stats = PipelineStats("test", profile="tracemalloc")
+    allocated, inner_done = threading.Event(), threading.Event()
+
+    def _other():
+        allocated.wait()
+        other = PipelineStats("other")
+        with other.stage("other"):
+            pass
+        inner_done.set()
+
+    t = threading.Thread(target=_other)
+    with stats.run():
+        t.start()
+        with stats.stage("branch"):
+            block = bytearray(30 * 1024 * 1024)
+            del block
+            allocated.set()
+            inner_done.wait()
+    t.join()
+    assert stats.stages["branch"].py_peak_mb >= 29
@@ -0,0 +1,45 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import network
+from benchmarks.synthetic import build_network, intersection_links_frame, make_supply_demand_frames
+
+
+@pytest.fixture(scope="module")
+def grid():
+    net = build_network(3, 3)
+    graph = network.LinkGraph.from_frame(intersection_links_frame(net))
+    cap, dem = make_supply_demand_frames(days=1)
+    demand_df = pd.concat(
+        [dem.assign(link_id=dem["direction"].map(inter["inLinks"])) for inter in net["intersections"]],
+        ignore_index=True,
+    )
+    return net, graph, cap, demand_df
+
+
+def _propagate(grid, capacity_scale):
+    net, graph, cap, demand_df = grid
+    cap = cap.assign(cleaned_capacity=cap["cleaned_capacity"] * capacity_scale)
+    arrays = network.network_series_arrays(graph, demand_df, {i["intersId"]: cap for i in net["intersections"]})
+    op = network.series_operator(graph, arrays)
+    d = np.where(arrays["present"], np.nan_to_num(arrays["demand"]), 0.0)
+    return d, network.propagate_arrays(op, d, arrays["capacity"], arrays["present"], arrays["capped"])
+
+
+@pytest.mark.parametrize("capacity_scale", [1.0, 0.3])
+def test_propagation_conserves_vehicles(grid, capacity_scale):
+    d, r = _propagate(grid, capacity_scale)
+    final_backlog = r["unsatisfied"][:, -1].sum()
+    # 每辆车要么已放行、要么仍在某条 link 的队列中、要么在传往下游的途中
+    assert d.sum() == pytest.approx(r["served"].sum() + final_backlog + r["in_transit"].sum(), rel=1e-9)
+    assert d.sum() >= r["propagated"].sum() + final_backlog
+    assert (r["unsatisfied"] >= -1e-9).all()
+
+
+def test_network_backlog_not_above_isolated(grid):
+    net, graph, cap, demand_df = grid
+    cap = cap.assign(cleaned_capacity=cap["cleaned_capacity"] * 0.3)
+    res = network.propagate_unsatisfied(graph, demand_df, {i["intersId"]: cap for i in net["intersections"]})
+    assert res["propagated_demand"].sum() < res["demand"].sum()
+    assert res["unsatisfied_network"].sum() <= res["unsatisfied_local"].sum()
@@ -0,0 +1,37 @@
+import subprocess
+import sys
+
+import numpy as np
+import pytest
+
+import demand
+import sampling
+from benchmarks import MockTrafficAPI, use_mock_endpoints
+
+
+def test_count_interval_zero_count():
+    low, high = sampling.count_interval([0, 5], 0.05)
+    assert low[0] == 0 and high[0] > 0
+    assert low[1] >= 5 and high[1] > 5 / 0.05
+
+
+def test_sampling_import_does_not_load_scipy():
+    code = "import sys, sampling; sys.exit('scipy' in sys.modules)"
+    assert subprocess.run([sys.executable, "-c", code], cwd=sampling.__file__.rsplit("/", 1)[0]).returncode == 0
+
+
+def test_sampled_pipeline_keeps_every_bin(small_dataset):
+    ds = small_dataset
+    ids = [i["intersId"] for i in ds["network"]["intersections"]]
+    keys = ["time_bin", "link_id", "Direction", "movement"]
+    with MockTrafficAPI(ds["network"]) as api, use_mock_endpoints(api):
+        _, exact = demand.run_pipeline(ids, ds["paths"]["perception"])
+        _, approx = demand.run_pipeline(ids, ds["paths"]["perception"], sample_rate=0.02)
+
+    assert (approx["sampled"] == 0).any()
+    assert len(approx) == len(exact)
+    assert not approx[keys].duplicated().any()
+    assert (approx["demand_high"] > 0).all()
+    assert (approx["demand_low"] <= approx["demand"]).all() and (approx["demand"] <= approx["demand_high"]).all()
+    zero = approx["sampled"] == 0
+    assert np.allclose(approx.loc[zero, ["demand", "demand_low"]], 0)
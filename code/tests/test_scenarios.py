@@ -0,0 +1,34 @@
+import numpy as np
+import pytest
+
+import scenarios
+from benchmarks.synthetic import make_supply_demand_frames
+
+
+@pytest.fixture(scope="module")
+def frames():
+    return make_supply_demand_frames(days=1)
+
+
+def test_explicit_zero_factors_are_kept(frames):
+    cap, dem = frames
+    table = scenarios.evaluate_scenarios(cap, dem, [
+        {"name": "base"},
+        {"name": "closed", "capacity_scale": 0},
+        {"name": "no_demand", "demand_growth": 0},
+    ])
+    by = {name: g.reset_index(drop=True) for name, g in table.groupby("scenario")}
+    assert (by["closed"]["capacity_scale"] == 0).all()
+    assert (by["no_demand"]["demand_growth"] == 0).all()
+    assert (by["closed"]["mean_capacity"] == 0).all()
+    assert (by["no_demand"]["mean_demand"] == 0).all()
+    # 进口关闭：需求全部积压，积压显著高于基准情景
+    assert by["closed"]["backlog_final"].sum() > by["base"]["backlog_final"].sum()
+    assert np.allclose(by["base"]["capacity_scale"], 1.0)
+
+
+@pytest.mark.parametrize("key", ["capacity_scale", "demand_growth"])
+def test_negative_factor_rejected(frames, key):
+    cap, dem = frames
+    with pytest.raises(ValueError):
+        scenarios.evaluate_scenarios(cap, dem, [{key: -0.5}])
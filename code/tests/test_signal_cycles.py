@@ -0,0 +1,78 @@
+import gzip
+import random
+
+import pandas as pd
+import pytest
+
+import signal_cycles
+
+
+def _canon(df):
+    df = df.assign(startTime=pd.to_datetime(df["startTime"]))
+    return df.sort_values(["regionId", "nodeId", "phaseId", "startTime"]).reset_index(drop=True)[signal_cycles.GREEN_COLUMNS]
+
+
+def test_incremental_refresh_matches_full_run(small_dataset, tmp_path):
+    src = small_dataset["paths"]["signal"]
+    signal_cycles.refresh_green_ratio(src, str(tmp_path / "full.json"), str(tmp_path / "full.csv"))
+    full = _canon(signal_cycles.read_green_ratio(str(tmp_path / "full.csv")))
+    assert len(full) > 0
+
+    # 按随机字节块追加（会截断行），每次追加后增量刷新
+    data = open(src, "rb").read()
+    live = tmp_path / "live.txt"
+    live.write_bytes(b"")
+    rng = random.Random(1)
+    pos = 0
+    while pos < len(data):
+        step = rng.randint(1, len(data) // 10)
+        with open(live, "ab") as f:
+            f.write(data[pos:pos + step])
+        pos += step
+        signal_cycles.refresh_green_ratio(str(live), str(tmp_path / "inc.json"), str(tmp_path / "inc.csv"))
+    inc = _canon(signal_cycles.read_green_ratio(str(tmp_path / "inc.csv")))
+    pd.testing.assert_frame_equal(inc, full, check_dtype=False)
+
+    # 无新数据时刷新不改变结果
+    signal_cycles.refresh_green_ratio(str(live), str(tmp_path / "inc.json"), str(tmp_path / "inc.csv"))
+    pd.testing.assert_frame_equal(_canon(signal_cycles.read_green_ratio(str(tmp_path / "inc.csv"))), full, check_dtype=False)
+
+
+def test_compressed_one_shot_matches_refresh(small_dataset, tmp_path):
+    src = small_dataset["paths"]["signal"]
+    signal_cycles.refresh_green_ratio(src, str(tmp_path / "full.json"), str(tmp_path / "full.csv"))
+    full = _canon(signal_cycles.read_green_ratio(str(tmp_path / "full.csv")))
+
+    gz = tmp_path / "signal.txt.gz"
+    with open(src, "rb") as f, gzip.open(gz, "wb") as g:
+        g.write(f.read())
+    pd.testing.assert_frame_equal(_canon(signal_cycles.green_ratio_frame(str(gz))), full, check_dtype=False)
+
+
+def test_crash_between_append_and_checkpoint_does_not_duplicate(small_dataset, tmp_path, monkeypatch):
+    src = small_dataset["paths"]["signal"]
+    signal_cycles.refresh_green_ratio(src, str(tmp_path / "full.json"), str(tmp_path / "full.csv"))
+    full = _canon(signal_cycles.read_green_ratio(str(tmp_path / "full.csv")))
+
+    data = open(src, "rb").read()
+    live = tmp_path / "live.txt"
+    ckpt, out = str(tmp_path / "inc.json"), str(tmp_path / "inc.csv")
+    live.write_bytes(data[:len(data) // 3])
+    signal_cycles.refresh_green_ratio(str(live), ckpt, out)
+
+    # 新周期已追加到 CSV，保存检查点前进程退出
+    live.write_bytes(data[:2 * len(data) // 3])
+    save = signal_cycles.GreenRatioTracker.save
+
+    def _crash(self, path):
+        raise KeyboardInterrupt
+
+    monkeypatch.setattr(signal_cycles.GreenRatioTracker, "save", _crash)
+    with pytest.raises(KeyboardInterrupt):
+        signal_cycles.refresh_green_ratio(str(live), ckpt, out)
+    monkeypatch.setattr(signal_cycles.GreenRatioTracker, "save", save)
+
+    live.write_bytes(data)
+    signal_cycles.refresh_green_ratio(str(live), ckpt, out)
+    inc = _canon(signal_cycles.read_green_ratio(out))
+    pd.testing.assert_frame_equal(inc, full, check_dtype=False)
@@ -0,0 +1,49 @@
+import numpy as np
+import pandas as pd
+
+import sketches
+
+
+def _signal_frame(n=5000, seed=0):
+    rng = np.random.default_rng(seed)
+    begin = pd.Timestamp("2025-01-01") + pd.to_timedelta(np.sort(rng.integers(0, 10 * 86_400, n)), unit="s")
+    cycle = rng.integers(110, 150, n).astype(float)
+    return pd.DataFrame({
+        "phaseId": rng.integers(1, 4, n),
+        "startTime": begin,
+        "cycle_time_sec": cycle,
+        "green_ratio": rng.uniform(0.2, 0.5, n),
+    })
+
+
+def test_chunked_merge_equals_concat_merge(tmp_path):
+    sk = sketches.sketch_signal(_signal_frame())
+    path = tmp_path / "s.sketch.csv"
+    sketches.write_sketches(sk, path)
+    whole = sketches.merge_sketches(sk)
+    chunked = sketches.merge_sketches(sketches.read_sketches(path, chunk_rows=997))
+    pd.testing.assert_frame_equal(whole, chunked, check_dtype=False)
+    halves = sketches.merge_sketches(sk.iloc[: len(sk) // 2], sk.iloc[len(sk) // 2:], by=("phaseId", "time_bin", "metric"))
+    pd.testing.assert_frame_equal(halves, sketches.merge_sketches(sk, by=("phaseId", "time_bin", "metric")))
+
+
+def test_compaction_shrinks_and_keeps_quantiles(tmp_path):
+    sk = sketches.sketch_signal(_signal_frame())
+    path = tmp_path / "s.sketch.csv"
+    sketches.write_sketches(sk, path)
+    n_in, n_out = sketches.compact_sketch_file(path, chunk_rows=1000)
+    assert n_in == len(sk)
+    assert n_out < len(sk) / 4
+    compacted = sketches.read_sketches(path)
+    assert (compacted["time_bin"] == compacted["time_bin"].dt.floor("1D")).all()
+    pd.testing.assert_frame_equal(sketches.sketch_quantiles(compacted), sketches.sketch_quantiles(sk))
+
+
+def test_compaction_keeps_recent_bins():
+    sk = sketches.sketch_signal(_signal_frame())
+    before = pd.Timestamp("2025-01-06")
+    out = sketches.compact_sketches(sk, before=before)
+    recent = out[out["time_bin"] >= before].reset_index(drop=True)
+    expected = sk[sk["time_bin"] >= before].reset_index(drop=True)
+    pd.testing.assert_frame_equal(recent, expected, check_dtype=False)
+    assert out["count"].sum() == sk["count"].sum()
@@ -0,0 +1,27 @@
+import os
+
+from benchmarks import MockTrafficAPI
+
+import signal_cycles
+import supply
+
+
+def test_capacity_pipeline_runs_on_checkpoint_path(small_dataset, tmp_path):
+    ds = small_dataset
+    inter = ds["network"]["intersections"][0]
+    ckpt = str(tmp_path / "signal.ckpt.json")
+    with MockTrafficAPI(ds["network"]) as api:
+        final_df, stats = supply.run_capacity_pipeline(
+            base_url=api.url("getTrafficLightsByIntersectionId.do"),
+            cross_id=str(inter["nodeId"]),
+            phase_map_path=ds["paths"]["phase_map"],
+            signal_file=ds["paths"]["signal"],
+            lane_csv_path=ds["paths"]["lane_csv"][inter["nodeId"]],
+            green_output_path=None,
+            signal_checkpoint_path=ckpt,
+            return_stats=True,
+        )
+    assert len(final_df) > 0
+    assert final_df["cleaned_capacity"].notna().any()
+    assert os.path.exists(signal_cycles.green_path_for(ckpt))
+    assert "analyze_signal" in stats.stages
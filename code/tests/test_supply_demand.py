@@ -0,0 +1,98 @@
+import math
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import supply_demand as sd
+from benchmarks import make_supply_demand_frames
+from scenarios import backlog_arrays
+
+
+@pytest.fixture(scope="module")
+def frames():
+    cap, dem = make_supply_demand_frames(days=3)
+    begin = (dem["time_bin"].min() + pd.Timedelta("6h")).strftime("%Y-%m-%d %H:%M:%S")
+    end = (dem["time_bin"].max() - pd.Timedelta("6h")).strftime("%Y-%m-%d %H:%M:%S")
+    return cap, dem, begin, end
+
+
+def assert_same_response(a, b):
+    """queryAll 响应逐点比较，数值允许浮点舍入差异"""
+    assert a.keys() == b.keys()
+    da, db = a["data"], b["data"]
+    assert da.keys() == db.keys()
+    for k in da:
+        va, vb = da[k], db[k]
+        if not isinstance(va, list):
+            assert va == vb or math.isclose(va, vb, rel_tol=1e-9), k
+            continue
+        assert len(va) == len(vb), k
+        for pa, pb in zip(va, vb):
+            assert pa.keys() == pb.keys() and pa.get("time") == pb.get("time"), k
+            for f in pa:
+                x, y = pa[f], pb[f]
+                if f == "time" or x is None or y is None:
+                    assert x == y, (k, f)
+                else:
+                    assert math.isclose(x, y, rel_tol=1e-9, abs_tol=1e-9), (k, f, x, y)
+
+
+@pytest.mark.parametrize("gaps", [False, True])
+def test_backlog_closed_form_matches_loop(gaps):
+    rng = np.random.default_rng(1)
+    T = 400
+    demand = rng.gamma(2.0, 200.0, T)
+    capacity = rng.uniform(150.0, 350.0, T)
+    present = rng.random(T) > 0.2 if gaps else np.ones(T, dtype=bool)
+    unsatisfied, utilized = backlog_arrays(demand, capacity, present)
+
+    df = pd.DataFrame({
+        "time_bin": pd.date_range("2025-03-07", periods=T, freq="15min"),
+        "smoothed_demand": demand,
+        "cleaned_capacity": capacity,
+    })[present]
+    ref = sd.compute_utilized_supply_with_backlog(df)
+    np.testing.assert_allclose(unsatisfied[present], ref["unsatisfied_demand"].to_numpy())
+    np.testing.assert_allclose(utilized[present], ref["utilized_supply"].to_numpy())
+    assert np.isnan(unsatisfied[~present]).all()
+
+
+def test_resilience_matrix_path_matches_merge_path(frames):
+    cap, dem, begin, end = frames
+    m_matrix, merged_matrix = sd.run_resilience_analysis(cap, dem, beginTime=begin, endTime=end, use_matrix=True)
+    m_merge, merged_merge = sd.run_resilience_analysis(cap, dem, beginTime=begin, endTime=end, use_matrix=False)
+
+    keys = ["direction", "movement"]
+    pd.testing.assert_frame_equal(
+        m_matrix.sort_values(keys).reset_index(drop=True),
+        m_merge.sort_values(keys).reset_index(drop=True)[m_matrix.columns],
+        check_dtype=False,
+    )
+    order = keys + ["time_bin"]
+    pd.testing.assert_frame_equal(
+        merged_matrix.sort_values(order).reset_index(drop=True),
+        merged_merge.sort_values(order).reset_index(drop=True)[merged_matrix.columns],
+        check_dtype=False,
+    )
+
+
+@pytest.mark.parametrize("kwargs", [{}, {"frequency": 1}, {"max_points": 60}])
+def test_queryall_matrix_path_matches_merge_path(frames, kwargs):
+    cap, dem, begin, end = frames
+    for direction, movement in [(-1, -1), ("N-L", -1), ("S", "T")]:
+        assert_same_response(
+            sd.build_queryAll_response(cap, dem, begin, end, direction, movement, use_matrix=True, **kwargs),
+            sd.build_queryAll_response(cap, dem, begin, end, direction, movement, use_matrix=False, **kwargs),
+        )
+
+
+@pytest.mark.parametrize("use_matrix", [True, False])
+def test_batch_queryall_matches_per_panel(frames, use_matrix):
+    cap, dem, begin, end = frames
+    dirs = sorted(dem["direction"].dropna().unique())
+    queries = [(f"{d}-{m}", -1) for d in dirs for m in "LTR"] + [(d, -1) for d in dirs] + [(-1, "T"), (-1, -1), ("X", "L")]
+    batch = sd.build_queryAll_batch(cap, dem, begin, end, queries, use_matrix=use_matrix)
+    assert len(batch) == len(queries)
+    for (direction, movement), got in zip(queries, batch):
+        assert_same_response(got, sd.build_queryAll_response(cap, dem, begin, end, direction, movement, use_matrix=use_matrix))
@@ -0,0 +1,56 @@
+import pandas as pd
+import pytest
+
+import demand
+import turning
+from benchmarks import MockTrafficAPI, use_mock_endpoints
+from benchmarks.synthetic import intersection_links_frame, lane_snapshot, simulate_vehicles
+
+
+@pytest.fixture(scope="module")
+def pipelines(small_dataset):
+    ds = small_dataset
+    ids = [i["intersId"] for i in ds["network"]["intersections"]]
+    with MockTrafficAPI(ds["network"]) as api, use_mock_endpoints(api):
+        lane = demand.run_pipeline(ids, ds["paths"]["perception"])
+        od = demand.run_pipeline(ids, ds["paths"]["perception"], turning="od", return_od=True)
+    return lane, od
+
+
+def test_od_movements_match_simulated_moves(small_dataset):
+    ds = small_dataset
+    net, cfg = ds["network"], ds["config"]
+    veh = simulate_vehicles(net, ds["start_ms"], cfg["hours"], cfg["rate_per_lane_h"], seed=0)
+    truth = pd.concat([pd.DataFrame({"uuid": v["uuid"], "intersId": k, "move": v["move"]}) for k, v in veh.items()])
+    truth["move"] = truth["move"].map({"L": "Left Turn", "T": "Through", "R": "Right Turn"})
+
+    df_inter = intersection_links_frame(net)
+    lanes = pd.DataFrame(lane_snapshot(net))[["laneId", "link_id"]]
+    data = demand.attach_links(demand.parse_kafka_file(ds["paths"]["perception"]), lanes, set(df_inter["linkId"]))
+    vod = turning.vehicle_od(data, df_inter)
+    pairs = turning.pair_movements(vod)
+    m = vod.dropna(subset=["to_link"]).merge(pairs, on=["intersId", "from_link", "to_link"]).merge(truth, on=["uuid", "intersId"])
+    assert len(m) > 1000
+    assert (m["movement"] == m["move"]).all()
+
+
+def test_shared_lanes_split_without_double_counting_lanes(pipelines):
+    lane, od = pipelines
+    lane66, final = lane
+    lane66_od, final_od, od_df = od.lane66_df, od.final_df, od.od_df
+    # 直右车道上的右转车辆在 OD 模式下单独成为流向
+    assert "Right Turn" not in set(final["movement"])
+    assert "Right Turn" in set(final_od["movement"])
+    assert set(od_df["movement"]) >= {"Left Turn", "Through", "Right Turn"}
+    # 车道数仍按车道本身的 turnInfo：与 lane 模式一致，共用车道只计一次
+    key = ["link_id", "direction", "turn_action"]
+    pd.testing.assert_frame_equal(
+        lane66.sort_values(key, ignore_index=True), lane66_od.sort_values(key, ignore_index=True)
+    )
+
+
+def test_default_return_unpacks_to_two_frames(pipelines):
+    lane, od = pipelines
+    assert isinstance(lane, tuple) and len(lane) == 2
+    assert isinstance(od, demand.PipelineResult)
+    assert od.stats is None and od.traj_df is None and od.od_df is not None
@@ -0,0 +1,166 @@
+"""
+输入文件读取：gzip / zstd 压缩文件流式解压，未压缩文件走内存映射快速路径
+
+    with open_text(path) as f:           # 按魔数识别 gzip / zstd / 明文，逐行流式读取
+        for line in f: ...
+
+    for value in iter_value_bytes_mmap(path):   # 未压缩 Kafka dump：mmap 扫描字节，每条消息一个 bytes 切片
+        ...
+    for value, position in iter_messages_mmap(path):   # 同上，另给出 (topic, partition, offset)，供消息级去重
+        ...
+
+    lines, offset = read_appended_lines(path, offset)   # 只追加的文件：从上次的字节偏移读到最后一个完整行
+
+压缩格式按文件头魔数判断（不依赖扩展名）：gzip 用标准库；zstd 需要可选依赖 zstandard。
+"""
+
+import contextlib
+import gzip
+import io
+import mmap
+import os
+import re
+
+try:
+    import zstandard
+except ImportError:  # zstandard 为可选依赖，仅读取 .zst 时需要
+    zstandard = None
+
+GZIP_MAGIC = b"\x1f\x8b"
+ZSTD_MAGIC = b"\x28\xb5\x2f\xfd"
+
+READ_CHUNK = 1 << 20
+
+
+def detect_compression(path):
+    """返回 "gzip" / "zstd" / None"""
+    with open(path, "rb") as f:
+        head = f.read(4)
+    if head[:2] == GZIP_MAGIC:
+        return "gzip"
+    if head == ZSTD_MAGIC:
+        return "zstd"
+    return None
+
+
+def _zstd_module():
+    if zstandard is None:
+        raise ImportError("读取 zstd 压缩文件需要安装 zstandard：pip install zstandard")
+    return zstandard
+
+
+@contextlib.contextmanager
+def open_binary(path):
+    """按魔数打开为二进制流（压缩文件流式解压）"""
+    kind = detect_compression(path)
+    raw = open(path, "rb")
+    try:
+        if kind == "gzip":
+            with gzip.GzipFile(fileobj=raw) as f:
+                yield f
+        elif kind == "zstd":
+            with _zstd_module().ZstdDecompressor().stream_reader(raw, read_size=READ_CHUNK) as f:
+                yield io.BufferedReader(f, buffer_size=READ_CHUNK)
+        else:
+            yield raw
+    finally:
+        raw.close()
+
+
+@contextlib.contextmanager
+def open_text(path, encoding="utf-8"):
+    """按魔数打开为文本流，可直接替换 open(path, "r", encoding=...)"""
+    with open_binary(path) as f:
+        with io.TextIOWrapper(f, encoding=encoding) as text:
+            yield text
+
+
+# ============================================================
+# 未压缩 Kafka dump 的 mmap 快速路径
+# ============================================================
+_MARK = b"Received message:"
+_VALUE = b"value="
+_TAIL = b"}, partition"
+_VALUE_TAIL = re.compile(rb"(\{.*\}),\s*partition", re.S)
+_TOPIC = re.compile(rb"topic=([^,\s]*)")
+_POSITION = re.compile(rb"partition=(\d+),\s*offset=(\d+)")
+
+
+def kafka_position(head, tail):
+    """
+    消息头（"Received message: topic=..., key=..., "）与尾（"}, partition=0, offset=1"）→ (topic, partition, offset)；
+    bytes / str 均可，缺 partition 或 offset 时返回 None
+    """
+    if isinstance(head, str):
+        head, tail = head.encode("utf-8", "replace"), tail.encode("utf-8", "replace")
+    pos = _POSITION.search(tail)
+    if pos is None:
+        return None
+    topic = _TOPIC.search(head)
+    return (topic.group(1) if topic else b""), int(pos.group(1)), int(pos.group(2))
+
+
+def iter_value_bytes_mmap(path):
+    """
+    在 mmap 上按 "Received message: ... value=" 定位每条消息，产出 value 的 JSON 字节串
+    （json.loads 可直接解析 bytes），不为每行创建 str，每条消息只复制一次 value。
+    消息结束于下一条消息开头；value 取到最后一个 "}, partition" 之前，没有 partition 尾巴时取到最后一个 "}"。
+    """
+    for value, _ in iter_messages_mmap(path, positions=False):
+        yield value
+
+
+def iter_messages_mmap(path, positions=True):
+    """同 iter_value_bytes_mmap，产出 (value, position)；position 见 kafka_position，positions=False 时恒为 None"""
+    with open(path, "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            size = len(mm)
+            pos = mm.find(_MARK)
+            while pos >= 0:
+                nxt = mm.find(_MARK, pos + len(_MARK))
+                end = nxt if nxt >= 0 else size
+                eol = mm.find(b"\n", pos, end)
+                begin = mm.find(_VALUE, pos, eol if eol >= 0 else end)
+                if begin >= 0:
+                    begin += len(_VALUE)
+                    close = mm.rfind(_TAIL, begin, end)
+                    if close >= 0:
+                        position = kafka_position(mm[pos:begin], mm[close + 1:end]) if positions else None
+                        yield mm[begin:close + 1], position
+                    else:
+                        # 非标准分隔（"},  partition" 等）或无 partition 尾巴
+                        chunk = mm[begin:end]
+                        tail = _VALUE_TAIL.search(chunk)
+                        if tail:
+                            position = kafka_position(mm[pos:begin], chunk[tail.end(1):]) if positions else None
+                            yield tail.group(1), position
+                        elif chunk.rfind(b"}") >= 0:
+                            yield chunk[:chunk.rfind(b"}") + 1], None
+                pos = nxt
+
+
+# ============================================================
+# 只追加文件的增量读取
+# ============================================================
+def read_appended_lines(path, offset=0):
+    """
+    从 offset（解压后的字节位置）读到最后一个换行，返回 (lines, new_offset)，lines 为不含换行的 bytes 行。
+    末尾没有换行的半行（写入方尚未写完）不消费，留到下次；压缩文件只能从头解压到 offset（丢弃字节，不解析）。
+    """
+    with open_binary(path) as f:
+        try:
+            f.seek(offset)
+        except (OSError, io.UnsupportedOperation):
+            remaining = offset
+            while remaining > 0:
+                chunk = f.read(min(READ_CHUNK, remaining))
+                if not chunk:
+                    break
+                remaining -= len(chunk)
+        data = f.read()
+    cut = data.rfind(b"\n")
+    if cut < 0:
+        return [], offset
+    return data[:cut].split(b"\n"), offset + cut + 1
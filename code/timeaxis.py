@@ -0,0 +1,126 @@
+"""
+时间轴：supply / supply_demand 内部统一用 int64 epoch 毫秒（UTC）表示时刻，只在输入输出边界做一次北京时间换算
+
+    t_ms = to_epoch_ms(df["time_bin"])                 # naive 视为北京时间墙钟（naive="utc" 时视为 UTC）
+    t_ms = as_epoch_ms(data["timestamp"])              # 原始记录的毫秒时间戳
+    t_ms = t_ms[(t_ms >= parse_beijing_ms(beginTime)) & ...]
+    bins = floor_ms(t_ms, freq_ms("15min"))            # 按北京时间墙钟取整
+    labels = format_beijing_ms(t_ms)                   # ["2025-03-07 08:00:00", ...]
+    df["time_bin"] = to_beijing_naive(t_ms)            # 或 to_beijing_aware(t_ms)
+
+北京时间固定 UTC+8、无夏令时，换算只是加减 BEIJING_OFFSET_MS，不查时区库；
+按 15min / 1h 等取整（floor_ms）与按北京时间墙钟取整结果相同。缺失时刻为 NAT_MS。
+"""
+
+import numpy as np
+import pandas as pd
+
+BJ_TZ = "Asia/Shanghai"
+
+BEIJING_OFFSET_MS = 8 * 3600 * 1000
+
+NAT_MS = np.iinfo(np.int64).min
+
+_NS_PER_MS = 1_000_000
+
+
+def parse_beijing_ms(value):
+    """'YYYY-MM-DD HH:mm:ss'（北京时间）或 Timestamp → epoch ms；None / '' / -1 / NaN 返回 None"""
+    if value is None or (isinstance(value, str) and value == "") or (isinstance(value, (int, float)) and (value == -1 or value != value)):
+        return None
+    if isinstance(value, pd.Timestamp):
+        ts = value
+    else:
+        ts = pd.to_datetime(value, format="%Y-%m-%d %H:%M:%S", errors="raise")
+    if ts.tzinfo is not None:
+        return int(ts.value // _NS_PER_MS)
+    return int(ts.value // _NS_PER_MS) - BEIJING_OFFSET_MS
+
+
+def to_epoch_ms(values, naive="beijing"):
+    """
+    datetime 类 Series / Index / 数组（或可解析的字符串）→ int64 epoch ms，NaT 为 NAT_MS。
+    tz-aware 按其时区换算；naive 按 naive="beijing"（北京时间墙钟）或 "utc" 解释。
+    """
+    if isinstance(values, pd.Series):
+        values = values.array
+    dt = pd.DatetimeIndex(pd.to_datetime(values, errors="coerce"))
+    ns = dt.as_unit("ns").asi8
+    missing = dt.isna()
+    ms = ns // _NS_PER_MS
+    if dt.tz is None and naive == "beijing":
+        ms = ms - BEIJING_OFFSET_MS
+    return np.where(missing, NAT_MS, ms)
+
+
+def as_epoch_ms(values):
+    """数值（或数字字符串）形式的 epoch ms 列 → int64，缺失 / 无法解析为 NAT_MS"""
+    v = pd.to_numeric(pd.Series(values) if not isinstance(values, pd.Series) else values, errors="coerce")
+    v = v.to_numpy(dtype=float)
+    out = np.full(len(v), NAT_MS, dtype=np.int64)
+    ok = ~np.isnan(v)
+    out[ok] = v[ok].astype(np.int64)
+    return out
+
+
+def freq_ms(freq):
+    """'15min' / '1h' / Timedelta → 毫秒数"""
+    return int(pd.Timedelta(freq).value // _NS_PER_MS)
+
+
+def floor_ms(ms, step_ms):
+    """按北京时间墙钟向下取整到 step_ms（NAT_MS 保持不变）"""
+    ms = np.asarray(ms, dtype=np.int64)
+    out = (ms + BEIJING_OFFSET_MS) // step_ms * step_ms - BEIJING_OFFSET_MS
+    return np.where(ms == NAT_MS, NAT_MS, out)
+
+
+def hour_of_day(ms):
+    """北京时间小时（0–23）"""
+    return (np.asarray(ms, dtype=np.int64) + BEIJING_OFFSET_MS) // 3_600_000 % 24
+
+
+def _wall(ms):
+    ms = np.asarray(ms, dtype=np.int64)
+    return np.where(ms == NAT_MS, NAT_MS, ms + BEIJING_OFFSET_MS).astype("datetime64[ms]")
+
+
+def to_beijing_naive(ms):
+    """epoch ms → naive 北京时间 DatetimeIndex"""
+    return pd.DatetimeIndex(_wall(ms).astype("datetime64[ns]"))
+
+
+def to_beijing_aware(ms):
+    """epoch ms → tz-aware（Asia/Shanghai）DatetimeIndex"""
+    ms = np.asarray(ms, dtype=np.int64)
+    utc = np.where(ms == NAT_MS, NAT_MS, ms).astype("datetime64[ms]").astype("datetime64[ns]")
+    return pd.DatetimeIndex(utc).tz_localize("UTC").tz_convert(BJ_TZ)
+
+
+def format_beijing_ms(ms):
+    """epoch ms → ['YYYY-MM-DD HH:mm:ss', ...]（北京时间），整列一次格式化"""
+    text = np.datetime_as_string(_wall(ms).astype("datetime64[s]"), unit="s")
+    return [s.replace("T", " ") for s in text.tolist()]
+
+
+def resample_mean(ms, step_ms, *columns):
+    """
+    同 Series.resample(step).mean()（按北京时间墙钟分桶）：返回 (bucket_ms, [mean, ...])，
+    首末桶之间的空桶为 NaN，各列分别忽略 NaN。ms 中不得有 NAT_MS。
+    """
+    ms = np.asarray(ms, dtype=np.int64)
+    if len(ms) == 0:
+        return np.empty(0, dtype=np.int64), [np.empty(0) for _ in columns]
+    bucket = (ms + BEIJING_OFFSET_MS) // step_ms
+    b0 = int(bucket.min())
+    code = bucket - b0
+    n_b = int(code.max()) + 1
+    means = []
+    for col in columns:
+        v = np.asarray(col, dtype=float)
+        ok = ~np.isnan(v)
+        count = np.bincount(code[ok], minlength=n_b)
+        total = np.bincount(code[ok], weights=v[ok], minlength=n_b)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            means.append(np.where(count > 0, total / count, np.nan))
+    return (b0 + np.arange(n_b, dtype=np.int64)) * step_ms - BEIJING_OFFSET_MS, means
@@ -0,0 +1,292 @@
+"""
+车辆轨迹存储：按 uuid 排序的 CSR 结构 + 向量化速度 / 停车 / 进口道延误
+
+    store = TrajectoryStore.from_frame(data)       # data: uuid, timestamp, longitude, latitude[, link_id, turn_name]
+    veh = store.vehicle_metrics()                  # 每车：点数、时长、里程、平均速度、停车次数
+    runs = store.approach_runs()                   # 每车每进口道一行：行程时间、停车、延误
+
+uuids 升序排列，offsets[i]:offsets[i+1] 为第 i 辆车的点在 t_ms / lon / lat / link / turn 缓冲区中的区间，
+同一辆车内按时间升序。所有指标都在整块数组上计算，不逐车循环。
+"""
+
+import numpy as np
+import pandas as pd
+
+from timeaxis import floor_ms, freq_ms, to_beijing_naive
+
+EARTH_RADIUS_M = 6371008.8
+
+# 低于该速度（m/s）的步长视为停车
+STOP_SPEED_MPS = 1.5
+
+# 自由流速度缺省取该路段行驶步速的分位数
+FREE_FLOW_QUANTILE = 0.85
+
+
+def _step_distance_m(lon0, lat0, lon1, lat1):
+    """相邻点间距（等距圆柱近似，检测范围内误差可忽略）"""
+    lat_mid = np.radians((lat0 + lat1) / 2)
+    dx = np.radians(lon1 - lon0) * np.cos(lat_mid)
+    dy = np.radians(lat1 - lat0)
+    return EARTH_RADIUS_M * np.hypot(dx, dy)
+
+
+class TrajectoryStore:
+    def __init__(self, uuids, offsets, t_ms, lon, lat, link_code=None, links=None, turn_code=None, turns=None):
+        self.uuids = uuids
+        self.offsets = offsets
+        self.t_ms = t_ms
+        self.lon = lon
+        self.lat = lat
+        self.link_code = link_code
+        self.links = links
+        self.turn_code = turn_code
+        self.turns = turns
+
+    @classmethod
+    def from_frame(cls, data):
+        """由 parse_kafka_file / label_turns 之后的明细构建；link_id / turn_name 列可选"""
+        uuid_cat = pd.Categorical(data["uuid"].astype(str))
+        vcode = uuid_cat.codes.astype(np.int64)
+        t_ms = pd.to_numeric(data["timestamp"], errors="coerce").to_numpy(dtype=np.int64)
+        order = np.lexsort((t_ms, vcode))
+
+        counts = np.bincount(vcode, minlength=len(uuid_cat.categories))
+        offsets = np.zeros(len(counts) + 1, dtype=np.int64)
+        np.cumsum(counts, out=offsets[1:])
+
+        link_code = links = turn_code = turns = None
+        if "link_id" in data.columns:
+            lc, links = pd.factorize(data["link_id"].astype(str))
+            link_code = lc.astype(np.int32)[order]
+            links = np.asarray(links)
+        if "turn_name" in data.columns:
+            tc, turns = pd.factorize(data["turn_name"])
+            turn_code = tc.astype(np.int16)[order]
+            # 缺失流向编码为 -1，末尾补 None 使其取值为 None
+            turns = np.append(np.asarray(turns, dtype=object), None)
+
+        return cls(
+            uuids=np.asarray(uuid_cat.categories),
+            offsets=offsets,
+            t_ms=t_ms[order],
+            lon=data["longitude"].to_numpy(dtype=float)[order],
+            lat=data["latitude"].to_numpy(dtype=float)[order],
+            link_code=link_code,
+            links=links,
+            turn_code=turn_code,
+            turns=turns,
+        )
+
+    def __len__(self):
+        return len(self.uuids)
+
+    @property
+    def n_points(self):
+        return int(self.offsets[-1])
+
+    @property
+    def nbytes(self):
+        arrays = [self.offsets, self.t_ms, self.lon, self.lat, self.link_code, self.turn_code]
+        return int(sum(a.nbytes for a in arrays if a is not None))
+
+    def vehicle(self, uuid):
+        """单辆车的轨迹（按时间升序）"""
+        i = np.searchsorted(self.uuids, str(uuid))
+        if i >= len(self.uuids) or self.uuids[i] != str(uuid):
+            raise KeyError(uuid)
+        sl = slice(self.offsets[i], self.offsets[i + 1])
+        out = {"timestamp": self.t_ms[sl], "longitude": self.lon[sl], "latitude": self.lat[sl]}
+        if self.link_code is not None:
+            out["link_id"] = self.links[self.link_code[sl]]
+        if self.turn_code is not None:
+            out["turn_name"] = self.turns[self.turn_code[sl]]
+        return pd.DataFrame(out)
+
+    # ------------------------------
+    # 步长（相邻两点）
+    # ------------------------------
+    def _vehicle_of_point(self):
+        return np.repeat(np.arange(len(self.uuids)), np.diff(self.offsets))
+
+    def _steps(self, boundary):
+        """
+        点 i 处记录 (i-1 → i) 这一步：距离、时长、速度；boundary[i] 为 True 的点不构成步长。
+        """
+        dist = np.zeros(self.n_points)
+        dt = np.zeros(self.n_points)
+        if self.n_points > 1:
+            dist[1:] = _step_distance_m(self.lon[:-1], self.lat[:-1], self.lon[1:], self.lat[1:])
+            dt[1:] = np.diff(self.t_ms) / 1000.0
+        valid = ~boundary & (dt > 0)
+        dist = np.where(valid, dist, 0.0)
+        dt = np.where(valid, dt, 0.0)
+        speed = np.divide(dist, dt, out=np.full(self.n_points, np.nan), where=valid)
+        return valid, dist, dt, speed
+
+    def _vehicle_boundary(self):
+        boundary = np.zeros(self.n_points, dtype=bool)
+        boundary[self.offsets[:-1][np.diff(self.offsets) > 0]] = True
+        return boundary
+
+    @staticmethod
+    def _stop_events(valid, speed, stop_speed_mps):
+        """停车步长 + 停车事件起点（由行驶转为停车的步长）"""
+        stopped = valid & (np.nan_to_num(speed, nan=np.inf) < stop_speed_mps)
+        prev = np.zeros_like(stopped)
+        prev[1:] = stopped[:-1]
+        return stopped, stopped & ~prev
+
+    # ------------------------------
+    # 每车指标
+    # ------------------------------
+    def vehicle_metrics(self, stop_speed_mps=STOP_SPEED_MPS):
+        """每车：points, first_ms, last_ms, duration_s, distance_m, speed_kmh, stops, stopped_s"""
+        boundary = self._vehicle_boundary()
+        valid, dist, dt, speed = self._steps(boundary)
+        stopped, stop_start = self._stop_events(valid, speed, stop_speed_mps)
+        veh = self._vehicle_of_point()
+        n = len(self.uuids)
+
+        counts = np.diff(self.offsets)
+        nonempty = counts > 0
+        first_ms = np.zeros(n, dtype=np.int64)
+        last_ms = np.zeros(n, dtype=np.int64)
+        first_ms[nonempty] = self.t_ms[self.offsets[:-1][nonempty]]
+        last_ms[nonempty] = self.t_ms[self.offsets[1:][nonempty] - 1]
+        distance = np.bincount(veh, weights=dist, minlength=n)
+        moving_s = np.bincount(veh, weights=dt, minlength=n)
+
+        return pd.DataFrame({
+            "uuid": self.uuids,
+            "points": counts,
+            "first_ms": first_ms,
+            "last_ms": last_ms,
+            "duration_s": (last_ms - first_ms) / 1000.0,
+            "distance_m": distance,
+            "speed_kmh": np.divide(distance, moving_s, out=np.full(n, np.nan), where=moving_s > 0) * 3.6,
+            "stops": np.bincount(veh, weights=stop_start, minlength=n).astype(np.int64),
+            "stopped_s": np.bincount(veh, weights=np.where(stopped, dt, 0.0), minlength=n),
+        })
+
+    # ------------------------------
+    # 每车每进口道（连续处于同一 link 的一段）
+    # ------------------------------
+    def approach_runs(self, stop_speed_mps=STOP_SPEED_MPS, free_speed_mps=None, bin_freq="15min"):
+        """
+        每车在每个 link 上的连续一段为一次进口道通行，返回：
+        uuid, link_id, turn_name（取最后一个点，即最接近停车线的车道）, time_bin（首点所在时段，北京时间）,
+        enter_ms, exit_ms, points, distance_m, travel_s, speed_kmh, stops, stopped_s, free_speed_kmh, delay_s。
+        delay_s = travel_s − distance_m / 自由流速度；free_speed_mps 缺省按路段步速 85 分位估计。
+        """
+        if self.link_code is None:
+            raise ValueError("approach_runs 需要 link_id 列")
+
+        boundary = self._vehicle_boundary()
+        if self.n_points > 1:
+            boundary[1:] |= self.link_code[1:] != self.link_code[:-1]
+        valid, dist, dt, speed = self._steps(boundary)
+        stopped, stop_start = self._stop_events(valid, speed, stop_speed_mps)
+
+        starts = np.flatnonzero(boundary)
+        ends = np.r_[starts[1:], self.n_points] - 1
+        run_id = np.cumsum(boundary) - 1
+        n_runs = len(starts)
+
+        distance = np.bincount(run_id, weights=dist, minlength=n_runs)
+        travel_s = (self.t_ms[ends] - self.t_ms[starts]) / 1000.0
+        link = self.link_code[starts]
+
+        # 自由流速度：行驶中（非停车）步速的分位数
+        if free_speed_mps is None:
+            moving = valid & ~stopped
+            link_speed = (
+                pd.Series(speed[moving]).groupby(self.link_code[moving]).quantile(FREE_FLOW_QUANTILE)
+            )
+            free = link_speed.reindex(np.arange(len(self.links))).to_numpy()[link]
+        else:
+            free = np.full(n_runs, float(free_speed_mps))
+        free_time = np.divide(distance, free, out=np.full(n_runs, np.nan), where=free > 0)
+
+        out = pd.DataFrame({
+            "uuid": self.uuids[self._vehicle_of_point()[starts]],
+            "link_id": self.links[link],
+            "turn_name": self.turns[self.turn_code[ends]] if self.turn_code is not None else None,
+            "time_bin": to_beijing_naive(floor_ms(self.t_ms[starts], freq_ms(bin_freq))),
+            "enter_ms": self.t_ms[starts],
+            "exit_ms": self.t_ms[ends],
+            "points": ends - starts + 1,
+            "distance_m": distance,
+            "travel_s": travel_s,
+            "speed_kmh": np.divide(distance, travel_s, out=np.full(n_runs, np.nan), where=travel_s > 0) * 3.6,
+            "stops": np.bincount(run_id, weights=stop_start, minlength=n_runs).astype(np.int64),
+            "stopped_s": np.bincount(run_id, weights=np.where(stopped, dt, 0.0), minlength=n_runs),
+            "free_speed_kmh": free * 3.6,
+            "delay_s": np.clip(travel_s - free_time, 0.0, None),
+        })
+        return out
+
+    # ------------------------------
+    # 每车每进口道的到达 / 过停车线时刻
+    # ------------------------------
+    def stopline_events(self, stop_speed_mps=STOP_SPEED_MPS):
+        """
+        每车在每个 link 上的连续一段一行：uuid, link_id, turn_name, enter_ms,
+        arrive_ms（首次停车的时刻，即到达排队队尾；未停车为 cross_ms）, cross_ms（该段最后一个点，即过停车线前最后一次观测，早于实际过线不超过一个感知周期）, stops。
+        供 signal_states.arrival_on_green 按灯态区间标注。
+        """
+        if self.link_code is None:
+            raise ValueError("stopline_events 需要 link_id 列")
+
+        boundary = self._vehicle_boundary()
+        if self.n_points > 1:
+            boundary[1:] |= self.link_code[1:] != self.link_code[:-1]
+        valid, _, _, speed = self._steps(boundary)
+        _, stop_start = self._stop_events(valid, speed, stop_speed_mps)
+
+        starts = np.flatnonzero(boundary)
+        ends = np.r_[starts[1:], self.n_points] - 1
+        run_id = np.cumsum(boundary) - 1
+        n_runs = len(starts)
+
+        # 点 i 记录 (i-1 → i) 这一步，停车从 i-1 开始；每段取第一次
+        first_stop = np.full(n_runs, -1, dtype=np.int64)
+        stop_pts = np.flatnonzero(stop_start)
+        runs_with_stop, first = np.unique(run_id[stop_pts], return_index=True)
+        first_stop[runs_with_stop] = stop_pts[first] - 1
+        cross_ms = self.t_ms[ends]
+
+        return pd.DataFrame({
+            "uuid": self.uuids[self._vehicle_of_point()[starts]],
+            "link_id": self.links[self.link_code[starts]],
+            "turn_name": self.turns[self.turn_code[ends]] if self.turn_code is not None else None,
+            "enter_ms": self.t_ms[starts],
+            "arrive_ms": np.where(first_stop >= 0, self.t_ms[np.maximum(first_stop, 0)], cross_ms),
+            "cross_ms": cross_ms,
+            "stops": np.bincount(run_id, weights=stop_start, minlength=n_runs).astype(np.int64),
+        })
+
+
+# ============================================================
+# 进口道通行 → 时段 × 路段 × 流向 汇总
+# ============================================================
+def aggregate_approaches(runs, keys=("time_bin", "link_id", "turn_name"), min_points=2):
+    """
+    vehicles / speed_kmh（空间平均速度：总里程 / 总时间）/ mean_delay_s / total_delay_s /
+    stops_per_veh / stop_share（至少停一次的车辆占比）
+    """
+    runs = runs[runs["points"] >= min_points]
+    g = runs.assign(stopped_any=runs["stops"] > 0).groupby(list(keys), dropna=False)
+    out = g.agg(
+        vehicles=("uuid", "count"),
+        distance_m=("distance_m", "sum"),
+        travel_s=("travel_s", "sum"),
+        mean_delay_s=("delay_s", "mean"),
+        total_delay_s=("delay_s", "sum"),
+        stops_per_veh=("stops", "mean"),
+        stop_share=("stopped_any", "mean"),
+    ).reset_index()
+    out["speed_kmh"] = np.divide(
+        out["distance_m"], out["travel_s"], out=np.full(len(out), np.nan), where=out["travel_s"] > 0
+    ) * 3.6
+    return out.drop(columns=["distance_m", "travel_s"])
@@ -0,0 +1,223 @@
+"""
+轨迹推导的转向 OD：每辆车在每个交叉口的首个 inLink（来向）与末个 outLink（去向），
+得到 时段 × 交叉口 × from_link × to_link 的转向计数，不依赖车道 turnInfo
+
+    vod = vehicle_od(data, df_inter)               # data: attach_links 后、按 inLink + outLink 过滤的明细
+    od_df = od_matrix(vod, df_lane)                # time_bin, intersId, from_link, to_link, Direction, movement, vehicles
+    data = apply_od_turns(data, vod)               # 已解析去向的车辆改用 OD 流向的 turnInfo 编码
+
+一次分组：明细点按 link 展开为 (交叉口, 角色) 记录（同一 link 可以是上游的 outLink、下游的 inLink），
+按 (uuid × 交叉口, 角色, 时间) 排序后取每组首末点，inLink 组的首点为来向、outLink 组的末点为去向。
+时段按首个 inLink 观测时刻划分（与 first_appearance_demand 的首次出现口径一致）。
+
+流向由轨迹几何判定：进口段（inLink 首点 → 末点）与出口段（outLink 首点 → 末点）的方位角差，
+同一 (from_link, to_link) 的所有车辆取圆周平均后统一归为一个流向，单车的感知抖动不影响结果。
+共用车道（直右、左直右等）上的车辆因此按实际去向分到各流向，而不是按 TURN_MAP 归入单一流向或丢弃。
+"""
+
+import numpy as np
+import pandas as pd
+
+from timeaxis import floor_ms, freq_ms, to_beijing_naive
+
+# 方位角差（度，顺时针为正）→ 流向
+THROUGH_MAX_DEG = 45.0
+TURN_MAX_DEG = 135.0
+
+MOVEMENTS = ["Left Turn", "Through", "Right Turn", "U-Turn"]
+
+# 流向 → turnInfo 编码（与 demand.TURNINFO_MAP 一致），供 label_turns / TURN_MAP 沿用
+MOVEMENT_TURNINFO = {"Left Turn": 3, "Through": 1, "Right Turn": 2, "U-Turn": 8}
+
+ROLE_IN = 0
+ROLE_OUT = 1
+
+
+def link_roles(df_inter):
+    """df_inter（intersId, linkId, linkType）→ 去重后的 (link_id, intersId, role)"""
+    roles = pd.DataFrame({
+        "link_id": df_inter["linkId"].astype(str),
+        "intersId": df_inter["intersId"].astype(str),
+        "role": np.where(df_inter["linkType"] == "inLink", ROLE_IN, ROLE_OUT),
+    })
+    roles = roles[df_inter["linkType"].isin(["inLink", "outLink"]).to_numpy()]
+    return roles.drop_duplicates().reset_index(drop=True)
+
+
+def _bearing_deg(lon0, lat0, lon1, lat1):
+    """方位角（度，正北为 0、顺时针）；两点重合时为 NaN"""
+    dx = np.radians(lon1 - lon0) * np.cos(np.radians((lat0 + lat1) / 2))
+    dy = np.radians(lat1 - lat0)
+    with np.errstate(invalid="ignore"):
+        return np.where((dx != 0) | (dy != 0), np.degrees(np.arctan2(dx, dy)), np.nan)
+
+
+def classify_turn(turn_deg):
+    """方位角差（度，(-180, 180]）→ 流向；NaN → None"""
+    turn_deg = np.asarray(turn_deg, dtype=float)
+    a = np.abs(turn_deg)
+    out = np.where(
+        a <= THROUGH_MAX_DEG, "Through",
+        np.where(a > TURN_MAX_DEG, "U-Turn", np.where(turn_deg > 0, "Right Turn", "Left Turn")),
+    ).astype(object)
+    out[np.isnan(turn_deg)] = None
+    return out
+
+
+# ============================================================
+# 1. 每车每交叉口的来向 / 去向
+# ============================================================
+def vehicle_od(data, df_inter):
+    """
+    data: 含 uuid、timestamp（epoch ms）、longitude、latitude、link_id 的明细（link 同时包含 inLink 与 outLink）。
+    返回每车每交叉口一行：uuid, intersId, from_link, to_link, in_ms, out_ms, turn_deg；
+    在该交叉口没有 inLink 观测的车辆不出现，没有晚于来向的 outLink 观测时 to_link / out_ms / turn_deg 为缺失。
+    """
+    roles = link_roles(df_inter).sort_values("link_id", kind="stable")
+    links = pd.Index(roles["link_id"].unique())
+    inters = pd.Index(roles["intersId"].unique())
+    role_link = links.get_indexer(roles["link_id"])
+    role_inter = inters.get_indexer(roles["intersId"]).astype(np.int64)
+    role_kind = roles["role"].to_numpy(dtype=np.int8)
+    # 每个 link 的角色记录在 roles 中连续：[role_start[l], role_start[l] + role_count[l])
+    role_count = np.bincount(role_link, minlength=len(links))
+    role_start = np.r_[0, np.cumsum(role_count)[:-1]]
+
+    point_link = links.get_indexer(data["link_id"].astype(str))
+    pts = np.flatnonzero(point_link >= 0)
+    n_roles = role_count[point_link[pts]]
+
+    # 点 × 角色展开
+    src = np.repeat(pts, n_roles)
+    first = np.repeat(role_start[point_link[pts]], n_roles)
+    within = np.arange(len(src)) - np.repeat(np.cumsum(n_roles) - n_roles, n_roles)
+    r = first + within
+
+    uuid_code, uuids = pd.factorize(data["uuid"].astype(str))
+    t_ms = pd.to_numeric(data["timestamp"], errors="coerce").to_numpy(dtype=np.int64)[src]
+    lon = data["longitude"].to_numpy(dtype=float)[src]
+    lat = data["latitude"].to_numpy(dtype=float)[src]
+    group = uuid_code.astype(np.int64)[src] * len(inters) + role_inter[r]
+    kind = role_kind[r]
+    link = role_link[r]
+
+    order = np.lexsort((t_ms, kind, group))
+    group, kind, link, t_ms, lon, lat = group[order], kind[order], link[order], t_ms[order], lon[order], lat[order]
+
+    # (车 × 交叉口, 角色) 分组的首末点
+    cut = np.flatnonzero((group[1:] != group[:-1]) | (kind[1:] != kind[:-1])) + 1
+    starts = np.r_[0, cut] if len(group) else np.empty(0, dtype=np.int64)
+    ends = np.r_[cut, len(group)] - 1 if len(group) else np.empty(0, dtype=np.int64)
+    is_in = kind[starts] == ROLE_IN
+    a, b = starts[is_in], ends[is_in]                  # 来向：首点所在 inLink
+    c, d = starts[~is_in], ends[~is_in]                # 去向：末点所在 outLink
+
+    # outLink 组与同一 (车, 交叉口) 的 inLink 组对齐（组号升序，同组内 inLink 在前）
+    if len(c):
+        pos = np.minimum(np.searchsorted(group[c], group[a]), len(c) - 1)
+        c, d = c[pos], d[pos]
+        has_out = (group[c] == group[a]) & (t_ms[d] > t_ms[a])
+    else:
+        c, d = a, a
+        has_out = np.zeros(len(a), dtype=bool)
+
+    b_in = _bearing_deg(lon[a], lat[a], lon[b], lat[b])
+    b_out = _bearing_deg(lon[c], lat[c], lon[d], lat[d])
+    turn_deg = (b_out - b_in + 180.0) % 360.0 - 180.0
+
+    g = group[a]
+    return pd.DataFrame({
+        "uuid": np.asarray(uuids)[g // len(inters)],
+        "intersId": np.asarray(inters)[g % len(inters)],
+        "from_link": np.asarray(links)[link[a]],
+        "to_link": np.where(has_out, np.asarray(links, dtype=object)[link[d]], None),
+        "in_ms": t_ms[a],
+        "out_ms": np.where(has_out, t_ms[d], np.nan),
+        "turn_deg": np.where(has_out, turn_deg, np.nan),
+    })
+
+
+def pair_movements(vod):
+    """
+    (intersId, from_link, to_link) → 流向：该 link 对全部车辆方位角差的圆周平均，再按阈值归类。
+    返回 intersId, from_link, to_link, turn_deg, movement, vehicles
+    """
+    resolved = vod[vod["to_link"].notna()]
+    rad = np.radians(resolved["turn_deg"].to_numpy(dtype=float))
+    valid = ~np.isnan(rad)
+    g = resolved.assign(
+        sin=np.where(valid, np.sin(rad), 0.0),
+        cos=np.where(valid, np.cos(rad), 0.0),
+    ).groupby(["intersId", "from_link", "to_link"], sort=True)
+    pairs = g.agg(sin=("sin", "sum"), cos=("cos", "sum"), vehicles=("uuid", "size")).reset_index()
+    angle = np.degrees(np.arctan2(pairs["sin"], pairs["cos"])).to_numpy()
+    # 全部车辆都缺少方位（单点进口 / 出口）时无法判定
+    angle[(pairs["sin"] == 0).to_numpy() & (pairs["cos"] == 0).to_numpy()] = np.nan
+    pairs["turn_deg"] = angle
+    pairs["movement"] = classify_turn(angle)
+    return pairs[["intersId", "from_link", "to_link", "turn_deg", "movement", "vehicles"]]
+
+
+# ============================================================
+# 2. 时段 × OD 计数
+# ============================================================
+def od_matrix(vod, df_lane=None, freq="15min", sample_rate=None):
+    """
+    vehicle_od 的输出 → 每时段每交叉口的 OD 计数（只含已解析去向的车辆）：
+    time_bin, intersId, from_link, to_link, Direction, movement, vehicles；
+    df_lane 给定时 Direction 为来向 link 的方向（同 summarize_demand），否则为缺失。
+    sample_rate 给定时 vod 来自按 uuid 抽样的明细：sampled 保留抽中车辆数，vehicles 按 1 / sample_rate 放大。
+    """
+    resolved = vod[vod["to_link"].notna()]
+    pairs = pair_movements(resolved)
+    keys = ["intersId", "from_link", "to_link"]
+
+    t_bin = to_beijing_naive(floor_ms(resolved["in_ms"].to_numpy(dtype=np.int64), freq_ms(freq)))
+    od = (
+        resolved.assign(time_bin=t_bin)
+        .groupby(["time_bin", *keys], sort=True)
+        .size()
+        .reset_index(name="vehicles")
+        .merge(pairs[[*keys, "movement"]], on=keys, how="left")
+    )
+
+    if df_lane is not None and not df_lane.empty:
+        direction_map = df_lane[["roadId", "direction"]].drop_duplicates("roadId")
+        direction_map = direction_map.assign(roadId=direction_map["roadId"].astype(str)).rename(
+            columns={"roadId": "from_link", "direction": "Direction"}
+        )
+        od = od.merge(direction_map, on="from_link", how="left")
+    else:
+        od["Direction"] = None
+
+    if sample_rate is not None:
+        od["sampled"] = od["vehicles"]
+        od["vehicles"] = od["vehicles"] / sample_rate
+    columns = ["time_bin", *keys, "Direction", "movement", "vehicles"]
+    return od[columns + (["sampled"] if sample_rate is not None else [])]
+
+
+def apply_od_turns(data, vod):
+    """
+    已解析去向的车辆：其在来向 inLink 上的点 turnInfo 改为 OD 流向的编码（MOVEMENT_TURNINFO），
+    共用车道按实际去向拆分，缺失 turnInfo 的点也可补齐；未解析的车辆保留车道 turnInfo。
+    改写前的车道 turnInfo 保留在 lane_turnInfo 列（车道数按车道本身的转向统计，见 demand.summarize_demand）。
+    返回 (data, n_points)，n_points 为改写的点数。
+    """
+    pairs = pair_movements(vod)
+    codes = pairs["movement"].map(MOVEMENT_TURNINFO)
+    pairs = pairs[codes.notna()].assign(code=codes[codes.notna()].astype(np.int64))
+    veh = vod[["uuid", "intersId", "from_link", "to_link"]].merge(
+        pairs[["intersId", "from_link", "to_link", "code"]], on=["intersId", "from_link", "to_link"]
+    )
+    veh = veh.drop_duplicates(["uuid", "from_link"])
+    key = pd.MultiIndex.from_arrays([veh["uuid"], veh["from_link"]])
+    hit = key.get_indexer(pd.MultiIndex.from_arrays([data["uuid"].astype(str), data["link_id"].astype(str)]))
+    sel = hit >= 0
+    data = data.copy()
+    data["lane_turnInfo"] = data["turnInfo"]
+    if sel.any():
+        turn = data["turnInfo"].astype(object).to_numpy()
+        turn[sel] = veh["code"].to_numpy()[hit[sel]]
+        data["turnInfo"] = turn
+    return data, int(sel.sum())